@@ -1,10 +1,140 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
+import time
+from typing import Literal, Optional
+
+from elasticsearch import ApiError, TransportError
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from redis import RedisError
+
+from app.services import rollups
+from app.services.log_search import CursorExpired, InvalidCursor, LogQuery, shared_search
+from app.services.replays import ndjson, parse_time
 
 router = APIRouter()
 
+def _query(
+    source, q, scenario_id, vm_id, event_id, severity, start, end, order, size=100
+) -> LogQuery:
+    try:
+        return LogQuery.build(
+            source,
+            q,
+            scenario_id=scenario_id,
+            vm_id=vm_id,
+            event_id=event_id,
+            severity=severity,
+            start=parse_time(start),
+            end=parse_time(end),
+            order=order,
+            size=size,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 @router.get("/search")
-async def search_logs(q: str = "", db: AsyncSession = Depends(get_db)):
-    """Search logs in Elasticsearch"""
-    return {"results": [], "total": 0}
+async def search_logs(
+    q: str = "",
+    source: Optional[str] = None,
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+    event_id: Optional[str] = None,
+    severity: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    order: Literal["asc", "desc"] = "desc",
+    size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """Search logs in Elasticsearch (pass next_cursor back as cursor for the next page)"""
+    query = None
+    if cursor is None:
+        query = _query(source, q, scenario_id, vm_id, event_id, severity, start, end, order, size)
+    try:
+        return await run_in_threadpool(shared_search().search, query, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="Cursor expired; repeat the search")
+    except ValueError as exc:
+        # Query syntax the configured log store does not support
+        raise HTTPException(status_code=400, detail=str(exc))
+    except ApiError as exc:
+        raise HTTPException(status_code=400 if exc.meta.status == 400 else 502, detail=exc.message)
+    except TransportError:
+        raise HTTPException(status_code=503, detail="Elasticsearch unavailable")
+
+@router.get("/export")
+async def export_logs(
+    q: str = "",
+    source: Optional[str] = None,
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+    event_id: Optional[str] = None,
+    severity: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    order: Literal["asc", "desc"] = "asc",
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream every matching log document as NDJSON"""
+    query = _query(source, q, scenario_id, vm_id, event_id, severity, start, end, order)
+    documents = shared_search().export(query, limit)
+    try:
+        # Open the PIT and fetch the first batch now, so errors get a status code
+        first = await run_in_threadpool(next, documents, None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except ApiError as exc:
+        raise HTTPException(status_code=400 if exc.meta.status == 400 else 502, detail=exc.message)
+    except TransportError:
+        raise HTTPException(status_code=503, detail="Elasticsearch unavailable")
+
+    def stream():
+        if first is not None:
+            yield first
+            yield from documents
+
+    return StreamingResponse(ndjson(stream()), media_type="application/x-ndjson")
+
+@router.get("/aggregate")
+async def aggregate_logs(
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+    event_id: Optional[str] = None,
+    severity: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    interval: int = Query(60, ge=60),
+    group_by: str = "vm_id,event_id,severity",
+):
+    """Event counts, max risk score and distinct processes per bucket, from ingest-time rollups"""
+    try:
+        end_ts = parse_time(end)
+        start_ts = parse_time(start)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from/to must be epoch seconds or ISO-8601")
+    end_ts = time.time() if end_ts is None else end_ts
+    start_ts = end_ts - 3600 if start_ts is None else start_ts
+    filters = {
+        name: value
+        for name, value in (("vm_id", vm_id), ("event_id", event_id), ("severity", severity))
+        if value is not None
+    }
+    dimensions = [name for name in group_by.split(",") if name]
+    try:
+        result = await run_in_threadpool(
+            rollups.aggregate,
+            rollups.redis_client(),
+            start_ts,
+            end_ts,
+            interval,
+            scenario_id,
+            filters,
+            dimensions,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Rollup store unavailable")
+    return {"scenario_id": scenario_id, "from": start_ts, "to": end_ts, **result}
@@ -0,0 +1,56 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.replays import ReplayNotFound, ndjson, open_replay, parse_time
+
+router = APIRouter()
+
+
+@router.get("/{replay_id}/events")
+async def get_replay_events(
+    replay_id: str,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    limit: int = Query(1000, ge=1, le=100_000),
+):
+    """Stream replay events in a time range as NDJSON (time-ordered)"""
+    try:
+        reader = open_replay(replay_id)
+    except ReplayNotFound:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    try:
+        start_ts, end_ts = parse_time(start), parse_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from/to must be epoch seconds or ISO-8601")
+    events = reader.events(start_ts, end_ts, limit)
+    return StreamingResponse(ndjson(events), media_type="application/x-ndjson")
+
+
+@router.get("/{replay_id}/timeline")
+async def get_replay_timeline(
+    replay_id: str,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    points: int = Query(500, ge=3, le=10_000),
+    mode: Literal["buckets", "lttb"] = "buckets",
+    metric: Literal["events", "bytes"] = "events",
+):
+    """Event/byte volume over time, answered from the replay's timeline pyramid"""
+    try:
+        reader = open_replay(replay_id)
+    except ReplayNotFound:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    timeline = reader.timeline()
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="Replay has no timeline")
+    try:
+        start_ts, end_ts = parse_time(start), parse_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from/to must be epoch seconds or ISO-8601")
+    if mode == "lttb":
+        result = timeline.downsample(start_ts, end_ts, points, metric)
+    else:
+        result = timeline.buckets(start_ts, end_ts, points)
+    return {"replay_id": replay_id, "mode": mode, **result}
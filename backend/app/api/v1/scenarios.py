@@ -1,7 +1,12 @@
+import uuid
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+from app.db.base import Scenario
 from app.db.session import get_db
+from app.services.scenario_plan import PlanError, compile_plan
+from app.workers.tasks import SCENARIO_ACTIONS, scenario_run_task
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -26,6 +31,10 @@ async def list_scenarios(db: AsyncSession = Depends(get_db)):
 @router.post("/", response_model=ScenarioResponse)
 async def create_scenario(scenario: ScenarioCreate, db: AsyncSession = Depends(get_db)):
     """Create a new scenario"""
+    try:
+        compile_plan(scenario.steps, actions=SCENARIO_ACTIONS)
+    except PlanError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
     # TODO: Implement scenario creation
     return {"id": "scn_123", "name": scenario.name, "description": scenario.description, "status": "draft"}
 
@@ -37,9 +46,25 @@ async def get_scenario(scenario_id: str, db: AsyncSession = Depends(get_db)):
 
 @router.post("/{scenario_id}/run")
 async def run_scenario(scenario_id: str, db: AsyncSession = Depends(get_db)):
-    """Start scenario execution"""
-    # TODO: Implement scenario execution
-    return {"message": "Scenario started", "run_id": "run_456"}
+    """
+    Start scenario execution: compile the steps into a plan and queue it;
+    the run id is the id of the scenario.run task executing it
+    """
+    try:
+        scenario = await db.get(Scenario, uuid.UUID(scenario_id))
+    except ValueError:
+        scenario = None
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    try:
+        plan = compile_plan(scenario.steps, actions=SCENARIO_ACTIONS)
+    except PlanError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    run_id = str(uuid.uuid4())
+    await run_in_threadpool(
+        scenario_run_task.apply_async, args=(scenario_id, run_id, plan.to_dict()), task_id=run_id
+    )
+    return {"message": "Scenario started", "run_id": run_id, "plan": plan.summary()}
 
 @router.get("/{scenario_id}/history")
 async def scenario_history(scenario_id: str, db: AsyncSession = Depends(get_db)):
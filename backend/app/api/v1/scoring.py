@@ -1,15 +1,69 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from redis import RedisError
+from app.services import leaderboard, rollups, scoring_results
 
 router = APIRouter()
 
+def _cached(found) -> Response:
+    etag, body = found
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/results")
-async def get_scoring_results(db: AsyncSession = Depends(get_db)):
-    """Get scoring results"""
-    return []
+async def get_scoring_results(
+    scenario_run_id: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Results of one run (or a summary of every scored run), as materialized
+    when its scoring.calculate finished; send the ETag back as
+    If-None-Match to get a 304 while they are unchanged
+    """
+    client = rollups.redis_client()
+    try:
+        if scenario_run_id is None:
+            found = await run_in_threadpool(scoring_results.run_list, client, if_none_match)
+        else:
+            found = await run_in_threadpool(
+                scoring_results.run_results, client, scenario_run_id, if_none_match
+            )
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Scoring results store unavailable")
+    if found is None:
+        raise HTTPException(status_code=404, detail="No results for this run yet")
+    return _cached(found)
 
 @router.get("/leaderboard")
-async def get_leaderboard(db: AsyncSession = Depends(get_db)):
-    """Get leaderboard"""
-    return []
+async def get_leaderboard(
+    scenario_id: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Ranked teams for a scenario (or across all scenarios), one window of positions at a time"""
+    try:
+        return await run_in_threadpool(
+            leaderboard.page, rollups.redis_client(), scenario_id, offset, limit
+        )
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Leaderboard store unavailable")
+
+@router.get("/leaderboard/rank")
+async def get_team_rank(
+    team_id: str,
+    scenario_id: Optional[str] = None,
+    around: int = Query(0, ge=0, le=50),
+):
+    """A team's rank and score, with ``around`` neighbours on either side"""
+    try:
+        result = await run_in_threadpool(
+            leaderboard.team_rank, rollups.redis_client(), team_id, scenario_id, around
+        )
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Leaderboard store unavailable")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Team has no score on this leaderboard")
+    return result
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 
+
 class Settings(BaseSettings):
     # App
     APP_NAME: str = "RetroRange"
@@ -21,13 +22,98 @@ class Settings(BaseSettings):
 
     # Elasticsearch
     ELASTICSEARCH_URL: str = "http://localhost:9200"
+    ES_BULK_MAX_DOCS: int = 5000
+    ES_BULK_MAX_BYTES: int = 5 * 1024 * 1024
+    ES_BULK_FLUSH_INTERVAL: float = 1.0
+    ES_BULK_CONCURRENCY: int = 4
+    ES_BULK_MAX_RETRIES: int = 8
+
+    # Log search (cache: "memory", "redis" to share across replicas, or "none")
+    LOG_SEARCH_DEFAULT_INDEX: str = "sysmon-*"
+    LOG_SEARCH_CACHE: str = "memory"
+    LOG_SEARCH_CACHE_TTL: float = 30.0
+    LOG_SEARCH_CACHE_SIZE: int = 1024
+    LOG_SEARCH_PIT_KEEP_ALIVE: str = "2m"
+    LOG_SEARCH_EXPORT_BATCH: int = 1000
+
+    # Log store: "elasticsearch", or "embedded" for segment files under LOG_STORE_PATH
+    LOG_STORE: str = "elasticsearch"
+    LOG_STORE_PATH: str = "/tmp/retrorange/logs"
+    LOG_STORE_SEGMENT_DOCS: int = 50_000
+    # Adjacent segments of a size tier are merged LOG_STORE_MERGE_FACTOR at a
+    # time (1: never), into segments of at most LOG_STORE_MAX_MERGE_DOCS
+    LOG_STORE_MERGE_FACTOR: int = 10
+    LOG_STORE_MAX_MERGE_DOCS: int = 2_000_000
+
+    # Log parsing: payloads over LOG_PARSE_PARALLEL_BYTES are split into
+    # chunks of about LOG_PARSE_CHUNK_BYTES for a pool of LOG_PARSE_WORKERS
+    # processes (0: one per CPU; a single CPU always parses inline)
+    LOG_PARSE_WORKERS: int = 0
+    LOG_PARSE_PARALLEL_BYTES: int = 8 * 1024 * 1024
+    LOG_PARSE_CHUNK_BYTES: int = 1024 * 1024
+
+    # GeoIP enrichment of destination_ip at ingest (CSV range database; empty disables)
+    GEOIP_DB_PATH: str = ""
+    # Family of integer range bounds: 4, 6, or 0 to tell from each row's end bound
+    GEOIP_DB_FAMILY: int = 0
+    GEOIP_CACHE_SIZE: int = 65536
+
+    # IOC feeds: a file or a directory of files, one indicator per line (empty disables)
+    IOC_FEED_PATH: str = ""
+    IOC_RELOAD_INTERVAL: float = 30.0
+
+    # Ingest write-ahead log (fsync: "always", "interval" or "never";
+    # drain rate in docs/sec, 0 for unlimited)
+    INGEST_WAL_ENABLED: bool = False
+    INGEST_WAL_PATH: str = "/tmp/retrorange/wal"
+    INGEST_WAL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    INGEST_WAL_FSYNC: str = "interval"
+    INGEST_WAL_FSYNC_INTERVAL: float = 1.0
+    INGEST_WAL_DRAIN_BATCH: int = 5000
+    INGEST_WAL_DRAIN_RATE: float = 0.0
+    INGEST_WAL_DRAIN_INTERVAL: float = 5.0
+
+    # Per-minute log rollups in Redis
+    ROLLUP_TTL: int = 14 * 24 * 3600
+    ROLLUP_MAX_MINUTES: int = 7 * 24 * 60
+
+    # Scenario scoring: objective and alert events of a run, read from
+    # SCORING_INDEX; an objective is detected by an alert within
+    # SCORING_DETECTION_WINDOW seconds, unless it sets its own window; a
+    # team's score is cut by SCORING_FALSE_POSITIVE_WEIGHT x its false positive rate
+    SCORING_INDEX: str = "scoring-*"
+    SCORING_DETECTION_WINDOW: float = 900.0
+    SCORING_FALSE_POSITIVE_WEIGHT: float = 0.5
+    # Live scoring: events are applied once SCORING_LIVE_LATENESS seconds
+    # behind the newest one; stream entries expire after SCORING_LIVE_TTL
+    SCORING_LIVE_LATENESS: float = 30.0
+    SCORING_LIVE_TTL: int = 2 * 24 * 3600
+
+    # Scenario execution: steps whose dependencies are done run concurrently,
+    # at most SCENARIO_MAX_PARALLEL at a time unless the scenario sets max_parallel
+    SCENARIO_MAX_PARALLEL: int = 8
 
     # MinIO
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minioadmin"
     MINIO_SECRET_KEY: str = "minioadmin"
 
+    # Replay: replay.process decodes a capture in a pool of REPLAY_WORKERS
+    # processes. The children of a prefork worker are daemonic and cannot
+    # start one, so it (and logs.ingest with a raw payload of at least
+    # LOG_PARSE_PARALLEL_BYTES) goes to DECODE_QUEUE, which is consumed by
+    # a worker on the threads pool (make dev-decode-worker)
+    DECODE_QUEUE: str = "decode"
+    REPLAY_WORKERS: int = 4
+    REPLAY_OUTPUT_DIR: str = "/tmp/retrorange/replays"
+    REPLAY_READER_CACHE_SIZE: int = 32
+
+    # Risk scoring (JSON indicator file; empty uses the built-in rules)
+    RISK_RULES_PATH: str = ""
+    RISK_RULES_RELOAD_INTERVAL: float = 5.0
+
     class Config:
         env_file = ".env"
 
+
 settings = Settings()
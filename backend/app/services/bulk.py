@@ -0,0 +1,296 @@
+"""
+Elasticsearch bulk indexing
+Batches documents by count, size and age and sends several _bulk requests
+at once over one pooled client, retrying only the items that failed
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from elasticsearch import ApiError, Elasticsearch, TransportError
+
+from app.core.config import settings
+
+# Item / request statuses worth retrying; anything else is a permanent error
+RETRYABLE_STATUSES = frozenset((429, 502, 503, 504))
+
+
+@dataclass
+class BulkStats:
+    indexed: int = 0
+    failed: int = 0
+    # Failed because Elasticsearch stayed unreachable or kept rejecting (retryable)
+    unavailable: int = 0
+    retried: int = 0
+    throttled: int = 0
+    requests: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def docs_per_sec(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.indexed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "indexed": self.indexed,
+            "failed": self.failed,
+            "unavailable": self.unavailable,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "docs_per_sec": round(self.docs_per_sec, 1),
+        }
+
+
+# One queued document: (action line, source line), both NDJSON-encoded
+_Item = Tuple[bytes, bytes]
+
+
+class BulkIndexer:
+    """
+    Concurrent, batching _bulk client
+
+    ``add()`` serialises a document straight into the open batch. A batch
+    is sent when it reaches ``max_docs`` or ``max_bytes``, or when it is
+    ``flush_interval`` seconds old. Up to ``concurrency`` batches are in
+    flight at once, all on one ``Elasticsearch`` client whose connection
+    pool has one connection per worker.
+
+    Backpressure: when every worker is busy ``add()`` blocks, and a 429
+    (for the whole request or for any item) pauses *all* workers for an
+    exponentially growing, jittered delay before the rejected items alone
+    are resent. Items with permanent errors are counted and kept (up to
+    ``max_errors``) in ``stats.errors``.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Elasticsearch] = None,
+        max_docs: int = settings.ES_BULK_MAX_DOCS,
+        max_bytes: int = settings.ES_BULK_MAX_BYTES,
+        flush_interval: float = settings.ES_BULK_FLUSH_INTERVAL,
+        concurrency: int = settings.ES_BULK_CONCURRENCY,
+        max_retries: int = settings.ES_BULK_MAX_RETRIES,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 10.0,
+        max_errors: int = 100,
+    ):
+        self.client = client or Elasticsearch(
+            settings.ELASTICSEARCH_URL,
+            connections_per_node=concurrency,
+            # Retries are per item and handled here
+            max_retries=0,
+            retry_on_status=(),
+            request_timeout=60,
+        )
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_errors = max_errors
+        self.stats = BulkStats()
+
+        self._lock = threading.Lock()
+        self._batch: List[_Item] = []
+        self._batch_bytes = 0
+        self._batch_started = 0.0
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk")
+        self._pending: List[Future] = []
+        self._throttle_until = 0.0
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_on_age, name="bulk-timer", daemon=True)
+        self._timer.start()
+
+    def __enter__(self) -> "BulkIndexer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, index: str, document: Dict[str, Any], doc_id: Optional[str] = None) -> None:
+        action: Dict[str, Any] = {"_index": index}
+        if doc_id is not None:
+            action["_id"] = doc_id
+        item = (
+            json.dumps({"index": action}, separators=(",", ":")).encode() + b"\n",
+            json.dumps(document, separators=(",", ":"), default=str).encode() + b"\n",
+        )
+        with self._lock:
+            if not self._batch:
+                self._batch_started = time.monotonic()
+            self._batch.append(item)
+            self._batch_bytes += len(item[0]) + len(item[1])
+            if len(self._batch) < self.max_docs and self._batch_bytes < self.max_bytes:
+                return
+            batch = self._take_batch()
+        self._submit(batch)
+
+    def flush(self) -> BulkStats:
+        """Send the open batch and wait for every in-flight request"""
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._submit(batch)
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return self.stats
+            for future in pending:
+                future.result()
+
+    def close(self) -> BulkStats:
+        self._closed.set()
+        stats = self.flush()
+        self._pool.shutdown(wait=True)
+        return stats
+
+    # ------------------------------------------------------------------
+
+    def _take_batch(self) -> List[_Item]:
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        return batch
+
+    def _submit(self, batch: List[_Item]) -> None:
+        # Blocks the producer while every worker is busy
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._send, batch)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(future)
+
+    def _flush_on_age(self) -> None:
+        interval = max(self.flush_interval / 4, 0.01)
+        while not self._closed.wait(interval):
+            with self._lock:
+                due = self._batch and time.monotonic() - self._batch_started >= self.flush_interval
+                batch = self._take_batch() if due else None
+            if batch:
+                self._submit(batch)
+
+    def _wait_for_throttle(self) -> None:
+        delay = self._throttle_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _throttle(self, attempt: int) -> None:
+        delay = min(self.max_backoff, self.initial_backoff * 2**attempt)
+        delay *= random.uniform(0.5, 1.0)
+        with self._lock:
+            self.stats.throttled += 1
+            self._throttle_until = max(self._throttle_until, time.monotonic() + delay)
+
+    def _send(self, batch: List[_Item]) -> None:
+        attempt = 0
+        while batch:
+            self._wait_for_throttle()
+            body = b"".join(line for item in batch for line in item)
+            try:
+                response = self.client.bulk(operations=body)
+            except ApiError as exc:
+                if exc.meta.status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    self._record_failures(batch, exc.meta.status, str(exc))
+                    return
+                self._throttle(attempt)
+                attempt += 1
+                continue
+            except TransportError as exc:
+                if attempt >= self.max_retries:
+                    self._record_failures(batch, None, str(exc))
+                    return
+                self._throttle(attempt)
+                attempt += 1
+                continue
+
+            retry: List[_Item] = []
+            indexed = 0
+            rejected = False
+            for item, result in zip(batch, response["items"]):
+                outcome = next(iter(result.values()))
+                status = outcome.get("status", 500)
+                if status < 300:
+                    indexed += 1
+                elif status in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    retry.append(item)
+                    rejected = rejected or status == 429
+                else:
+                    self._record_failures([item], status, outcome.get("error"))
+            with self._lock:
+                self.stats.indexed += indexed
+                self.stats.requests += 1
+                self.stats.bytes += len(body)
+                self.stats.retried += len(retry)
+            if retry:
+                if rejected:
+                    self._throttle(attempt)
+                attempt += 1
+            batch = retry
+
+    def _record_failures(self, items: List[_Item], status: Optional[int], error: Any) -> None:
+        with self._lock:
+            self.stats.failed += len(items)
+            if status is None or status in RETRYABLE_STATUSES:
+                self.stats.unavailable += len(items)
+            for action, _ in items[: max(0, self.max_errors - len(self.stats.errors))]:
+                self.stats.errors.append(
+                    {"action": json.loads(action), "status": status, "error": error}
+                )
+
+
+def daily_index(prefix: str, timestamp: Any = None) -> str:
+    """
+    ``<prefix>-YYYY.MM.DD`` for an event timestamp (ISO string or epoch),
+    by its UTC day; today's index if it is missing or unparseable
+    """
+    day = None
+    try:
+        if isinstance(timestamp, (int, float)):
+            day = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        elif isinstance(timestamp, str):
+            day = datetime.fromisoformat(timestamp)
+            # Naive timestamps are taken as UTC
+            day = day.astimezone(timezone.utc) if day.tzinfo else day
+    except (ValueError, OverflowError, OSError):
+        day = None
+    if day is None:
+        day = datetime.now(timezone.utc)
+    return f"{prefix}-{day:%Y.%m.%d}"
+
+
+_shared: Optional[BulkIndexer] = None
+_shared_pid: Optional[int] = None
+_shared_lock = threading.Lock()
+
+
+def shared_indexer() -> BulkIndexer:
+    """
+    Process-wide BulkIndexer, created on first use
+
+    Created lazily (and again after a fork) so prefork workers each get
+    their own client, threads and connection pool.
+    """
+    global _shared, _shared_pid
+    with _shared_lock:
+        if _shared is None or _shared_pid != os.getpid():
+            _shared = BulkIndexer()
+            _shared_pid = os.getpid()
+        return _shared
@@ -0,0 +1,378 @@
+"""
+GeoIP enrichment
+Answers address -> location lookups from a local CSV range database
+(DB-IP / IP2Location style: one ``start,end,...`` row per range), in
+process, for the ingest path that replaces Logstash's geoip filter
+
+Bounds are addresses or integers. Integer files are either all IPv4
+(IP2Location's IPv4 CSV) or all IPv6 (its IPv6 CSV, where IPv4 appears as
+``::ffff:0:0/96`` ranges); the family is given per file or, by default,
+read from each row's end bound. IPv4-mapped ranges are filed as IPv4, as
+``address_value`` does for addresses, so one lookup path serves both.
+
+Ranges are loaded into sorted integer arrays: each family keeps the
+range starts, with gaps between ranges filled in as "no location"
+entries, and a parallel array of record numbers into a table of
+distinct location records. A lookup is one bisect. IPv4 additionally
+keeps a 65536-entry index on the top 16 bits that narrows the bisect to
+the few ranges in that /16, so it touches a handful of cache lines even
+on multi-million-row databases. Hot addresses are served from an LRU.
+Batches (``lookup_many``, which ingest uses) are packed into one array
+per family and resolved with a single ``np.searchsorted`` each: IPv6
+starts are also kept as 16-byte big-endian strings, which sort as the
+numbers do.
+"""
+
+import bisect
+import csv
+import socket
+import struct
+import threading
+from array import array
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Columns after start/end when the file has no header (DB-IP city lite)
+DEFAULT_COLUMNS = ("continent_code", "country_code", "region_name", "city_name", "lat", "lon")
+
+_V4 = struct.Struct(">I")
+_V4_MAX = 0xFFFFFFFF
+# ::ffff:0:0/96, where IPv6 databases keep IPv4
+_MAPPED = 0xFFFF << 32
+_MAPPED_PREFIX = np.frombuffer(bytes(10) + b"\xff\xff", dtype=np.uint8)
+_BLOCK_SHIFT = 16
+_pton4 = partial(socket.inet_pton, socket.AF_INET)
+_pton6 = partial(socket.inet_pton, socket.AF_INET6)
+
+
+class GeoIPDatabaseError(ValueError):
+    pass
+
+
+def address_value(address: str) -> Tuple[int, int]:
+    """``(4 or 6, integer)`` for an address string; IPv4-mapped IPv6 counts as IPv4"""
+    if ":" in address:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+        if value >> 32 == 0xFFFF:
+            return 4, value & _V4_MAX
+        return 6, value
+    return 4, _V4.unpack(socket.inet_pton(socket.AF_INET, address))[0]
+
+
+def _bound(text: str, family: int) -> Tuple[int, int]:
+    """``(family, value)``; IPv6 values are the full 128-bit address, mapped or not"""
+    if text.isdigit():
+        return family, int(text)
+    if ":" in text:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+    return 4, _V4.unpack(socket.inet_pton(socket.AF_INET, text))[0]
+
+
+def _split(
+    start_text: str, end_text: str, family: Optional[int] = None
+) -> Iterator[Tuple[int, int, int]]:
+    """
+    ``(family, start, end)`` pieces of one range row: the part of an IPv6
+    range inside ``::ffff:0:0/96`` becomes an IPv4 range. ``family`` is that
+    of integer bounds; None takes IPv6 when the end bound needs more than 32 bits.
+    """
+    start_text, end_text = start_text.strip(), end_text.strip()
+    if family is None and end_text.isdigit():
+        family = 6 if int(end_text) > _V4_MAX else 4
+    try:
+        start_family, start = _bound(start_text, family)
+        end_family, end = _bound(end_text, family)
+    except OSError:
+        raise GeoIPDatabaseError(f"Invalid range {start_text} - {end_text}")
+    if start_family != end_family or start > end or (start_family == 4 and end > _V4_MAX):
+        raise GeoIPDatabaseError(f"Invalid range {start_text} - {end_text}")
+    if start_family == 4:
+        yield 4, start, end
+        return
+    mapped_end = _MAPPED + _V4_MAX
+    if start < _MAPPED:
+        yield 6, start, min(end, _MAPPED - 1)
+    if start <= mapped_end and end >= _MAPPED:
+        yield 4, max(start, _MAPPED) - _MAPPED, min(end, mapped_end) - _MAPPED
+    if end > mapped_end:
+        yield 6, max(start, mapped_end + 1), end
+
+
+def _record(columns: Sequence[str], values: Sequence[str]) -> Dict[str, Any]:
+    record: Dict[str, Any] = {}
+    location: Dict[str, float] = {}
+    for name, value in zip(columns, values):
+        value = value.strip()
+        if not value or value == "-":
+            continue
+        if name in ("lat", "latitude", "lon", "longitude"):
+            try:
+                location["lat" if name.startswith("lat") else "lon"] = float(value)
+            except ValueError:
+                pass
+        else:
+            record[name] = value
+    if len(location) == 2:
+        # geo_point shape, as the Logstash geoip filter writes it
+        record["location"] = location
+    return record
+
+
+class _Table:
+    """Sorted range starts with a record number each (-1 for gaps)"""
+
+    def __init__(self, ranges: List[Tuple[int, int, int]], typecode: str, indexed: bool):
+        ranges.sort()
+        starts: List[int] = []
+        records: List[int] = []
+        previous_end = -1
+        for start, end, record in ranges:
+            if start <= previous_end:
+                raise GeoIPDatabaseError(f"Overlapping range starting at {start}")
+            if start > previous_end + 1:
+                starts.append(previous_end + 1)
+                records.append(-1)
+            starts.append(start)
+            records.append(record)
+            previous_end = end
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+            records.insert(0, -1)
+        # Values above the last range have no entry
+        self.end = previous_end
+        # IPv6 values exceed 64 bits, so that family keeps a list of ints
+        self.starts = array(typecode, starts) if typecode else starts
+        self.records = array("i", records)
+        # For find_many: IPv4 starts as a view of the same memory, IPv6 ones
+        # as big-endian bytes. An empty table's only entry is a gap at 0.
+        self._records = np.frombuffer(self.records, dtype=np.int32)
+        if typecode:
+            self._starts = np.frombuffer(self.starts, dtype=np.uint32)
+            self._end: Any = max(self.end, 0)
+        else:
+            self._starts = np.array([start.to_bytes(16, "big") for start in starts], dtype="S16")
+            self._end = np.bytes_(max(self.end, 0).to_bytes(16, "big"))
+        self.blocks: Optional[array] = None
+        if indexed:
+            # blocks[k]: first entry whose start is >= k << 16
+            self.blocks = array(
+                "I",
+                (bisect.bisect_left(self.starts, k << _BLOCK_SHIFT) for k in range(65537)),
+            )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def find(self, value: int) -> int:
+        """Record number for ``value``, -1 if no range holds it"""
+        if value > self.end:
+            return -1
+        blocks = self.blocks
+        if blocks is not None:
+            block = value >> _BLOCK_SHIFT
+            position = bisect.bisect_right(self.starts, value, blocks[block], blocks[block + 1])
+        else:
+            position = bisect.bisect_right(self.starts, value)
+        return self.records[position - 1]
+
+    def find_many(self, values: np.ndarray) -> np.ndarray:
+        """``find`` for an array of values (uint32, or S16 big-endian for IPv6) at once"""
+        # In ascending order, each search starts from where the last one ended:
+        # far fewer cache misses than random probes into a large table
+        order = np.argsort(values)
+        positions = np.empty(len(values), dtype=np.intp)
+        positions[order] = np.searchsorted(self._starts, values[order], side="right") - 1
+        numbers = self._records[positions]
+        numbers[values > self._end] = -1
+        return numbers
+
+
+class GeoIPDatabase:
+    """
+    Range database, built from ``(start, end, record)`` triples
+
+    ``from_csv`` reads a file whose first two columns are the range bounds
+    (addresses, or integers of the given ``family``) and the rest location
+    fields named by the header row, if the file has one, else by ``columns``. Latitude and
+    longitude become a ``location`` geo_point. Rows with identical
+    location fields share one record.
+    """
+
+    def __init__(
+        self,
+        ranges: Iterable[Tuple[str, str, Dict[str, Any]]] = (),
+        cache_size: int = settings.GEOIP_CACHE_SIZE,
+        family: Optional[int] = None,
+    ):
+        if family not in (None, 4, 6):
+            raise ValueError("family must be 4, 6 or None")
+        self.records: List[Dict[str, Any]] = []
+        # Keyed by identity: sources pass the same dict for repeated records
+        interned: Dict[int, int] = {}
+        families: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+        for start_text, end_text, record in ranges:
+            pieces = list(_split(start_text, end_text, family))
+            number = interned.get(id(record))
+            if number is None:
+                number = interned[id(record)] = len(self.records)
+                self.records.append(record)
+            for piece_family, start, end in pieces:
+                families[piece_family].append((start, end, number))
+        self.v4 = _Table(families[4], "I", indexed=True)
+        self.v6 = _Table(families[6], "", indexed=False)
+        # Record by number, with None last so that -1 (no range) maps to it
+        self._by_number: List[Optional[Dict[str, Any]]] = [*self.records, None]
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_csv(
+        cls,
+        path: str,
+        columns: Sequence[str] = DEFAULT_COLUMNS,
+        cache_size: int = settings.GEOIP_CACHE_SIZE,
+        family: Optional[int] = None,
+    ) -> "GeoIPDatabase":
+        return cls(_read_csv(path, columns), cache_size, family)
+
+    def __len__(self) -> int:
+        return len(self.v4) + len(self.v6)
+
+    def _lookup(self, address: str) -> Optional[Dict[str, Any]]:
+        """Location record for ``address``, None if unknown or not an address"""
+        try:
+            if ":" in address:
+                family, value = address_value(address)
+            else:
+                # Dotted quad, the common case, without the extra call
+                family, value = 4, _V4.unpack(socket.inet_pton(socket.AF_INET, address))[0]
+        except (OSError, ValueError, TypeError):
+            return None
+        number = (self.v4 if family == 4 else self.v6).find(value)
+        return None if number < 0 else self.records[number]
+
+    def lookup_many(self, addresses: Sequence[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Records for a whole batch, in order
+
+        Each distinct address is resolved once, with one ``np.searchsorted``
+        per family; IPv4-mapped IPv6 addresses go to the IPv4 table.
+        Bypasses the LRU, which would only churn on a bulk batch.
+        """
+        found: Dict[Optional[str], Optional[Dict[str, Any]]] = dict.fromkeys(addresses)
+        v4: List[str] = []
+        v6: List[str] = []
+        for address in found:
+            if isinstance(address, str):
+                (v6 if ":" in address else v4).append(address)
+        by_number = self._by_number
+        v4, packed = _pack(v4, _pton4)
+        if v4:
+            values = np.frombuffer(packed, dtype=">u4").astype(np.uint32)
+            found.update(zip(v4, map(by_number.__getitem__, self.v4.find_many(values).tolist())))
+        v6, packed = _pack(v6, _pton6)
+        if v6:
+            raw = np.frombuffer(packed, dtype=np.uint8).reshape(-1, 16)
+            mapped = (raw[:, :12] == _MAPPED_PREFIX).all(axis=1)
+            numbers = np.empty(len(v6), dtype=np.int32)
+            if mapped.any():
+                values = raw[mapped, 12:].view(">u4").ravel().astype(np.uint32)
+                numbers[mapped] = self.v4.find_many(values)
+            numbers[~mapped] = self.v6.find_many(np.frombuffer(packed, dtype="S16")[~mapped])
+            found.update(zip(v6, map(by_number.__getitem__, numbers.tolist())))
+        return [found[address] for address in addresses]
+
+    def enrich(
+        self,
+        documents: Sequence[Dict[str, Any]],
+        source_field: str = "destination_ip",
+        target: str = "geoip",
+    ) -> int:
+        """
+        Set ``target`` on each document whose ``source_field`` resolves (to the
+        shared record, so treat it as read-only); returns how many
+        """
+        found = 0
+        for doc, record in zip(
+            documents, self.lookup_many([doc.get(source_field) for doc in documents])
+        ):
+            if record is not None:
+                doc[target] = record
+                found += 1
+        return found
+
+
+def _pack(addresses: List[str], pton: Any) -> Tuple[List[str], bytes]:
+    """The addresses ``pton`` accepts, and their packed forms end to end"""
+    try:
+        return addresses, b"".join(map(pton, addresses))
+    except (OSError, ValueError):
+        pass
+    valid: List[str] = []
+    packed: List[bytes] = []
+    for address in addresses:
+        try:
+            packed.append(pton(address))
+        except (OSError, ValueError):
+            continue
+        valid.append(address)
+    return valid, b"".join(packed)
+
+
+def _read_csv(path: str, columns: Sequence[str]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    records: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        for line, row in enumerate(reader, 1):
+            if len(row) < 2:
+                continue
+            if line == 1 and not any(character.isdigit() for character in row[0]):
+                columns = [name.strip().lower() for name in row[2:]]
+                continue
+            values = tuple(row[2:])
+            record = records.get(values)
+            if record is None:
+                record = records[values] = _record(columns, values)
+            if not record.keys() - {"location"}:
+                # No location fields ("-" placeholders and 0,0 in IP2Location): a gap
+                continue
+            yield row[0], row[1], record
+
+
+def enrich_stream(
+    documents: Iterable[Dict[str, Any]],
+    database: GeoIPDatabase,
+    batch: int = 5000,
+    source_field: str = "destination_ip",
+) -> Iterator[Dict[str, Any]]:
+    """Documents with ``geoip`` added, looked up ``batch`` at a time (``lookup_many``)"""
+    pending: List[Dict[str, Any]] = []
+    for doc in documents:
+        pending.append(doc)
+        if len(pending) >= batch:
+            database.enrich(pending, source_field)
+            yield from pending
+            pending = []
+    if pending:
+        database.enrich(pending, source_field)
+        yield from pending
+
+
+_shared: Optional[GeoIPDatabase] = None
+_shared_lock = threading.Lock()
+
+
+def shared_database() -> Optional[GeoIPDatabase]:
+    """Process-wide database from ``settings.GEOIP_DB_PATH``, loaded on first use; None if unset"""
+    global _shared
+    if not settings.GEOIP_DB_PATH:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = GeoIPDatabase.from_csv(
+                settings.GEOIP_DB_PATH, family=settings.GEOIP_DB_FAMILY or None
+            )
+        return _shared
@@ -0,0 +1,375 @@
+"""
+IOC matching
+Tags events whose addresses, file hashes or domains appear in the loaded
+indicator feeds, before they are indexed
+
+Indicators are held in compact, read-only structures so feeds of
+millions of entries stay small:
+
+- IP addresses and CIDRs: merged ranges in sorted integer arrays
+  (``array('I')`` for IPv4), one bisect per address;
+- file hashes: per digest length, a sorted blob of raw digests (exact)
+  behind a Bloom filter, so the binary search only runs for the rare
+  digests the filter cannot rule out;
+- domains: a name matches an indicator equal to it or to any parent
+  domain. The name's suffixes are walked from the TLD down, as a
+  reversed-label trie would be, against a sorted array of 64-bit name
+  hashes (8 bytes per domain instead of a trie node per label).
+
+Feeds are plain text, one indicator per line (``#`` comments); each line
+is classified as an address, a CIDR, an MD5/SHA1/SHA256 digest, or a
+domain.
+"""
+
+import bisect
+import ipaddress
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.geoip import address_value
+
+IP_FIELDS = ("destination_ip", "source_ip")
+DOMAIN_FIELDS = ("query_name", "destination_hostname")
+DIGEST_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256"}
+
+_HEX = re.compile(r"^[0-9a-fA-F]+$")
+_DOMAIN = re.compile(r"^(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z0-9-]{2,63}$")
+
+
+class IPRangeSet:
+    """Addresses and CIDRs as merged, sorted [start, end] ranges per family"""
+
+    def __init__(self, ranges: Iterable[Tuple[int, int, int]] = ()):
+        merged: Dict[int, List[List[int]]] = {4: [], 6: []}
+        for family, start, end in sorted(ranges):
+            current = merged[family]
+            if current and start <= current[-1][1] + 1:
+                current[-1][1] = max(current[-1][1], end)
+            else:
+                current.append([start, end])
+        self.v4_starts = array("I", (start for start, _ in merged[4]))
+        self.v4_ends = array("I", (end for _, end in merged[4]))
+        # IPv6 values exceed 64 bits
+        self.v6_starts = [start for start, _ in merged[6]]
+        self.v6_ends = [end for _, end in merged[6]]
+
+    def __len__(self) -> int:
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    def __contains__(self, address: str) -> bool:
+        try:
+            family, value = address_value(address)
+        except (OSError, ValueError, TypeError):
+            return False
+        starts, ends = (
+            (self.v4_starts, self.v4_ends) if family == 4 else (self.v6_starts, self.v6_ends)
+        )
+        position = bisect.bisect_right(starts, value) - 1
+        return position >= 0 and value <= ends[position]
+
+
+class BloomFilter:
+    """
+    Bloom filter over uniformly distributed keys (digests)
+
+    The key's own bytes supply the two base hashes for double hashing, so
+    nothing is rehashed. ``bits_per_item`` 10 gives about a 1% false
+    positive rate.
+    """
+
+    def __init__(self, capacity: int, bits_per_item: int = 10):
+        self.size = max(64, capacity * bits_per_item)
+        self.hashes = max(1, round(bits_per_item * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: bytes) -> Iterator[int]:
+        first = int.from_bytes(key[:8], "little")
+        step = int.from_bytes(key[8:16], "little") | 1
+        size = self.size
+        for number in range(self.hashes):
+            yield (first + number * step) % size
+
+    def add(self, key: bytes) -> None:
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class DigestSet:
+    """Fixed-width digests, sorted in one bytes blob, behind a BloomFilter"""
+
+    def __init__(self, width: int, digests: Iterable[bytes]):
+        unique = sorted(set(digests))
+        self.width = width
+        self.count = len(unique)
+        self.bloom = BloomFilter(self.count)
+        for digest in unique:
+            self.bloom.add(digest)
+        self.blob = b"".join(unique)
+
+    def __contains__(self, digest: bytes) -> bool:
+        if digest not in self.bloom:
+            return False
+        width, blob = self.width, self.blob
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if blob[middle * width : (middle + 1) * width] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self.count and blob[low * width : (low + 1) * width] == digest
+
+
+class DomainSuffixSet:
+    """
+    Domains, matched against a name and all its parent domains
+
+    Stored as a sorted array of 64-bit ``hash()`` values, built and used
+    in the same process. A false match takes a 64-bit collision: about
+    n / 2^64 per lookup for n domains.
+    """
+
+    def __init__(self, domains: Iterable[str]):
+        self.hashes = array("q", sorted({hash(domain) for domain in domains}))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _contains(self, name: str) -> bool:
+        hashes = self.hashes
+        value = hash(name)
+        position = bisect.bisect_left(hashes, value)
+        return position < len(hashes) and hashes[position] == value
+
+    def match(self, name: str) -> Optional[str]:
+        """The shortest listed suffix of ``name`` (itself included), else None"""
+        name = name.lower().rstrip(".")
+        end = len(name)
+        while end > 0:
+            dot = name.rfind(".", 0, end)
+            candidate = name[dot + 1 :]
+            if self._contains(candidate):
+                return candidate
+            end = dot
+        return None
+
+
+def normalize_domain(value: str) -> Optional[str]:
+    value = value.strip().lower().rstrip(".")
+    if value.startswith("*."):
+        value = value[2:]
+    return value if _DOMAIN.match(value) else None
+
+
+def classify(line: str) -> Optional[Tuple[str, Any]]:
+    """
+    ``("ip", (family, start, end))``, ``("hash", digest bytes)`` or
+    ``("domain", name)`` for one feed line; None for blanks, comments and
+    anything unrecognised
+    """
+    value = line.strip()
+    if not value or value.startswith("#"):
+        return None
+    if "/" in value:
+        try:
+            network = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            return None
+        return (
+            "ip",
+            (network.version, int(network.network_address), int(network.broadcast_address)),
+        )
+    try:
+        family, number = address_value(value)
+        return "ip", (family, number, number)
+    except (OSError, ValueError):
+        pass
+    if len(value) in DIGEST_LENGTHS and _HEX.match(value):
+        return "hash", bytes.fromhex(value)
+    domain = normalize_domain(value)
+    if domain is not None:
+        return "domain", domain
+    return None
+
+
+class IOCMatcher:
+    """Compiled indicator sets and the event fields they are matched against"""
+
+    def __init__(
+        self,
+        ips: Iterable[Tuple[int, int, int]] = (),
+        digests: Iterable[bytes] = (),
+        domains: Iterable[str] = (),
+    ):
+        self.ips = IPRangeSet(ips)
+        by_width: Dict[int, List[bytes]] = {}
+        for digest in digests:
+            by_width.setdefault(len(digest), []).append(digest)
+        self.digests = {width: DigestSet(width, values) for width, values in by_width.items()}
+        self.domains = DomainSuffixSet(domains)
+        self.skipped = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "IOCMatcher":
+        ips: List[Tuple[int, int, int]] = []
+        digests: List[bytes] = []
+        domains: List[str] = []
+        sinks = {"ip": ips.append, "hash": digests.append, "domain": domains.append}
+        skipped = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            indicator = classify(line)
+            if indicator is None:
+                skipped += 1
+                continue
+            sinks[indicator[0]](indicator[1])
+        matcher = cls(ips, digests, domains)
+        matcher.skipped = skipped
+        return matcher
+
+    @classmethod
+    def from_paths(cls, paths: Sequence[str]) -> "IOCMatcher":
+        def lines() -> Iterator[str]:
+            for path in paths:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    yield from f
+
+        return cls.from_lines(lines())
+
+    def __len__(self) -> int:
+        return (
+            len(self.ips)
+            + sum(digests.count for digests in self.digests.values())
+            + len(self.domains)
+        )
+
+    def _digest_match(self, value: Any) -> bool:
+        if not isinstance(value, str):
+            return False
+        try:
+            digest = bytes.fromhex(value)
+        except ValueError:
+            return False
+        digests = self.digests.get(len(digest))
+        return digests is not None and digest in digests
+
+    def match(self, doc: Dict[str, Any]) -> List[Dict[str, str]]:
+        """``{"type", "field", "value"}`` for every indicator hit in ``doc``"""
+        hits = []
+        for field in IP_FIELDS:
+            value = doc.get(field)
+            if value and value in self.ips:
+                hits.append({"type": "ip", "field": field, "value": value})
+        hashes = doc.get("hashes")
+        if hashes and self.digests:
+            for name, value in hashes.items():
+                if self._digest_match(value):
+                    hits.append({"type": "hash", "field": f"hashes.{name}", "value": value})
+        for field in DOMAIN_FIELDS:
+            value = doc.get(field)
+            if value and isinstance(value, str):
+                indicator = self.domains.match(value)
+                if indicator is not None:
+                    hits.append({"type": "domain", "field": field, "value": indicator})
+        return hits
+
+    def tag(self, doc: Dict[str, Any]) -> bool:
+        """Set ``ioc`` on ``doc`` when anything matches"""
+        hits = self.match(doc)
+        if hits:
+            doc["ioc"] = hits
+        return bool(hits)
+
+
+def tag_stream(
+    documents: Iterable[Dict[str, Any]], matcher: IOCMatcher
+) -> Iterator[Dict[str, Any]]:
+    for doc in documents:
+        matcher.tag(doc)
+        yield doc
+
+
+def feed_paths(path: str) -> List[str]:
+    """Feed files at ``path``: the file itself, or every regular file in the directory"""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if not name.startswith(".") and os.path.isfile(os.path.join(path, name))
+        )
+    return [path]
+
+
+class IOCFeeds:
+    """
+    The matcher for ``settings.IOC_FEED_PATH``, recompiled when its files
+    change (checked at most every ``reload_interval`` seconds). The new
+    matcher replaces the old one in a single assignment; a feed that
+    fails to load keeps the previous matcher and sets ``last_error``.
+    """
+
+    def __init__(self, path: str, reload_interval: float = settings.IOC_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.matcher = IOCMatcher()
+        self.last_error: Optional[str] = None
+        self._signature: Optional[Tuple] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                paths = feed_paths(self.path)
+                signature = tuple(
+                    (path, stat.st_mtime_ns, stat.st_size)
+                    for path, stat in ((path, os.stat(path)) for path in paths)
+                )
+                if signature == self._signature:
+                    return False
+                matcher = IOCMatcher.from_paths(paths)
+            except OSError as exc:
+                self.last_error = f"{self.path}: {exc}"
+                return False
+            self.matcher = matcher
+            self._signature = signature
+            self.last_error = None
+            return True
+
+    def current(self) -> IOCMatcher:
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self.matcher
+
+
+_shared: Optional[IOCFeeds] = None
+_shared_lock = threading.Lock()
+
+
+def shared_matcher() -> Optional[IOCMatcher]:
+    """Current matcher for ``settings.IOC_FEED_PATH``; None when no feeds are configured"""
+    global _shared
+    if not settings.IOC_FEED_PATH:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = IOCFeeds(settings.IOC_FEED_PATH)
+    return _shared.current()
@@ -0,0 +1,162 @@
+"""
+Leaderboards
+Team rankings kept in Redis sorted sets, updated as scores change, so a
+page view costs O(log n + page) instead of re-ranking every team
+
+    leaderboard:scenario:{scenario_id}  ZSET  team -> its score in that scenario
+    leaderboard:global                  ZSET  team -> sum of its scenario scores
+    leaderboard:runs                    HASH  run id -> the scenario it ran
+
+Recording a score replaces the team's scenario entry and moves its global
+entry by the difference, in one optimistic (WATCH/MULTI) transaction, so
+concurrent writers never double-count. Boards are per scenario, not per
+run: a run's scores are recorded under the scenario it ran (``scenario_of``),
+so running a scenario again replaces its teams' entries instead of adding
+to their global totals. Scores are stored as integer hundredths, so global
+sums stay exact and equal totals really tie. Ranks are competition ranks:
+equal scores share a rank ("1224"); within a tie, Redis orders members by
+reverse team id.
+"""
+
+from typing import Any, Dict, List, Mapping, Optional
+
+import redis
+
+PREFIX = "leaderboard:"
+GLOBAL = "global"
+RUNS_KEY = PREFIX + "runs"
+
+
+def _key(scenario_id: Optional[str]) -> str:
+    return PREFIX + (GLOBAL if scenario_id is None else f"scenario:{scenario_id}")
+
+
+def _points(score: float) -> int:
+    return round(score * 100)
+
+
+def _entry(rank: int, team: bytes, points: float) -> Dict[str, Any]:
+    return {"rank": rank, "team_id": team.decode(), "score": points / 100}
+
+
+def register_run(client: redis.Redis, run_id: str, scenario_id: str) -> None:
+    """Note which scenario ``run_id`` is a run of, for ``scenario_of``"""
+    client.hset(RUNS_KEY, run_id, scenario_id)
+
+
+def scenario_of(client: redis.Redis, run_id: str) -> Optional[str]:
+    """The scenario ``run_id`` ran, or None if it was never registered"""
+    scenario_id = client.hget(RUNS_KEY, run_id)
+    return None if scenario_id is None else scenario_id.decode()
+
+
+def record(client: redis.Redis, scenario_id: str, scores: Mapping[str, float]) -> Dict[str, float]:
+    """
+    Set each team's score for ``scenario_id``; returns the change applied
+    to each team's global score
+    """
+    if not scores:
+        return {}
+    key = _key(scenario_id)
+    points = {team: _points(score) for team, score in scores.items()}
+    teams = list(points)
+    deltas: Dict[str, int] = {}
+
+    def update(pipe: redis.client.Pipeline) -> None:
+        previous = pipe.zmscore(key, teams)
+        deltas.clear()
+        for team, old in zip(teams, previous):
+            delta = points[team] - int(old or 0)
+            if old is None or delta:
+                deltas[team] = delta
+        pipe.multi()
+        pipe.zadd(key, points)
+        for team, delta in deltas.items():
+            pipe.zincrby(_key(None), delta, team)
+
+    client.transaction(update, key)
+    return {team: delta / 100 for team, delta in deltas.items()}
+
+
+def remove(client: redis.Redis, scenario_id: str) -> int:
+    """Drop a scenario's leaderboard and take its scores out of the global one"""
+    key = _key(scenario_id)
+    removed = 0
+
+    def update(pipe: redis.client.Pipeline) -> None:
+        nonlocal removed
+        entries = pipe.zrange(key, 0, -1, withscores=True)
+        removed = len(entries)
+        pipe.multi()
+        for team, score in entries:
+            pipe.zincrby(_key(None), -score, team)
+        pipe.delete(key)
+
+    client.transaction(update, key)
+    return removed
+
+
+def page(
+    client: redis.Redis, scenario_id: Optional[str] = None, offset: int = 0, limit: int = 50
+) -> Dict[str, Any]:
+    """
+    Entries ``offset`` to ``offset + limit - 1`` (0-based positions, best
+    first) with their ranks, and the number of ranked teams
+    """
+    key = _key(scenario_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.zcard(key)
+    pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+    total, entries = pipe.execute()
+    return {
+        "scenario_id": scenario_id,
+        "total": total,
+        "offset": offset,
+        "entries": _ranked(client, key, offset, entries),
+    }
+
+
+def _ranked(client: redis.Redis, key: str, offset: int, entries: List) -> List[Dict[str, Any]]:
+    if not entries:
+        return []
+    # Only the first entry's rank needs a lookup: it may tie with the page before
+    first = entries[0][1]
+    rank = client.zcount(key, f"({int(first)}", "+inf") + 1
+    ranked = []
+    previous = first
+    for position, (team, score) in enumerate(entries, offset):
+        if score != previous:
+            rank = position + 1
+            previous = score
+        ranked.append(_entry(rank, team, score))
+    return ranked
+
+
+def team_rank(
+    client: redis.Redis, team_id: str, scenario_id: Optional[str] = None, around: int = 0
+) -> Optional[Dict[str, Any]]:
+    """
+    The team's rank and score, with up to ``around`` neighbours on either
+    side; None if the team has no score there
+    """
+    key = _key(scenario_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.zscore(key, team_id)
+    pipe.zrevrank(key, team_id)
+    pipe.zcard(key)
+    score, position, total = pipe.execute()
+    if score is None or position is None:
+        return None
+    rank = client.zcount(key, f"({int(score)}", "+inf") + 1
+    result = {
+        "scenario_id": scenario_id,
+        "team_id": team_id,
+        "rank": rank,
+        "score": score / 100,
+        "total": total,
+    }
+    if around > 0:
+        start = max(0, position - around)
+        entries = client.zrevrange(key, start, position + around, withscores=True)
+        result["neighbours"] = _ranked(client, key, start, entries)
+    return result
@@ -0,0 +1,230 @@
+"""
+Live scoring
+Scores teams while a run is in progress: ingest forwards each run's
+objective and alert events to a Redis stream, and a consumer applies them
+to a ``scoring.LiveRun`` and publishes what changed
+
+    scoring:events:{run}   STREAM  one entry per event: {"doc": JSON}
+    scoring:live:runs      SET     runs with events to consume
+    scoring:live:{run}     channel {"scenario_run_id", "teams": [...]} per poll,
+                                   each team with its new score and the delta;
+                                   a last message with "final": true carries the
+                                   batch results when scoring.calculate finishes
+    scoring:live:lock:{run} STRING held by the one consumer of a run
+    scoring:live:state:{run} STRING the consumer's last stream id and LiveRun
+                                   state (JSON), written with each publish
+
+Changed scores also go to the leaderboard of the run's scenario, so the Scoring page reads
+ranks and deltas and never recomputes. The state is written in the same
+transaction as the message it led to, and whichever worker takes a run's
+lock next loads it and carries on from that entry, so a run is neither
+re-read nor its scores published again as deltas when it moves between
+worker processes.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+import redis
+
+from app.core.config import settings
+from app.services import leaderboard
+from app.services.scoring import OBJECTIVE_FIELD, TEAM_FIELD, LiveRun
+
+RUNS_KEY = "scoring:live:runs"
+
+
+def stream_key(run_id: str) -> str:
+    return f"scoring:events:{run_id}"
+
+
+def channel(run_id: str) -> str:
+    return f"scoring:live:{run_id}"
+
+
+def state_key(run_id: str) -> str:
+    return f"scoring:live:state:{run_id}"
+
+
+def forward(
+    client: redis.Redis, documents: Iterable[Dict[str, Any]], ttl: int = settings.SCORING_LIVE_TTL
+) -> int:
+    """Append the scoring events among ``documents`` to their runs' streams; returns how many"""
+    pipe = client.pipeline(transaction=False)
+    runs = set()
+    forwarded = 0
+    for doc in documents:
+        run = doc.get("scenario_id")
+        if run is None or (doc.get(TEAM_FIELD) is None and doc.get(OBJECTIVE_FIELD) is None):
+            continue
+        pipe.xadd(stream_key(str(run)), {"doc": json.dumps(doc, separators=(",", ":"))})
+        runs.add(str(run))
+        forwarded += 1
+    if not forwarded:
+        return 0
+    for run in runs:
+        pipe.expire(stream_key(run), ttl)
+    pipe.sadd(RUNS_KEY, *runs)
+    pipe.execute()
+    return forwarded
+
+
+class LiveConsumer:
+    """Reads one run's stream into a LiveRun and publishes score changes"""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        run_id: str,
+        live: Optional[LiveRun] = None,
+        last_id: str = "0-0",
+        events: int = 0,
+    ):
+        self.client = client
+        self.run_id = run_id
+        self.live = live if live is not None else LiveRun()
+        self.last_id = last_id
+        self.events = events
+        # Looked up on first publish: scenario.run registers the run when it starts
+        self.scenario_id: Optional[str] = None
+
+    @classmethod
+    def load(cls, client: redis.Redis, run_id: str) -> "LiveConsumer":
+        """The run's consumer as last saved in Redis (a new one if there is none)"""
+        raw = client.get(state_key(run_id))
+        if raw is None:
+            return cls(client, run_id)
+        state = json.loads(raw)
+        live = LiveRun.restore(state["live"])
+        return cls(client, run_id, live, state["last_id"], state["events"])
+
+    def poll(self, block_ms: Optional[int] = None, count: int = 10_000) -> int:
+        """
+        Apply the next entries of the stream (waiting up to ``block_ms`` for
+        some) and publish the resulting changes; returns entries read
+        """
+        reply = self.client.xread({stream_key(self.run_id): self.last_id}, count, block_ms)
+        read = 0
+        for _, entries in reply or ():
+            for entry_id, fields in entries:
+                self.live.add(json.loads(fields[b"doc"]))
+                self.last_id = entry_id.decode()
+                read += 1
+        self.events += read
+        self.live.advance()
+        self.publish(save=bool(read))
+        return read
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Apply everything still buffered (the run is over) and publish; final scores"""
+        self.live.advance(flush=True)
+        self.publish(save=True)
+        return [result.to_dict() for result in self.live.results()]
+
+    def publish(self, save: bool = False, ttl: int = settings.SCORING_LIVE_TTL) -> int:
+        """
+        Publish the score changes, saving the consumer's state along with
+        them (or on its own with ``save``); returns the teams published
+        """
+        updates = self.live.changes()
+        if not updates and not save:
+            return 0
+        state = {"last_id": self.last_id, "events": self.events, "live": self.live.state()}
+        pipe = self.client.pipeline(transaction=True)
+        if updates:
+            message = {"scenario_run_id": self.run_id, "teams": updates}
+            pipe.publish(channel(self.run_id), json.dumps(message, separators=(",", ":")))
+        pipe.set(state_key(self.run_id), json.dumps(state, separators=(",", ":")), ex=ttl)
+        pipe.execute()
+        if not updates:
+            return 0
+        if self.scenario_id is None:
+            self.scenario_id = leaderboard.scenario_of(self.client, self.run_id)
+        if self.scenario_id is not None:
+            scores = {update["team_id"]: update["score"] for update in updates}
+            leaderboard.record(self.client, self.scenario_id, scores)
+        return len(updates)
+
+
+_consumers: Dict[str, LiveConsumer] = {}
+_consumers_pid: Optional[int] = None
+_consumers_lock = threading.Lock()
+
+
+def shared_consumer(client: redis.Redis, run_id: str, reload: bool = False) -> LiveConsumer:
+    """
+    This process's consumer for ``run_id``, loaded from Redis the first
+    time, after a fork, or with ``reload`` (another worker may have
+    consumed the run since)
+    """
+    global _consumers_pid
+    with _consumers_lock:
+        if _consumers_pid != os.getpid():
+            _consumers.clear()
+            _consumers_pid = os.getpid()
+        consumer = _consumers.get(run_id)
+        if reload or consumer is None or consumer.client is not client:
+            consumer = _consumers[run_id] = LiveConsumer.load(client, run_id)
+        return consumer
+
+
+def drop(run_id: str) -> None:
+    with _consumers_lock:
+        _consumers.pop(run_id, None)
+
+
+def _lock_key(run_id: str) -> str:
+    return f"scoring:live:lock:{run_id}"
+
+
+def consume(client: redis.Redis, max_seconds: float, block_ms: int = 1000) -> Dict[str, Any]:
+    """
+    Poll every active run for up to ``max_seconds``, skipping runs another
+    worker holds the lock for
+    """
+    token = uuid.uuid4().hex.encode()
+    lock_seconds = int(max_seconds) + 30
+    deadline = time.monotonic() + max_seconds
+    owned: List[str] = []
+    read = 0
+    try:
+        while True:
+            polled = 0
+            for run in sorted(member.decode() for member in client.smembers(RUNS_KEY)):
+                if run not in owned:
+                    if not client.set(_lock_key(run), token, nx=True, ex=lock_seconds):
+                        continue
+                    owned.append(run)
+                    shared_consumer(client, run, reload=True)
+                polled += shared_consumer(client, run).poll()
+            read += polled
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not polled and owned:
+                # Nothing new anywhere: wait on one stream instead of spinning
+                wait = max(1, min(block_ms, int(remaining * 1000)))
+                read += shared_consumer(client, owned[0]).poll(wait)
+            elif not polled:
+                time.sleep(min(block_ms / 1000, remaining))
+    finally:
+        for run in owned:
+            if client.get(_lock_key(run)) == token:
+                client.delete(_lock_key(run))
+    return {"runs": owned, "events": read}
+
+
+def close(client: redis.Redis, run_id: str, results: List[Dict[str, Any]]) -> None:
+    """
+    Stop consuming a finished run and publish its final scores (from the
+    batch calculation) as the last message on its channel
+    """
+    client.srem(RUNS_KEY, run_id)
+    client.delete(state_key(run_id))
+    message = {"scenario_run_id": run_id, "final": True, "teams": results}
+    client.publish(channel(run_id), json.dumps(message, separators=(",", ":")))
+    drop(run_id)
@@ -0,0 +1,380 @@
+"""
+Log search
+Cursor pagination with a point-in-time and ``search_after`` over
+Elasticsearch or the embedded log store, a page cache that can be shared
+through Redis, and an NDJSON export that walks a whole result set
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import redis
+from elasticsearch import Elasticsearch, NotFoundError
+
+from app.core.config import settings
+from app.services.log_store import shared_store
+
+INDEX_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorExpired(LookupError):
+    """The cursor's point-in-time was closed or timed out"""
+
+
+@dataclass(frozen=True)
+class LogQuery:
+    """Normalized search request; equal queries share cache entries"""
+
+    index: str
+    q: str = ""
+    scenario_id: Optional[str] = None
+    vm_id: Optional[str] = None
+    event_id: Optional[str] = None
+    severity: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    order: str = "desc"
+    size: int = 100
+
+    def __post_init__(self) -> None:
+        # Also guards queries rebuilt from a cursor
+        source = self.index[:-2] if self.index.endswith("-*") else None
+        if self.index != settings.LOG_SEARCH_DEFAULT_INDEX and not (
+            source and INDEX_PATTERN.match(source)
+        ):
+            raise ValueError(f"Invalid log index: {self.index!r}")
+        if self.order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+        if isinstance(self.size, bool) or not isinstance(self.size, int):
+            raise ValueError("size must be an integer")
+        if not 1 <= self.size <= MAX_PAGE_SIZE:
+            raise ValueError(f"size must be between 1 and {MAX_PAGE_SIZE}")
+        if not isinstance(self.q, str):
+            raise ValueError("q must be a string")
+        for name in ("scenario_id", "vm_id", "event_id", "severity"):
+            if not isinstance(getattr(self, name), (str, type(None))):
+                raise ValueError(f"{name} must be a string")
+        for name in ("start", "end"):
+            value = getattr(self, name)
+            if isinstance(value, bool) or not isinstance(value, (int, float, type(None))):
+                raise ValueError(f"{name} must be epoch seconds")
+
+    @classmethod
+    def build(cls, source: Optional[str] = None, q: str = "", **filters: Any) -> "LogQuery":
+        if source is None:
+            index = settings.LOG_SEARCH_DEFAULT_INDEX
+        elif INDEX_PATTERN.match(source):
+            index = f"{source}-*"
+        else:
+            raise ValueError(f"Invalid log source: {source!r}")
+        # Collapse whitespace so trivially different spellings share a key
+        return cls(index=index, q=" ".join(q.split()), **filters)
+
+    def cache_key(self, after: Optional[List[Any]] = None) -> str:
+        payload = json.dumps([asdict(self), after], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def body(self) -> Dict[str, Any]:
+        """Query and sort clauses (the index comes from the point-in-time)"""
+        must: List[Dict[str, Any]] = []
+        if self.q:
+            must.append({"query_string": {"query": self.q, "default_operator": "AND"}})
+        filters: List[Dict[str, Any]] = [
+            {"term": {name: value}}
+            for name, value in (
+                ("scenario_id", self.scenario_id),
+                ("vm_id", self.vm_id),
+                ("event_id", self.event_id),
+                ("severity", self.severity),
+            )
+            if value is not None
+        ]
+        if self.start is not None or self.end is not None:
+            span: Dict[str, Any] = {"format": "epoch_millis"}
+            if self.start is not None:
+                span["gte"] = int(self.start * 1000)
+            if self.end is not None:
+                span["lte"] = int(self.end * 1000)
+            filters.append({"range": {"@timestamp": span}})
+        return {
+            "query": {"bool": {"must": must or [{"match_all": {}}], "filter": filters}},
+            # _shard_doc is the cheap, unique tiebreaker a point-in-time provides
+            "sort": [
+                {"@timestamp": {"order": self.order, "unmapped_type": "date"}},
+                {"_shard_doc": self.order},
+            ],
+        }
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(raw: bytes, secret: str) -> bytes:
+    return hmac.new(secret.encode(), raw, hashlib.sha256).digest()
+
+
+def encode_cursor(
+    query: LogQuery, pit_id: str, after: List[Any], total: int, secret: str = settings.SECRET_KEY
+) -> str:
+    """``payload.signature``: the cursor's query is only ever one this API built"""
+    payload = {"query": asdict(query), "pit": pit_id, "after": after, "total": total}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return f"{_b64encode(raw)}.{_b64encode(_signature(raw, secret))}"
+
+
+def decode_cursor(
+    cursor: str, secret: str = settings.SECRET_KEY
+) -> Tuple[LogQuery, str, List[Any], int]:
+    try:
+        encoded, _, signature = cursor.partition(".")
+        raw = _b64decode(encoded)
+        if not hmac.compare_digest(_b64decode(signature), _signature(raw, secret)):
+            raise ValueError("Cursor signature does not match")
+        payload = json.loads(raw)
+        return (
+            LogQuery(**payload["query"]),
+            str(payload["pit"]),
+            list(payload["after"]),
+            int(payload["total"]),
+        )
+    except (binascii.Error, ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+
+class MemoryPageCache:
+    """Per-process LRU of result pages with a TTL"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._pages: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, page: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pages[key] = (time.monotonic() + self.ttl, page)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+
+class RedisPageCache:
+    """
+    Result pages in Redis, shared by every API replica
+
+    Entries expire server-side after ``ttl``; Redis enforces the size
+    limit through its own eviction policy. Redis errors count as misses,
+    so an outage degrades to uncached searches.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: float, prefix: str = "logsearch:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, page: Dict[str, Any]) -> None:
+        try:
+            self.client.set(self.prefix + key, json.dumps(page), px=int(self.ttl * 1000))
+        except redis.RedisError:
+            pass
+
+
+def _hit(hit: Dict[str, Any]) -> Dict[str, Any]:
+    return {"_index": hit["_index"], "_id": hit["_id"], **hit.get("_source", {})}
+
+
+class ElasticsearchStore:
+    """
+    Point-in-time paging over Elasticsearch
+
+    The store interface ``LogSearch`` drives (``EmbeddedLogStore``
+    implements it too): ``open_pit(index)``, ``page(query, pit_id, after,
+    size, track_total)`` returning a search response body, and
+    ``close_pit(pit_id)``.
+    """
+
+    def __init__(self, client: Elasticsearch, keep_alive: str = settings.LOG_SEARCH_PIT_KEEP_ALIVE):
+        self.client = client
+        self.keep_alive = keep_alive
+
+    def open_pit(self, index: str) -> str:
+        response = self.client.open_point_in_time(
+            index=index, keep_alive=self.keep_alive, ignore_unavailable=True
+        )
+        return response["id"]
+
+    def close_pit(self, pit_id: str) -> None:
+        try:
+            self.client.close_point_in_time(id=pit_id)
+        except NotFoundError:
+            pass
+
+    def page(
+        self,
+        query: LogQuery,
+        pit_id: str,
+        after: Optional[List[Any]],
+        size: int,
+        track_total: bool,
+    ) -> Dict[str, Any]:
+        body = query.body()
+        try:
+            return self.client.search(
+                pit={"id": pit_id, "keep_alive": self.keep_alive},
+                size=size,
+                search_after=after,
+                track_total_hits=track_total,
+                **body,
+            ).body
+        except NotFoundError as exc:
+            # Missing search context: the PIT timed out or was closed
+            raise CursorExpired(pit_id) from exc
+
+
+class LogSearch:
+    """
+    Paginated search and export over the log indices
+
+    The first page opens a point-in-time, so later pages see the same
+    snapshot however the indices change; each page resumes with
+    ``search_after`` from the last sort values instead of ``from``, which
+    keeps deep pages as cheap as the first. The returned cursor is
+    self-contained (query, PIT id, sort values, total) and signed with
+    SECRET_KEY, so any replica can serve the next page and a client cannot
+    edit the query it carries.
+
+    Pages are cached under the normalized query and resume position for
+    ``cache.ttl`` seconds, which must stay below the PIT keep-alive so a
+    cached cursor still points at a live PIT. Search PITs are not closed
+    explicitly, since a cached cursor may still be shared; they expire
+    after the keep-alive. Exports close theirs when done.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        cache: Optional[Any] = None,
+        export_batch: int = settings.LOG_SEARCH_EXPORT_BATCH,
+    ):
+        self.store = store
+        self.cache = cache
+        self.export_batch = export_batch
+
+    def search(
+        self, query: Optional[LogQuery] = None, cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """One page: ``{"results", "total", "next_cursor", "cached"}``"""
+        if cursor is not None:
+            query, pit_id, after, total = decode_cursor(cursor)
+        elif query is None:
+            raise ValueError("A query or a cursor is required")
+        else:
+            pit_id, after, total = None, None, None
+
+        key = query.cache_key(after)
+        if self.cache is not None:
+            page = self.cache.get(key)
+            if page is not None:
+                return {**page, "cached": True}
+
+        if pit_id is None:
+            pit_id = self.store.open_pit(query.index)
+        response = self.store.page(query, pit_id, after, query.size, track_total=total is None)
+        hits = response["hits"]["hits"]
+        if total is None:
+            total = response["hits"]["total"]["value"]
+        pit_id = response.get("pit_id", pit_id)
+        next_cursor = None
+        if len(hits) == query.size:
+            next_cursor = encode_cursor(query, pit_id, hits[-1]["sort"], total)
+        page = {"results": [_hit(hit) for hit in hits], "total": total, "next_cursor": next_cursor}
+        if self.cache is not None:
+            self.cache.set(key, page)
+        return {**page, "cached": False}
+
+    def export(self, query: LogQuery, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Every matching document (up to ``limit``), in sort order, one PIT page at a time"""
+        pit_id = self.store.open_pit(query.index)
+        after = None
+        remaining = limit
+        try:
+            while remaining is None or remaining > 0:
+                size = self.export_batch if remaining is None else min(self.export_batch, remaining)
+                response = self.store.page(query, pit_id, after, size, track_total=False)
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                for hit in hits:
+                    yield _hit(hit)
+                if remaining is not None:
+                    remaining -= len(hits)
+                if len(hits) < size:
+                    break
+                after = hits[-1]["sort"]
+        finally:
+            self.store.close_pit(pit_id)
+
+
+_shared: Optional[LogSearch] = None
+_shared_lock = threading.Lock()
+
+
+def _page_cache() -> Optional[Any]:
+    backend = settings.LOG_SEARCH_CACHE
+    if backend == "redis":
+        client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.5)
+        return RedisPageCache(client, settings.LOG_SEARCH_CACHE_TTL)
+    if backend == "memory":
+        return MemoryPageCache(settings.LOG_SEARCH_CACHE_SIZE, settings.LOG_SEARCH_CACHE_TTL)
+    return None
+
+
+def _store() -> Any:
+    if settings.LOG_STORE == "embedded":
+        return shared_store()
+    return ElasticsearchStore(Elasticsearch(settings.ELASTICSEARCH_URL))
+
+
+def shared_search() -> LogSearch:
+    """Process-wide LogSearch over the configured store, created on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LogSearch(_store(), _page_cache())
+        return _shared
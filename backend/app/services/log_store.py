@@ -0,0 +1,828 @@
+"""
+Embedded log store
+An in-process alternative to Elasticsearch for small deployments and CI:
+immutable, memory-mapped segment files with an inverted index over keyword
+fields, a trigram index on command_line, and time-sorted postings
+
+Segment layout::
+
+    MAGIC
+    timestamps   i64[n]  epoch millis, ascending (doc id = position)
+    doc offsets  u64[n+1] into the document blob
+    documents    JSON [index, id, source] per doc
+    text offsets u64[n+1] into the text blob
+    texts        lowercased command_line per doc (UTF-8), for substring checks
+    postings     u32[]   sorted doc ids, one run per term
+    keys         u64[n]  merged segments only: each doc's original key
+    id hashes    u64[m]  sorted hashes of the docs' ``_id`` (docs given one)
+    id docs      u32[m]  the doc id of each hash
+    footer (JSON): per-field term -> [start, count] into postings
+    footer length (u64) | MAGIC
+
+Because documents are numbered in time order, every posting list is also
+time-ordered: a time range is two bisects on ``timestamps`` and restricts
+each posting list with two more.
+
+A document's key is ``sequence << 32 | doc`` in the segment it was first
+published in. Merging keeps it (merged segments store it per document, in
+(timestamp, key) order), so sort values, generated ids and cursors do not
+change when segments are merged.
+
+A document added with an ``_id`` already stored is dropped, so replaying
+an ingest write-ahead log after a crash does not store anything twice.
+Unlike Elasticsearch, which replaces the stored document, the first one
+wins: segments are immutable, and a replay resends the same document.
+"""
+
+import fcntl
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.bulk import BulkStats
+
+MAGIC = b"RRLOGS01"
+FORMAT_VERSION = 1
+# segment-{sequence}.rrl as published; segment-{first}-{last}.rrl once merged
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{10})(?:-(\d{10}))?\.rrl$")
+
+# Keyword fields of the sysmon-* template (plus the index name), matched exactly
+KEYWORD_FIELDS = (
+    "_index",
+    "event_id",
+    "computer_name",
+    "process_name",
+    "parent_process_name",
+    "user",
+    "image",
+    "target_filename",
+    "protocol",
+    "severity",
+    "scenario_id",
+    "vm_id",
+    "source_ip",
+    "destination_ip",
+    "destination_port",
+    "process_id",
+    "parent_process_id",
+)
+TEXT_FIELD = "command_line"
+
+_TRAILER = struct.Struct("<Q8s")
+_ALIGN = 8
+_LITTLE_ENDIAN = sys.byteorder == "little"
+_TOKEN = re.compile(r'(?:([\w.@]+):)?(?:"([^"]*)"|(\S+))')
+# A directory listing is reused only once the directory has been unchanged
+# this long, as mtimes are only as fine as the kernel tick (or the filesystem)
+_QUIET_NS = 2_000_000_000
+
+
+class SegmentFormatError(ValueError):
+    """Raised when a file is not a valid log segment"""
+
+
+def timestamp_millis(value: Any) -> int:
+    """@timestamp (ISO-8601 string or epoch seconds) as epoch millis; 0 if missing"""
+    if isinstance(value, (int, float)):
+        return int(value * 1000)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return 0
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp() * 1000)
+    return 0
+
+
+def _keyword_values(value: Any) -> List[str]:
+    if value is None or isinstance(value, dict):
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value if item is not None and not isinstance(item, dict)]
+    return [str(value)]
+
+
+def _trigrams(text: str) -> set:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _id_hash(ident: str) -> int:
+    return int.from_bytes(hashlib.blake2b(ident.encode(), digest_size=8).digest(), "little")
+
+
+def write_segment(
+    path: str,
+    documents: Sequence[Tuple[str, Optional[str], Dict[str, Any]]],
+    keys: Optional[Sequence[int]] = None,
+) -> None:
+    """
+    Write ``(index, id, source)`` documents as one segment file at ``path``;
+    ``keys`` are the documents' original keys when merging segments
+    """
+    stamped = sorted(
+        (
+            (timestamp_millis(source.get("@timestamp")), n if keys is None else keys[n], n)
+            for n, (_, _, source) in enumerate(documents)
+        )
+    )
+    timestamps = array("q", (millis for millis, _, _ in stamped))
+    offsets = array("Q", [0])
+    blobs: List[bytes] = []
+    text_offsets = array("Q", [0])
+    texts: List[bytes] = []
+    terms: Dict[str, Dict[str, List[int]]] = {name: {} for name in KEYWORD_FIELDS}
+    trigrams: Dict[str, List[int]] = {}
+    position = text_position = 0
+    for doc_id, (_, _, n) in enumerate(stamped):
+        index, ident, source = documents[n]
+        blob = json.dumps([index, ident, source], separators=(",", ":"), default=str).encode()
+        blobs.append(blob)
+        position += len(blob)
+        offsets.append(position)
+        for name in KEYWORD_FIELDS:
+            value = index if name == "_index" else source.get(name)
+            for term in _keyword_values(value):
+                terms[name].setdefault(term, []).append(doc_id)
+        text = source.get(TEXT_FIELD)
+        lowered = text.lower() if isinstance(text, str) else ""
+        for gram in _trigrams(lowered):
+            trigrams.setdefault(gram, []).append(doc_id)
+        encoded = lowered.encode()
+        texts.append(encoded)
+        text_position += len(encoded)
+        text_offsets.append(text_position)
+
+    postings = array("I")
+    fields: Dict[str, Dict[str, List[int]]] = {}
+    for name, values in (*terms.items(), (TEXT_FIELD, trigrams)):
+        table = fields[name] = {}
+        for term in sorted(values):
+            ids = values[term]
+            table[term] = [len(postings), len(ids)]
+            postings.extend(ids)
+
+    with open(path, "wb") as f:
+        offset = len(MAGIC)
+        f.write(MAGIC)
+
+        def write(data: bytes) -> List[int]:
+            nonlocal offset
+            pad = -offset % _ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            f.write(data)
+            start, offset = offset, offset + len(data)
+            return [start, len(data)]
+
+        def write_array(values: array) -> List[int]:
+            if not _LITTLE_ENDIAN:
+                values.byteswap()
+            return write(values.tobytes())
+
+        footer = {
+            "version": FORMAT_VERSION,
+            "docs": len(documents),
+            "min_ts": timestamps[0] if timestamps else None,
+            "max_ts": timestamps[-1] if timestamps else None,
+            "timestamps": write_array(timestamps),
+            "offsets": write_array(offsets),
+            "documents": write(b"".join(blobs)),
+            "text_offsets": write_array(text_offsets),
+            "texts": write(b"".join(texts)),
+            "postings": write_array(postings),
+            "fields": fields,
+        }
+        if keys is not None:
+            footer["keys"] = write_array(array("Q", (key for _, key, _ in stamped)))
+        ids = sorted(
+            (_id_hash(documents[n][1]), doc_id)
+            for doc_id, (_, _, n) in enumerate(stamped)
+            if documents[n][1] is not None
+        )
+        if ids:
+            footer["id_hashes"] = write_array(array("Q", (hashed for hashed, _ in ids)))
+            footer["id_docs"] = write_array(array("I", (doc_id for _, doc_id in ids)))
+        payload = json.dumps(footer, separators=(",", ":")).encode()
+        write(payload)
+        f.write(_TRAILER.pack(len(payload), MAGIC))
+
+
+class SegmentReader:
+    """Memory-mapped, read-only view of one segment"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as exc:
+                raise SegmentFormatError(f"{path}: empty segment") from exc
+        if self._mm[: len(MAGIC)] != MAGIC or len(self._mm) < len(MAGIC) + _TRAILER.size:
+            raise SegmentFormatError(f"{path}: not a log segment")
+        footer_size, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        if magic != MAGIC:
+            raise SegmentFormatError(f"{path}: truncated log segment")
+        footer_start = len(self._mm) - _TRAILER.size - footer_size
+        footer = json.loads(self._mm[footer_start : footer_start + footer_size])
+        self.docs: int = footer["docs"]
+        self.fields: Dict[str, Dict[str, List[int]]] = footer["fields"]
+        self.timestamps = self._typed(footer["timestamps"], "q")
+        self._offsets = self._typed(footer["offsets"], "Q")
+        self._documents = footer["documents"][0]
+        self._text_offsets = self._typed(footer["text_offsets"], "Q")
+        self._texts = footer["texts"][0]
+        self._postings = self._typed(footer["postings"], "I")
+        self.keys = self._typed(footer["keys"], "Q") if "keys" in footer else None
+        self._id_hashes = None
+        self._id_docs = None
+        if "id_hashes" in footer:
+            self._id_hashes = self._typed(footer["id_hashes"], "Q")
+            self._id_docs = self._typed(footer["id_docs"], "I")
+
+    def __len__(self) -> int:
+        return self.docs
+
+    def _typed(self, span: List[int], typecode: str):
+        offset, size = span
+        view = memoryview(self._mm)[offset : offset + size]
+        if _LITTLE_ENDIAN:
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def time_range(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """Doc ids [lo, hi) with start <= timestamp <= end (millis)"""
+        lo = 0 if start is None else bisect_left(self.timestamps, start)
+        hi = self.docs if end is None else bisect_left(self.timestamps, end + 1)
+        return lo, max(lo, hi)
+
+    def postings(self, field: str, term: str, lo: int, hi: int) -> Sequence[int]:
+        """Sorted doc ids in [lo, hi) holding ``term`` (a trigram for command_line)"""
+        entry = self.fields.get(field, {}).get(term)
+        if entry is None:
+            return ()
+        start, count = entry
+        run = self._postings[start : start + count]
+        return run[bisect_left(run, lo) : bisect_left(run, hi)]
+
+    def terms(self, field: str) -> Dict[str, List[int]]:
+        return self.fields.get(field, {})
+
+    def text(self, doc_id: int) -> bytes:
+        """Lowercased command_line of a document, UTF-8 encoded"""
+        return self._mm[
+            self._texts + self._text_offsets[doc_id] : self._texts + self._text_offsets[doc_id + 1]
+        ]
+
+    def document(self, doc_id: int) -> Tuple[str, Optional[str], Dict[str, Any]]:
+        start = self._documents + self._offsets[doc_id]
+        end = self._documents + self._offsets[doc_id + 1]
+        index, ident, source = json.loads(self._mm[start:end])
+        return index, ident, source
+
+    def stored_ids(self, idents: Sequence[str], hashes: np.ndarray) -> List[int]:
+        """Positions in ``idents`` (hashed as ``hashes``) of the ids this segment holds"""
+        if self._id_hashes is None or not len(idents):
+            return []
+        stored = np.asarray(self._id_hashes, dtype=np.uint64)
+        positions = np.searchsorted(stored, hashes)
+        hits = np.flatnonzero(stored[np.minimum(positions, len(stored) - 1)] == hashes)
+        found = []
+        for n in hits.tolist():
+            # Hashes may collide: compare the ids themselves
+            position = int(positions[n])
+            while position < len(stored) and stored[position] == hashes[n]:
+                if self.document(self._id_docs[position])[1] == idents[n]:
+                    found.append(n)
+                    break
+                position += 1
+        return found
+
+    def close(self) -> None:
+        """Unmap the file; the reader cannot be used afterwards"""
+        views = (self.timestamps, self._offsets, self._text_offsets, self._postings, self.keys)
+        for view in (*views, self._id_hashes, self._id_docs):
+            if isinstance(view, memoryview):
+                view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # A slice is still referenced; the map goes when that does
+            pass
+
+
+class _Plan:
+    """A LogQuery compiled for segments: term sets to intersect plus substrings to verify"""
+
+    def __init__(self, query: Any):
+        # field -> accepted values (OR); fnmatch patterns allowed
+        self.terms: List[Tuple[str, List[str]]] = [("_index", [query.index])]
+        self.substrings: List[str] = []
+        for name in ("scenario_id", "vm_id", "event_id", "severity"):
+            value = getattr(query, name)
+            if value is not None:
+                self.terms.append((name, [str(value)]))
+        self.start = None if query.start is None else int(query.start * 1000)
+        self.end = None if query.end is None else int(query.end * 1000)
+        self.descending = query.order == "desc"
+        self._parse(query.q)
+        self._encoded = [part.encode() for part in self.substrings]
+
+    def _parse(self, q: str) -> None:
+        """
+        The query_string subset the embedded store understands: AND-ed
+        ``field:value`` terms on keyword fields (``*``/``?`` wildcards
+        allowed), and bare words or "phrases", matched case-insensitively
+        as substrings of command_line (as is ``command_line:value``)
+        """
+        for match in _TOKEN.finditer(q):
+            field, quoted, bare = match.groups()
+            value = quoted if quoted is not None else bare
+            if field is None and quoted is None:
+                if value == "AND":
+                    continue
+                if value in ("OR", "NOT") or value[0] in "-+!(" or value[-1] == ")":
+                    raise ValueError(f"Unsupported by the embedded log store: {value!r}")
+            if field is None or field == TEXT_FIELD:
+                value = value.strip("*").lower() if field else value.lower()
+                if value:
+                    self.substrings.append(value)
+            elif field in KEYWORD_FIELDS:
+                self.terms.append((field, [value]))
+            else:
+                raise ValueError(f"Field not indexed by the embedded log store: {field!r}")
+
+    def candidates(self, segment: SegmentReader) -> Sequence[int]:
+        """Sorted doc ids matching every term and trigram (substrings still unverified)"""
+        lo, hi = segment.time_range(self.start, self.end)
+        if lo >= hi:
+            return ()
+        lists: List[Sequence[int]] = []
+        for field, values in self.terms:
+            matched: List[Sequence[int]] = []
+            for value in values:
+                if any(char in value for char in "*?["):
+                    names = [term for term in segment.terms(field) if fnmatchcase(term, value)]
+                else:
+                    names = [value]
+                matched.extend(segment.postings(field, name, lo, hi) for name in names)
+            matched = [run for run in matched if len(run)]
+            if not matched:
+                return ()
+            lists.append(matched[0] if len(matched) == 1 else sorted(set().union(*matched)))
+        for text in self.substrings:
+            for gram in _trigrams(text):
+                run = segment.postings(TEXT_FIELD, gram, lo, hi)
+                if not len(run):
+                    return ()
+                lists.append(run)
+        if not lists:
+            return range(lo, hi)
+        if len(lists) == 1:
+            return lists[0]
+        lists.sort(key=len)
+        result = np.asarray(lists[0], dtype=np.uint32)
+        for other in lists[1:]:
+            postings = np.asarray(other, dtype=np.uint32)
+            positions = np.searchsorted(postings, result)
+            result = result[positions < len(postings)]
+            result = result[postings[positions[: len(result)]] == result]
+            if not len(result):
+                return ()
+        return result.tolist()
+
+    def verify(self, segment: SegmentReader, doc: int) -> bool:
+        if not self.substrings:
+            return True
+        text = segment.text(doc)
+        return all(part in text for part in self._encoded)
+
+
+class EmbeddedLogStore:
+    """
+    Log store in a directory of immutable segment files
+
+    Writes are buffered and published as a new segment every
+    ``segment_docs`` documents or on ``flush()``; a segment is written to a
+    temporary file and hard-linked under the next sequence number, taken
+    under an ``flock`` so several writer processes can share a directory.
+    Under the same lock, documents whose ``_id`` a segment already holds
+    are left out.
+    Readers pick up new segments when a search opens its snapshot; the
+    listing is cached until the directory changes.
+
+    After each publish, runs of ``merge_factor`` adjacent segments of the
+    same size tier (tier 0 below ``segment_docs * merge_factor`` docs, each
+    tier ``merge_factor`` times the one before) are merged into one
+    ``segment-{first}-{last}.rrl`` that replaces them, so a directory holds
+    about ``merge_factor`` segments per tier. Segments too big to merge
+    into one of at most ``max_merge_docs`` are left as they are. Readers
+    of merged-away segments are unmapped once no search is using them.
+
+    A point-in-time is the highest segment sequence number at open time:
+    segments never change once published, and documents keep their keys
+    when merged, so a PIT is a stable snapshot that needs no keep-alive
+    (the documents of a merged segment published after it are filtered by
+    key). Sort values are ``[timestamp millis, key]``, the embedded
+    equivalent of ``_shard_doc``. Implements the same store interface as
+    ``log_search.ElasticsearchStore``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        segment_docs: int = settings.LOG_STORE_SEGMENT_DOCS,
+        merge_factor: int = settings.LOG_STORE_MERGE_FACTOR,
+        max_merge_docs: int = settings.LOG_STORE_MAX_MERGE_DOCS,
+    ):
+        self.path = path
+        self.segment_docs = segment_docs
+        self.merge_factor = merge_factor
+        self.max_merge_docs = max_merge_docs
+        self.stats = BulkStats()
+        os.makedirs(path, exist_ok=True)
+        self._buffer: List[Tuple[str, Optional[str], Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        # (first, last sequence, file name) of the visible segments, oldest
+        # first, and the directory mtime it was listed at
+        self._listing: List[Tuple[int, int, str]] = []
+        self._listed: Optional[int] = None
+        self._readers: Dict[str, SegmentReader] = {}
+        # Searches using each reader; retired readers are closed at zero
+        self._users: Dict[SegmentReader, int] = {}
+        self._retired: set = set()
+
+    # -- writing ---------------------------------------------------------
+
+    def add(self, index: str, document: Dict[str, Any], doc_id: Optional[str] = None) -> None:
+        with self._lock:
+            self._buffer.append((index, doc_id, document))
+            if len(self._buffer) < self.segment_docs:
+                return
+            batch, self._buffer = self._buffer, []
+        self._publish(batch)
+
+    def flush(self) -> BulkStats:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._publish(batch)
+        return self.stats
+
+    def close(self) -> BulkStats:
+        stats = self.flush()
+        with self._lock:
+            for reader in self._readers.values():
+                self._retire(reader)
+            self._readers.clear()
+            self._listed = None
+        return stats
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(os.path.join(self.path, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _publish(self, batch: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> None:
+        """Write ``batch`` as the next segment, leaving out ids that are already stored"""
+        added = len(batch)
+        seen = set()
+        unique = []
+        for entry in batch:
+            if entry[1] is not None:
+                if entry[1] in seen:
+                    continue
+                seen.add(entry[1])
+            unique.append(entry)
+        batch = unique
+        final = None
+        fd, temp = tempfile.mkstemp(prefix=".segment-", suffix=".tmp", dir=self.path)
+        os.close(fd)
+        try:
+            write_segment(temp, batch)
+            with self._locked():
+                fresh = self._unstored(batch)
+                if len(fresh) < len(batch):
+                    # Rare (a replay): written again without them, still under the lock
+                    batch = fresh
+                    if batch:
+                        write_segment(temp, batch)
+                if batch:
+                    visible, _ = self._scan()
+                    sequence = max((last for _, last, _ in visible), default=0) + 1
+                    final = os.path.join(self.path, f"segment-{sequence:010d}.rrl")
+                    os.link(temp, final)
+        except BaseException:
+            with self._lock:
+                self.stats.failed += added
+            raise
+        finally:
+            os.unlink(temp)
+        with self._lock:
+            # Dropped duplicates count as indexed, as overwrites do in Elasticsearch
+            self.stats.indexed += added
+            if final is None:
+                return
+            self.stats.requests += 1
+            self.stats.bytes += os.path.getsize(final)
+            self._listed = None
+        self.merge()
+
+    def _unstored(
+        self, batch: List[Tuple[str, Optional[str], Dict[str, Any]]]
+    ) -> List[Tuple[str, Optional[str], Dict[str, Any]]]:
+        """``batch`` without the documents whose id is already stored (called under the flock)"""
+        idents = [ident for _, ident, _ in batch if ident is not None]
+        if not idents:
+            return batch
+        hashes = np.fromiter(map(_id_hash, idents), dtype=np.uint64, count=len(idents))
+        with self._lock:
+            # Another process may have published since the listing was cached
+            self._listed = None
+        segments = self._acquire(sys.maxsize)
+        try:
+            stored = set()
+            for _, _, segment in segments:
+                stored.update(idents[n] for n in segment.stored_ids(idents, hashes))
+        finally:
+            self._release(segments)
+        if not stored:
+            return batch
+        return [entry for entry in batch if entry[1] is None or entry[1] not in stored]
+
+    def _tier(self, docs: int) -> int:
+        tier, bound = 0, self.segment_docs * self.merge_factor
+        while docs >= bound:
+            tier += 1
+            bound *= self.merge_factor
+        return tier
+
+    def merge(self) -> int:
+        """Merge runs of adjacent same-tier segments until none is left; returns merges done"""
+        merges = 0
+        while self.merge_factor > 1:
+            segments = self._acquire(sys.maxsize)
+            try:
+                run: List[Tuple[int, int, SegmentReader]] = []
+                for entry in segments:
+                    if len(entry[2]) * self.merge_factor > self.max_merge_docs:
+                        run = []
+                        continue
+                    if run and self._tier(len(run[-1][2])) != self._tier(len(entry[2])):
+                        run = []
+                    run.append(entry)
+                    if len(run) == self.merge_factor:
+                        break
+                else:
+                    return merges
+                merged = self._merge(run)
+            finally:
+                self._release(segments)
+            with self._lock:
+                self._listed = None
+            merges += merged
+        return merges
+
+    def _merge(self, run: List[Tuple[int, int, SegmentReader]]) -> bool:
+        """Replace ``run`` by one segment; False if another process merged any of it first"""
+        documents = []
+        keys: List[int] = []
+        for first, _, segment in run:
+            base = first << 32
+            for doc in range(len(segment)):
+                documents.append(segment.document(doc))
+                keys.append(segment.keys[doc] if segment.keys is not None else base | doc)
+        first, last = run[0][0], run[-1][1]
+        sources = [os.path.basename(segment.path) for _, _, segment in run]
+        fd, temp = tempfile.mkstemp(prefix=".segment-", suffix=".tmp", dir=self.path)
+        os.close(fd)
+        try:
+            write_segment(temp, documents, keys)
+            with self._locked():
+                visible, superseded = self._scan()
+                if not set(sources) <= {name for _, _, name in visible}:
+                    return False
+                os.link(temp, os.path.join(self.path, f"segment-{first:010d}-{last:010d}.rrl"))
+                # With segments left behind by a merge that stopped before removing them
+                for name in sources + superseded:
+                    try:
+                        os.unlink(os.path.join(self.path, name))
+                    except FileNotFoundError:
+                        pass
+        finally:
+            os.unlink(temp)
+        return True
+
+    # -- reading ---------------------------------------------------------
+
+    def _scan(self) -> Tuple[List[Tuple[int, int, str]], List[str]]:
+        """
+        Visible segments as (first, last sequence, file name), oldest first,
+        and the names of segments a merged one has replaced
+        """
+        found = []
+        for name in os.listdir(self.path):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                first = int(match.group(1))
+                found.append((first, int(match.group(2) or first), name))
+        # Merged ranges nest: the widest one starting at a sequence hides the rest
+        found.sort(key=lambda entry: (entry[0], -entry[1]))
+        visible: List[Tuple[int, int, str]] = []
+        superseded = []
+        for entry in found:
+            if visible and entry[0] <= visible[-1][1]:
+                superseded.append(entry[2])
+            else:
+                visible.append(entry)
+        return visible, superseded
+
+    def _refresh(self) -> List[Tuple[int, int, str]]:
+        """The visible segments, listed again only if the directory changed (holding _lock)"""
+        changed = os.stat(self.path).st_mtime_ns
+        if changed != self._listed or time.time_ns() - changed < _QUIET_NS:
+            self._listing, _ = self._scan()
+            self._listed = changed
+            names = {name for _, _, name in self._listing}
+            for name in [name for name in self._readers if name not in names]:
+                self._retire(self._readers.pop(name))
+        return self._listing
+
+    def _retire(self, reader: SegmentReader) -> None:
+        if self._users.get(reader):
+            self._retired.add(reader)
+        else:
+            reader.close()
+
+    def _acquire(self, upto: int) -> List[Tuple[int, int, SegmentReader]]:
+        """
+        Readers of the visible segments holding documents published up to
+        ``upto``, kept open until ``_release``
+        """
+        with self._lock:
+            while True:
+                segments = []
+                stale = False
+                for first, last, name in self._refresh():
+                    if first > upto:
+                        break
+                    reader = self._readers.get(name)
+                    if reader is None:
+                        try:
+                            reader = SegmentReader(os.path.join(self.path, name))
+                        except FileNotFoundError:
+                            # Merged away since it was listed
+                            stale = True
+                            break
+                        except (OSError, SegmentFormatError):
+                            continue
+                        self._readers[name] = reader
+                    segments.append((first, last, reader))
+                if stale:
+                    self._listed = None
+                    continue
+                for _, _, reader in segments:
+                    self._users[reader] = self._users.get(reader, 0) + 1
+                return segments
+
+    def _release(self, segments: List[Tuple[int, int, SegmentReader]]) -> None:
+        with self._lock:
+            for _, _, reader in segments:
+                self._users[reader] -= 1
+                if not self._users[reader]:
+                    del self._users[reader]
+                    if reader in self._retired:
+                        self._retired.discard(reader)
+                        reader.close()
+
+    def open_pit(self, index: str) -> str:
+        with self._lock:
+            return str(max((last for _, last, _ in self._refresh()), default=0))
+
+    def close_pit(self, pit_id: str) -> None:
+        pass
+
+    def page(
+        self,
+        query: Any,
+        pit_id: str,
+        after: Optional[List[Any]],
+        size: int,
+        track_total: bool,
+    ) -> Dict[str, Any]:
+        """One page in the Elasticsearch response shape (hits.total, hits.hits[].sort)"""
+        plan = _Plan(query)
+        upto = int(pit_id)
+        bound = None if after is None else (int(after[0]), int(after[1]))
+        segments = self._acquire(upto)
+        try:
+            streams = []
+            total = 0
+            for first, last, segment in segments:
+                candidates = plan.candidates(segment)
+                if last > upto and len(candidates):
+                    # Merged with segments published after the PIT: only its own documents
+                    keys = segment.keys
+                    candidates = [doc for doc in candidates if keys[doc] >> 32 <= upto]
+                if not len(candidates):
+                    continue
+                if track_total:
+                    total += (
+                        len(candidates)
+                        if not plan.substrings
+                        else sum(1 for doc in candidates if plan.verify(segment, doc))
+                    )
+                streams.append(self._stream(segment, first, candidates, bound, plan.descending))
+
+            hits = []
+            for millis, key, segment, doc in heapq.merge(*streams, reverse=plan.descending):
+                if not plan.verify(segment, doc):
+                    continue
+                index, ident, source = segment.document(doc)
+                hits.append(
+                    {
+                        "_index": index,
+                        "_id": ident if ident is not None else f"{key >> 32}.{key & 0xFFFFFFFF}",
+                        "_source": source,
+                        "sort": [millis, key],
+                    }
+                )
+                if len(hits) >= size:
+                    break
+        finally:
+            self._release(segments)
+        return {"pit_id": pit_id, "hits": {"total": {"value": total}, "hits": hits}}
+
+    @staticmethod
+    def _stream(
+        segment: SegmentReader,
+        sequence: int,
+        candidates: Sequence[int],
+        bound: Optional[Tuple[int, int]],
+        descending: bool,
+    ) -> Iterator[Tuple[int, int, SegmentReader, int]]:
+        timestamps = segment.timestamps
+        keys = segment.keys
+        base = sequence << 32
+
+        def sort_key(doc: int) -> Tuple[int, int]:
+            return timestamps[doc], base | doc
+
+        if keys is not None:
+
+            def sort_key(doc: int) -> Tuple[int, int]:
+                return timestamps[doc], keys[doc]
+
+        if descending:
+            end = len(candidates) if bound is None else bisect_left(candidates, bound, key=sort_key)
+            positions = range(end - 1, -1, -1)
+        else:
+            start = 0
+            if bound is not None:
+                start = bisect_left(candidates, bound, key=sort_key)
+                if start < len(candidates) and sort_key(candidates[start]) == bound:
+                    start += 1
+            positions = range(start, len(candidates))
+        for position in positions:
+            doc = candidates[position]
+            millis, key = sort_key(doc)
+            yield millis, key, segment, doc
+
+
+_shared: Optional[EmbeddedLogStore] = None
+_shared_pid: Optional[int] = None
+_shared_lock = threading.Lock()
+
+
+def shared_store() -> EmbeddedLogStore:
+    """Process-wide EmbeddedLogStore at ``settings.LOG_STORE_PATH`` (recreated after a fork)"""
+    global _shared, _shared_pid
+    with _shared_lock:
+        if _shared is None or _shared_pid != os.getpid():
+            _shared = EmbeddedLogStore(settings.LOG_STORE_PATH)
+            _shared_pid = os.getpid()
+        return _shared
@@ -0,0 +1,95 @@
+"""
+Log parser registry
+Maps an ingest ``source`` to the parser that turns its raw payload into
+documents shaped like the sysmon-* index template, and fans large
+payloads out over a process pool
+
+A parser is a ``parse(payload, scenario_id, vm_id)`` generator plus a
+``split(payload, chunk_bytes)`` that cuts a payload into chunks which
+parse independently (whole lines, whole <Event> elements, each Zeek chunk
+carrying its header). Payloads under ``parallel_bytes`` are parsed
+inline; larger ones are split and the chunks parsed by a pool of
+``workers`` processes, with documents returned in payload order.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from app.core.config import settings
+from app.services import suricata, sysmon, zeek
+
+Payload = Union[bytes, str]
+
+
+@dataclass(frozen=True)
+class LogParser:
+    name: str
+    parse: Callable[[Payload, Optional[str], Optional[str]], Iterator[Dict[str, Any]]]
+    split: Callable[[bytes, int], List[bytes]]
+
+
+PARSERS: Dict[str, LogParser] = {}
+
+
+def register(parser: LogParser) -> LogParser:
+    """Add (or replace) the parser for ``parser.name``"""
+    PARSERS[parser.name] = parser
+    return parser
+
+
+def get_parser(source: str) -> LogParser:
+    parser = PARSERS.get(source)
+    if parser is None:
+        raise ValueError(f"No parser for log source {source!r}")
+    return parser
+
+
+register(LogParser("sysmon", sysmon.parse_stream, sysmon.split))
+register(LogParser("zeek", zeek.parse_stream, zeek.split))
+register(LogParser("suricata", suricata.parse_stream, suricata.split))
+
+
+def parse_chunk(
+    source: str, chunk: bytes, scenario_id: Optional[str], vm_id: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Parse one chunk to a list (pool worker)"""
+    return list(get_parser(source).parse(chunk, scenario_id, vm_id))
+
+
+def normalize(
+    source: str,
+    payload: Payload,
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+    workers: int = settings.LOG_PARSE_WORKERS,
+    parallel_bytes: int = settings.LOG_PARSE_PARALLEL_BYTES,
+    chunk_bytes: int = settings.LOG_PARSE_CHUNK_BYTES,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documents for a raw ``source`` payload, in payload order
+
+    A daemonic process cannot start the pool, so there every payload is
+    parsed inline and ``scripts.bench_parsers`` scaling does not apply.
+    That is the case for tasks in a prefork Celery worker; large
+    ``logs.ingest`` payloads are routed to the decode queue, whose worker
+    runs the threads pool so tasks execute in its (non-daemonic) main
+    process.
+    """
+    parser = get_parser(source)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    workers = workers or os.cpu_count() or 1
+    # Daemonic processes (e.g. prefork Celery children) cannot start a pool
+    if workers == 1 or len(payload) < parallel_bytes or multiprocessing.current_process().daemon:
+        yield from parser.parse(payload, scenario_id, vm_id)
+        return
+    chunks = parser.split(payload, chunk_bytes)
+    count = len(chunks)
+    with ProcessPoolExecutor(max_workers=min(workers, count)) as pool:
+        for documents in pool.map(
+            parse_chunk, [source] * count, chunks, [scenario_id] * count, [vm_id] * count
+        ):
+            yield from documents
@@ -0,0 +1,114 @@
+"""
+Processed replay files
+Resolves replay ids to columnar replay files and keeps their readers open
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional, Tuple
+
+from replay.columnar import ReplayFormatError, ReplayReader
+
+from app.core.config import settings
+
+REPLAY_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+# NDJSON lines are sent to the client in groups of this many events
+NDJSON_BATCH = 256
+
+
+class ReplayNotFound(LookupError):
+    pass
+
+
+def replay_path(replay_id: str) -> str:
+    if not REPLAY_ID_PATTERN.match(replay_id):
+        raise ReplayNotFound(replay_id)
+    return os.path.join(settings.REPLAY_OUTPUT_DIR, f"{replay_id}.rrp")
+
+
+def replay_id_for(pcap_file: str) -> str:
+    """
+    ``<capture name>-<hash of its absolute path>``: captures with the same
+    file name in different directories get different replays, and
+    processing one capture again replaces its own
+    """
+    digest = hashlib.sha256(os.path.abspath(pcap_file).encode()).hexdigest()[:16]
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.splitext(os.path.basename(pcap_file))[0])
+    return f"{name.lstrip('_.-')[:100] or 'capture'}-{digest}"
+
+
+class ReplayReaderCache:
+    """
+    LRU of open ReplayReaders keyed on (path, mtime)
+
+    Opening a replay parses its footer index, which grows with the file;
+    keeping readers open makes a query cost only the binary searches and
+    the rows it returns. A rewritten file gets a new mtime and a new reader.
+    Evicted readers are not closed explicitly, as a response may still be
+    streaming from them; they are released once unreferenced.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._readers: "OrderedDict[Tuple[str, int], ReplayReader]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> ReplayReader:
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError as exc:
+            raise ReplayNotFound(path) from exc
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is not None:
+                self._readers.move_to_end(key)
+                return reader
+        try:
+            reader = ReplayReader(path)
+        except (FileNotFoundError, ReplayFormatError) as exc:
+            raise ReplayNotFound(path) from exc
+        with self._lock:
+            self._readers[key] = reader
+            while len(self._readers) > self.size:
+                self._readers.popitem(last=False)
+        return reader
+
+
+_cache = ReplayReaderCache(settings.REPLAY_READER_CACHE_SIZE)
+
+
+def open_replay(replay_id: str) -> ReplayReader:
+    """Reader for a processed replay (raises ReplayNotFound)"""
+    return _cache.get(replay_path(replay_id))
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds or an ISO-8601 timestamp (naive means UTC)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def ndjson(events: Iterable[dict]) -> Iterator[str]:
+    """Encode events as newline-delimited JSON, a batch of lines at a time"""
+    lines = []
+    for event in events:
+        lines.append(json.dumps(event))
+        if len(lines) >= NDJSON_BATCH:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
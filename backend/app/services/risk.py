@@ -0,0 +1,235 @@
+"""
+Command-line risk scoring
+Compiles weighted indicators into one matcher and scores a command line
+in a single pass; rules are reloaded when their file changes
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Indicator:
+    """A case-insensitive substring (or, with ``regex``, pattern) worth ``weight`` points"""
+
+    id: str
+    pattern: str
+    weight: int
+    regex: bool = False
+
+
+# Logstash parity (siem/logstash/pipelines/sysmon.conf)
+DEFAULT_INDICATORS = (
+    Indicator("powershell", "powershell", 10),
+    Indicator("invoke-expression", "invoke-expression", 15),
+    Indicator("downloadstring", "downloadstring", 20),
+)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex source matching any of ``words``, factored into a prefix trie
+
+    sre backtracks through an alternation one branch at a time; sharing
+    prefixes means each input position costs at most one walk down the
+    trie. Optional tails are greedy, so the longest word starting at a
+    position wins.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def build(node: Dict) -> str:
+        ends_here = "" in node
+        children = [(char, child) for char, child in sorted(node.items()) if char]
+        if not children:
+            return ""
+        leaves = [char for char, child in children if len(child) == 1 and "" in child]
+        if len(leaves) == len(children) and len(leaves) > 1:
+            body = "[" + "".join(re.escape(char) for char in leaves) + "]"
+        else:
+            branches = [re.escape(char) + build(child) for char, child in children]
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class CompiledRules:
+    """
+    Immutable, compiled snapshot of a rule set
+
+    Literal indicators share one trie regex wrapped in a lookahead, so
+    ``finditer`` reports the longest literal starting at every position,
+    overlapping ones included, in one scan of the lowercased text. The
+    shorter literals that are prefixes of a match are credited from a
+    precomputed table. Regex indicators go through one combined pattern
+    first and are only evaluated one by one when it matches.
+    """
+
+    def __init__(self, indicators: Sequence[Indicator]):
+        self.indicators = tuple(indicators)
+        self.weights = tuple(indicator.weight for indicator in self.indicators)
+
+        by_literal: Dict[str, List[int]] = {}
+        self._regexes: List[Tuple[int, re.Pattern]] = []
+        for number, indicator in enumerate(self.indicators):
+            if indicator.regex:
+                self._regexes.append((number, re.compile(indicator.pattern, re.IGNORECASE)))
+            elif indicator.pattern:
+                by_literal.setdefault(indicator.pattern.lower(), []).append(number)
+
+        # matched literal -> every indicator whose literal is a prefix of it
+        self._covers: Dict[str, FrozenSet[int]] = {}
+        for literal in by_literal:
+            covered: List[int] = []
+            for end in range(1, len(literal) + 1):
+                covered.extend(by_literal.get(literal[:end], ()))
+            self._covers[literal] = frozenset(covered)
+        self._scanner = (
+            re.compile("(?=(" + _trie_pattern(by_literal) + "))") if by_literal else None
+        )
+        self._regex_gate = (
+            re.compile(
+                "|".join(
+                    f"(?:{indicator.pattern})" for indicator in self.indicators if indicator.regex
+                ),
+                re.IGNORECASE,
+            )
+            if self._regexes
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.indicators)
+
+    def matches(self, text: Optional[str]) -> FrozenSet[int]:
+        """Positions in ``indicators`` of every indicator found in ``text``"""
+        if not text:
+            return frozenset()
+        found: FrozenSet[int] = frozenset()
+        if self._scanner is not None:
+            covers = self._covers
+            literals = {match.group(1) for match in self._scanner.finditer(text.lower())}
+            if literals:
+                found = frozenset().union(*(covers[literal] for literal in literals))
+        if self._regex_gate is not None and self._regex_gate.search(text):
+            found |= {number for number, pattern in self._regexes if pattern.search(text)}
+        return found
+
+    def score(self, text: Optional[str]) -> int:
+        """Sum of the weights of the indicators found; each counts once"""
+        weights = self.weights
+        return sum(weights[number] for number in self.matches(text))
+
+
+def load_indicators(path: str) -> List[Indicator]:
+    """
+    Read a JSON rules file
+
+    Either a list of indicators or ``{"indicators": [...]}``; each entry
+    has ``pattern`` and ``weight`` and optionally ``id`` and ``regex``.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("indicators", [])
+    indicators = []
+    for entry in data:
+        pattern = str(entry["pattern"])
+        indicators.append(
+            Indicator(
+                id=str(entry.get("id", pattern)),
+                pattern=pattern,
+                weight=int(entry["weight"]),
+                regex=bool(entry.get("regex", False)),
+            )
+        )
+    return indicators
+
+
+class RiskEngine:
+    """
+    Scores command lines against a hot-reloadable rule set
+
+    With a ``path``, the file's mtime and size are checked at most every
+    ``reload_interval`` seconds on the scoring path; a changed file is
+    compiled and swapped in with a single assignment, so concurrent
+    callers see either the old or the new rules, never a mix. A file that
+    fails to load leaves the current rules in place and is reported in
+    ``last_error``.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        reload_interval: float = settings.RISK_RULES_RELOAD_INTERVAL,
+        indicators: Sequence[Indicator] = DEFAULT_INDICATORS,
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.rules = CompiledRules(indicators)
+        self.last_error: Optional[str] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile from ``path`` if the file changed; True when swapped"""
+        if not self.path:
+            return False
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if not force and signature == self._signature:
+                    return False
+                rules = CompiledRules(load_indicators(self.path))
+            except (OSError, ValueError, KeyError, TypeError, re.error) as exc:
+                self.last_error = f"{self.path}: {exc}"
+                return False
+            self.rules = rules
+            self._signature = signature
+            self.last_error = None
+            return True
+
+    def _maybe_reload(self) -> CompiledRules:
+        if self.path and time.monotonic() >= self._next_check:
+            self.reload()
+        return self.rules
+
+    def matches(self, command_line: Optional[str]) -> List[str]:
+        """Ids of the indicators found in ``command_line``"""
+        rules = self._maybe_reload()
+        return sorted(rules.indicators[number].id for number in rules.matches(command_line))
+
+    def score(self, command_line: Optional[str]) -> int:
+        return self._maybe_reload().score(command_line)
+
+
+_shared: Optional[RiskEngine] = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine() -> RiskEngine:
+    """Process-wide RiskEngine for ``settings.RISK_RULES_PATH``, created on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RiskEngine(settings.RISK_RULES_PATH or None)
+        return _shared
@@ -0,0 +1,212 @@
+"""
+Log rollups
+Per-minute aggregates maintained at ingest time, so dashboards read
+O(buckets) Redis entries instead of re-aggregating raw events
+
+For every (scenario_id, minute) there are three structures, all keyed on
+the dimensions ``[vm_id, event_id, severity]`` (JSON-encoded):
+
+    rollup:{scenario}:{minute}:n          HASH  dims -> event count
+    rollup:{scenario}:{minute}:max        ZSET  dims -> max risk_score (ZADD GT)
+    rollup:{scenario}:{minute}:hll:{dims} HLL   distinct processes
+
+plus ``rollup:scenarios``, the set of scenario ids seen. Distinct process
+counts of any larger bucket come from one PFCOUNT over its minutes' HLLs.
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import redis
+
+from app.core.config import settings
+
+MINUTE = 60
+DIMENSIONS = ("vm_id", "event_id", "severity")
+SCENARIOS_KEY = "rollup:scenarios"
+# Stand-in for events without a scenario
+NO_SCENARIO = "_"
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def _process(doc: Dict[str, Any]) -> Optional[str]:
+    """Identity of the process behind an event: Sysmon's GUID, else host and pid"""
+    guid = doc.get("process_guid")
+    if guid:
+        return str(guid)
+    pid = doc.get("process_id")
+    if pid is not None:
+        return f"{doc.get('computer_name') or doc.get('vm_id') or ''}:{pid}"
+    return None
+
+
+def _prefix(scenario: str, minute: int) -> str:
+    return f"rollup:{scenario}:{minute}"
+
+
+class RollupBatch:
+    """
+    Accumulates one ingest batch in memory, then writes each touched cell
+    once: a batch of N events costs O(cells) Redis commands, not O(N)
+    """
+
+    def __init__(self) -> None:
+        # (scenario, minute, dims) -> [count, max risk, processes]
+        self._cells: Dict[Tuple[str, int, str], List[Any]] = {}
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        timestamp = _epoch(doc.get("@timestamp"))
+        if timestamp is None:
+            self.skipped += 1
+            return
+        scenario = doc.get("scenario_id")
+        dims = json.dumps(
+            [None if doc.get(name) is None else str(doc[name]) for name in DIMENSIONS]
+        )
+        key = (NO_SCENARIO if scenario is None else str(scenario), int(timestamp // MINUTE), dims)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = [0, 0, set()]
+        cell[0] += 1
+        risk = doc.get("risk_score")
+        if isinstance(risk, (int, float)) and risk > cell[1]:
+            cell[1] = risk
+        process = _process(doc)
+        if process is not None:
+            cell[2].add(process)
+
+    def flush(self, client: redis.Redis, ttl: int = settings.ROLLUP_TTL) -> int:
+        """Write the batch in one pipeline; returns the number of cells updated"""
+        if not self._cells:
+            return 0
+        pipe = client.pipeline(transaction=False)
+        scenarios: Set[str] = set()
+        touched: Set[str] = set()
+        for (scenario, minute, dims), (count, risk, processes) in self._cells.items():
+            prefix = _prefix(scenario, minute)
+            scenarios.add(scenario)
+            pipe.hincrby(prefix + ":n", dims, count)
+            pipe.zadd(prefix + ":max", {dims: risk}, gt=True)
+            touched.add(prefix)
+            if processes:
+                hll = f"{prefix}:hll:{dims}"
+                pipe.pfadd(hll, *processes)
+                pipe.expire(hll, ttl)
+        for prefix in touched:
+            pipe.expire(prefix + ":n", ttl)
+            pipe.expire(prefix + ":max", ttl)
+        pipe.sadd(SCENARIOS_KEY, *scenarios)
+        pipe.execute()
+        written = len(self._cells)
+        self._cells = {}
+        return written
+
+
+def aggregate(
+    client: redis.Redis,
+    start: float,
+    end: float,
+    interval: int = MINUTE,
+    scenario_id: Optional[str] = None,
+    filters: Optional[Dict[str, str]] = None,
+    group_by: Sequence[str] = DIMENSIONS,
+) -> Dict[str, Any]:
+    """
+    Buckets of ``interval`` seconds (a multiple of a minute) over [start, end]
+
+    Each bucket has the event count, max risk_score and distinct process
+    count per ``group_by`` combination, after keeping only cells equal to
+    ``filters``. Reads two structures per scenario-minute plus one
+    PFCOUNT per output row, independent of how many events were ingested.
+    """
+    if interval < MINUTE or interval % MINUTE:
+        raise ValueError("interval must be a positive multiple of 60 seconds")
+    unknown = set(group_by) - set(DIMENSIONS) or set(filters or ()) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown rollup dimensions: {sorted(unknown)}")
+    first, last = int(start // MINUTE), int(end // MINUTE)
+    minutes = last - first + 1
+    if minutes <= 0:
+        return {"interval": interval, "group_by": list(group_by), "buckets": []}
+    if minutes > settings.ROLLUP_MAX_MINUTES:
+        raise ValueError(f"Range covers more than {settings.ROLLUP_MAX_MINUTES} minutes")
+
+    if scenario_id is not None:
+        scenarios = [scenario_id]
+    else:
+        scenarios = sorted(member.decode() for member in client.smembers(SCENARIOS_KEY))
+    cells = [(scenario, minute) for scenario in scenarios for minute in range(first, last + 1)]
+    pipe = client.pipeline(transaction=False)
+    for scenario, minute in cells:
+        prefix = _prefix(scenario, minute)
+        pipe.hgetall(prefix + ":n")
+        pipe.zrange(prefix + ":max", 0, -1, withscores=True)
+    replies = pipe.execute()
+
+    positions = [DIMENSIONS.index(name) for name in group_by]
+    wanted = [(DIMENSIONS.index(name), value) for name, value in (filters or {}).items()]
+    # (bucket start, group values) -> [count, max risk, hll keys]
+    rows: Dict[Tuple[int, Tuple], List[Any]] = {}
+    for number, (scenario, minute) in enumerate(cells):
+        counts, maxima = replies[2 * number], dict(replies[2 * number + 1])
+        if not counts:
+            continue
+        bucket = minute * MINUTE // interval * interval
+        prefix = _prefix(scenario, minute)
+        for raw, count in counts.items():
+            values = json.loads(raw)
+            if any(values[position] != value for position, value in wanted):
+                continue
+            key = (bucket, tuple(values[position] for position in positions))
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = [0, 0, []]
+            row[0] += int(count)
+            row[1] = max(row[1], maxima.get(raw, 0))
+            row[2].append(f"{prefix}:hll:{raw.decode()}")
+
+    ordered = sorted(rows.items(), key=lambda item: (item[0][0], [str(v) for v in item[0][1]]))
+    pipe = client.pipeline(transaction=False)
+    for _, (_, _, hlls) in ordered:
+        pipe.pfcount(*hlls)
+    distinct = pipe.execute() if ordered else []
+
+    buckets = []
+    for ((bucket, values), (count, risk, _)), processes in zip(ordered, distinct):
+        row = {"timestamp": bucket, **dict(zip(group_by, values))}
+        risk = int(risk) if float(risk).is_integer() else risk
+        row.update(count=count, max_risk_score=risk, distinct_processes=processes)
+        buckets.append(row)
+    return {"interval": interval, "group_by": list(group_by), "buckets": buckets}
+
+
+_client: Optional[redis.Redis] = None
+_client_lock = threading.Lock()
+
+
+def redis_client() -> redis.Redis:
+    """Process-wide Redis client for rollups and leaderboards, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=2.0)
+        return _client
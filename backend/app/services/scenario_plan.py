@@ -0,0 +1,164 @@
+"""
+Scenario execution plans
+``Scenario.steps`` holds a dependency graph of steps:
+
+    {
+        "max_parallel": 8,
+        "steps": [
+            {"id": "network", "action": "terraform.apply", "params": {...}},
+            {"id": "dc01", "action": "ansible.run", "params": {...},
+             "depends_on": ["network"]},
+            {"id": "agent-dc01", "action": "caldera.start", "params": {...},
+             "depends_on": ["dc01"], "timeout": 300}
+        ]
+    }
+
+Each step names an action (a worker task), its keyword arguments, the
+steps it waits for and, optionally, a timeout in seconds; ``max_parallel``
+caps how many steps run at once (SCENARIO_MAX_PARALLEL if absent). An
+empty document is an empty plan.
+
+``compile_plan`` validates the graph and orders it: steps in a
+topological order (ties kept in declaration order), grouped into stages
+of steps whose dependencies all sit in earlier stages, and ranked by the
+longest chain of steps that still has to follow each one, which the
+executor uses to start the critical path first.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class PlanError(ValueError):
+    """The steps document is not a valid, acyclic step graph"""
+
+
+@dataclass(frozen=True)
+class Step:
+    id: str
+    action: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        step: Dict[str, Any] = {"id": self.id, "action": self.action, "params": self.params}
+        if self.depends_on:
+            step["depends_on"] = list(self.depends_on)
+        if self.timeout is not None:
+            step["timeout"] = self.timeout
+        return step
+
+
+@dataclass
+class Plan:
+    steps: List[Step]
+    stages: List[List[str]]
+    dependents: Dict[str, List[str]]
+    rank: Dict[str, int]
+    max_parallel: int
+
+    def __post_init__(self) -> None:
+        self._by_id = {step.id: step for step in self.steps}
+
+    def step(self, step_id: str) -> Step:
+        return self._by_id[step_id]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The steps document, in plan order; compiling it again gives the same plan"""
+        return {"max_parallel": self.max_parallel, "steps": [step.to_dict() for step in self.steps]}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "steps": len(self.steps),
+            "stages": len(self.stages),
+            "critical_path": max(self.rank.values(), default=0),
+            "max_parallel": self.max_parallel,
+        }
+
+
+def _step(index: int, raw: Any) -> Step:
+    if not isinstance(raw, dict):
+        raise PlanError(f"Step {index} is not an object")
+    step_id, action = raw.get("id"), raw.get("action")
+    if not isinstance(step_id, str) or not step_id:
+        raise PlanError(f"Step {index} has no id")
+    if not isinstance(action, str) or not action:
+        raise PlanError(f"Step {step_id!r} has no action")
+    params = raw.get("params") or {}
+    if not isinstance(params, dict):
+        raise PlanError(f"Step {step_id!r}: params must be an object")
+    depends_on = raw.get("depends_on") or []
+    if isinstance(depends_on, str) or not all(isinstance(dep, str) for dep in depends_on):
+        raise PlanError(f"Step {step_id!r}: depends_on must be a list of step ids")
+    timeout = raw.get("timeout")
+    if timeout is not None and (
+        isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0
+    ):
+        raise PlanError(f"Step {step_id!r}: timeout must be a positive number of seconds")
+    return Step(step_id, action, params, tuple(dict.fromkeys(depends_on)), timeout)
+
+
+def compile_plan(
+    spec: Optional[Dict[str, Any]],
+    actions: Optional[Iterable[str]] = None,
+    max_parallel: int = settings.SCENARIO_MAX_PARALLEL,
+) -> Plan:
+    """
+    Validate a steps document and order it for execution; ``actions``, if
+    given, are the only actions allowed
+    """
+    spec = spec or {}
+    if not isinstance(spec, dict) or not isinstance(spec.get("steps", []), list):
+        raise PlanError('Steps must be an object with a "steps" list')
+    max_parallel = spec.get("max_parallel", max_parallel)
+    if isinstance(max_parallel, bool) or not isinstance(max_parallel, int) or max_parallel < 1:
+        raise PlanError("max_parallel must be a positive integer")
+    declared = [_step(index, raw) for index, raw in enumerate(spec.get("steps", []))]
+
+    position: Dict[str, int] = {}
+    for index, step in enumerate(declared):
+        if step.id in position:
+            raise PlanError(f"Duplicate step id {step.id!r}")
+        position[step.id] = index
+    allowed = None if actions is None else set(actions)
+    dependents: Dict[str, List[str]] = {step.id: [] for step in declared}
+    waiting = {}
+    for step in declared:
+        if allowed is not None and step.action not in allowed:
+            raise PlanError(f"Step {step.id!r}: unknown action {step.action!r}")
+        for dep in step.depends_on:
+            if dep not in position:
+                raise PlanError(f"Step {step.id!r} depends on unknown step {dep!r}")
+            if dep == step.id:
+                raise PlanError(f"Step {step.id!r} depends on itself")
+            dependents[dep].append(step.id)
+        waiting[step.id] = len(step.depends_on)
+
+    # Kahn's algorithm; the heap keeps ready steps in declaration order
+    ready = [index for index, step in enumerate(declared) if not step.depends_on]
+    heapq.heapify(ready)
+    order: List[Step] = []
+    stage: Dict[str, int] = {}
+    while ready:
+        step = declared[heapq.heappop(ready)]
+        order.append(step)
+        stage[step.id] = 1 + max((stage[dep] for dep in step.depends_on), default=-1)
+        for child in dependents[step.id]:
+            waiting[child] -= 1
+            if not waiting[child]:
+                heapq.heappush(ready, position[child])
+    if len(order) < len(declared):
+        cycle = sorted((step_id for step_id, count in waiting.items() if count), key=position.get)
+        raise PlanError(f"Dependency cycle among or upstream of steps: {', '.join(cycle)}")
+
+    stages: List[List[str]] = [[] for _ in range(max(stage.values(), default=-1) + 1)]
+    for step in order:
+        stages[stage[step.id]].append(step.id)
+    rank: Dict[str, int] = {}
+    for step in reversed(order):
+        rank[step.id] = 1 + max((rank[child] for child in dependents[step.id]), default=0)
+    return Plan(order, stages, dependents, rank, max_parallel)
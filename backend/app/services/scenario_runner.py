@@ -0,0 +1,145 @@
+"""
+Scenario execution
+Runs a compiled ``scenario_plan.Plan``: each step starts as soon as every
+step it depends on has succeeded, at most ``max_parallel`` at a time, and
+when more steps are ready than there are free slots the one with the
+longest chain still behind it goes first.
+
+A step fails when its handler raises or it runs past its timeout; the
+steps that depend on it, directly or not, are skipped and the rest of the
+graph carries on. Handlers are looked up by action and called with the
+step and the outputs of the steps it depends on. Coroutine functions are
+awaited; anything else (a worker task run inline) runs in a thread, so
+blocking steps still overlap. A timed-out thread is not interrupted, only
+no longer waited for.
+"""
+
+import asyncio
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from app.services.scenario_plan import Plan, PlanError, Step
+
+Handler = Callable[[Step, Dict[str, Any]], Any]
+
+
+@dataclass
+class StepResult:
+    step_id: str
+    status: str  # running, succeeded, failed or skipped
+    started: Optional[float] = None  # seconds since the run started
+    finished: Optional[float] = None
+    output: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class RunReport:
+    status: str  # succeeded, or failed if any step did not succeed
+    elapsed: float
+    steps: List[StepResult]  # in plan order
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "elapsed": round(self.elapsed, 3),
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+
+async def _call(
+    handler: Handler, step: Step, inputs: Dict[str, Any], threads: ThreadPoolExecutor
+) -> Any:
+    if asyncio.iscoroutinefunction(handler):
+        call = handler(step, inputs)
+    else:
+        call = asyncio.get_running_loop().run_in_executor(threads, handler, step, inputs)
+    if step.timeout is None:
+        return await call
+    return await asyncio.wait_for(call, step.timeout)
+
+
+async def execute(
+    plan: Plan,
+    handlers: Mapping[str, Handler],
+    max_parallel: Optional[int] = None,
+    on_update: Optional[Callable[[StepResult], None]] = None,
+) -> RunReport:
+    """
+    Run every step of ``plan``; ``on_update`` is called as each step starts,
+    finishes or is skipped
+    """
+    missing = sorted({step.action for step in plan.steps} - set(handlers))
+    if missing:
+        raise PlanError(f"No handler for actions: {', '.join(missing)}")
+    limit = max_parallel or plan.max_parallel
+    begin = time.monotonic()
+    position = {step.id: index for index, step in enumerate(plan.steps)}
+    waiting = {step.id: len(step.depends_on) for step in plan.steps}
+    ready = [(-plan.rank[step.id], position[step.id]) for step in plan.steps if not step.depends_on]
+    heapq.heapify(ready)
+    results: Dict[str, StepResult] = {}
+    running: Dict[asyncio.Task, str] = {}
+    # Not the loop's default executor: that one is sized to the CPU count,
+    # which would cap blocking steps below the plan's limit
+    threads = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="scenario-step")
+
+    def update(result: StepResult) -> None:
+        if on_update is not None:
+            on_update(result)
+
+    def skip(failed: str) -> None:
+        behind = list(plan.dependents[failed])
+        while behind:
+            step_id = behind.pop()
+            if step_id in results:
+                continue
+            results[step_id] = StepResult(step_id, "skipped", error=f"{failed} did not succeed")
+            update(results[step_id])
+            behind.extend(plan.dependents[step_id])
+
+    try:
+        while ready or running:
+            while ready and len(running) < limit:
+                step = plan.steps[heapq.heappop(ready)[1]]
+                inputs = {dep: results[dep].output for dep in step.depends_on}
+                results[step.id] = StepResult(step.id, "running", time.monotonic() - begin)
+                update(results[step.id])
+                task = asyncio.create_task(_call(handlers[step.action], step, inputs, threads))
+                running[task] = step.id
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            finished = {running.pop(task): task for task in done}
+            for step_id in sorted(finished, key=position.get):
+                result = results[step_id]
+                result.finished = time.monotonic() - begin
+                try:
+                    result.output = finished[step_id].result()
+                    result.status = "succeeded"
+                except asyncio.TimeoutError:
+                    result.status = "failed"
+                    result.error = f"timed out after {plan.step(step_id).timeout}s"
+                except Exception as exc:
+                    result.status = "failed"
+                    result.error = f"{type(exc).__name__}: {exc}"
+                update(result)
+                if result.status != "succeeded":
+                    skip(step_id)
+                    continue
+                for child in plan.dependents[step_id]:
+                    waiting[child] -= 1
+                    if not waiting[child]:
+                        heapq.heappush(ready, (-plan.rank[child], position[child]))
+    finally:
+        for task in running:
+            task.cancel()
+        threads.shutdown(wait=False)
+
+    steps = [results[step.id] for step in plan.steps]
+    failed = any(result.status != "succeeded" for result in steps)
+    return RunReport("failed" if failed else "succeeded", time.monotonic() - begin, steps)
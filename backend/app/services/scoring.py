@@ -0,0 +1,470 @@
+"""
+Scenario run scoring
+Detection rate, mean time to detect and false positives per team, from
+the run's objective events and the alerts each team raised
+
+Both arrive as ingested events tagged with the run's ``scenario_id``:
+
+- an objective event (``objective_id``) marks a red-team action at its
+  ``@timestamp``; it may set its own ``detection_window`` in seconds;
+- an alert (``team_id``) is a detection raised by that team.
+
+An objective is detected by a team's first alert in
+``[start, start + window]``; time to detect is that alert's delay. An
+alert inside no objective's window is a false positive. Repeated events
+for an objective keep the earliest.
+
+All timestamps are int64 epoch millis in NumPy arrays: objectives sorted
+by start, alerts grouped by team and sorted by time, and the objective
+windows merged into disjoint covered spans. Per team, one batched
+``searchsorted`` of the objective starts and the span bounds into the
+team's alerts gives each objective's first candidate alert and how many
+alerts fall inside any window, so the work per team grows with the
+number of objectives, not of alerts.
+"""
+
+import heapq
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.log_store import timestamp_millis
+
+OBJECTIVE_FIELD = "objective_id"
+TEAM_FIELD = "team_id"
+WINDOW_FIELD = "detection_window"
+
+
+class RunEvents:
+    """Objective windows and per-team alert times of one run"""
+
+    def __init__(
+        self,
+        objective_ids: Sequence[str],
+        objective_times: Sequence[int],
+        objective_windows: Sequence[int],
+        team_ids: Sequence[str],
+        alert_teams: Sequence[int],
+        alert_times: Sequence[int],
+    ):
+        """
+        Times and windows in millis; ``alert_teams`` holds each alert's
+        index into ``team_ids``
+        """
+        starts = np.asarray(objective_times, dtype=np.int64)
+        # Ties in start time go by objective id, whatever order events came in
+        order = np.lexsort((np.asarray(objective_ids, dtype=str), starts))
+        self.objective_ids = [objective_ids[i] for i in order]
+        self.starts = starts[order]
+        self.ends = self.starts + np.asarray(objective_windows, dtype=np.int64)[order]
+        # Disjoint spans covered by some window: a span starts where an
+        # objective starts after every earlier window has closed
+        reach = self.ends
+        opens = closes = np.zeros(0, dtype=np.int64)
+        if len(reach):
+            reach = np.maximum.accumulate(self.ends)
+            opens = np.flatnonzero(np.concatenate(([True], self.starts[1:] > reach[:-1])))
+            closes = np.append(opens[1:] - 1, len(reach) - 1)
+        # Searched for together: objective starts, span starts, one past span ends
+        self.needles = np.concatenate((self.starts, self.starts[opens], reach[closes] + 1))
+        self.team_ids = list(team_ids)
+
+        teams = np.asarray(alert_teams, dtype=np.int64)
+        times = np.asarray(alert_times, dtype=np.int64)
+        order = np.lexsort((times, teams))
+        self.alert_times = times[order]
+        # Team k's alerts are alert_times[bounds[k]:bounds[k + 1]]
+        self.bounds = np.searchsorted(teams[order], np.arange(len(self.team_ids) + 1))
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Iterable[Dict[str, Any]],
+        detection_window: float = settings.SCORING_DETECTION_WINDOW,
+    ) -> "RunEvents":
+        """Split a run's events into objectives and alerts; anything else is ignored"""
+        objective_ids: List[str] = []
+        objective_times: List[int] = []
+        objective_windows: List[int] = []
+        positions: Dict[str, int] = {}
+        teams: Dict[str, int] = {}
+        alert_teams: List[int] = []
+        alert_times: List[int] = []
+        for doc in documents:
+            team = doc.get(TEAM_FIELD)
+            if team is not None:
+                alert_teams.append(teams.setdefault(str(team), len(teams)))
+                alert_times.append(timestamp_millis(doc.get("@timestamp")))
+                continue
+            objective = doc.get(OBJECTIVE_FIELD)
+            if objective is None:
+                continue
+            objective = str(objective)
+            millis = timestamp_millis(doc.get("@timestamp"))
+            position = positions.get(objective)
+            if position is not None:
+                # Documents may come in any order; the earliest event wins
+                if millis >= objective_times[position]:
+                    continue
+                objective_times[position] = millis
+                objective_windows[position] = _window_millis(doc, detection_window)
+                continue
+            positions[objective] = len(objective_ids)
+            objective_ids.append(objective)
+            objective_times.append(millis)
+            objective_windows.append(_window_millis(doc, detection_window))
+        return cls(
+            objective_ids,
+            objective_times,
+            objective_windows,
+            list(teams),
+            alert_teams,
+            alert_times,
+        )
+
+    def alerts(self, team: int) -> np.ndarray:
+        return self.alert_times[self.bounds[team] : self.bounds[team + 1]]
+
+
+def _window_millis(doc: Dict[str, Any], default: float) -> int:
+    window = doc.get(WINDOW_FIELD)
+    if not isinstance(window, (int, float)) or window < 0:
+        window = default
+    return int(window * 1000)
+
+
+@dataclass
+class TeamScore:
+    team_id: str
+    objectives: int
+    detected: int
+    detection_rate: float
+    # Seconds, over detected objectives; None when nothing was detected
+    mean_time_to_detect: Optional[float]
+    false_positives: int
+    false_positive_rate: float
+    alerts: int
+    score: float
+    # objective_id -> seconds to detect, None if missed
+    detections: Dict[str, Optional[float]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def match_team(run: RunEvents, team: int) -> Tuple[np.ndarray, int]:
+    """
+    Millis from each objective to the team's first alert in its window
+    (-1 if none), and the team's false positive count
+    """
+    alerts = run.alerts(team)
+    objectives = len(run.starts)
+    if not len(alerts):
+        return np.full(objectives, -1, dtype=np.int64), 0
+    positions = np.searchsorted(alerts, run.needles, side="left")
+    first = positions[:objectives]
+    spans = (len(positions) - objectives) // 2
+    covered = int(
+        (positions[objectives + spans :] - positions[objectives : objectives + spans]).sum()
+    )
+    at = alerts[np.minimum(first, len(alerts) - 1)]
+    detected = (first < len(alerts)) & (at <= run.ends)
+    return np.where(detected, at - run.starts, -1), len(alerts) - covered
+
+
+def team_score(
+    run: RunEvents,
+    team: int,
+    delays: np.ndarray,
+    false_positives: int,
+    alerts: int,
+    false_positive_weight: float = settings.SCORING_FALSE_POSITIVE_WEIGHT,
+) -> TeamScore:
+    """
+    Score out of 100: each objective is worth an equal share, half for
+    detecting it and half scaled by how early in its window that was.
+    The total is then cut by ``false_positive_weight`` times the share of
+    the team's alerts that were false positives (all noise, at the default
+    0.5, halves it).
+    """
+    objectives = len(delays)
+    detected = delays >= 0
+    hits = int(detected.sum())
+    windows = run.ends - run.starts
+    # A zero-length window can only be hit at its start: full speed credit
+    lateness = np.divide(delays, windows, out=np.zeros(objectives), where=windows > 0)
+    credit = np.where(detected, 1.0 - 0.5 * lateness, 0.0)
+    earned = 100.0 * float(credit.sum()) / objectives if objectives else 0.0
+    false_positive_rate = false_positives / alerts if alerts else 0.0
+    return TeamScore(
+        team_id=run.team_ids[team],
+        objectives=objectives,
+        detected=hits,
+        detection_rate=round(hits / objectives, 4) if objectives else 0.0,
+        mean_time_to_detect=(round(float(delays[detected].mean()) / 1000, 3) if hits else None),
+        false_positives=false_positives,
+        false_positive_rate=round(false_positive_rate, 4),
+        alerts=alerts,
+        score=round(earned * (1.0 - false_positive_weight * false_positive_rate), 2),
+        detections={
+            objective: (delay / 1000 if delay >= 0 else None)
+            for objective, delay in zip(run.objective_ids, delays.tolist())
+        },
+    )
+
+
+def score_run(
+    run: RunEvents,
+    false_positive_weight: float = settings.SCORING_FALSE_POSITIVE_WEIGHT,
+) -> List[TeamScore]:
+    """Every team's score, best first"""
+    alerts = np.diff(run.bounds).tolist()
+    scores = [
+        team_score(run, team, *match_team(run, team), alerts[team], false_positive_weight)
+        for team in range(len(run.team_ids))
+    ]
+    scores.sort(key=lambda result: (-result.score, result.team_id))
+    return scores
+
+
+class _TeamState:
+    __slots__ = ("next", "delays", "credit", "detected", "delay_sum", "false_positives", "alerts")
+
+    def __init__(self) -> None:
+        # Objectives before ``next`` are resolved: ``delays`` has one entry each
+        self.next = 0
+        self.delays: List[int] = []
+        self.credit = 0.0
+        self.detected = 0
+        self.delay_sum = 0
+        self.false_positives = 0
+        self.alerts = 0
+
+
+class LiveRun:
+    """
+    Per-team score state of one run, updated event by event as the run's
+    objectives and alerts are ingested
+
+    Events are applied in time order, objectives before alerts at the same
+    millisecond, as the batch path sees them. They are held in a reorder
+    buffer until ``lateness`` millis behind the newest event, so ingest
+    may deliver them somewhat out of order; anything older than what was
+    already applied is counted in ``late`` and dropped (the batch
+    ``scoring.calculate`` stays authoritative for such runs).
+
+    Applying an alert costs O(1) plus the objectives it resolves for its
+    team, each once per team: a team's first alert at or after an
+    objective's start decides it (detected if within the window, missed
+    otherwise), and the alert is a false positive if it is past the
+    latest window end so far. ``results`` then scores the per-team delays
+    with ``team_score``, so the final figures equal ``score_run`` over the
+    same events.
+    """
+
+    def __init__(
+        self,
+        lateness: float = settings.SCORING_LIVE_LATENESS,
+        detection_window: float = settings.SCORING_DETECTION_WINDOW,
+        false_positive_weight: float = settings.SCORING_FALSE_POSITIVE_WEIGHT,
+    ):
+        self.lateness = int(lateness * 1000)
+        self.detection_window = detection_window
+        self.false_positive_weight = false_positive_weight
+        self.objective_ids: List[str] = []
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.seen: Dict[str, int] = {}
+        self.teams: Dict[str, _TeamState] = {}
+        self.reach = -1
+        self.late = 0
+        self._buffer: List[Tuple[int, int, Any, Any]] = []
+        self._sequence = 0
+        self._newest: Optional[int] = None
+        # Everything before this time has been applied
+        self._horizon: Optional[int] = None
+        self._changed: set = set()
+        self._all_changed = False
+        self._published: Dict[str, float] = {}
+
+    def add(self, doc: Dict[str, Any]) -> bool:
+        """Buffer one event; False if it is not a scoring event or arrived too late"""
+        team = doc.get(TEAM_FIELD)
+        objective = doc.get(OBJECTIVE_FIELD)
+        if team is None and objective is None:
+            return False
+        millis = timestamp_millis(doc.get("@timestamp"))
+        if self._horizon is not None and millis < self._horizon:
+            self.late += 1
+            return False
+        if team is not None:
+            self._sequence += 1
+            entry = (millis, 1, self._sequence, str(team))
+        else:
+            window = _window_millis(doc, self.detection_window)
+            entry = (millis, 0, str(objective), window)
+        heapq.heappush(self._buffer, entry)
+        if self._newest is None or millis > self._newest:
+            self._newest = millis
+        return True
+
+    def advance(self, flush: bool = False) -> int:
+        """Apply buffered events older than the lateness bound (all of them with ``flush``)"""
+        if self._newest is None:
+            return 0
+        horizon = self._newest + 1 if flush else self._newest - self.lateness
+        if self._horizon is not None and horizon <= self._horizon:
+            return 0
+        self._horizon = horizon
+        applied = 0
+        buffer = self._buffer
+        while buffer and buffer[0][0] < horizon:
+            millis, kind, key, value = heapq.heappop(buffer)
+            if kind:
+                self._alert(value, millis)
+            else:
+                self._objective(key, millis, value)
+            applied += 1
+        return applied
+
+    def _objective(self, objective: str, start: int, window: int) -> None:
+        if objective in self.seen:
+            return
+        self.seen[objective] = len(self.objective_ids)
+        self.objective_ids.append(objective)
+        self.starts.append(start)
+        self.ends.append(start + window)
+        self.reach = max(self.reach, start + window)
+        # Every team's share per objective just shrank
+        self._all_changed = True
+
+    def _alert(self, team: str, millis: int) -> None:
+        state = self.teams.get(team)
+        if state is None:
+            state = self.teams[team] = _TeamState()
+        state.alerts += 1
+        if millis > self.reach:
+            state.false_positives += 1
+        starts, ends = self.starts, self.ends
+        while state.next < len(starts) and starts[state.next] <= millis:
+            start, end = starts[state.next], ends[state.next]
+            if millis <= end:
+                delay = millis - start
+                state.delays.append(delay)
+                state.detected += 1
+                state.delay_sum += delay
+                state.credit += 1.0 - 0.5 * (delay / (end - start)) if end > start else 1.0
+            else:
+                state.delays.append(-1)
+            state.next += 1
+        self._changed.add(team)
+
+    def score(self, team: str) -> float:
+        """Current score, with the objectives so far (the batch formula, summed as it goes)"""
+        state = self.teams[team]
+        if not self.objective_ids:
+            return 0.0
+        earned = 100.0 * state.credit / len(self.objective_ids)
+        rate = state.false_positives / state.alerts if state.alerts else 0.0
+        return round(earned * (1.0 - self.false_positive_weight * rate), 2)
+
+    def changes(self) -> List[Dict[str, Any]]:
+        """Teams whose score moved since the last call: new score and the delta"""
+        teams = self.teams if self._all_changed else self._changed
+        updates = []
+        for team in teams:
+            state = self.teams[team]
+            score = self.score(team)
+            previous = self._published.get(team)
+            if previous == score:
+                continue
+            self._published[team] = score
+            updates.append(
+                {
+                    "team_id": team,
+                    "score": score,
+                    "delta": round(score - (previous or 0.0), 2),
+                    "detected": state.detected,
+                    "objectives": len(self.objective_ids),
+                    "false_positives": state.false_positives,
+                    "alerts": state.alerts,
+                }
+            )
+        self._changed = set()
+        self._all_changed = False
+        return updates
+
+    def state(self) -> Dict[str, Any]:
+        """Everything needed to carry on elsewhere, as JSON-serializable values"""
+        return {
+            "lateness": self.lateness,
+            "detection_window": self.detection_window,
+            "false_positive_weight": self.false_positive_weight,
+            "objectives": [self.objective_ids, self.starts, self.ends],
+            "teams": {
+                team: [getattr(state, name) for name in _TeamState.__slots__]
+                for team, state in self.teams.items()
+            },
+            "reach": self.reach,
+            "late": self.late,
+            "buffer": self._buffer,
+            "sequence": self._sequence,
+            "newest": self._newest,
+            "horizon": self._horizon,
+            "changed": sorted(self._changed),
+            "all_changed": self._all_changed,
+            "published": self._published,
+        }
+
+    @classmethod
+    def restore(cls, state: Dict[str, Any]) -> "LiveRun":
+        """The LiveRun ``state()`` was taken from"""
+        live = cls(0, state["detection_window"], state["false_positive_weight"])
+        live.lateness = state["lateness"]
+        live.objective_ids, live.starts, live.ends = state["objectives"]
+        live.seen = {objective: index for index, objective in enumerate(live.objective_ids)}
+        for team, values in state["teams"].items():
+            team_state = live.teams[team] = _TeamState()
+            for name, value in zip(_TeamState.__slots__, values):
+                setattr(team_state, name, value)
+        live.reach = state["reach"]
+        live.late = state["late"]
+        # Stored in heap order, so still a heap
+        live._buffer = [tuple(entry) for entry in state["buffer"]]
+        live._sequence = state["sequence"]
+        live._newest = state["newest"]
+        live._horizon = state["horizon"]
+        live._changed = set(state["changed"])
+        live._all_changed = state["all_changed"]
+        live._published = dict(state["published"])
+        return live
+
+    def results(self) -> List[TeamScore]:
+        """Final scores of the events applied so far, as ``score_run`` orders them"""
+        run = RunEvents(
+            self.objective_ids,
+            self.starts,
+            [end - start for start, end in zip(self.starts, self.ends)],
+            list(self.teams),
+            [],
+            [],
+        )
+        # Same objective order as the batch: by start, then id
+        order = [self.seen[objective] for objective in run.objective_ids]
+        scores = []
+        for number, (team, state) in enumerate(self.teams.items()):
+            delays = state.delays + [-1] * (len(order) - len(state.delays))
+            scores.append(
+                team_score(
+                    run,
+                    number,
+                    np.asarray([delays[position] for position in order], dtype=np.int64),
+                    state.false_positives,
+                    state.alerts,
+                    self.false_positive_weight,
+                )
+            )
+        scores.sort(key=lambda result: (-result.score, result.team_id))
+        return scores
@@ -0,0 +1,114 @@
+"""
+Materialized scoring results
+Each run's results, as ``scoring.calculate`` produced them, stored in
+Redis as ready-to-send JSON with its ETag, so serving them costs one or
+two hash reads and no aggregation
+
+    scoring:results:run:{run}  HASH  etag, body (JSON bytes)
+    scoring:results:runs       HASH  run -> summary JSON (one line per run)
+    scoring:results:list       HASH  etag, body: the summaries as one JSON list
+
+Documents are rebuilt only when a calculation for the run finishes
+(``store``); nothing else writes them. The ETag is a digest of the body,
+so clients holding the current one get a 304 from a single field read.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+import redis
+
+RUNS_KEY = "scoring:results:runs"
+LIST_KEY = "scoring:results:list"
+
+
+def _key(run_id: str) -> str:
+    return f"scoring:results:run:{run_id}"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    teams = result.get("teams") or []
+    leader = teams[0] if teams else None
+    return {
+        "scenario_run_id": result["scenario_run_id"],
+        "calculated_at": result.get("calculated_at"),
+        "objectives": result.get("objectives", 0),
+        "teams": len(teams),
+        "leader": leader and {"team_id": leader["team_id"], "score": leader["score"]},
+    }
+
+
+def store(client: redis.Redis, result: Dict[str, Any]) -> str:
+    """Materialize one run's results and the run list; returns the run document's ETag"""
+    run_id = result["scenario_run_id"]
+    result = {"calculated_at": datetime.now(timezone.utc).isoformat(), **result}
+    body = _encode(result)
+    etag = _etag(body)
+    pipe = client.pipeline(transaction=True)
+    pipe.hset(_key(run_id), mapping={"etag": etag, "body": body})
+    pipe.hset(RUNS_KEY, run_id, _encode(summary(result)))
+    pipe.execute()
+
+    def rebuild(pipe: redis.client.Pipeline) -> None:
+        runs = pipe.hgetall(RUNS_KEY)
+        ordered = sorted(
+            (json.loads(value) for value in runs.values()),
+            key=lambda item: (item["calculated_at"] or "", item["scenario_run_id"]),
+            reverse=True,
+        )
+        listing = _encode(ordered)
+        pipe.multi()
+        pipe.hset(LIST_KEY, mapping={"etag": _etag(listing), "body": listing})
+
+    # Concurrent calculations for other runs retry instead of losing a summary
+    client.transaction(rebuild, RUNS_KEY)
+    return etag
+
+
+def _read(
+    client: redis.Redis, key: str, if_none_match: Optional[str], default: Optional[bytes] = None
+) -> Optional[Tuple[str, Optional[bytes]]]:
+    if if_none_match:
+        etag = client.hget(key, "etag")
+        current = etag.decode() if etag is not None else default and _etag(default)
+        if current is None:
+            return None
+        tags = _tags(if_none_match)
+        if "*" in tags or current in tags:
+            return current, None
+    etag, body = client.hmget(key, ["etag", "body"])
+    if etag is None or body is None:
+        return None if default is None else (_etag(default), default)
+    return etag.decode(), body
+
+
+def _tags(header: str) -> Set[str]:
+    """Entity tags of an If-None-Match header; weak tags compare equal (RFC 9110)"""
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def run_results(
+    client: redis.Redis, run_id: str, if_none_match: Optional[str] = None
+) -> Optional[Tuple[str, Optional[bytes]]]:
+    """
+    ``(etag, body)`` for a run; body is None when ``if_none_match`` already
+    names the current ETag. None if the run has no results yet.
+    """
+    return _read(client, _key(run_id), if_none_match)
+
+
+def run_list(
+    client: redis.Redis, if_none_match: Optional[str] = None
+) -> Optional[Tuple[str, Optional[bytes]]]:
+    """Summaries of every scored run, newest first, as ``run_results`` returns them"""
+    return _read(client, LIST_KEY, if_none_match, default=b"[]")
@@ -0,0 +1,126 @@
+"""
+Suricata EVE parsing
+Reads EVE JSON (one event per line) into documents shaped like the
+sysmon-* index template
+
+Common top-level keys map straight onto template fields; alert, dns,
+http, tls and fileinfo records contribute their few template fields and
+the rest of each event is kept under ``suricata``.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from app.services.sysmon import severity_for
+
+# Top-level EVE key -> document field
+FIELD_MAP: Dict[str, str] = {
+    "timestamp": "@timestamp",
+    "src_ip": "source_ip",
+    "src_port": "source_port",
+    "dest_ip": "destination_ip",
+    "dest_port": "destination_port",
+    "proto": "protocol",
+    "host": "computer_name",
+}
+
+# Suricata alert severity (1 is the most severe) -> risk score; the
+# scores sit on the sysmon severity thresholds (severity_for)
+ALERT_RISK = {1: 30, 2: 10, 3: 0}
+
+
+def _timestamp(value: str) -> str:
+    """ "2024-03-01T12:00:00.123456+0000" -> "...+00:00" (ISO-8601 offset)"""
+    if len(value) > 5 and value[-5] in "+-" and value[-3] != ":":
+        return f"{value[:-2]}:{value[-2:]}"
+    return value
+
+
+def _dns_query(dns: Dict[str, Any]) -> Optional[str]:
+    # EVE v2 logs one query per record; v3 groups them under "queries"
+    if "rrname" in dns:
+        return dns["rrname"]
+    queries = dns.get("queries")
+    if queries:
+        return queries[0].get("rrname")
+    return None
+
+
+def event_document(
+    event: Dict[str, Any], scenario_id: Optional[str] = None, vm_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Convert one decoded EVE record to a document"""
+    event_type = event.get("event_type", "unknown")
+    doc: Dict[str, Any] = {"event_id": f"suricata.{event_type}"}
+    extra: Dict[str, Any] = {}
+    for key, value in event.items():
+        field = FIELD_MAP.get(key)
+        if field is not None:
+            doc[field] = value
+        elif key != "event_type":
+            extra[key] = value
+    timestamp = doc.get("@timestamp")
+    if isinstance(timestamp, str):
+        doc["@timestamp"] = _timestamp(timestamp)
+
+    score = 0
+    field, value = None, None
+    if event_type == "alert":
+        alert = event.get("alert") or {}
+        field, value = "rule_name", alert.get("signature")
+        score = ALERT_RISK.get(alert.get("severity"), 0)
+    elif event_type == "dns":
+        field, value = "query_name", _dns_query(event.get("dns") or {})
+    elif event_type == "http":
+        field, value = "destination_hostname", (event.get("http") or {}).get("hostname")
+    elif event_type == "tls":
+        field, value = "destination_hostname", (event.get("tls") or {}).get("sni")
+    elif event_type == "fileinfo":
+        fileinfo = event.get("fileinfo") or {}
+        field, value = "target_filename", fileinfo.get("filename")
+        hashes = {name: fileinfo[name] for name in ("md5", "sha1", "sha256") if name in fileinfo}
+        if hashes:
+            doc["hashes"] = hashes
+    if value is not None:
+        doc[field] = value
+    if extra:
+        doc["suricata"] = extra
+    doc["risk_score"] = score
+    doc["severity"] = severity_for(score)
+    if scenario_id is not None:
+        doc["scenario_id"] = scenario_id
+    if vm_id is not None:
+        doc["vm_id"] = vm_id
+    return doc
+
+
+def parse_stream(
+    source: Union[bytes, str],
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Documents for every EVE line; blank and malformed lines are skipped"""
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    loads = json.loads
+    for line in source.splitlines():
+        if not line.strip():
+            continue
+        try:
+            event = loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            yield event_document(event, scenario_id, vm_id)
+
+
+def split(data: bytes, chunk_bytes: int) -> List[bytes]:
+    """Cut a payload into line-aligned chunks of about ``chunk_bytes``"""
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", min(start + chunk_bytes, len(data)) - 1)
+        end = len(data) if end < 0 else end + 1
+        chunks.append(data[start:end])
+        start = end
+    return chunks
@@ -0,0 +1,361 @@
+"""
+Ingest write-ahead log
+Ingest appends documents to local, segment-rotated files and returns; a
+drainer replays them into the log store with a durable checkpoint, so an
+Elasticsearch outage backs up on disk instead of in the Celery broker
+
+Record layout (little-endian)::
+
+    length u32 | crc32 u32 | JSON [index, document]
+
+Segments are ``wal-<n>.log``; writers only ever append to the highest
+numbered one and start a new one past ``segment_bytes``. Appends and
+rotation happen under an exclusive ``flock`` so several worker processes
+can share a directory. A record cut short by a crash fails its length or
+CRC check: readers stop there and the next append truncates it away. Every
+append records where the intact log ends in ``tail``, so a writer that
+finds the segment a different size from what it last left only has to
+check the bytes written since that mark.
+"""
+
+import fcntl
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+SEGMENT_PATTERN = re.compile(r"^wal-(\d{10})\.log$")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_HEADER = struct.Struct("<II")
+# ``tail``: segment number and the end of its last intact record
+_TAIL = struct.Struct("<QQ")
+# Upper bound on one record; anything larger is treated as corruption
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+
+
+def _segment_name(number: int) -> str:
+    return f"wal-{number:010d}.log"
+
+
+def read_records(path: str, offset: int = 0) -> Iterator[Tuple[int, int, str, Dict[str, Any]]]:
+    """
+    ``(offset, next_offset, index, document)`` for each intact record from
+    ``offset``; stops at the end of the file or at the first torn record
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            if length > MAX_RECORD_BYTES:
+                return
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            index, document = json.loads(payload)
+            next_offset = offset + _HEADER.size + length
+            yield offset, next_offset, index, document
+            offset = next_offset
+
+
+def _valid_length(path: str, offset: int = 0) -> int:
+    end = offset
+    for _, end, _, _ in read_records(path, offset):
+        pass
+    return end
+
+
+class WriteAheadLog:
+    """
+    Append side of the WAL
+
+    ``fsync``: "always" syncs every append, "interval" at most once per
+    ``fsync_interval`` seconds (a crash can lose that window), "never"
+    leaves it to the OS (a host crash can lose anything unflushed; a
+    worker crash loses nothing).
+    """
+
+    def __init__(
+        self,
+        path: str = settings.INGEST_WAL_PATH,
+        segment_bytes: int = settings.INGEST_WAL_SEGMENT_BYTES,
+        fsync: str = settings.INGEST_WAL_FSYNC,
+        fsync_interval: float = settings.INGEST_WAL_FSYNC_INTERVAL,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._last_sync = 0.0
+        # (segment, size) as this writer's last append left them
+        self._tail: Optional[Tuple[int, int]] = None
+        os.makedirs(path, exist_ok=True)
+        self.recover()
+
+    @contextmanager
+    def _locked(self, name: str = "wal.lock", blocking: bool = True) -> Iterator[bool]:
+        with open(os.path.join(self.path, name), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def segments(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.path):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def segment_path(self, number: int) -> str:
+        return os.path.join(self.path, _segment_name(number))
+
+    def _read_tail(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.path, "tail"), "rb") as f:
+                data = f.read(_TAIL.size)
+        except FileNotFoundError:
+            return 0, 0
+        return _TAIL.unpack(data) if len(data) == _TAIL.size else (0, 0)
+
+    def _write_tail(self, number: int, end: int) -> None:
+        # Called under the lock; a stale mark only makes the next check scan more
+        fd = os.open(os.path.join(self.path, "tail"), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, _TAIL.pack(number, end), 0)
+        finally:
+            os.close(fd)
+
+    def _truncate_torn(self, number: int, full: bool = False) -> int:
+        """
+        Cut a torn record off segment ``number``; the caller holds the lock.
+        Scans from the last recorded intact end unless ``full``.
+        """
+        path = self.segment_path(number)
+        size = os.path.getsize(path)
+        marked, end = self._read_tail()
+        start = end if not full and marked == number and end <= size else 0
+        valid = _valid_length(path, start)
+        if valid < size:
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+        self._write_tail(number, valid)
+        return size - valid
+
+    def recover(self) -> int:
+        """Truncate a torn record at the tail of the active segment; returns bytes dropped"""
+        with self._locked():
+            segments = self.segments()
+            if not segments:
+                return 0
+            dropped = self._truncate_torn(segments[-1], full=True)
+            self._tail = (segments[-1], os.path.getsize(self.segment_path(segments[-1])))
+            return dropped
+
+    def append(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Append ``(index, document)`` records as one write; returns the count"""
+        chunks = []
+        count = 0
+        for index, document in records:
+            payload = json.dumps([index, document], separators=(",", ":"), default=str).encode()
+            chunks.append(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            chunks.append(payload)
+            count += 1
+        if not count:
+            return 0
+        data = b"".join(chunks)
+        with self._locked():
+            segments = self.segments()
+            number = segments[-1] if segments else 1
+            path = self.segment_path(number)
+            if segments:
+                size = os.path.getsize(path)
+                if (number, size) != self._tail:
+                    # Someone else wrote since our last append, and may have
+                    # died mid-record: anything we add must not land behind that
+                    self._truncate_torn(number)
+                    size = os.path.getsize(path)
+                if size >= self.segment_bytes:
+                    number += 1
+                    path = self.segment_path(number)
+            created = not os.path.exists(path)
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                end = f.tell()
+                now = time.monotonic()
+                if self.fsync == "always" or (
+                    self.fsync == "interval" and now - self._last_sync >= self.fsync_interval
+                ):
+                    os.fsync(f.fileno())
+                    self._last_sync = now
+            self._write_tail(number, end)
+            self._tail = (number, end)
+            if created and self.fsync != "never":
+                # Make the new segment's directory entry durable too
+                directory = os.open(self.path, os.O_RDONLY)
+                try:
+                    os.fsync(directory)
+                finally:
+                    os.close(directory)
+        return count
+
+
+class WALDrainer:
+    """
+    Replays the WAL into a log store (``add``/``flush`` with BulkStats)
+
+    Documents get deterministic ids (``<segment>-<offset>``), so replaying
+    records after a crash between a flush and its checkpoint overwrites
+    (Elasticsearch) or is dropped (``EmbeddedLogStore``) instead of
+    duplicating. The checkpoint (segment, offset) is replaced
+    atomically after every successful flush. If the store is unavailable
+    the batch is left unacknowledged and the drain stops, to be retried on
+    the next run. Fully drained segments other than the active one are
+    deleted. Only one drainer runs per directory at a time.
+    """
+
+    def __init__(
+        self,
+        wal: WriteAheadLog,
+        store: Any,
+        batch: int = settings.INGEST_WAL_DRAIN_BATCH,
+        rate: float = settings.INGEST_WAL_DRAIN_RATE,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.wal = wal
+        self.store = store
+        self.batch = batch
+        self.rate = rate
+        self._sleep = sleep
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.wal.path, "checkpoint.json")
+
+    def checkpoint(self) -> Tuple[int, int]:
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except FileNotFoundError:
+            return 0, 0
+
+    def _save_checkpoint(self, segment: int, offset: int) -> None:
+        temp = self.checkpoint_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.checkpoint_path)
+
+    def pending(self) -> int:
+        """Bytes not yet drained"""
+        segment, offset = self.checkpoint()
+        total = 0
+        for number in self.wal.segments():
+            if number >= segment:
+                size = os.path.getsize(self.wal.segment_path(number))
+                total += size - (offset if number == segment else 0)
+        return total
+
+    def drain(self, max_seconds: Optional[float] = None) -> Dict[str, Any]:
+        with self.wal._locked("drain.lock", blocking=False) as acquired:
+            if not acquired:
+                return {"status": "busy", "drained": 0}
+            return self._drain(max_seconds)
+
+    def _drain(self, max_seconds: Optional[float]) -> Dict[str, Any]:
+        started = time.monotonic()
+        segment, offset = self.checkpoint()
+        drained = 0
+        status = "idle"
+        for number in self.wal.segments():
+            if number < segment:
+                continue
+            if number > segment:
+                segment, offset = number, 0
+            sealed = number != self.wal.segments()[-1]
+            pending: List[Tuple[int, int, str, Dict[str, Any]]] = []
+            for record in read_records(self.wal.segment_path(number), offset):
+                pending.append(record)
+                if len(pending) >= self.batch:
+                    if not self._send(number, pending):
+                        return self._result("stalled", drained, segment, offset)
+                    offset = pending[-1][1]
+                    drained += len(pending)
+                    pending = []
+                    status = "drained"
+                    self._throttle(started, drained)
+                    if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                        return self._result("partial", drained, segment, offset)
+            if pending:
+                if not self._send(number, pending):
+                    return self._result("stalled", drained, segment, offset)
+                offset = pending[-1][1]
+                drained += len(pending)
+                status = "drained"
+            if sealed:
+                os.unlink(self.wal.segment_path(number))
+                segment, offset = number + 1, 0
+                self._save_checkpoint(segment, offset)
+        return self._result(status, drained, segment, offset)
+
+    def _send(self, number: int, records: List[Tuple[int, int, str, Dict[str, Any]]]) -> bool:
+        stats = self.store.stats
+        unavailable = stats.unavailable
+        try:
+            for position, _, index, document in records:
+                self.store.add(index, document, doc_id=f"{number}-{position}")
+            stats = self.store.flush()
+        except OSError:
+            return False
+        if stats.unavailable != unavailable:
+            return False
+        self._save_checkpoint(number, records[-1][1])
+        return True
+
+    def _throttle(self, started: float, drained: int) -> None:
+        if self.rate > 0:
+            ahead = drained / self.rate - (time.monotonic() - started)
+            if ahead > 0:
+                self._sleep(ahead)
+
+    def _result(self, status: str, drained: int, segment: int, offset: int) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "drained": drained,
+            "checkpoint": [segment, offset],
+            "pending_bytes": self.pending(),
+        }
+
+
+_shared: Optional[WriteAheadLog] = None
+_shared_pid: Optional[int] = None
+
+
+def shared_wal() -> WriteAheadLog:
+    """Process-wide WriteAheadLog at ``settings.INGEST_WAL_PATH`` (recreated after a fork)"""
+    global _shared, _shared_pid
+    if _shared is None or _shared_pid != os.getpid():
+        _shared = WriteAheadLog()
+        _shared_pid = os.getpid()
+    return _shared
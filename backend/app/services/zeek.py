@@ -0,0 +1,208 @@
+"""
+Zeek log parsing
+Reads Zeek's tab-separated ASCII logs (conn, dns, http, ssl, files, ...)
+into documents shaped like the sysmon-* index template
+
+The ``#fields``/``#types`` header is compiled once into a column map, so
+each row is one split plus a converter call per populated column.
+Columns the template has no field for are kept under ``zeek``.
+"""
+
+import bisect
+import re
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.services.sysmon import severity_for
+
+# Zeek field -> document field, for columns with a place in the template
+FIELD_MAP: Dict[str, str] = {
+    "ts": "@timestamp",
+    "id.orig_h": "source_ip",
+    "id.orig_p": "source_port",
+    "id.resp_h": "destination_ip",
+    "id.resp_p": "destination_port",
+    "proto": "protocol",
+    "query": "query_name",
+    "answers": "query_results",
+    "rcode_name": "query_status",
+    "host": "destination_hostname",
+    "server_name": "destination_hostname",
+    "filename": "target_filename",
+    "username": "user",
+    "md5": "hashes.md5",
+    "sha1": "hashes.sha1",
+    "sha256": "hashes.sha256",
+}
+
+
+@lru_cache(maxsize=4096)
+def _second(seconds: str) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(int(seconds)))
+
+
+def _time(value: str) -> str:
+    """Epoch "1709294400.123456" -> "2024-03-01T12:00:00.123456Z" """
+    seconds, _, fraction = value.partition(".")
+    return f"{_second(seconds)}.{fraction}Z" if fraction else f"{_second(seconds)}Z"
+
+
+def _bool(value: str) -> bool:
+    return value == "T"
+
+
+# (column, document field or None for the zeek object, zeek name, converter,
+# whether "(empty)" means an empty set)
+_Column = Tuple[int, Optional[str], str, Optional[Callable[[str], Any]], bool]
+
+# A run of header lines (#separator .. #types, or #close and the next header)
+_HEADER_RUN = re.compile(rb"(?:^#[^\n]*\n)+", re.MULTILINE)
+
+
+class _Columns:
+    """Column map compiled from one header block"""
+
+    __slots__ = ("path", "separator", "set_separator", "empty", "unset", "columns")
+
+    def __init__(self) -> None:
+        self.path = "unknown"
+        self.separator = "\t"
+        self.set_separator = ","
+        self.empty = "(empty)"
+        self.unset = "-"
+        self.columns: List[_Column] = []
+
+    def header(self, line: str) -> None:
+        if line.startswith("#separator"):
+            # The only header line separated by a space: "#separator \x09"
+            value = line.split(" ", 1)[1]
+            self.separator = value.encode().decode("unicode_escape")
+            return
+        name, _, value = line.partition(self.separator)
+        if name == "#set_separator":
+            self.set_separator = value
+        elif name == "#empty_field":
+            self.empty = value
+        elif name == "#unset_field":
+            self.unset = value
+        elif name == "#path":
+            self.path = value
+        elif name == "#fields":
+            self.compile(value.split(self.separator), [])
+        elif name == "#types":
+            self.compile([column[2] for column in self.columns], value.split(self.separator))
+
+    def compile(self, fields: List[str], types: List[str]) -> None:
+        self.columns = []
+        for position, name in enumerate(fields):
+            kind = types[position] if position < len(types) else "string"
+            self.columns.append(
+                (
+                    position,
+                    FIELD_MAP.get(name),
+                    name,
+                    self._converter(kind, name),
+                    kind.startswith(("set[", "vector[")),
+                )
+            )
+
+    def _converter(self, kind: str, name: str) -> Optional[Callable[[str], Any]]:
+        if name == "ts" or kind == "time":
+            return _time
+        if kind in ("count", "int", "port"):
+            return int
+        if kind in ("double", "interval"):
+            return float
+        if kind == "bool":
+            return _bool
+        if kind.startswith(("set[", "vector[")):
+            separator = self.set_separator
+            if name == "answers":
+                # Same shape as Sysmon's QueryResults
+                return lambda value: ";".join(value.split(separator))
+            return lambda value: value.split(separator)
+        return None
+
+
+def _document(
+    values: List[str], state: _Columns, scenario_id: Optional[str], vm_id: Optional[str]
+) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {"event_id": f"zeek.{state.path}"}
+    extra: Dict[str, Any] = {}
+    unset, empty = state.unset, state.empty
+    for position, field, name, convert, is_set in state.columns:
+        value = values[position]
+        if value == unset:
+            continue
+        if value == empty:
+            parsed: Any = [] if is_set else ""
+        else:
+            try:
+                parsed = convert(value) if convert else value
+            except ValueError:
+                parsed = value
+        if field is None:
+            extra[name] = parsed
+        elif field.startswith("hashes."):
+            doc.setdefault("hashes", {})[field[7:]] = parsed
+        else:
+            doc[field] = parsed
+    if extra:
+        doc["zeek"] = extra
+    doc["risk_score"] = 0
+    doc["severity"] = severity_for(0)
+    if scenario_id is not None:
+        doc["scenario_id"] = scenario_id
+    if vm_id is not None:
+        doc["vm_id"] = vm_id
+    return doc
+
+
+def parse_stream(
+    source: Union[bytes, str],
+    scenario_id: Optional[str] = None,
+    vm_id: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documents for every row of one or more concatenated Zeek logs
+
+    Each header block (``#separator`` .. ``#types``) replaces the column
+    map, so rotated logs of different paths can be sent as one payload.
+    Rows before any ``#fields`` line, or with the wrong number of
+    columns, are skipped.
+    """
+    if isinstance(source, bytes):
+        source = source.decode("utf-8", errors="replace")
+    state = _Columns()
+    for line in source.splitlines():
+        if not line:
+            continue
+        if line[0] == "#":
+            state.header(line)
+            continue
+        values = line.split(state.separator)
+        if len(values) != len(state.columns):
+            continue
+        yield _document(values, state, scenario_id, vm_id)
+
+
+def split(data: bytes, chunk_bytes: int) -> List[bytes]:
+    """
+    Cut a payload into line-aligned chunks of about ``chunk_bytes``, each
+    prefixed with the header block in effect where it starts, so chunks
+    parse independently
+    """
+    runs = [match.span() for match in _HEADER_RUN.finditer(data) if b"#fields" in match.group()]
+    run_ends = [end for _, end in runs]
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", min(start + chunk_bytes, len(data)) - 1)
+        end = len(data) if end < 0 else end + 1
+        # Header runs ending at or before this chunk; the last one applies
+        applies = bisect.bisect_right(run_ends, start)
+        header = data[slice(*runs[applies - 1])] if applies else b""
+        chunks.append(header + data[start:end])
+        start = end
+    return chunks
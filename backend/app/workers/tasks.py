@@ -1,5 +1,49 @@
+import asyncio
+import inspect
+import os
+from typing import Optional
+
 from celery import Celery
+from redis import RedisError
+from replay.columnar import ReplayReader
+from replay.pcap_processor import PCAPProcessor
+
 from app.core.config import settings
+from app.services import (
+    geoip,
+    ioc,
+    leaderboard,
+    live_scoring,
+    parsers,
+    replays,
+    rollups,
+    scenario_plan,
+    scenario_runner,
+    scoring,
+    scoring_results,
+    wal,
+)
+from app.services.bulk import daily_index, shared_indexer
+from app.services.log_search import LogQuery, shared_search
+from app.services.log_store import shared_store
+
+
+def route_ingest(name, args, kwargs, options, task=None, **kw):
+    """
+    Send logs.ingest payloads big enough for a parser pool to DECODE_QUEUE;
+    smaller ones stay on the default queue, where they parse inline anyway
+    """
+    if name != "logs.ingest":
+        return None
+    source = args[0] if args else kwargs.get("source")
+    data = args[1] if len(args) > 1 else kwargs.get("data")
+    if not isinstance(data, dict):
+        return None
+    raw = data.get("raw") or (data.get("xml") if source == "sysmon" else None)
+    if raw and len(raw) >= settings.LOG_PARSE_PARALLEL_BYTES:
+        return {"queue": settings.DECODE_QUEUE}
+    return None
+
 
 # Initialize Celery
 celery_app = Celery(
@@ -14,6 +58,8 @@ celery_app.conf.update(
     accept_content=["json"],
     timezone="UTC",
     enable_utc=True,
+    # Tasks that start a process pool: see DECODE_QUEUE
+    task_routes=({"replay.process": {"queue": settings.DECODE_QUEUE}}, route_ingest),
 )
 
 
@@ -70,48 +116,210 @@ def caldera_start_operation_task(scenario_id: str, operation_id: str):
     return {"status": "success", "operation_id": operation_id}
 
 
+# Worker tasks a scenario step can name as its action
+SCENARIO_ACTIONS = ("terraform.apply", "terraform.destroy", "ansible.run", "caldera.start")
+
+
+def _step_handlers(scenario_id: str) -> dict:
+    """Each step action's task, run inline; tasks that take a scenario_id default to this one"""
+    handlers = {}
+    for action in SCENARIO_ACTIONS:
+        task = celery_app.tasks[action]
+        defaults = {}
+        if "scenario_id" in inspect.signature(task.run).parameters:
+            defaults["scenario_id"] = scenario_id
+        handlers[action] = lambda step, inputs, task=task, defaults=defaults: task(
+            **{**defaults, **step.params}
+        )
+    return handlers
+
+
+@celery_app.task(name="scenario.run")
+def scenario_run_task(scenario_id: str, run_id: str, steps: dict):
+    """
+    Execute a scenario's steps, each as soon as the steps it depends on are done
+    """
+    print(f"[SCENARIO] Running scenario {scenario_id} as {run_id}")
+    try:
+        leaderboard.register_run(rollups.redis_client(), run_id, scenario_id)
+    except RedisError as exc:
+        # scoring.calculate can still be given the scenario id explicitly
+        print(f"[SCENARIO] Could not register run {run_id}: {exc}")
+    plan = scenario_plan.compile_plan(steps, actions=SCENARIO_ACTIONS)
+    finished = []
+
+    def progress(result):
+        if result.status == "running":
+            return
+        finished.append(result.step_id)
+        meta = {"scenario_id": scenario_id, "finished": len(finished), "steps": len(plan.steps)}
+        try:
+            scenario_run_task.update_state(task_id=run_id, state="PROGRESS", meta=meta)
+        except RedisError:
+            # Progress is advisory; the run's result is stored when it ends
+            pass
+
+    report = asyncio.run(
+        scenario_runner.execute(plan, _step_handlers(scenario_id), on_update=progress)
+    )
+    return {"scenario_id": scenario_id, "run_id": run_id, **report.to_dict()}
+
+
+def _log_store():
+    return shared_store() if settings.LOG_STORE == "embedded" else shared_indexer()
+
+
 @celery_app.task(name="logs.ingest")
 def logs_ingest_task(source: str, data: dict):
     """
     Ingest logs to Elasticsearch
+
+    Raw payloads of LOG_PARSE_PARALLEL_BYTES or more are routed to
+    DECODE_QUEUE (``route_ingest``) so ``parsers.normalize`` can start its
+    pool; in a prefork child it would parse them inline.
     """
-    # TODO: Implement Elasticsearch bulk indexing
-    # 1. Connect to Elasticsearch
-    # 2. Parse and normalize log data
-    # 3. Bulk index to appropriate index (sysmon-*, zeek-*, etc.)
-    # 4. Update metadata in PostgreSQL
     print(f"[LOGS] Ingesting {source} logs")
-    return {"status": "success", "records": len(data.get("events", []))}
+    events = data.get("events", [])
+    # Raw sensor output (Zeek TSV, Sysmon XML, Suricata EVE); "xml" is the
+    # older name for a Sysmon payload
+    raw = data.get("raw") or (data.get("xml") if source == "sysmon" else None)
+    if raw:
+        events = parsers.normalize(source, raw, data.get("scenario_id"), data.get("vm_id"))
+    database = geoip.shared_database()
+    if database is not None:
+        events = geoip.enrich_stream(events, database)
+    matcher = ioc.shared_matcher()
+    if matcher is not None:
+        events = ioc.tag_stream(events, matcher)
+    if source == "scoring":
+        # Objective and alert events also feed live scoring once stored
+        events = list(events)
+    batch = rollups.RollupBatch()
+    if settings.INGEST_WAL_ENABLED:
+        # Durable on local disk first; logs.drain_wal replays it into the log store
+        staged = []
+        for event in events:
+            staged.append((daily_index(source, event.get("@timestamp")), event))
+            batch.add(event)
+        result = {"status": "queued", "records": wal.shared_wal().append(staged)}
+    else:
+        indexer = _log_store()
+        indexed, failed = indexer.stats.indexed, indexer.stats.failed
+        records = 0
+        for event in events:
+            indexer.add(daily_index(source, event.get("@timestamp")), event)
+            batch.add(event)
+            records += 1
+        stats = indexer.flush()
+        result = {
+            "status": "success" if stats.failed == failed else "partial",
+            "records": records,
+            "indexed": stats.indexed - indexed,
+            "failed": stats.failed - failed,
+        }
+    try:
+        result["rollup_cells"] = batch.flush(rollups.redis_client())
+    except RedisError as exc:
+        # Events are already indexed; dashboards fall back to raw queries
+        result["rollup_error"] = str(exc)
+    if source == "scoring":
+        try:
+            result["live_scoring"] = live_scoring.forward(rollups.redis_client(), events)
+        except RedisError as exc:
+            # Live scores lag; scoring.calculate still scores the run from the log store
+            result["live_scoring_error"] = str(exc)
+    return result
+
+
+@celery_app.task(name="logs.drain_wal")
+def logs_drain_wal_task(max_seconds: Optional[float] = None):
+    """
+    Replay the ingest write-ahead log into the log store
+    """
+    if not settings.INGEST_WAL_ENABLED:
+        return {"status": "disabled", "drained": 0}
+    return wal.WALDrainer(wal.shared_wal(), _log_store()).drain(max_seconds)
 
 
 @celery_app.task(name="scoring.calculate")
-def scoring_calculate_task(scenario_run_id: str):
+def scoring_calculate_task(scenario_run_id: str, scenario_id: Optional[str] = None):
     """
     Calculate scoring for a completed scenario run
+
+    Scores go to the leaderboard of the run's scenario (``scenario_id``, or
+    the one scenario.run registered for the run), replacing that
+    scenario's previous entries.
     """
-    # TODO: Implement scoring logic
-    # 1. Load scenario objectives
-    # 2. Query Elasticsearch for events
-    # 3. Calculate metrics (detection rate, response time, etc.)
-    # 4. Store results in database
-    # 5. Generate leaderboard updates
     print(f"[SCORING] Calculating scores for run {scenario_run_id}")
-    return {"status": "success", "score": 85.5}
+    query = LogQuery(index=settings.SCORING_INDEX, scenario_id=scenario_run_id, order="asc")
+    run = scoring.RunEvents.from_documents(shared_search().export(query))
+    teams = scoring.score_run(run)
+    result = {
+        "status": "success",
+        "scenario_run_id": scenario_run_id,
+        "objectives": len(run.objective_ids),
+        "teams": [team.to_dict() for team in teams],
+    }
+    try:
+        client = rollups.redis_client()
+        scoring_results.store(client, result)
+        scenario_id = scenario_id or leaderboard.scenario_of(client, scenario_run_id)
+        if scenario_id is None:
+            result["leaderboard_error"] = f"No scenario registered for run {scenario_run_id}"
+        else:
+            scores = {team.team_id: team.score for team in teams}
+            leaderboard.record(client, scenario_id, scores)
+        live_scoring.close(client, scenario_run_id, result["teams"])
+    except RedisError as exc:
+        # Scores are still returned; the next calculation brings results and leaderboard up to date
+        result["leaderboard_error"] = str(exc)
+    return result
+
+
+@celery_app.task(name="scoring.live")
+def scoring_live_task(max_seconds: float = 60.0):
+    """
+    Apply newly ingested objective and alert events to live run scores
+    """
+    return live_scoring.consume(rollups.redis_client(), max_seconds)
 
 
 @celery_app.task(name="replay.process")
-def replay_process_pcap_task(pcap_file: str):
+def replay_process_pcap_task(
+    pcap_file: str, workers: Optional[int] = None, replay_id: Optional[str] = None
+):
     """
     Process PCAP file for replay
+
+    Written to REPLAY_OUTPUT_DIR as ``{replay_id}.rrp``; by default the id
+    is derived from the capture's full path (``replays.replay_id_for``), so
+    same-named captures from different directories do not overwrite each
+    other. Routed to DECODE_QUEUE: only a worker whose tasks run in its
+    main process (threads or solo pool) can decode with REPLAY_WORKERS
+    processes.
     """
-    # TODO: Implement PCAP processing
+    # TODO: Remaining PCAP processing steps
     # 1. Load PCAP from MinIO
-    # 2. Extract packets and metadata
-    # 3. Build timeline with correlation to host events
-    # 4. Generate replay index in Elasticsearch
-    # 5. Store metadata in PostgreSQL
+    # 2. Build timeline with correlation to host events
+    # 3. Generate replay index in Elasticsearch
+    # 4. Store metadata in PostgreSQL
     print(f"[REPLAY] Processing PCAP {pcap_file}")
-    return {"status": "success", "packets": 1234, "duration": 300}
+    replay_id = replay_id or replays.replay_id_for(pcap_file)
+    if not replays.REPLAY_ID_PATTERN.match(replay_id):
+        raise ValueError(f"Invalid replay id {replay_id!r}")
+    output_path = replays.replay_path(replay_id)
+    os.makedirs(settings.REPLAY_OUTPUT_DIR, exist_ok=True)
+    processor = PCAPProcessor(pcap_file, workers=workers or settings.REPLAY_WORKERS)
+    processor.generate_replay(output_path)
+    with ReplayReader(output_path) as reader:
+        duration = reader.end_ts - reader.start_ts if len(reader) else 0
+        return {
+            "status": "success",
+            "replay_id": replay_id,
+            "replay_file": output_path,
+            "events": len(reader),
+            "duration": round(duration, 6),
+        }
 
 
 @celery_app.task(name="cleanup.snapshots")
@@ -151,4 +359,14 @@ celery_app.conf.beat_schedule = {
         "task": "backup.database",
         "schedule": 86400.0,
     },
+    "drain-ingest-wal": {
+        "task": "logs.drain_wal",
+        "schedule": settings.INGEST_WAL_DRAIN_INTERVAL,
+        "kwargs": {"max_seconds": 60.0},
+    },
+    "consume-live-scoring": {
+        "task": "scoring.live",
+        "schedule": 60.0,
+        "kwargs": {"max_seconds": 55.0},
+    },
 }
@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+
+from app.api.v1 import auth, logs, replay, scenarios, scoring, topology, users, vms
 from app.core.config import settings
-from app.api.v1 import auth, users, scenarios, vms, topology, logs, scoring
 
 app = FastAPI(
     title="RetroRange API",
@@ -28,11 +29,14 @@ app.include_router(vms.router, prefix="/api/v1/vms", tags=["vms"])
 app.include_router(topology.router, prefix="/api/v1/topology", tags=["topology"])
 app.include_router(logs.router, prefix="/api/v1/logs", tags=["logs"])
 app.include_router(scoring.router, prefix="/api/v1/scoring", tags=["scoring"])
+app.include_router(replay.router, prefix="/api/v1/replay", tags=["replay"])
+
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "retrorange-api"}
 
+
 @app.get("/")
 async def root():
     return {"message": "RetroRange API v1.0.0"}
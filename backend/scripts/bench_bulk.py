@@ -0,0 +1,134 @@
+"""
+Bulk indexing benchmark against a local fake _bulk server
+
+The fake server rejects whole requests and individual items with 429 at
+configurable rates, then checks that every document was indexed exactly
+once (only failed items may be resent). Reports docs/sec.
+
+Usage: cd backend && python -m scripts.bench_bulk [--docs N] [--concurrency N]
+           [--request-429 0.05] [--item-429 0.02]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from elasticsearch import Elasticsearch
+
+from app.services.bulk import BulkIndexer, daily_index
+
+
+class FakeBulkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, request_429: float, item_429: float, latency: float, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), FakeBulkHandler)
+        self.request_429 = request_429
+        self.item_429 = item_429
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.received = {}  # document seq -> times indexed
+        self.requests = 0
+
+
+class FakeBulkHandler(BaseHTTPRequestHandler):
+    server: FakeBulkServer
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            reject = server.random.random() < server.request_429
+        if reject:
+            self._reply(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            return
+
+        lines = body.splitlines()
+        items = []
+        with server.lock:
+            for action_line, source_line in zip(lines[0::2], lines[1::2]):
+                index = json.loads(action_line)["index"]["_index"]
+                if server.random.random() < server.item_429:
+                    items.append({"index": {"_index": index, "status": 429}})
+                    continue
+                seq = json.loads(source_line)["seq"]
+                server.received[seq] = server.received.get(seq, 0) + 1
+                items.append({"index": {"_index": index, "status": 201, "result": "created"}})
+        self._reply(200, {"took": 1, "errors": True, "items": items})
+
+    # The client sends _bulk as PUT
+    do_PUT = do_POST
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200_000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--request-429", type=float, default=0.05)
+    parser.add_argument("--item-429", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.005, help="server seconds per request")
+    args = parser.parse_args()
+
+    server = FakeBulkServer(args.request_429, args.item_429, args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Elasticsearch(
+        f"http://127.0.0.1:{server.server_address[1]}",
+        connections_per_node=args.concurrency,
+        max_retries=0,
+        retry_on_status=(),
+    )
+
+    indexer = BulkIndexer(
+        client,
+        max_docs=args.batch,
+        concurrency=args.concurrency,
+        initial_backoff=0.01,
+        max_backoff=0.5,
+        max_retries=20,
+    )
+    for seq in range(args.docs):
+        event = {
+            "@timestamp": "2024-03-01T12:00:00.000Z",
+            "seq": seq,
+            "event_id": "1",
+            "computer_name": f"WS{seq % 64:02d}",
+            "process_name": "powershell.exe",
+            "command_line": "powershell.exe -nop -w hidden -c IEX (New-Object Net.WebClient)",
+            "severity": "high",
+        }
+        indexer.add(daily_index("sysmon", event["@timestamp"]), event)
+    stats = indexer.close()
+    server.shutdown()
+
+    duplicates = sum(1 for count in server.received.values() if count > 1)
+    missing = args.docs - len(server.received)
+    print(json.dumps(stats.as_dict(), indent=2))
+    print(f"server requests: {server.requests:,}")
+    print(f"missing: {missing}  duplicated: {duplicates}")
+    print(f"{stats.indexed / (time.perf_counter() - stats.started):,.0f} docs/sec")
+    if missing or duplicates or stats.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
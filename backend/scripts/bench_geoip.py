@@ -0,0 +1,229 @@
+"""
+GeoIP lookup benchmark on a synthetic range database
+
+Writes a CSV range database (IPv4 and IPv6 ranges with gaps, DB-IP
+column layout), loads it, checks every answer against a plain bisect
+over (start, end) pairs, and reports lookups/sec for:
+
+- uncached single lookups of uniformly random addresses (worst case),
+- LRU-cached lookups of a skewed stream (a few hot hosts, as in real
+  traffic),
+- ``lookup_many`` over bulk-sized batches of that stream, and of the
+  uniform addresses (what ingest does, with nothing cached).
+
+The same ranges are also written in IP2Location's integer layouts (the
+IPv6 file, with IPv4 as ``::ffff:0:0/96`` ranges, and the IPv4 file) and
+must answer every address the same way.
+
+Usage: cd backend && python -m scripts.bench_geoip [--v4-ranges N] [--v6-ranges N] [--lookups N]
+"""
+
+import argparse
+import bisect
+import ipaddress
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from app.services.geoip import GeoIPDatabase, address_value
+
+_COUNTRIES = ("US", "DE", "FR", "GB", "IN", "BR", "JP", "AU", "ZA", "CA")
+
+
+def write_database(path: str, v4_ranges: int, v6_ranges: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("ip_start,ip_end,continent,country,stateprov,city,latitude,longitude\n")
+        for family, count in ((4, v4_ranges), (6, v6_ranges)):
+            # Evenly spread bounds; about one range in ten is left as a gap
+            bounds = sorted(rng.sample(range(1, 2**32 if family == 4 else 2**62), 2 * count))
+            if family == 6:
+                bounds = [(0x2000 << 112) | (bound << 48) for bound in bounds]
+            for start, end in zip(bounds[::2], bounds[1::2]):
+                if rng.random() < 0.1:
+                    continue
+                country = rng.choice(_COUNTRIES)
+                city = f"City{rng.randrange(2000)}"
+                f.write(
+                    f"{ipaddress.ip_address(start)},{ipaddress.ip_address(end)},XX,{country},"
+                    f"Region,{city},{rng.uniform(-60, 60):.4f},{rng.uniform(-180, 180):.4f}\n"
+                )
+
+
+def write_integer_database(path: str, target: str, family: int) -> None:
+    """``path``'s ranges with integer bounds and no header, as IP2Location ships them"""
+    with open(path) as source, open(target, "w") as f:
+        next(source)
+        if family == 6:
+            f.write(f'"0","{(0xFFFF << 32) - 1}","-","-","-","-","0","0"\n')
+        for line in source:
+            start, end, *fields = line.rstrip("\n").split(",")
+            start, end = ipaddress.ip_address(start), ipaddress.ip_address(end)
+            if start.version == 4 and family == 6:
+                start, end = ipaddress.IPv6Address(f"::ffff:{start}"), ipaddress.IPv6Address(
+                    f"::ffff:{end}"
+                )
+            elif start.version != family:
+                continue
+            f.write(",".join(f'"{value}"' for value in (int(start), int(end), *fields)) + "\n")
+
+
+def reference(path: str) -> Tuple[List[int], List[Tuple[int, int, str]]]:
+    ranges = []
+    with open(path) as f:
+        next(f)
+        for line in f:
+            start, end, _, country, _, city = line.split(",")[:6]
+            ranges.append(
+                (int(ipaddress.ip_address(start)), int(ipaddress.ip_address(end)), country + city)
+            )
+    ranges.sort()
+    return [start for start, _, _ in ranges], ranges
+
+
+def reference_lookup(starts, ranges, address: str) -> Optional[str]:
+    value = int(ipaddress.ip_address(address))
+    position = bisect.bisect_right(starts, value) - 1
+    if position >= 0 and value <= ranges[position][1]:
+        return ranges[position][2]
+    return None
+
+
+def random_addresses(count: int, v6_share: float, rng: random.Random) -> List[str]:
+    addresses = []
+    for _ in range(count):
+        if rng.random() < v6_share:
+            value = (0x2000 << 112) | (rng.getrandbits(64) << 48) | rng.getrandbits(48)
+            addresses.append(str(ipaddress.IPv6Address(value)))
+        else:
+            addresses.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+    return addresses
+
+
+def skewed_stream(count: int, hosts: List[str], rng: random.Random) -> List[str]:
+    # Zipf-like: a handful of destinations take most events
+    weights = [1 / (rank + 1) for rank in range(len(hosts))]
+    return rng.choices(hosts, weights=weights, k=count)
+
+
+def _rate(label: str, count: int, elapsed: float) -> None:
+    print(f"{label:<44} {count / elapsed:>12,.0f} lookups/sec")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--v4-ranges", type=int, default=1_000_000)
+    parser.add_argument("--v6-ranges", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ranges.csv")
+        write_database(path, args.v4_ranges, args.v6_ranges)
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        database = GeoIPDatabase.from_csv(path)
+        load = time.perf_counter() - started
+        starts, ranges = reference(path)
+        integer_databases = []
+        for family in (6, 4):
+            integer_path = os.path.join(directory, f"ip2location-v{family}.csv")
+            write_integer_database(path, integer_path, family)
+            integer_databases.append((family, GeoIPDatabase.from_csv(integer_path)))
+
+    table_bytes = sum(
+        len(column) * column.itemsize
+        for column in (database.v4.starts, database.v4.records, database.v4.blocks)
+    )
+    print(
+        f"database: {len(ranges):,} ranges ({size / 2**20:.0f} MiB CSV), "
+        f"{len(database.records):,} distinct records, loaded in {load:.1f}s; "
+        f"IPv4 arrays {table_bytes / 2**20:.1f} MiB"
+    )
+
+    uniform = random_addresses(args.lookups, 0.1, rng)
+    mismatches = 0
+    for address in uniform[:50_000]:
+        record = database.lookup(address)
+        got = record and record["country"] + record["city"]
+        mismatches += got != reference_lookup(starts, ranges, address)
+
+    for family, integer_database in integer_databases:
+        for address in uniform[:50_000]:
+            if family == 4 and ":" in address:
+                continue
+            for form in (address, f"::ffff:{address}") if ":" not in address else (address,):
+                record = integer_database.lookup(form)
+                got = record and record["country_code"] + record["city_name"]
+                mismatches += got != reference_lookup(starts, ranges, address)
+        # The placeholder row IP2Location puts below ::ffff:0:0 holds no location
+        mismatches += family == 6 and integer_database.lookup("::1") is not None
+    print(f"IP2Location integer layouts (IPv6 with mapped IPv4, IPv4) checked: {mismatches} off")
+
+    lookup = database._lookup
+    started = time.perf_counter()
+    for address in uniform:
+        lookup(address)
+    _rate("uncached, uniform random (10% IPv6)", len(uniform), time.perf_counter() - started)
+
+    v4_only = [address for address in uniform if ":" not in address]
+    started = time.perf_counter()
+    for address in v4_only:
+        lookup(address)
+    _rate("uncached, uniform random IPv4", len(v4_only), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for address in v4_only:
+        address_value(address)
+    _rate("  (address parsing alone)", len(v4_only), time.perf_counter() - started)
+
+    stream = skewed_stream(args.lookups, random_addresses(20_000, 0.1, rng), rng)
+    database.lookup.cache_clear()
+    cached = database.lookup
+    started = time.perf_counter()
+    for address in stream:
+        cached(address)
+    elapsed = time.perf_counter() - started
+    info = cached.cache_info()
+    _rate("LRU, skewed stream over 20k hosts", len(stream), elapsed)
+    print(f"{'':<44} hit rate {info.hits / (info.hits + info.misses):.1%}")
+
+    started = time.perf_counter()
+    batched = []
+    for first in range(0, len(stream), args.batch):
+        batched.extend(database.lookup_many(stream[first : first + args.batch]))
+    _rate(
+        f"lookup_many, skewed stream, batches of {args.batch}",
+        len(stream),
+        time.perf_counter() - started,
+    )
+
+    started = time.perf_counter()
+    uniform_batched = []
+    for first in range(0, len(uniform), args.batch):
+        uniform_batched.extend(database.lookup_many(uniform[first : first + args.batch]))
+    _rate(
+        f"lookup_many, uniform random, batches of {args.batch}",
+        len(uniform),
+        time.perf_counter() - started,
+    )
+
+    mismatches += sum(
+        1 for address, record in zip(stream, batched) if record is not database._lookup(address)
+    )
+    mismatches += sum(
+        1
+        for address, record in zip(uniform[:50_000], uniform_batched)
+        if record is not database._lookup(address)
+    )
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+IOC matcher benchmark: memory per million indicators and match throughput
+
+Builds a million indicators of each kind (IPv4 addresses with some CIDRs,
+SHA256/MD5 digests, domains), measures the memory each compiled structure
+retains next to a plain Python set of the same indicator strings, then
+tags a synthetic event stream (about 1% of events carrying a listed
+address, digest or parent domain) and checks every tag against the plain
+sets.
+
+Usage: cd backend && python -m scripts.bench_ioc [--indicators N] [--events N]
+"""
+
+import argparse
+import gc
+import ipaddress
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from app.services.ioc import DigestSet, DomainSuffixSet, IOCMatcher, IPRangeSet, classify
+
+
+def _retained(build: Callable[[], Any]) -> Tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def build_feeds(count: int, rng: random.Random) -> Dict[str, List[str]]:
+    ips = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(count)]
+    ips[: count // 100] = [
+        f"{ipaddress.IPv4Address(rng.getrandbits(32) & 0xFFFFFF00)}/24" for _ in range(count // 100)
+    ]
+    hashes = [f"{rng.getrandbits(256):064x}" for _ in range(count * 9 // 10)]
+    hashes += [f"{rng.getrandbits(128):032x}" for _ in range(count - len(hashes))]
+    prefixes = ("cdn", "api", "mail", "x")
+    domains = [
+        f"{rng.choice(prefixes)}{n}.{rng.getrandbits(24):06x}.example{n % 50}.com"
+        for n in range(count)
+    ]
+    return {"ip": ips, "hash": hashes, "domain": domains}
+
+
+def build_events(count: int, feeds: Dict[str, List[str]], rng: random.Random) -> List[Dict]:
+    events = []
+    for n in range(count):
+        doc: Dict[str, Any] = {
+            "destination_ip": str(ipaddress.IPv4Address(rng.getrandbits(32))),
+            "source_ip": f"10.0.{n % 256}.{n % 250 + 1}",
+            "hashes": {
+                "sha256": f"{rng.getrandbits(256):064X}",
+                "md5": f"{rng.getrandbits(128):032X}",
+            },
+            "query_name": f"host{n}.benign{n % 1000}.org",
+        }
+        roll = rng.random()
+        if roll < 0.0033:
+            doc["destination_ip"] = rng.choice(feeds["ip"]).split("/")[0]
+        elif roll < 0.0066:
+            doc["hashes"]["sha256"] = rng.choice(feeds["hash"][:1000]).upper()
+        elif roll < 0.01:
+            doc["query_name"] = "www." + rng.choice(feeds["domain"])
+        events.append(doc)
+    return events
+
+
+def reference_hits(doc: Dict[str, Any], ips: Set, networks: Set, hashes: Set, domains: Set) -> int:
+    hits = 0
+    for field in ("destination_ip", "source_ip"):
+        address = doc[field]
+        # Every listed network is a /24
+        if address in ips or int(ipaddress.IPv4Address(address)) & 0xFFFFFF00 in networks:
+            hits += 1
+    hits += sum(value.lower() in hashes for value in doc["hashes"].values())
+    labels = doc["query_name"].split(".")
+    hits += any(".".join(labels[i:]) in domains for i in range(len(labels)))
+    return hits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--indicators", type=int, default=1_000_000)
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    feeds = build_feeds(args.indicators, rng)
+    per_million = 1_000_000 / args.indicators
+
+    classified = {kind: [classify(line)[1] for line in lines] for kind, lines in feeds.items()}
+    structures = {
+        "ip": lambda: IPRangeSet(classified["ip"]),
+        "hash": lambda: {
+            width: DigestSet(width, [d for d in classified["hash"] if len(d) == width])
+            for width in (16, 32)
+        },
+        "domain": lambda: DomainSuffixSet(classified["domain"]),
+    }
+    print(f"{'indicators':<10} {'compact MiB/M':>14} {'build s':>8} {'python set MiB/M':>17}")
+    for kind, build in structures.items():
+        started = time.perf_counter()
+        _, compact = _retained(build)
+        elapsed = time.perf_counter() - started
+        _, plain = _retained(lambda: set(line.lower() for line in feeds[kind]))
+        print(
+            f"{kind:<10} {compact * per_million / 2**20:>14.1f} {elapsed:>8.1f} "
+            f"{plain * per_million / 2**20:>17.1f}"
+        )
+
+    lines = [line for kind in ("ip", "hash", "domain") for line in feeds[kind]]
+    started = time.perf_counter()
+    matcher = IOCMatcher.from_lines(lines)
+    print(f"matcher: {len(matcher):,} indicators compiled in {time.perf_counter() - started:.1f}s")
+
+    events = build_events(args.events, feeds, rng)
+    started = time.perf_counter()
+    tagged = sum(matcher.tag(doc) for doc in events)
+    elapsed = time.perf_counter() - started
+    print(f"tagging: {len(events) / elapsed:,.0f} events/sec, {tagged:,} tagged")
+
+    ips = {line for line in feeds["ip"] if "/" not in line}
+    networks = {
+        int(ipaddress.ip_network(line).network_address) for line in feeds["ip"] if "/" in line
+    }
+    hashes = set(feeds["hash"])
+    domains = set(feeds["domain"])
+    sample = events[:: max(1, len(events) // 20_000)]
+    mismatches = sum(
+        len(doc.get("ioc", ())) != reference_hits(doc, ips, networks, hashes, domains)
+        for doc in sample
+    )
+    mismatches += sum(
+        len(doc.get("ioc", ())) != reference_hits(doc, ips, networks, hashes, domains)
+        for doc in events
+        if "ioc" in doc
+    )
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Leaderboard benchmark and consistency check
+
+Records scores for many teams across several scenarios, then applies a
+stream of live single-team updates (as scoring recalculations arrive),
+and reports updates/sec and the latency of leaderboard pages at the top,
+middle and bottom and of "my rank" lookups. Every page of every
+leaderboard is checked against competition ranks computed by sorting the
+same scores in Python, and the global board against per-team sums.
+
+Runs against an in-process fakeredis by default (pip install fakeredis),
+or a real server with --redis-url.
+
+Usage: cd backend && python -m scripts.bench_leaderboard [--teams N] [--scenarios N] [--updates N]
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List, Optional
+
+import redis
+
+from app.services import leaderboard
+
+
+def reference_ranks(scores: Dict[str, float]) -> Dict[str, int]:
+    ordered = sorted(scores.values(), reverse=True)
+    first: Dict[float, int] = {}
+    for position, score in enumerate(ordered):
+        first.setdefault(score, position + 1)
+    return {team: first[score] for team, score in scores.items()}
+
+
+def check_board(
+    client: redis.Redis, scenario_id: Optional[str], scores: Dict[str, float], page_size: int
+) -> int:
+    expected = reference_ranks(scores)
+    mismatches = 0
+    seen = 0
+    previous = float("inf")
+    for offset in range(0, len(scores), page_size):
+        result = leaderboard.page(client, scenario_id, offset, page_size)
+        mismatches += result["total"] != len(scores)
+        for entry in result["entries"]:
+            team = entry["team_id"]
+            mismatches += entry["rank"] != expected[team]
+            mismatches += entry["score"] != round(scores[team], 2)
+            mismatches += entry["score"] > previous
+            previous = entry["score"]
+            seen += 1
+    return mismatches + (seen != len(scores))
+
+
+def _latency(label: str, timings: List[float]) -> None:
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(f"{label:<36} p50 {p50:>7.3f} ms   p99 {p99:>7.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--teams", type=int, default=10_000)
+    parser.add_argument("--scenarios", type=int, default=10)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    if args.redis_url:
+        client = redis.Redis.from_url(args.redis_url)
+    else:
+        import fakeredis
+
+        client = fakeredis.FakeRedis()
+    client.flushdb()
+
+    rng = random.Random(0)
+    teams = [f"team-{n:05d}" for n in range(args.teams)]
+    scenarios = [f"scenario-{n}" for n in range(args.scenarios)]
+    boards: Dict[str, Dict[str, float]] = {scenario: {} for scenario in scenarios}
+
+    started = time.perf_counter()
+    for scenario in scenarios:
+        # Whole-run results, as scoring.calculate records them; coarse scores tie often
+        scores = {
+            team: round(rng.uniform(0, 100), 1) for team in rng.sample(teams, len(teams) // 2)
+        }
+        leaderboard.record(client, scenario, scores)
+        boards[scenario].update(scores)
+    elapsed = time.perf_counter() - started
+    recorded = sum(len(board) for board in boards.values())
+    print(f"bulk record: {recorded:,} scores in {elapsed:.2f}s ({recorded / elapsed:,.0f}/s)")
+
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        scenario, team = rng.choice(scenarios), rng.choice(teams)
+        score = round(rng.uniform(0, 100), 1)
+        leaderboard.record(client, scenario, {team: score})
+        boards[scenario][team] = score
+    elapsed = time.perf_counter() - started
+    print(f"live updates: {args.updates / elapsed:,.0f} single-team updates/s")
+
+    # Totals in hundredths, as stored, so ties are exact
+    totals: Dict[str, float] = {}
+    for board in boards.values():
+        for team, score in board.items():
+            totals[team] = totals.get(team, 0) + round(score * 100)
+    totals = {team: total / 100 for team, total in totals.items()}
+    total_teams = len(totals)
+    for label, scenario in (("scenario", scenarios[0]), ("global", None)):
+        size = len(boards[scenario]) if scenario else total_teams
+        for where, offset in (("top", 0), ("middle", size // 2), ("bottom", size - args.page_size)):
+            timings = []
+            for _ in range(200):
+                started = time.perf_counter()
+                leaderboard.page(client, scenario, max(0, offset), args.page_size)
+                timings.append(time.perf_counter() - started)
+            _latency(f"{label} page ({where}, {size:,} teams)", timings)
+    timings = []
+    for _ in range(1000):
+        team = rng.choice(teams)
+        started = time.perf_counter()
+        leaderboard.team_rank(client, team, None, around=2)
+        timings.append(time.perf_counter() - started)
+    _latency("my rank (global, 2 neighbours)", timings)
+
+    # What each page view would cost if it re-ranked from the raw scores
+    timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        sorted(totals.items(), key=lambda item: -item[1])[: args.page_size]
+        timings.append(time.perf_counter() - started)
+    _latency("re-rank all teams in Python", timings)
+
+    mismatches = sum(
+        check_board(client, scenario, boards[scenario], args.page_size) for scenario in scenarios
+    )
+    rounded = {team: round(total * 100) for team, total in totals.items()}
+    stored = {
+        team.decode(): score
+        for team, score in client.zrange(leaderboard._key(None), 0, -1, withscores=True)
+    }
+    mismatches += stored != rounded
+    mismatches += check_board(client, None, totals, args.page_size * 20)
+    for team in rng.sample(list(totals), 200):
+        result = leaderboard.team_rank(client, team)
+        mismatches += result is None or result["rank"] != leaderboard_rank(client, team)
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+def leaderboard_rank(client: redis.Redis, team: str) -> int:
+    """Rank by a full scan of the stored global board"""
+    entries = client.zrange(leaderboard._key(None), 0, -1, withscores=True)
+    score = dict(entries)[team.encode()]
+    return 1 + sum(1 for _, other in entries if other > score)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Live scoring benchmark: per-event update cost and equality with the batch path
+
+Turns a synthetic run (as in bench_scoring) into objective and alert
+events, delivers them out of order within the lateness bound, applies
+them to a ``LiveRun`` one ingest batch at a time (collecting the score
+deltas each batch would publish), and checks the final results equal
+``score_run`` over the same events, field for field. Then pushes a
+smaller run through the Redis path (ingest ``forward``, ``LiveConsumer``,
+pub/sub and leaderboard) on fakeredis and checks it the same way, and
+once more handing the run to a second consumer half way (as when another
+worker process takes it over): that consumer must carry on from the saved
+state, so no entry is read twice and the published deltas of each team
+still add up to its final score.
+
+Usage: cd backend && python -m scripts.bench_live_scoring [--teams N] [--alerts N] [--objectives N]
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from app.services import leaderboard, live_scoring
+from app.services.scoring import LiveRun, RunEvents, score_run
+from scripts.bench_scoring import build_run
+
+
+def run_documents(run: RunEvents, run_id: str) -> List[Dict[str, Any]]:
+    docs = [
+        {
+            "@timestamp": start / 1000,
+            "scenario_id": run_id,
+            "objective_id": objective,
+            "detection_window": (end - start) / 1000,
+        }
+        for objective, start, end in zip(run.objective_ids, run.starts.tolist(), run.ends.tolist())
+    ]
+    for team, team_id in enumerate(run.team_ids):
+        docs.extend(
+            {"@timestamp": millis / 1000, "scenario_id": run_id, "team_id": team_id}
+            for millis in run.alerts(team).tolist()
+        )
+    return docs
+
+
+def delivery_order(docs: List[Dict[str, Any]], jitter: float, rng: random.Random) -> List[Dict]:
+    """Time order, with each event delayed by up to ``jitter`` seconds"""
+    return sorted(docs, key=lambda doc: doc["@timestamp"] + rng.uniform(0, jitter))
+
+
+def compare(live: List[Dict[str, Any]], batch: List[Dict[str, Any]]) -> int:
+    return sum(1 for a, b in zip(live, batch) if a != b) + abs(len(live) - len(batch))
+
+
+def messages(subscriber: Any) -> List[Dict[str, Any]]:
+    received = []
+    while True:
+        message = subscriber.get_message(timeout=0.01)
+        if message is None:
+            return received
+        received.append(json.loads(message["data"]))
+
+
+def drain(consumer: live_scoring.LiveConsumer) -> int:
+    read = total = consumer.poll()
+    while read:
+        read = consumer.poll()
+        total += read
+    return total
+
+
+def check_handoff(client: Any, docs: List[Dict[str, Any]], batch: List[Dict[str, Any]]) -> int:
+    run_id = docs[0]["scenario_id"]
+    subscriber = client.pubsub()
+    subscriber.subscribe(live_scoring.channel(run_id))
+    subscriber.get_message(timeout=1)
+    half = len(docs) // 2
+    first = live_scoring.LiveConsumer.load(client, run_id)
+    live_scoring.forward(client, docs[:half])
+    drain(first)
+    second = live_scoring.LiveConsumer.load(client, run_id)
+    # Nothing new: the second consumer reads nothing and publishes nothing
+    mismatches = second.poll() != 0 or second.last_id != first.last_id
+    live_scoring.forward(client, docs[half:])
+    mismatches += drain(second) != len(docs) - half
+    mismatches += compare(second.finish(), batch)
+    mismatches += second.events != len(docs)
+    totals: Dict[str, float] = {}
+    for message in messages(subscriber):
+        for update in message["teams"]:
+            totals[update["team_id"]] = totals.get(update["team_id"], 0.0) + update["delta"]
+    mismatches += sum(
+        abs(totals.get(result["team_id"], 0.0) - result["score"]) > 0.005 for result in batch
+    )
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--objectives", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--lateness", type=float, default=30.0)
+    parser.add_argument("--redis-events", type=int, default=100_000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    docs = run_documents(build_run(args.teams, args.alerts, args.objectives), "run-live")
+    stream = delivery_order(docs, args.lateness * 0.9, rng)
+    batch = [result.to_dict() for result in score_run(RunEvents.from_documents(docs))]
+
+    live = LiveRun(lateness=args.lateness)
+    deltas = 0
+    started = time.perf_counter()
+    for first in range(0, len(stream), args.batch):
+        for doc in stream[first : first + args.batch]:
+            live.add(doc)
+        live.advance()
+        deltas += len(live.changes())
+    elapsed = time.perf_counter() - started
+    live.advance(flush=True)
+    deltas += len(live.changes())
+    mismatches = compare([result.to_dict() for result in live.results()], batch)
+    print(
+        f"live: {len(stream):,} events in {elapsed:.2f}s ({len(stream) / elapsed:,.0f} events/s, "
+        f"{elapsed / len(stream) * 1e6:.2f} us/event), {deltas:,} team deltas over "
+        f"{-(-len(stream) // args.batch):,} batches, {live.late} late"
+    )
+    print(f"final results vs batch: {mismatches} mismatches over {len(batch)} teams")
+
+    # One event older than the lateness bound is dropped, and counted
+    live.add({"@timestamp": 0, "scenario_id": "run-live", "team_id": "team-000"})
+    mismatches += live.late != 1
+
+    import fakeredis
+
+    client = fakeredis.FakeRedis()
+    small = build_run(20, args.redis_events, 50, seed=1)
+    docs = run_documents(small, "run-redis")
+    subscriber = client.pubsub()
+    subscriber.subscribe(live_scoring.channel("run-redis"))
+    subscriber.get_message(timeout=1)
+    leaderboard.register_run(client, "run-redis", "scenario-redis")
+    consumer = live_scoring.LiveConsumer(client, "run-redis", LiveRun(lateness=args.lateness))
+    stream = delivery_order(docs, args.lateness * 0.9, rng)
+    started = time.perf_counter()
+    for first in range(0, len(stream), args.batch):
+        live_scoring.forward(client, stream[first : first + args.batch])
+        consumer.poll()
+    results = consumer.finish()
+    elapsed = time.perf_counter() - started
+    published = len(messages(subscriber))
+    batch = [result.to_dict() for result in score_run(RunEvents.from_documents(docs))]
+    redis_mismatches = compare(results, batch)
+    board = leaderboard.page(client, "scenario-redis", 0, len(batch))["entries"]
+    # The live leaderboard ends on the final scores
+    redis_mismatches += {entry["team_id"]: entry["score"] for entry in board} != {
+        result["team_id"]: result["score"] for result in batch
+    }
+    print(
+        f"redis path: {len(stream):,} events in {elapsed:.2f}s ({len(stream) / elapsed:,.0f}/s), "
+        f"{published} delta messages, {redis_mismatches} mismatches"
+    )
+    handoff = check_handoff(
+        client, delivery_order(run_documents(small, "run-handoff"), 0, rng), batch
+    )
+    print(f"handoff to a second consumer: {handoff} mismatches")
+    if mismatches or redis_mismatches or handoff or not published:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Log parser benchmark: per-source throughput, inline and in a process pool
+
+Builds a synthetic payload per registered source (Zeek conn + dns logs
+in one payload, Suricata EVE with alert/dns/http/tls/flow records, a
+Sysmon export), parses each inline and through ``parsers.normalize`` with
+a pool, checks the pool yields exactly the inline documents in the same
+order, and prints events/sec and MB/sec.
+
+Usage: cd backend && python -m scripts.bench_parsers [--events N] [--workers W]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from typing import Callable, Dict
+
+from app.core.config import settings
+from app.services import parsers
+from scripts.bench_sysmon import synthetic_export
+
+_ZEEK_HEADER = (
+    "#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n#unset_field\t-\n"
+    "#path\t{path}\n#open\t2024-03-01-12-00-00\n#fields\t{fields}\n#types\t{types}\n"
+)
+_CONN = (
+    ("ts", "time"),
+    ("uid", "string"),
+    ("id.orig_h", "addr"),
+    ("id.orig_p", "port"),
+    ("id.resp_h", "addr"),
+    ("id.resp_p", "port"),
+    ("proto", "enum"),
+    ("service", "string"),
+    ("duration", "interval"),
+    ("orig_bytes", "count"),
+    ("resp_bytes", "count"),
+    ("conn_state", "string"),
+    ("local_orig", "bool"),
+    ("missed_bytes", "count"),
+    ("history", "string"),
+    ("orig_pkts", "count"),
+    ("resp_pkts", "count"),
+    ("tunnel_parents", "set[string]"),
+)
+_DNS = (
+    ("ts", "time"),
+    ("uid", "string"),
+    ("id.orig_h", "addr"),
+    ("id.orig_p", "port"),
+    ("id.resp_h", "addr"),
+    ("id.resp_p", "port"),
+    ("proto", "enum"),
+    ("trans_id", "count"),
+    ("query", "string"),
+    ("qtype_name", "string"),
+    ("rcode_name", "string"),
+    ("AA", "bool"),
+    ("answers", "vector[string]"),
+    ("TTLs", "vector[interval]"),
+)
+
+
+def _zeek_log(path: str, columns, rows) -> str:
+    header = _ZEEK_HEADER.format(
+        path=path,
+        fields="\t".join(name for name, _ in columns),
+        types="\t".join(kind for _, kind in columns),
+    )
+    return header + "".join("\t".join(row) + "\n" for row in rows) + "#close\t2024-03-01-13-00-00\n"
+
+
+def zeek_payload(events: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    half = events // 2
+    conn = [
+        (
+            f"{1709294400 + n // 100}.{n % 1000000:06d}",
+            f"C{n:017x}",
+            f"10.0.{n % 256}.{n % 250 + 1}",
+            str(49152 + n % 16000),
+            f"192.168.1.{n % 250 + 1}",
+            str(rng.choice((53, 80, 443, 445))),
+            rng.choice(("tcp", "udp")),
+            rng.choice(("-", "http", "ssl", "dns")),
+            f"{rng.random():.6f}",
+            str(rng.randrange(100000)),
+            str(rng.randrange(100000)),
+            "SF",
+            rng.choice(("T", "F")),
+            "0",
+            "ShADadFf",
+            str(rng.randrange(1, 100)),
+            str(rng.randrange(1, 100)),
+            "(empty)",
+        )
+        for n in range(half)
+    ]
+    dns = [
+        (
+            f"{1709294400 + n // 100}.{n % 1000000:06d}",
+            f"D{n:017x}",
+            f"10.0.{n % 256}.{n % 250 + 1}",
+            str(49152 + n % 16000),
+            "192.168.1.53",
+            "53",
+            "udp",
+            str(n % 65536),
+            f"host{n % 5000}.example.com",
+            "A",
+            "NOERROR",
+            "F",
+            f"192.168.1.{n % 250 + 1},10.1.1.{n % 250 + 1}",
+            "60.000000,60.000000",
+        )
+        for n in range(events - half)
+    ]
+    return (_zeek_log("conn", _CONN, conn) + _zeek_log("dns", _DNS, dns)).encode()
+
+
+def suricata_payload(events: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    lines = []
+    for n in range(events):
+        kind = rng.choice(("alert", "dns", "http", "tls", "flow"))
+        event = {
+            "timestamp": f"2024-03-01T12:{n // 60 % 60:02d}:{n % 60:02d}.{n % 1000000:06d}+0000",
+            "flow_id": 1000000000000 + n,
+            "in_iface": "eth0",
+            "event_type": kind,
+            "src_ip": f"10.0.{n % 256}.{n % 250 + 1}",
+            "src_port": 49152 + n % 16000,
+            "dest_ip": f"192.168.1.{n % 250 + 1}",
+            "dest_port": rng.choice((53, 80, 443)),
+            "proto": "TCP",
+            "host": "sensor-01",
+        }
+        if kind == "alert":
+            event["alert"] = {
+                "action": "allowed",
+                "gid": 1,
+                "signature_id": 2000000 + n % 500,
+                "rev": 1,
+                "signature": f"ET POLICY Suspicious Rule {n % 500}",
+                "category": "Potentially Bad Traffic",
+                "severity": rng.choice((1, 2, 3)),
+            }
+        elif kind == "dns":
+            event["dns"] = {"type": "query", "id": n % 65536, "rrname": f"host{n}.example.com"}
+        elif kind == "http":
+            event["http"] = {"hostname": f"www{n % 50}.example.com", "url": "/", "status": 200}
+        elif kind == "tls":
+            event["tls"] = {"sni": f"api{n % 50}.example.com", "version": "TLS 1.3"}
+        else:
+            event["flow"] = {"pkts_toserver": 5, "pkts_toclient": 4, "bytes_toserver": 600}
+        lines.append(json.dumps(event))
+    return ("\n".join(lines) + "\n").encode()
+
+
+PAYLOADS: Dict[str, Callable[[int], bytes]] = {
+    "zeek": zeek_payload,
+    "suricata": suricata_payload,
+    "sysmon": synthetic_export,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument(
+        "--workers", type=int, default=settings.LOG_PARSE_WORKERS or max(2, os.cpu_count() or 1)
+    )
+    parser.add_argument("--chunk-bytes", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    print(f"{args.workers} pool workers, {os.cpu_count()} CPUs")
+    print(f"{'source':>9} {'MiB':>6} {'inline ev/s':>12} {'MB/s':>6} {'pool ev/s':>12} {'MB/s':>6}")
+    failed = False
+    for source, build in PAYLOADS.items():
+        payload = build(args.events)
+        mib = len(payload) / 2**20
+
+        started = time.perf_counter()
+        inline = list(parsers.normalize(source, payload, workers=1))
+        inline_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pooled = list(
+            parsers.normalize(
+                source,
+                payload,
+                workers=args.workers,
+                parallel_bytes=0,
+                chunk_bytes=args.chunk_bytes,
+            )
+        )
+        pool_s = time.perf_counter() - started
+
+        ok = len(inline) == args.events and pooled == inline
+        failed = failed or not ok
+        print(
+            f"{source:>9} {mib:>6.1f} {len(inline) / inline_s:>12,.0f} {mib / inline_s:>6.1f} "
+            f"{len(pooled) / pool_s:>12,.0f} {mib / pool_s:>6.1f}" + ("" if ok else "  MISMATCH")
+        )
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
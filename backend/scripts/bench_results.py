@@ -0,0 +1,194 @@
+"""
+Scoring results load test: aggregate per request vs materialized with ETags
+
+Serves GET /scoring/results through the real router (httpx over ASGI, no
+sockets) with many concurrent clients, three ways:
+
+    before   score the run's events on every request and encode the JSON,
+             as the endpoint would without materialized results
+    after    the materialized document (200 with body)
+    304      the same request with If-None-Match, as a polling Scoring page sends
+
+and reports p50/p99 latency and throughput for each. The materialized body
+is checked against the computed results, and a recalculation must change
+the ETag so a client holding the old one gets the new body.
+
+Usage: cd backend && python -m scripts.bench_results [--requests N] [--concurrency N] [--alerts N]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.v1 import scoring as scoring_api
+from app.services import rollups, scoring_results
+from app.services.scoring import RunEvents, score_run
+from scripts.bench_live_scoring import run_documents
+from scripts.bench_scoring import build_run
+
+
+def calculate(run_id: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """What scoring.calculate returns for a run"""
+    run = RunEvents.from_documents(docs)
+    return {
+        "status": "success",
+        "scenario_run_id": run_id,
+        "objectives": len(run.objective_ids),
+        "teams": [team.to_dict() for team in score_run(run)],
+    }
+
+
+def build_app(docs: List[Dict[str, Any]]) -> FastAPI:
+    app = FastAPI()
+    app.include_router(scoring_api.router, prefix="/scoring")
+
+    @app.get("/aggregate/results")
+    async def aggregate(scenario_run_id: str):
+        # The endpoint without materialization: every request pays for scoring
+        result = await run_in_threadpool(calculate, scenario_run_id, docs)
+        return Response(
+            content=json.dumps(result, separators=(",", ":")), media_type="application/json"
+        )
+
+    return app
+
+
+def _latency(label: str, timings: List[float], elapsed: float) -> None:
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(
+        f"{label:<8} p50 {p50:>9.3f} ms   p99 {p99:>9.3f} ms   "
+        f"{len(timings) / elapsed:>8,.0f} req/s"
+    )
+
+
+async def load(
+    client: httpx.AsyncClient,
+    url: str,
+    requests: int,
+    concurrency: int,
+    headers: Optional[Dict[str, str]] = None,
+    check: Optional[Callable[[httpx.Response], bool]] = None,
+) -> tuple:
+    timings: List[float] = []
+    responses: List[httpx.Response] = []
+    queue = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in queue:
+            started = time.perf_counter()
+            responses.append(await client.get(url, headers=headers))
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # Checked after timing, so decoding bodies does not hold up the other clients
+    failures = sum(1 for response in responses if check is not None and not check(response))
+    return timings, elapsed, failures
+
+
+async def run(args: argparse.Namespace) -> int:
+    import fakeredis
+
+    rollups._client = fakeredis.FakeRedis()
+    run_id = "run-results"
+    docs = run_documents(build_run(args.teams, args.alerts, args.objectives), run_id)
+    expected = calculate(run_id, docs)
+    etag = scoring_results.store(rollups._client, expected)
+    for n in range(args.runs - 1):
+        scoring_results.store(rollups._client, {**expected, "scenario_run_id": f"run-{n:04d}"})
+
+    transport = httpx.ASGITransport(app=build_app(docs))
+    mismatches = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        url = f"/scoring/results?scenario_run_id={run_id}"
+
+        def same_results(response: httpx.Response) -> bool:
+            body = response.json()
+            body.pop("calculated_at", None)
+            return response.status_code == 200 and body == expected
+
+        before_requests = max(args.concurrency, args.requests // args.before_fraction)
+        timings, elapsed, failures = await load(
+            client,
+            f"/aggregate/results?scenario_run_id={run_id}",
+            before_requests,
+            args.concurrency,
+            check=same_results,
+        )
+        _latency("before", timings, elapsed)
+        mismatches += failures
+
+        timings, elapsed, failures = await load(
+            client,
+            url,
+            args.requests,
+            args.concurrency,
+            check=lambda response: same_results(response) and response.headers["etag"] == etag,
+        )
+        _latency("after", timings, elapsed)
+        mismatches += failures
+
+        timings, elapsed, failures = await load(
+            client,
+            url,
+            args.requests,
+            args.concurrency,
+            headers={"If-None-Match": etag},
+            check=lambda response: response.status_code == 304 and not response.content,
+        )
+        _latency("304", timings, elapsed)
+        mismatches += failures
+
+        timings, elapsed, failures = await load(
+            client,
+            "/scoring/results",
+            args.requests,
+            args.concurrency,
+            check=lambda response: len(response.json()) == args.runs,
+        )
+        _latency("run list", timings, elapsed)
+        mismatches += failures
+
+        # A recalculation replaces the document: the old ETag no longer matches
+        scoring_results.store(rollups._client, {**expected, "objectives": -1})
+        response = await client.get(url, headers={"If-None-Match": etag})
+        mismatches += response.status_code != 200 or response.json()["objectives"] != -1
+        response = await client.get("/scoring/results?scenario_run_id=missing")
+        mismatches += response.status_code != 404
+
+    size = len(json.dumps(expected))
+    print(f"{len(docs):,} events, {args.teams} teams, {size / 1024:.0f} KiB body")
+    print(f"mismatches: {mismatches}")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--alerts", type=int, default=200_000)
+    parser.add_argument("--objectives", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--before-fraction",
+        type=int,
+        default=10,
+        help="the aggregating endpoint serves requests/N requests (it is much slower)",
+    )
+    args = parser.parse_args()
+    if asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
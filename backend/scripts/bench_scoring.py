@@ -0,0 +1,163 @@
+"""
+Scoring benchmark: the NumPy engine against a per-alert Python loop
+
+Generates a week-long run of objectives and alerts from 100 teams
+(each detecting a different share of objectives, plus noise that lands
+both inside and outside windows), scores it with ``score_run`` and with
+a plain bisect-and-loop reference, checks every team's delays and false
+positive count agree, and prints both timings. Also times
+``RunEvents.from_documents`` on a slice of the run as documents.
+
+Usage: cd backend && python -m scripts.bench_scoring [--teams N] [--alerts N] [--objectives N]
+"""
+
+import argparse
+import bisect
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.scoring import RunEvents, match_team, score_run
+
+RUN_START = 1_709_294_400_000
+RUN_MILLIS = 7 * 24 * 3600 * 1000
+WINDOW_MILLIS = 900 * 1000
+
+
+def build_run(teams: int, alerts: int, objectives: int, seed: int = 0) -> RunEvents:
+    rng = np.random.default_rng(seed)
+    starts = RUN_START + rng.integers(0, RUN_MILLIS, objectives)
+    windows = np.where(rng.random(objectives) < 0.1, 300_000, WINDOW_MILLIS)
+    per_team = alerts // teams
+    alert_teams, alert_times = [], []
+    for team in range(teams):
+        # Better teams detect more objectives and raise less noise
+        rank = team / max(1, teams - 1)
+        found = rng.random(objectives) < 0.3 + 0.7 * rank
+        first = starts[found] + rng.exponential(WINDOW_MILLIS / 3, found.sum()).astype(np.int64)
+        first = np.minimum(first, starts[found] + windows[found])
+        # Follow-up alerts on detected objectives, later in the same window
+        noise_count = int(per_team * (0.6 - 0.5 * rank))
+        follow = rng.integers(0, len(first), max(0, per_team - len(first) - noise_count))
+        follow_ups = first[follow] + rng.integers(0, 60_000, len(follow))
+        # Noise comes in bursts (alert storms), so most windows see none of it
+        bursts = RUN_START + rng.integers(0, RUN_MILLIS, 20)
+        noise = rng.choice(bursts, noise_count)
+        noise += rng.normal(0, 60_000, noise_count).astype(np.int64)
+        times = np.concatenate((first, follow_ups, noise))[:per_team]
+        alert_teams.append(np.full(len(times), team))
+        alert_times.append(times)
+    return RunEvents(
+        [f"obj-{n}" for n in range(objectives)],
+        starts,
+        windows,
+        [f"team-{n:03d}" for n in range(teams)],
+        np.concatenate(alert_teams),
+        np.concatenate(alert_times),
+    )
+
+
+def reference(run: RunEvents) -> List[Tuple[List[int], int]]:
+    """Per team: delay per objective (-1 if missed) and false positives, alert by alert"""
+    starts, ends = run.starts.tolist(), run.ends.tolist()
+    reach = list(itertools.accumulate(ends, max))
+    results = []
+    for team in range(len(run.team_ids)):
+        alerts = run.alerts(team).tolist()
+        delays = []
+        for start, end in zip(starts, ends):
+            position = bisect.bisect_left(alerts, start)
+            hit = position < len(alerts) and alerts[position] <= end
+            delays.append(alerts[position] - start if hit else -1)
+        false_positives = 0
+        for alert in alerts:
+            position = bisect.bisect_right(starts, alert) - 1
+            false_positives += position < 0 or reach[position] < alert
+        results.append((delays, false_positives))
+    return results
+
+
+def brute_force_false_positives(run: RunEvents, team: int) -> int:
+    windows = list(zip(run.starts.tolist(), run.ends.tolist()))
+    return sum(
+        1
+        for alert in run.alerts(team).tolist()
+        if not any(start <= alert <= end for start, end in windows)
+    )
+
+
+def documents(run: RunEvents, limit: int):
+    def iso(millis: int) -> str:
+        return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).isoformat()
+
+    for objective, start, end in zip(run.objective_ids, run.starts.tolist(), run.ends.tolist()):
+        yield {
+            "@timestamp": iso(start),
+            "objective_id": objective,
+            "detection_window": (end - start) / 1000,
+        }
+    for team in range(len(run.team_ids)):
+        for millis in run.alerts(team)[: limit // len(run.team_ids)].tolist():
+            yield {"@timestamp": iso(millis), "team_id": run.team_ids[team]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--objectives", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=200_000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    run = build_run(args.teams, args.alerts, args.objectives)
+    print(
+        f"run: {len(run.objective_ids):,} objectives, {len(run.team_ids)} teams, "
+        f"{len(run.alert_times):,} alerts (built in {time.perf_counter() - started:.1f}s)"
+    )
+
+    started = time.perf_counter()
+    scores = score_run(run)
+    engine = time.perf_counter() - started
+    rate = len(run.alert_times) / engine
+    print(f"score_run:   {engine * 1000:>9.1f} ms ({rate:,.0f} alerts/s)")
+
+    started = time.perf_counter()
+    expected = reference(run)
+    loop = time.perf_counter() - started
+    print(f"python loop: {loop * 1000:>9.1f} ms ({loop / engine:,.0f}x slower)")
+
+    mismatches = 0
+    for team, (delays, false_positives) in enumerate(expected):
+        got_delays, got_false_positives = match_team(run, team)
+        mismatches += got_delays.tolist() != delays or got_false_positives != false_positives
+    # Independent check of window coverage, on a few teams
+    for team in range(0, len(run.team_ids), max(1, len(run.team_ids) // 3)):
+        mismatches += match_team(run, team)[1] != brute_force_false_positives(run, team)
+    print(f"mismatches: {mismatches}")
+
+    best, worst = scores[0], scores[-1]
+    for label, result in (("best", best), ("worst", worst)):
+        print(
+            f"{label}: {result.team_id} score {result.score} detection rate "
+            f"{result.detection_rate:.1%} mttd {result.mean_time_to_detect}s "
+            f"false positives {result.false_positives:,}"
+        )
+
+    docs = list(documents(run, args.documents))
+    started = time.perf_counter()
+    parsed = RunEvents.from_documents(docs)
+    elapsed = time.perf_counter() - started
+    print(f"from_documents: {len(docs) / elapsed:,.0f} documents/s")
+    mismatches += not np.array_equal(parsed.starts, run.starts) or not np.array_equal(
+        parsed.ends, run.ends
+    )
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
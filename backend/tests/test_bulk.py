@@ -0,0 +1,148 @@
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from elasticsearch import Elasticsearch
+
+from app.services.bulk import BulkIndexer, daily_index
+
+
+class FakeBulkServer(ThreadingHTTPServer):
+    """
+    A ``_bulk`` endpoint that rejects whole requests and single items:
+    the first request gets a 429, document ``n`` with n % 10 == 3 has a
+    mapping error, n % 10 == 5 is rejected (429) once and n % 10 == 7 gets
+    a 503 twice before each is indexed
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), BulkHandler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        # Documents in a request rejected as a whole
+        self.rejected = Counter()
+        self.attempts = Counter()
+        self.indexed = Counter()
+
+    def outcome(self, n):
+        with self.lock:
+            self.attempts[n] += 1
+            attempt = self.attempts[n]
+            if n % 10 == 3:
+                return 400, {"type": "mapper_parsing_exception"}
+            if n % 10 == 5 and attempt == 1:
+                return 429, {"type": "es_rejected_execution_exception"}
+            if n % 10 == 7 and attempt <= 2:
+                return 503, {"type": "unavailable_shards_exception"}
+            self.indexed[n] += 1
+            return 201, None
+
+
+class BulkHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        server = self.server
+        lines = self.rfile.read(int(self.headers["Content-Length"])).splitlines()
+        with server.lock:
+            server.requests += 1
+            first = server.requests == 1
+        if first:
+            server.rejected.update(json.loads(source)["n"] for source in lines[1::2])
+            error = {"type": "es_rejected_execution_exception"}
+            return self._reply(429, {"error": error, "status": 429})
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            index = json.loads(action)["index"]["_index"]
+            status, error = server.outcome(json.loads(source)["n"])
+            result = {"_index": index, "status": status}
+            if error is not None:
+                result["error"] = error
+            items.append({"index": result})
+        self._reply(200, {"took": 1, "errors": True, "items": items})
+
+    # The client sends _bulk as a PUT
+    do_PUT = do_POST
+
+
+@pytest.fixture
+def server():
+    server = FakeBulkServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_every_document_is_indexed_once_and_only_failures_are_resent(server):
+    host, port = server.server_address
+    client = Elasticsearch(f"http://{host}:{port}", max_retries=0, retry_on_status=())
+    count = 1000
+    indexer = BulkIndexer(
+        client, max_docs=64, flush_interval=60, concurrency=3, initial_backoff=0.001
+    )
+    with indexer:
+        for n in range(count):
+            indexer.add("sysmon-2023.11.14", {"n": n, "message": "x" * (n % 50)})
+    stats = indexer.stats
+    permanent = {n for n in range(count) if n % 10 == 3}
+    assert len(server.rejected) == 64 and set(server.rejected.values()) == {1}
+    assert set(server.indexed) == set(range(count)) - permanent
+    assert set(server.indexed.values()) == {1}
+    # Besides the rejected request, which was resent whole, only failed items went again
+    expected = {3: 1, 5: 2, 7: 3}
+    assert all(server.attempts[n] == expected.get(n % 10, 1) for n in range(count))
+    assert stats.indexed == count - len(permanent)
+    assert stats.failed == len(permanent) and stats.unavailable == 0
+    assert {error["status"] for error in stats.errors} == {400}
+    assert stats.retried == count // 10 * 3
+    assert stats.throttled >= 2
+
+
+def test_retries_give_up_after_max_retries(server):
+    host, port = server.server_address
+    client = Elasticsearch(f"http://{host}:{port}", max_retries=0, retry_on_status=())
+    with BulkIndexer(client, max_retries=1, initial_backoff=0.001) as indexer:
+        for n in range(20):
+            indexer.add("sysmon-2023.11.14", {"n": n})
+    # The request-level 429 used the one retry, so retryable items fail on their first rejection
+    assert indexer.stats.failed == 6
+    assert indexer.stats.unavailable == 4
+    assert sorted(server.indexed) == [n for n in range(20) if n % 10 not in (3, 5, 7)]
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        ("2023-11-14T22:13:20.123Z", "zeek-2023.11.14"),
+        ("2023-11-14", "zeek-2023.11.14"),
+        ("2023-11-14T23:30:00-02:00", "zeek-2023.11.15"),
+        ("2023-11-14 10:00:00", "zeek-2023.11.14"),
+        (1_700_000_000, "zeek-2023.11.14"),
+        (1_700_000_000.5, "zeek-2023.11.14"),
+    ],
+)
+def test_daily_index_uses_the_utc_day(timestamp, expected):
+    assert daily_index("zeek", timestamp) == expected
+
+
+@pytest.mark.parametrize("timestamp", [None, "not a timestamp", "yesterday!", "2023-13-45", 1e20])
+def test_daily_index_falls_back_to_today(timestamp):
+    today = datetime.now(timezone.utc)
+    assert daily_index("zeek", timestamp) == f"zeek-{today:%Y.%m.%d}"
@@ -0,0 +1,110 @@
+import ipaddress
+import random
+
+import pytest
+
+from app.services import geoip
+from app.services.geoip import GeoIPDatabase
+
+RANGES = [
+    ("1.0.0.0", "1.0.0.255", {"country_code": "AU"}),
+    ("1.0.1.0", "1.0.3.255", {"country_code": "CN"}),
+    # A gap, then ranges sharing one record
+    ("8.8.8.0", "8.8.8.255", {"country_code": "US"}),
+    ("10.0.0.0", "10.255.255.255", {"country_code": "ZZ"}),
+    ("2001:db8::", "2001:db8::ffff", {"country_code": "DE"}),
+    ("2001:db8:1::", "2001:db8:1:ffff:ffff:ffff:ffff:ffff", {"country_code": "FR"}),
+    # IPv4 held as an IPv4-mapped IPv6 range
+    ("::ffff:192.168.0.0", "::ffff:192.168.255.255", {"country_code": "LAN"}),
+    ("ffff::", "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff", {"country_code": "TOP"}),
+]
+
+
+@pytest.fixture(scope="module")
+def database():
+    return GeoIPDatabase(RANGES)
+
+
+EDGES = [
+    "1.0.0.0",
+    "1.0.0.255",
+    "1.0.1.0",
+    "1.0.3.255",
+    "1.0.4.0",
+    "0.0.0.0",
+    "8.8.8.8",
+    "9.0.0.1",
+    "10.255.255.255",
+    "11.0.0.0",
+    "255.255.255.255",
+    "192.168.4.20",
+    "::ffff:10.1.2.3",
+    "::ffff:192.168.0.1",
+    "2001:db8::1",
+    "2001:db8::1:0",
+    "2001:db8:1::42",
+    "2001:db8:2::",
+    "::",
+    "::1",
+    "ffff::1",
+    "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff",
+    None,
+    "",
+    "not an address",
+    "1.2.3",
+    "01.0.0.1",
+    "1.0.0.1 ",
+    "2001:db8::zz",
+    "fe80::1%eth0",
+]
+
+
+def test_lookup_many_agrees_with_single_lookups(database):
+    addresses = EDGES + EDGES[::-1]
+    records = database.lookup_many(addresses)
+    assert records == [database._lookup(address) for address in addresses]
+    countries = {
+        address: record and record["country_code"] for address, record in zip(EDGES, records)
+    }
+    assert countries["1.0.0.255"] == "AU" and countries["1.0.4.0"] is None
+    assert countries["192.168.4.20"] == countries["::ffff:192.168.0.1"] == "LAN"
+    assert countries["::ffff:10.1.2.3"] == "ZZ" and countries["2001:db8::1:0"] is None
+    assert countries["ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff"] == "TOP"
+    assert database.lookup_many([]) == []
+
+
+def test_lookup_many_on_random_addresses(database):
+    rng = random.Random(0)
+    addresses = []
+    for _ in range(5000):
+        if rng.random() < 0.3:
+            # 2001:db8::/112 half the time, 2001:db8:1::/48 or 2001:db8:2:: (no range)
+            value = (0x2001_0DB8 << 96) | (rng.randrange(3) << 80) | rng.getrandbits(17)
+            addresses.append(str(ipaddress.IPv6Address(value)))
+        else:
+            addresses.append(
+                f"{rng.choice((1, 8, 10, 192))}.{rng.randrange(256)}.0.{rng.randrange(256)}"
+            )
+    records = database.lookup_many(addresses)
+    assert records == [database._lookup(address) for address in addresses]
+    assert sum(record is not None for record in records) > 1500
+
+
+def test_empty_database():
+    assert GeoIPDatabase([]).lookup_many(["1.2.3.4", "::1", "0.0.0.0", "::"]) == [None] * 4
+
+
+def test_enrich_stream_looks_up_a_chunk_at_a_time(database, monkeypatch):
+    batches = []
+    lookup_many = database.lookup_many
+    monkeypatch.setattr(
+        database,
+        "lookup_many",
+        lambda addresses: batches.append(len(addresses)) or lookup_many(addresses),
+    )
+    documents = [{"destination_ip": address} for address in EDGES * 10]
+    enriched = list(geoip.enrich_stream(iter(documents), database, batch=64))
+    assert batches == [64] * 4 + [44]
+    assert enriched == documents
+    assert enriched[0]["geoip"] == {"country_code": "AU"}
+    assert "geoip" not in enriched[EDGES.index("9.0.0.1")]
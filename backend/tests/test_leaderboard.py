@@ -0,0 +1,102 @@
+import fakeredis
+import pytest
+
+from app.services import leaderboard
+from app.workers import tasks
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+def _board(client, scenario_id=None):
+    return {
+        entry["team_id"]: entry["score"]
+        for entry in leaderboard.page(client, scenario_id)["entries"]
+    }
+
+
+def test_recording_a_scenario_again_replaces_its_entries(client):
+    assert leaderboard.record(client, "s1", {"red": 10.5, "blue": 7}) == {"red": 10.5, "blue": 7}
+    # Only the changes move the global board
+    assert leaderboard.record(client, "s1", {"red": 4.25, "blue": 7}) == {"red": -6.25}
+    assert _board(client, "s1") == {"red": 4.25, "blue": 7}
+    assert _board(client) == {"red": 4.25, "blue": 7}
+    assert leaderboard.record(client, "s1", {}) == {}
+
+
+def test_global_board_sums_scenarios(client):
+    leaderboard.record(client, "s1", {"red": 10.1, "blue": 20.2})
+    leaderboard.record(client, "s2", {"red": 0.2, "green": 5})
+    leaderboard.record(client, "s2", {"red": 0.3})
+    assert _board(client) == {"red": 10.4, "blue": 20.2, "green": 5}
+    assert leaderboard.remove(client, "s2") == 2
+    assert _board(client) == {"red": 10.1, "blue": 20.2, "green": 0}
+    assert leaderboard.page(client, "s2")["total"] == 0
+
+
+def test_pages_are_windows_of_the_ranking(client):
+    scores = {f"team-{n:03d}": float(n) for n in range(120)}
+    leaderboard.record(client, "s1", scores)
+    pages = [leaderboard.page(client, "s1", offset, 50) for offset in (0, 50, 100)]
+    assert [page["total"] for page in pages] == [120] * 3
+    assert [len(page["entries"]) for page in pages] == [50, 50, 20]
+    entries = [entry for page in pages for entry in page["entries"]]
+    assert [entry["rank"] for entry in entries] == list(range(1, 121))
+    assert [entry["score"] for entry in entries] == sorted(scores.values(), reverse=True)
+    assert leaderboard.page(client, "s1", 500, 50)["entries"] == []
+
+
+def test_ties_share_a_competition_rank_across_pages(client):
+    leaderboard.record(client, "s1", {"a": 9, "b": 5, "c": 5, "d": 5, "e": 1})
+    first = leaderboard.page(client, "s1", 0, 2)["entries"]
+    second = leaderboard.page(client, "s1", 2, 3)["entries"]
+    assert [entry["rank"] for entry in first + second] == [1, 2, 2, 2, 5]
+    # Within a tie, reverse team id
+    assert [entry["team_id"] for entry in first + second] == ["a", "d", "c", "b", "e"]
+
+
+def test_team_rank_with_neighbours(client):
+    leaderboard.record(client, "s1", {"a": 9, "b": 5, "c": 5, "d": 3, "e": 1})
+    mine = leaderboard.team_rank(client, "b", "s1", around=1)
+    assert (mine["rank"], mine["score"], mine["total"]) == (2, 5, 5)
+    assert [entry["team_id"] for entry in mine["neighbours"]] == ["c", "b", "d"]
+    assert [entry["rank"] for entry in mine["neighbours"]] == [2, 2, 4]
+    assert "neighbours" not in leaderboard.team_rank(client, "a", "s1")
+    assert leaderboard.team_rank(client, "a")["rank"] == 1
+    assert leaderboard.team_rank(client, "nobody", "s1") is None
+
+
+def _run_documents():
+    base = 1_700_000_000_000
+    docs = [{"@timestamp": base + n * 1000, "objective_id": f"obj-{n}"} for n in range(3)]
+    docs += [
+        {"@timestamp": base + 500, "team_id": "red"},
+        {"@timestamp": base + 2500, "team_id": "blue"},
+    ]
+    return docs
+
+
+def test_rescoring_runs_of_a_scenario_does_not_add_up(client, monkeypatch):
+    class Search:
+        def export(self, query):
+            return iter(_run_documents())
+
+    monkeypatch.setattr(tasks, "shared_search", Search)
+    monkeypatch.setattr(tasks.rollups, "redis_client", lambda: client)
+    leaderboard.register_run(client, "run-1", "scenario-1")
+    leaderboard.register_run(client, "run-2", "scenario-1")
+    first = tasks.scoring_calculate_task("run-1")
+    scores = {team["team_id"]: team["score"] for team in first["teams"]}
+    assert scores and "leaderboard_error" not in first
+    tasks.scoring_calculate_task("run-1")
+    tasks.scoring_calculate_task("run-2")
+    assert _board(client, "scenario-1") == scores
+    assert _board(client) == scores
+    assert leaderboard.page(client, "run-1")["total"] == 0
+    # An unregistered run is scored, but kept off the leaderboards
+    unknown = tasks.scoring_calculate_task("run-3")
+    assert unknown["teams"] == first["teams"] and "leaderboard_error" in unknown
+    tasks.scoring_calculate_task("run-3", "scenario-2")
+    assert _board(client) == {team: 2 * score for team, score in scores.items()}
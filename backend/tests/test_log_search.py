@@ -0,0 +1,246 @@
+import json
+import random
+
+import fakeredis
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ConnectionError, NotFoundError
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import logs as logs_api
+from app.services import log_search
+from app.services.log_search import (
+    CursorExpired,
+    ElasticsearchStore,
+    InvalidCursor,
+    LogQuery,
+    LogSearch,
+    MemoryPageCache,
+    RedisPageCache,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+
+
+def _not_found(message):
+    meta = ApiResponseMeta(404, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200))
+    return NotFoundError(message, meta, {})
+
+
+class FakeElasticsearch:
+    """The PIT, search_after and term/range subset of the client that ElasticsearchStore uses"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.pits = {}
+        self.searches = 0
+        self.opened = 0
+
+    def open_point_in_time(self, index, keep_alive, ignore_unavailable):
+        self.opened += 1
+        pit = f"pit-{self.opened}"
+        self.pits[pit] = list(self.documents)
+        return {"id": pit}
+
+    def close_point_in_time(self, id):
+        if self.pits.pop(id, None) is None:
+            raise _not_found("no such pit")
+
+    def search(self, pit, size, search_after, track_total_hits, query, sort):
+        self.searches += 1
+        if pit["id"] not in self.pits:
+            raise _not_found("search_context_missing_exception")
+        descending = sort[0]["@timestamp"]["order"] == "desc"
+        matched = []
+        for shard_doc, doc in enumerate(self.pits[pit["id"]]):
+            if self._matches(doc, query["bool"]["filter"]):
+                matched.append(([doc["@timestamp"], shard_doc], doc))
+        matched.sort(key=lambda entry: entry[0], reverse=descending)
+        if search_after is not None:
+            matched = [
+                entry
+                for entry in matched
+                if (entry[0] < search_after if descending else entry[0] > search_after)
+            ]
+        hits = [
+            {"_index": "sysmon-2023.11.14", "_id": doc["id"], "_source": doc, "sort": key}
+            for key, doc in matched[:size]
+        ]
+        total = {"value": len(matched) if track_total_hits else 0}
+        return _Response({"pit_id": pit["id"], "hits": {"total": total, "hits": hits}})
+
+    @staticmethod
+    def _matches(doc, filters):
+        for clause in filters:
+            if "term" in clause:
+                ((name, value),) = clause["term"].items()
+                if doc.get(name) != value:
+                    return False
+            else:
+                span = clause["range"]["@timestamp"]
+                if doc["@timestamp"] < span.get("gte", float("-inf")):
+                    return False
+                if doc["@timestamp"] > span.get("lte", float("inf")):
+                    return False
+        return True
+
+
+def _documents(count=2500, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"doc-{n}",
+            "@timestamp": 1_700_000_000_000 + rng.randrange(100_000),
+            "vm_id": f"vm-{rng.randrange(3)}",
+            "severity": rng.choice(("low", "high")),
+        }
+        for n in range(count)
+    ]
+
+
+def _walk(search, query):
+    page = search.search(query)
+    pages = [page]
+    while page["next_cursor"] is not None:
+        page = search.search(cursor=page["next_cursor"])
+        pages.append(page)
+    return pages
+
+
+@pytest.mark.parametrize("order", ["desc", "asc"])
+def test_cursor_pages_walk_the_whole_result_once(order):
+    documents = _documents()
+    client = FakeElasticsearch(documents)
+    search = LogSearch(ElasticsearchStore(client))
+    query = LogQuery.build(None, vm_id="vm-1", severity="high", order=order, size=100)
+    pages = _walk(search, query)
+    expected = sorted(
+        (doc for doc in documents if doc["vm_id"] == "vm-1" and doc["severity"] == "high"),
+        key=lambda doc: (doc["@timestamp"], documents.index(doc)),
+        reverse=order == "desc",
+    )
+    ids = [result["_id"] for page in pages for result in page["results"]]
+    assert ids == [doc["id"] for doc in expected]
+    assert {page["total"] for page in pages} == {len(expected)}
+    # One PIT for the whole walk
+    assert client.opened == 1
+
+
+def test_repeated_search_is_served_from_the_cache():
+    client = FakeElasticsearch(_documents(500))
+    search = LogSearch(ElasticsearchStore(client), MemoryPageCache(16, 30))
+    query = LogQuery.build(None, size=50)
+    first = search.search(query)
+    calls = client.searches
+    again = search.search(query)
+    assert again["cached"] and not first["cached"]
+    assert again["results"] == first["results"]
+    assert client.searches == calls
+
+
+def test_redis_page_cache_is_shared_between_replicas():
+    redis_client = fakeredis.FakeRedis()
+    client = FakeElasticsearch(_documents(500))
+    replicas = [
+        LogSearch(ElasticsearchStore(client), RedisPageCache(redis_client, 30)) for _ in range(2)
+    ]
+    query = LogQuery.build(None, vm_id="vm-0", size=20)
+    first = replicas[0].search(query)
+    calls = client.searches
+    second = replicas[1].search(query)
+    assert second["cached"] and second["results"] == first["results"]
+    assert client.searches == calls
+    # The next page from either replica's cursor
+    assert replicas[1].search(cursor=first["next_cursor"])["results"]
+
+
+def test_export_returns_everything_and_closes_its_pit():
+    documents = _documents(2537)
+    client = FakeElasticsearch(documents)
+    search = LogSearch(ElasticsearchStore(client), export_batch=300)
+    exported = list(search.export(LogQuery.build(None, order="asc")))
+    assert len(exported) == len(documents)
+    assert len({doc["_id"] for doc in exported}) == len(documents)
+    assert client.pits == {}
+    assert len(list(search.export(LogQuery.build(None), limit=450))) == 450
+
+
+def test_cursor_query_cannot_be_edited():
+    query = LogQuery.build("zeek", size=100)
+    cursor = encode_cursor(query, "pit-1", [1, 2], 10)
+    assert decode_cursor(cursor) == (query, "pit-1", [1, 2], 10)
+    encoded, signature = cursor.split(".")
+    payload = json.loads(log_search._b64decode(encoded))
+    for field, value in (("index", "*"), ("index", ".security-*"), ("size", 1_000_000)):
+        edited = dict(payload, query={**payload["query"], field: value})
+        raw = json.dumps(edited, separators=(",", ":")).encode()
+        with pytest.raises(InvalidCursor):
+            decode_cursor(f"{log_search._b64encode(raw)}.{signature}")
+    # Signed with another key
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(query, "pit-1", [1, 2], 10, secret="guess"))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encoded)
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"index": "*"},
+        {"index": "sysmon"},
+        {"order": "sideways"},
+        {"size": 0},
+        {"size": 1001},
+        {"size": True},
+        {"q": ["a"]},
+        {"vm_id": {"$ne": 1}},
+        {"start": "yesterday"},
+    ],
+)
+def test_queries_are_checked_however_they_are_built(fields):
+    with pytest.raises(ValueError):
+        LogQuery(**{"index": "sysmon-*", **fields})
+
+
+@pytest.fixture
+def api(monkeypatch):
+    client = FakeElasticsearch(_documents(300))
+    search = LogSearch(ElasticsearchStore(client))
+    monkeypatch.setattr(logs_api, "shared_search", lambda: search)
+    app = FastAPI()
+    app.include_router(logs_api.router, prefix="/logs")
+    return TestClient(app), client
+
+
+def test_search_endpoint_pages_and_error_codes(api):
+    http, client = api
+    first = http.get("/logs/search", params={"size": 100}).json()
+    second = http.get("/logs/search", params={"cursor": first["next_cursor"]}).json()
+    assert len(first["results"]) == len(second["results"]) == 100
+    assert http.get("/logs/search", params={"cursor": "garbage"}).status_code == 400
+    assert http.get("/logs/search", params={"source": "../etc"}).status_code == 400
+    client.pits.clear()
+    assert http.get("/logs/search", params={"cursor": second["next_cursor"]}).status_code == 410
+
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("connection refused")
+
+    client.open_point_in_time = unreachable
+    assert http.get("/logs/search", params={"vm_id": "vm-2"}).status_code == 503
+
+
+def test_expired_pit_raises_cursor_expired():
+    client = FakeElasticsearch(_documents(50))
+    store = ElasticsearchStore(client)
+    pit = store.open_pit("sysmon-*")
+    store.close_pit(pit)
+    with pytest.raises(CursorExpired):
+        store.page(LogQuery.build(None), pit, None, 10, True)
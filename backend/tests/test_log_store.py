@@ -0,0 +1,188 @@
+import os
+import random
+import shutil
+
+import pytest
+
+from app.services import log_store
+from app.services.log_search import LogQuery
+from app.services.log_store import EmbeddedLogStore
+
+
+def _documents(count, seed=0):
+    rng = random.Random(seed)
+    start = 1_700_000_000
+    docs = []
+    for n in range(count):
+        # Whole seconds, so many documents share a timestamp and the key breaks ties
+        docs.append(
+            {
+                "@timestamp": start + rng.randrange(600),
+                "event_id": str(rng.choice((1, 3, 11))),
+                "vm_id": f"vm-{rng.randrange(4)}",
+                "command_line": rng.choice(("cmd.exe /c whoami", "powershell -enc AAA", "")),
+                "seq": n,
+            }
+        )
+    return docs
+
+
+def _fill(store, docs, flush_every):
+    for n, doc in enumerate(docs, 1):
+        store.add("sysmon-2023.11.14", doc)
+        if n % flush_every == 0:
+            store.flush()
+    store.flush()
+
+
+def _walk(store, query, pit=None, size=37):
+    pit = pit or store.open_pit(query.index)
+    after, hits = None, []
+    while True:
+        page = store.page(query, pit, after, size, track_total=after is None)["hits"]["hits"]
+        if not page:
+            return hits
+        hits.extend((hit["_id"], hit["sort"], hit["_source"]["seq"]) for hit in page)
+        after = page[-1]["sort"]
+
+
+def _segment_files(path):
+    return sorted(name for name in os.listdir(path) if log_store.SEGMENT_PATTERN.match(name))
+
+
+QUERIES = [
+    LogQuery.build(None),
+    LogQuery.build(None, order="asc"),
+    LogQuery.build(None, q="event_id:3 whoami", vm_id="vm-1"),
+    LogQuery.build(None, start=1_700_000_100, end=1_700_000_300, order="asc"),
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_merged_segments_return_the_same_pages(tmp_path, query):
+    docs = _documents(3000)
+    plain = EmbeddedLogStore(str(tmp_path / "plain"), segment_docs=50, merge_factor=1)
+    merged = EmbeddedLogStore(str(tmp_path / "merged"), segment_docs=50, merge_factor=4)
+    _fill(plain, docs, 50)
+    _fill(merged, docs, 50)
+    assert len(_segment_files(plain.path)) == 60
+    # 60 segments of 50 docs: 3 of 800, 3 of 200 (tiers 2 and 1)
+    assert len(_segment_files(merged.path)) == 6
+    assert _walk(merged, query) == _walk(plain, query)
+    total = merged.page(query, merged.open_pit(query.index), None, 1, True)["hits"]["total"]
+    assert total == plain.page(query, plain.open_pit(query.index), None, 1, True)["hits"]["total"]
+
+
+def test_pit_and_cursor_survive_merges(tmp_path):
+    docs = _documents(1000, seed=1)
+    plain = EmbeddedLogStore(str(tmp_path / "plain"), segment_docs=50, merge_factor=1)
+    merged = EmbeddedLogStore(str(tmp_path / "merged"), segment_docs=50, merge_factor=4)
+    query = LogQuery.build(None)
+    expected = []
+    for store in (plain, merged):
+        _fill(store, docs[:150], 50)
+        pit = store.open_pit(query.index)
+        first = store.page(query, pit, None, 40, True)["hits"]["hits"]
+        # Published after the PIT: merged together with the PIT's segments
+        _fill(store, docs[150:], 50)
+        rest = _walk(store, query, pit)
+        rest = [hit for hit in rest if hit[1] < first[-1]["sort"]]
+        hits = [(hit["_id"], hit["sort"], hit["_source"]["seq"]) for hit in first] + rest
+        expected.append(hits)
+    assert len(_segment_files(merged.path)) < 10
+    assert expected[1] == expected[0]
+    assert sorted(seq for _, _, seq in expected[1]) == list(range(150))
+
+
+def test_cursor_pages_stay_consistent_across_a_merge(tmp_path):
+    store = EmbeddedLogStore(str(tmp_path), segment_docs=50, merge_factor=4)
+    docs = _documents(600, seed=2)
+    _fill(store, docs[:150], 50)
+    query = LogQuery.build(None, order="asc")
+    pit = store.open_pit(query.index)
+    before = _walk(store, query, pit)
+    page = store.page(query, pit, None, 70, True)["hits"]["hits"]
+    _fill(store, docs[150:], 50)
+    after = page[-1]["sort"]
+    seen = [(hit["_id"], hit["sort"], hit["_source"]["seq"]) for hit in page]
+    while True:
+        page = store.page(query, pit, after, 70, False)["hits"]["hits"]
+        if not page:
+            break
+        seen.extend((hit["_id"], hit["sort"], hit["_source"]["seq"]) for hit in page)
+        after = page[-1]["sort"]
+    assert seen == before
+
+
+def test_readers_of_merged_segments_are_closed(tmp_path):
+    store = EmbeddedLogStore(str(tmp_path), segment_docs=50, merge_factor=4)
+    _fill(store, _documents(150, seed=3), 50)
+    held = store._acquire(int(store.open_pit("sysmon-*")))
+    assert len(held) == 3
+    _fill(store, _documents(50, seed=4), 50)
+    assert _segment_files(store.path) == ["segment-0000000001-0000000004.rrl"]
+    store._release(store._acquire(4))
+    # Still in use by a search: unmapped only when it lets go
+    assert not any(reader._mm.closed for _, _, reader in held)
+    store._release(held)
+    assert all(reader._mm.closed for _, _, reader in held)
+    assert list(store._readers) == ["segment-0000000001-0000000004.rrl"]
+
+
+def test_segment_listing_is_cached_until_the_directory_changes(tmp_path, monkeypatch):
+    store = EmbeddedLogStore(str(tmp_path), segment_docs=50, merge_factor=1)
+    _fill(store, _documents(200, seed=5), 50)
+    quiet = os.stat(store.path).st_mtime_ns - 10 * log_store._QUIET_NS
+    os.utime(store.path, ns=(quiet, quiet))
+    listings = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listings.append(path) or listdir(path))
+    query = LogQuery.build(None)
+    for _ in range(5):
+        _walk(store, query)
+    assert len(listings) == 1
+    _fill(store, _documents(50, seed=6), 50)
+    assert len(_walk(store, query)) == 250
+
+
+def test_sources_left_by_an_interrupted_merge_are_hidden(tmp_path):
+    store = EmbeddedLogStore(str(tmp_path / "store"), segment_docs=50, merge_factor=1)
+    _fill(store, _documents(200, seed=7), 50)
+    query = LogQuery.build(None)
+    expected = _walk(store, query)
+    backup = tmp_path / "backup"
+    shutil.copytree(store.path, backup)
+    store.merge_factor = 4
+    assert store.merge() == 1
+    # As if the merging process died after linking the merged segment
+    for name in _segment_files(backup):
+        shutil.copy(backup / name, tmp_path / "store" / name)
+    store._listed = None
+    assert _walk(store, query) == expected
+    store.merge_factor = 2
+    _fill(store, _documents(100, seed=8), 50)
+    assert all("-" in name[len("segment-") :] for name in _segment_files(store.path))
+
+
+def test_documents_with_a_stored_id_are_dropped(tmp_path):
+    store = EmbeddedLogStore(str(tmp_path), segment_docs=50, merge_factor=4)
+    docs = _documents(400, seed=9)
+    for n, doc in enumerate(docs[:300]):
+        store.add("sysmon-2023.11.14", doc, doc_id=f"doc-{n}")
+    store.flush()
+    # Again across segments (merged by now), twice within one batch, and new ones
+    for n in [*range(250, 391), 390, 389, *range(391, 400)]:
+        store.add("sysmon-2023.11.14", {**docs[n], "replayed": True}, doc_id=f"doc-{n}")
+    # Documents without an id are never taken for duplicates
+    for doc in docs[:10]:
+        store.add("sysmon-2023.11.14", doc)
+    store.flush()
+    hits = _walk(store, LogQuery.build(None), size=100)
+    assert len(hits) == 410
+    by_id = {hit_id: seq for hit_id, _, seq in hits if hit_id.startswith("doc-")}
+    assert by_id == {f"doc-{n}": n for n in range(400)}
+    assert store.stats.indexed == 462 and store.stats.failed == 0
+    page = store.page(LogQuery.build(None), store.open_pit("sysmon-*"), None, 1000, False)
+    replayed = [hit["_id"] for hit in page["hits"]["hits"] if hit["_source"].get("replayed")]
+    # The first copy is kept
+    assert sorted(replayed) == sorted(f"doc-{n}" for n in range(300, 400))
@@ -0,0 +1,50 @@
+import socket
+import struct
+
+import pytest
+from replay.pcap_reader import PcapReader
+
+_GLOBAL_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+_ETH_IPV6 = b"\x02\x00\x00\x00\x00\x01" b"\x02\x00\x00\x00\x00\x02" b"\x86\xdd"
+_SRC6 = socket.inet_pton(socket.AF_INET6, "2001:db8::1")
+_DST6 = socket.inet_pton(socket.AF_INET6, "2001:db8::2")
+
+
+def _ipv6_frame(payload, next_header, hop_by_hop=False):
+    if hop_by_hop:
+        payload = struct.pack("!BB6x", next_header, 0) + payload
+        next_header = 0
+    header = struct.pack("!IHBB16s16s", 6 << 28, len(payload), next_header, 64, _SRC6, _DST6)
+    return _ETH_IPV6 + header + payload
+
+
+def _fragment(offset, more, proto, payload):
+    header = struct.pack("!BBHI", proto, 0, offset << 3 | more, 0x1234)
+    return header + payload
+
+
+def _write(path, frames):
+    with open(path, "wb") as f:
+        f.write(_GLOBAL_HEADER)
+        for n, frame in enumerate(frames):
+            f.write(struct.pack("<IIII", 1_700_000_000 + n, 0, len(frame), len(frame)))
+            f.write(frame)
+
+
+@pytest.mark.parametrize("hop_by_hop", [False, True])
+def test_only_first_ipv6_fragments_are_parsed_for_ports(tmp_path, hop_by_hop):
+    udp = struct.pack("!HHHH", 5353, 53, 8 + 24, 0) + b"q" * 24
+    # A later fragment whose data happens to start like a UDP header
+    later = struct.pack("!HHHH", 1111, 2222, 0, 0) + b"r" * 16
+    frames = [
+        _ipv6_frame(_fragment(0, 1, 17, udp), 44, hop_by_hop),
+        _ipv6_frame(_fragment(4, 0, 17, later), 44, hop_by_hop),
+        _ipv6_frame(udp, 17, hop_by_hop),
+    ]
+    _write(tmp_path / "frag.pcap", frames)
+    with PcapReader(str(tmp_path / "frag.pcap")) as reader:
+        packets = [
+            (packet.protocol, packet.source_port, packet.dest_port, packet.payload_size)
+            for packet in reader
+        ]
+    assert packets == [("UDP", 5353, 53, 24), ("UDP", 0, 0, 24), ("UDP", 5353, 53, 24)]
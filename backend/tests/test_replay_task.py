@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from replay.synthetic import write_synthetic_pcap
+
+from app.core.config import settings
+from app.services import replays
+from app.workers.tasks import replay_process_pcap_task
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    path = tmp_path / "replays"
+    monkeypatch.setattr(settings, "REPLAY_OUTPUT_DIR", str(path))
+    return path
+
+
+def test_same_named_captures_get_their_own_replays(tmp_path, output_dir):
+    captures = []
+    for sensor, flows in (("sensor-a", 20), ("sensor-b", 30)):
+        os.makedirs(tmp_path / sensor)
+        captures.append(str(tmp_path / sensor / "capture.pcap"))
+        write_synthetic_pcap(captures[-1], packets=300, flows=flows, protocol_mix={"tcp": 1.0})
+    first, second = (replay_process_pcap_task(path, workers=1) for path in captures)
+    assert first["replay_id"] != second["replay_id"]
+    assert first["replay_id"].startswith("capture-")
+    assert sorted(os.listdir(output_dir)) == sorted(
+        f"{result['replay_id']}.rrp" for result in (first, second)
+    )
+    # One event per flow: each replay is its own capture's
+    assert (first["events"], second["events"]) == (20, 30)
+    # Processing a capture again replaces its own replay
+    assert replay_process_pcap_task(captures[0], workers=1)["replay_id"] == first["replay_id"]
+    assert len(os.listdir(output_dir)) == 2
+    assert replays.replay_path(first["replay_id"]) == first["replay_file"]
+
+
+def test_replay_id_can_be_given(tmp_path, output_dir):
+    capture = str(tmp_path / "capture.pcap")
+    write_synthetic_pcap(capture, packets=100, flows=5)
+    result = replay_process_pcap_task(capture, workers=1, replay_id="run-42")
+    assert result["replay_file"] == str(output_dir / "run-42.rrp")
+    with pytest.raises(ValueError):
+        replay_process_pcap_task(capture, workers=1, replay_id="../run-42")
+
+
+def test_replay_ids_are_valid_for_any_file_name():
+    for path in ("/data/my capture (1).pcapng", "/x/.hidden.pcap", "/x/-.pcap", "relative.pcap"):
+        assert replays.REPLAY_ID_PATTERN.match(replays.replay_id_for(path))
+    assert replays.replay_id_for("relative.pcap") == replays.replay_id_for(
+        os.path.abspath("relative.pcap")
+    )
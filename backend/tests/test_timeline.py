@@ -0,0 +1,155 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+from replay.columnar import ReplayReader, ReplayWriter
+from replay.timeline import Timeline, TimelineBuilder
+
+
+def _events(count=20_000, start=1_700_000_000.0, span=4 * 3600, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        # Bursty: most events fall in a few busy minutes, with quiet gaps between
+        if rng.random() < 0.7:
+            minute = rng.choice((5, 17, 90, 200))
+            ts = start + minute * 60 + rng.uniform(0, 60)
+        else:
+            ts = start + rng.uniform(0, span)
+        events.append((ts, rng.randrange(40, 1500)))
+    return events
+
+
+def _build(events, base_width=1.0, factor=4):
+    builder = TimelineBuilder(base_width, factor)
+    for ts, volume in events:
+        builder.add(ts, volume)
+    return builder.levels()
+
+
+def _raw_buckets(events, width):
+    counts, volumes = Counter(), Counter()
+    for ts, volume in events:
+        index = math.floor(ts / width)
+        counts[index] += 1
+        volumes[index] += volume
+    return counts, volumes
+
+
+def test_every_level_sums_to_the_raw_events():
+    events = _events()
+    levels = _build(events)
+    assert len(levels[-1]) == 1
+    for level in levels:
+        assert sum(level.counts) == len(events)
+        assert sum(level.volumes) == sum(volume for _, volume in events)
+
+
+def test_every_bucket_equals_the_raw_events_it_covers():
+    events = _events(seed=1)
+    for level in _build(events, base_width=0.5, factor=3):
+        counts, volumes = _raw_buckets(events, level.width)
+        assert [level.index(i) for i in range(len(level))] == sorted(counts)
+        for i in range(len(level)):
+            assert level.counts[i] == counts[level.index(i)]
+            assert level.volumes[i] == volumes[level.index(i)]
+
+
+def test_outlier_timestamp_does_not_allocate_the_span():
+    # pcapng simple packet blocks and events without a time come out as 0.0
+    events = _events(count=1000) + [(0.0, 60)]
+    levels = _build(events)
+    assert sum(len(level) for level in levels) < 4 * len(events)
+    assert levels[0].index(0) == 0
+    assert all(sum(level.counts) == len(events) for level in levels)
+
+
+@pytest.mark.parametrize("max_points", [3, 50, 500, 5000])
+def test_ranged_bucket_totals_match_raw_events(max_points):
+    events = _events(seed=2)
+    timeline = Timeline(_build(events))
+    start, end = 1_700_000_000.0 + 600, 1_700_000_000.0 + 9000
+    result = timeline.buckets(start, end, max_points)
+    width = result["bucket_seconds"]
+    assert len(result["points"]) <= max_points
+    # Buckets overlapping the range, whole: the raw events in those buckets
+    covered = [
+        (ts, volume)
+        for ts, volume in events
+        if math.floor(start / width) <= math.floor(ts / width) <= math.floor(end / width)
+    ]
+    assert result["total_events"] == len(covered)
+    assert result["total_bytes"] == sum(volume for _, volume in covered)
+
+
+def test_unbounded_buckets_cover_everything():
+    events = _events(seed=3)
+    result = Timeline(_build(events)).buckets(max_points=100)
+    assert result["total_events"] == len(events)
+    assert result["total_bytes"] == sum(volume for _, volume in events)
+
+
+@pytest.mark.parametrize("metric", ["events", "bytes"])
+def test_downsample_keeps_bounds_and_gaps(metric):
+    events = _events(seed=4)
+    timeline = Timeline(_build(events))
+    result = timeline.downsample(max_points=200, metric=metric)
+    points = result["points"]
+    assert 3 <= len(points) <= 200
+    xs = [x for x, _ in points]
+    assert xs == sorted(xs)
+    # First and last busy buckets are always kept
+    level = timeline.levels[result["level"]]
+    width = result["bucket_seconds"]
+    assert xs[0] == (level.index(0) + 0.5) * width
+    assert xs[-1] == (level.index(len(level) - 1) + 0.5) * width
+
+
+def test_downsample_draws_quiet_stretches_down_to_zero():
+    start = 1_700_000_000.0
+    # Two bursts an hour apart and nothing in between
+    events = [(start + i * 0.5, 100) for i in range(600)]
+    events += [(start + 3900 + i * 0.5, 100) for i in range(600)]
+    timeline = Timeline(_build(events))
+    points = timeline.downsample(max_points=100)["points"]
+    quiet = [y for x, y in points if start + 300 < x < start + 3900]
+    assert quiet and all(y == 0 for y in quiet)
+    assert sum(1 for _, y in points if y > 0) >= 2
+
+
+def test_downsample_rates_match_bucket_totals():
+    events = _events(seed=5)
+    timeline = Timeline(_build(events))
+    result = timeline.downsample(max_points=100_000)
+    level = timeline.levels[result["level"]]
+    kept = {x: y for x, y in result["points"]}
+    for i in range(len(level)):
+        x = (level.index(i) + 0.5) * level.width
+        assert kept[x] == level.counts[i] / level.width
+
+
+def test_replay_file_round_trip(tmp_path):
+    events = _events(count=5000, seed=6)
+    path = str(tmp_path / "timeline.rrp")
+    with ReplayWriter(path, chunk_size=1000) as writer:
+        for ts, volume in events:
+            writer.write(
+                {
+                    "timestamp": ts,
+                    "source_ip": "10.0.0.1",
+                    "dest_ip": "10.0.0.2",
+                    "source_port": 1234,
+                    "dest_port": 443,
+                    "protocol": "TCP",
+                    "bytes": volume,
+                }
+            )
+    timeline = ReplayReader(path).timeline()
+    built = _build(events)
+    assert len(timeline.levels) == len(built)
+    for stored, level in zip(timeline.levels, built):
+        assert list(stored.indexes) == list(level.indexes)
+        assert list(stored.counts) == list(level.counts)
+        assert list(stored.volumes) == list(level.volumes)
+    assert timeline.buckets(max_points=100)["total_events"] == len(events)
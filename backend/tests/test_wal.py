@@ -0,0 +1,181 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from app.services.bulk import BulkStats
+from app.services.log_search import LogQuery
+from app.services.log_store import EmbeddedLogStore
+from app.services.wal import WALDrainer, WriteAheadLog, read_records
+
+TORN_FRAME = b"\x10\x00\x00\x00\xde\xad"
+
+
+class MemoryStore:
+    """Keeps documents by id, like an index; ``down`` makes every flush fail as unavailable"""
+
+    def __init__(self):
+        self.documents = {}
+        self.stats = BulkStats()
+        self.down = False
+        self.crash_after_flush = False
+        self._pending = []
+
+    def add(self, index, document, doc_id=None):
+        self._pending.append((doc_id, document))
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        if self.down:
+            self.stats.failed += len(pending)
+            self.stats.unavailable += len(pending)
+            return self.stats
+        for doc_id, document in pending:
+            self.documents[doc_id] = document
+        self.stats.indexed += len(pending)
+        if self.crash_after_flush:
+            raise KeyboardInterrupt("drainer killed before checkpoint")
+        return self.stats
+
+
+def _event(number):
+    return {
+        "@timestamp": "2024-01-01T00:00:00Z",
+        "seq": number,
+        "vm_id": f"vm-{number % 8}",
+        "command_line": f"powershell.exe -nop -c Get-Process -Id {number}",
+    }
+
+
+def _readable(wal):
+    return [
+        doc["seq"]
+        for number in wal.segments()
+        for _, _, _, doc in read_records(wal.segment_path(number))
+    ]
+
+
+_WRITER = """
+import sys
+from app.services.wal import WriteAheadLog
+wal = WriteAheadLog(sys.argv[1], segment_bytes=64 * 1024, fsync="never")
+number = 0
+while True:
+    wal.append(("logs-x", {"seq": n, "pad": "x" * 200}) for n in range(number, number + 50))
+    number += 50
+    print(number, flush=True)
+"""
+
+
+def test_sigkilled_writer_loses_no_acknowledged_record(tmp_path):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    writer = subprocess.Popen(
+        [sys.executable, "-c", _WRITER, str(tmp_path)], stdout=subprocess.PIPE, text=True, env=env
+    )
+    acknowledged = 0
+    for line in writer.stdout:
+        acknowledged = int(line)
+        if acknowledged >= 2000:
+            break
+    writer.send_signal(signal.SIGKILL)
+    writer.wait()
+    writer.stdout.close()
+    # As if the kill had landed mid-write as well
+    wal = WriteAheadLog(str(tmp_path), fsync="never")
+    tail = wal.segment_path(wal.segments()[-1])
+    with open(tail, "ab") as f:
+        f.write(TORN_FRAME)
+    size = os.path.getsize(tail)
+    wal = WriteAheadLog(str(tmp_path), fsync="never")
+    assert size - os.path.getsize(tail) >= len(TORN_FRAME)
+    recovered = _readable(wal)
+    assert len(wal.segments()) > 1
+    assert recovered == list(range(len(recovered)))
+    assert len(recovered) >= acknowledged
+
+
+def test_running_writers_truncate_a_torn_frame(tmp_path):
+    # Both writers are open (and have checked the tail) before a third one dies mid-record
+    writers = [WriteAheadLog(str(tmp_path), segment_bytes=64 * 1024, fsync="never") for _ in "ab"]
+    seq = 0
+    for _ in range(20):
+        for wal in writers:
+            wal.append(("logs-x", _event(n)) for n in range(seq, seq + 10))
+            seq += 10
+    torn_segment = writers[0].segments()[-1]
+    with open(writers[0].segment_path(torn_segment), "ab") as f:
+        f.write(TORN_FRAME)
+    # Enough afterwards to seal the torn segment and move on to the next
+    for _ in range(300):
+        for wal in writers:
+            wal.append(("logs-x", _event(n)) for n in range(seq, seq + 10))
+            seq += 10
+    assert writers[0].segments()[-1] > torn_segment
+    assert _readable(writers[0]) == list(range(seq))
+    store = MemoryStore()
+    result = WALDrainer(writers[0], store, batch=500).drain()
+    assert sorted(doc["seq"] for doc in store.documents.values()) == list(range(seq))
+    assert result["pending_bytes"] == 0
+
+
+def test_drainer_crash_before_checkpoint_replays_under_the_same_ids(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), segment_bytes=64 * 1024, fsync="never")
+    wal.append(("logs-x", _event(n)) for n in range(5000))
+    store = MemoryStore()
+    store.crash_after_flush = True
+    with pytest.raises(KeyboardInterrupt):
+        WALDrainer(wal, store, batch=500).drain()
+    assert WALDrainer(wal, store).checkpoint() == (0, 0)
+    store.crash_after_flush = False
+    result = WALDrainer(wal, store, batch=500).drain()
+    assert sorted(doc["seq"] for doc in store.documents.values()) == list(range(5000))
+    # The first batch was sent twice
+    assert store.stats.indexed == 5500
+    assert result["pending_bytes"] == 0
+
+
+def test_embedded_store_keeps_one_copy_of_a_replayed_batch(tmp_path, monkeypatch):
+    wal = WriteAheadLog(str(tmp_path / "wal"), segment_bytes=64 * 1024, fsync="never")
+    wal.append(("sysmon-2024.01.01", _event(n)) for n in range(3000))
+    store = EmbeddedLogStore(str(tmp_path / "logs"), segment_docs=400, merge_factor=3)
+
+    def killed(self, segment, offset):
+        raise KeyboardInterrupt("drainer killed before checkpoint")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(WALDrainer, "_save_checkpoint", killed)
+        with pytest.raises(KeyboardInterrupt):
+            WALDrainer(wal, store, batch=700).drain()
+    result = WALDrainer(wal, store, batch=700).drain()
+    assert result["pending_bytes"] == 0
+    query = LogQuery.build(None, size=1000)
+    pit = store.open_pit(query.index)
+    after, hits = None, []
+    while True:
+        page = store.page(query, pit, after, 1000, after is None)
+        if not page["hits"]["hits"]:
+            break
+        if after is None:
+            assert page["hits"]["total"]["value"] == 3000
+        hits.extend(page["hits"]["hits"])
+        after = hits[-1]["sort"]
+    assert sorted(hit["_source"]["seq"] for hit in hits) == list(range(3000))
+    assert len({hit["_id"] for hit in hits}) == 3000
+
+
+def test_store_outage_holds_the_checkpoint(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), segment_bytes=64 * 1024, fsync="never")
+    drainer = WALDrainer(wal, MemoryStore(), batch=500)
+    drainer.store.down = True
+    wal.append(("logs-x", _event(n)) for n in range(3000))
+    first = wal.segments()[0]
+    stalled = drainer.drain()
+    assert stalled["status"] == "stalled" and stalled["drained"] == 0
+    assert stalled["checkpoint"] == [first, 0] and stalled["pending_bytes"] > 0
+    wal.append(("logs-x", _event(n)) for n in range(3000, 6000))
+    drainer.store.down = False
+    result = drainer.drain()
+    assert sorted(doc["seq"] for doc in drainer.store.documents.values()) == list(range(6000))
+    assert result["status"] == "drained" and result["pending_bytes"] == 0
@@ -0,0 +1 @@
+"""RetroRange PCAP replay engine"""
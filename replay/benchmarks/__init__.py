@@ -0,0 +1 @@
+"""Replay engine benchmarks (run with ``python -m replay.benchmarks.<name>``)"""
@@ -0,0 +1,51 @@
+"""
+Parallel Decode Scaling Benchmark
+Times flow aggregation at 1/2/4/8 workers and checks every run against the
+serial output
+
+Usage: python -m replay.benchmarks.parallel [--packets N] [--flows N] [--workers 1,2,4,8]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from replay.flows import aggregate_flows
+from replay.parallel import parallel_flows
+from replay.pcap_reader import PcapReader
+from replay.synthetic import write_synthetic_pcap
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=2_000_000)
+    parser.add_argument("--flows", type=int, default=20_000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pcap")
+        write_synthetic_pcap(path, packets=args.packets, flows=args.flows)
+        print(f"capture: {args.packets:,} packets, {os.path.getsize(path) / 2**20:.1f} MiB")
+        print(f"cpus: {os.cpu_count()}")
+
+        start = time.perf_counter()
+        with PcapReader(path) as reader:
+            expected = [flow.to_event() for flow in aggregate_flows(reader.packets())]
+        serial = time.perf_counter() - start
+        print(f"serial:    {args.packets / serial:>12,.0f} packets/sec  {serial:6.2f}s")
+
+        for workers in (int(w) for w in args.workers.split(",")):
+            start = time.perf_counter()
+            events = [flow.to_event() for flow in parallel_flows(path, workers=workers)]
+            elapsed = time.perf_counter() - start
+            status = "identical" if events == expected else "MISMATCH"
+            print(
+                f"workers={workers}: {args.packets / elapsed:>12,.0f} packets/sec  "
+                f"{elapsed:6.2f}s  x{serial / elapsed:.2f}  {status}"
+            )
+
+
+if __name__ == "__main__":
+    main()
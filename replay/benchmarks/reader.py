@@ -0,0 +1,57 @@
+"""
+PCAP Reader Throughput Benchmark
+Times PcapReader and PCAPProcessor on a synthetic capture
+
+Usage: python -m replay.benchmarks.reader [--packets N] [--flows N]
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from replay.pcap_processor import PCAPProcessor
+from replay.pcap_reader import PcapReader
+from replay.synthetic import write_synthetic_pcap
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB (Linux reports KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=1_000_000)
+    parser.add_argument("--flows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pcap")
+        write_synthetic_pcap(path, packets=args.packets, flows=args.flows)
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"capture: {args.packets:,} packets, {size_mb:.1f} MiB")
+        rss_before = peak_rss_mb()
+
+        start = time.perf_counter()
+        with PcapReader(path) as reader:
+            decoded = sum(1 for _ in reader.packets())
+        elapsed = time.perf_counter() - start
+        print(f"PcapReader.packets:      {decoded / elapsed:>12,.0f} packets/sec")
+
+        start = time.perf_counter()
+        sum(1 for _ in PCAPProcessor(path).packet_events())
+        elapsed = time.perf_counter() - start
+        print(f"packet_events:           {decoded / elapsed:>12,.0f} packets/sec")
+
+        start = time.perf_counter()
+        flows = sum(1 for _ in PCAPProcessor(path).process())
+        elapsed = time.perf_counter() - start
+        print(f"process (flows):         {decoded / elapsed:>12,.0f} packets/sec ({flows:,} flows)")
+
+        print(f"peak RSS: {peak_rss_mb():.1f} MiB (before reading: {rss_before:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
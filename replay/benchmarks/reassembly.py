@@ -0,0 +1,58 @@
+"""
+TCP Reassembly Benchmark
+Times TCPReassembler on a synthetic capture under a given memory budget
+
+Usage: python -m replay.benchmarks.reassembly [--packets N] [--flows N]
+                                              [--budget-mb N] [--stream-cap-kb N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from replay.benchmarks.reader import peak_rss_mb
+from replay.pcap_reader import PcapReader
+from replay.reassembly import TCPReassembler
+from replay.synthetic import write_synthetic_pcap
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=1_000_000)
+    parser.add_argument("--flows", type=int, default=10_000)
+    parser.add_argument("--budget-mb", type=int, default=64)
+    parser.add_argument("--stream-cap-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pcap")
+        write_synthetic_pcap(path, packets=args.packets, flows=args.flows)
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"capture: {args.packets:,} packets, {size_mb:.1f} MiB")
+        rss_before = peak_rss_mb()
+
+        reassembler = TCPReassembler(
+            memory_budget=args.budget_mb * 2**20, stream_cap=args.stream_cap_kb * 1024
+        )
+        streams = payload = 0
+        start = time.perf_counter()
+        with PcapReader(path) as reader:
+            for packet in reader.packets():
+                for stream in reassembler.add(packet):
+                    streams += 1
+                    payload += stream.size
+        for stream in reassembler.flush():
+            streams += 1
+            payload += stream.size
+        elapsed = time.perf_counter() - start
+
+        print(f"reassembly:   {args.packets / elapsed:>12,.0f} packets/sec")
+        print(f"              {payload / elapsed / 2**20:>12,.1f} MiB/sec payload")
+        print(f"streams: {streams:,} ({reassembler.evicted:,} evicted by the memory budget)")
+        print(f"peak buffered: {reassembler.peak_buffered / 2**20:.1f} MiB")
+        print(f"peak RSS: {peak_rss_mb():.1f} MiB (before reassembly: {rss_before:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Replay Benchmark Suite
+Generates a deterministic synthetic capture and times the replay pipeline
+stages, writing packets/sec, events/sec and peak memory as JSON for CI
+
+Usage: python -m replay.benchmarks.suite [--packets N] [--flows N]
+           [--mix http=0.3,dns=0.2,...] [--out-of-order 0.01]
+           [--output results.json] [--baseline previous.json --tolerance 0.25]
+
+Each stage runs in a fresh worker process, so its peak RSS is its own, and
+reports the best of --repeat runs to keep timings stable on shared runners.
+With --baseline the run exits non-zero when any stage's packets/sec falls
+more than --tolerance below the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from replay.benchmarks.reader import peak_rss_mb
+from replay.columnar import ReplayReader
+from replay.pcap_processor import PCAPProcessor
+from replay.pcap_reader import PcapReader
+from replay.synthetic import DEFAULT_PROTOCOL_MIX, write_synthetic_pcap
+
+STAGES = ("process", "correlate", "generate_replay", "payload_events")
+
+
+def host_events_for(pcap_path: str) -> List[Dict]:
+    """Sysmon process-create / network-connect pairs for every other flow"""
+    events = []
+    for n, flow in enumerate(PCAPProcessor(pcap_path).process()):
+        if n % 2:
+            continue
+        timestamp = flow["timestamp"] + "Z"
+        pid = 1000 + n % 30000
+        computer = f"WS{n % 64:02d}"
+        events.append(
+            {
+                "@timestamp": timestamp,
+                "event_id": 1,
+                "computer_name": computer,
+                "process_id": pid,
+                "image": "C:\\Windows\\System32\\svchost.exe",
+                "command_line": "svchost.exe -k netsvcs",
+            }
+        )
+        events.append(
+            {
+                "@timestamp": timestamp,
+                "event_id": 3,
+                "computer_name": computer,
+                "process_id": pid,
+                "source_ip": flow["source_ip"],
+                "source_port": flow["source_port"],
+                "destination_ip": flow["dest_ip"],
+                "destination_port": flow["dest_port"],
+            }
+        )
+    return events
+
+
+def run_stage(stage: str, pcap_path: str, workdir: str, repeat: int = 1) -> Dict:
+    """Run one stage (in a worker process) and return its measurements"""
+    processor = PCAPProcessor(pcap_path)
+    host_events = host_events_for(pcap_path) if stage == "correlate" else None
+    rss_before = peak_rss_mb()
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if stage == "process":
+            events = sum(1 for _ in processor.process())
+        elif stage == "correlate":
+            events = len(processor.correlate_with_host_events(host_events))
+        elif stage == "generate_replay":
+            output = processor.generate_replay(os.path.join(workdir, "replay.rrp"))
+            with ReplayReader(output) as reader:
+                events = len(reader)
+        elif stage == "payload_events":
+            events = sum(1 for _ in processor.payload_events())
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+        best = min(best, time.perf_counter() - start)
+
+    return {
+        "seconds": round(best, 4),
+        "events": events,
+        "events_per_sec": round(events / best, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_before_mb": round(rss_before, 1),
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Stages whose packets/sec regressed beyond ``tolerance``"""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or not previous.get("packets_per_sec"):
+            continue
+        ratio = current["packets_per_sec"] / previous["packets_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{stage}: {ratio:.0%} of baseline packets/sec")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=200_000)
+    parser.add_argument("--flows", type=int, default=2_000)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_PROTOCOL_MIX)
+    parser.add_argument("--out-of-order", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs per stage")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pcap_path = os.path.join(tmp, "synthetic.pcap")
+        write_synthetic_pcap(
+            pcap_path,
+            packets=args.packets,
+            flows=args.flows,
+            seed=args.seed,
+            protocol_mix=args.mix,
+            out_of_order_rate=args.out_of_order,
+        )
+        with PcapReader(pcap_path) as reader:
+            packets = sum(1 for _ in reader.packets())
+
+        results = {
+            "generated_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "capture": {
+                "packets": packets,
+                "flows": args.flows,
+                "protocol_mix": args.mix,
+                "out_of_order_rate": args.out_of_order,
+                "seed": args.seed,
+                "size_mb": round(os.path.getsize(pcap_path) / 2**20, 2),
+            },
+            "stages": {},
+        }
+        for stage in args.stages.split(","):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                measured = pool.submit(run_stage, stage, pcap_path, tmp, args.repeat).result()
+            measured["packets_per_sec"] = round(packets / measured["seconds"], 1)
+            results["stages"][stage] = measured
+            print(
+                f"{stage:<16} {measured['packets_per_sec']:>12,.0f} packets/sec "
+                f"{measured['events_per_sec']:>12,.0f} events/sec "
+                f"{measured['peak_rss_mb']:>8.1f} MiB",
+                file=sys.stderr,
+            )
+
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,529 @@
+"""
+Columnar Replay File Format
+Chunked, seekable binary replay files with a footer time index
+
+Layout::
+
+    MAGIC
+    chunk 0: column 0 | column 1 | ...     (8-byte aligned, little-endian)
+    chunk 1: ...
+    footer (JSON): schema, per-chunk time range and column offsets
+    footer length (u64) | MAGIC
+
+Numeric columns are raw fixed-width arrays that ``numpy.frombuffer`` can
+wrap without copying (dtypes are recorded in the footer). String columns
+are dictionary-encoded per chunk: a u32 code array plus the chunk's
+distinct values. Rows inside a chunk are sorted by ``first_timestamp``.
+"""
+
+import heapq
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .correlation import event_time
+from .pcap_reader import TCP_FLAG_NAMES, tcp_flag_names
+from .timeline import DEFAULT_BASE_WIDTH, DEFAULT_FACTOR, Timeline, TimelineBuilder, TimelineLevel
+
+MAGIC = b"RRPLAY01"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 65_536
+# Rows decoded at a time when reading a chunk
+ROW_BATCH = 1024
+
+_TRAILER = struct.Struct("<Q8s")
+_ALIGN = 8
+
+# Row kinds
+KIND_FLOW = 0
+KIND_PACKET = 1
+KIND_OTHER = 2
+
+NUMERIC_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("first_timestamp", "d"),
+    ("last_timestamp", "d"),
+    ("source_port", "H"),
+    ("dest_port", "H"),
+    ("packets", "Q"),
+    ("bytes", "Q"),
+    ("payload_size", "Q"),
+    ("tcp_flags", "B"),
+    ("kind", "B"),
+)
+STRING_COLUMNS: Tuple[str, ...] = (
+    "event_type",
+    "source_ip",
+    "dest_ip",
+    "protocol",
+    "metadata",
+    "extra",
+)
+NUMPY_DTYPES = {"d": "<f8", "H": "<u2", "I": "<u4", "Q": "<u8", "q": "<i8", "B": "u1"}
+
+# Keys stored in dedicated columns; anything else on a network event goes
+# to the JSON ``extra`` column
+_NETWORK_KEYS = frozenset(
+    (
+        "timestamp",
+        "event_type",
+        "source_ip",
+        "source_port",
+        "dest_ip",
+        "dest_port",
+        "protocol",
+        "payload_size",
+        "flags",
+        "packets",
+        "bytes",
+        "first_timestamp",
+        "last_timestamp",
+        "duration_seconds",
+        "metadata",
+    )
+)
+_FLAG_BITS = {name: bit for bit, name in TCP_FLAG_NAMES}
+_LITTLE_ENDIAN = sys.byteorder == "little"
+_MISSING = object()
+
+
+class ReplayFormatError(ValueError):
+    """Raised when a file is not a valid columnar replay"""
+
+
+def _flags_to_bits(flags) -> int:
+    bits = 0
+    for name in flags or ():
+        bits |= _FLAG_BITS.get(name, 0)
+    return bits
+
+
+class ReplayWriter:
+    """
+    Streaming writer for columnar replay files
+
+    Holds at most one chunk of rows in memory; call ``close()`` (or use as
+    a context manager) to write the footer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        info: Optional[Dict] = None,
+        timeline_width: float = DEFAULT_BASE_WIDTH,
+        timeline_factor: int = DEFAULT_FACTOR,
+    ):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.info = dict(info or {})
+        self._timeline = TimelineBuilder(timeline_width, timeline_factor)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._chunks: List[Dict] = []
+        self._total = 0
+        self._reset()
+
+    def __enter__(self) -> "ReplayWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _reset(self) -> None:
+        self._numeric: Dict[str, list] = {name: [] for name, _ in NUMERIC_COLUMNS}
+        self._strings: Dict[str, list] = {name: [] for name in STRING_COLUMNS}
+        self._rows = 0
+
+    def write(self, event: Dict) -> None:
+        numeric = self._numeric
+        strings = self._strings
+        if "source_port" in event:
+            ts = event_time(event)
+            kind = KIND_FLOW if "first_timestamp" in event else KIND_PACKET
+            extra = {k: v for k, v in event.items() if k not in _NETWORK_KEYS}
+            numeric["first_timestamp"].append(ts)
+            numeric["last_timestamp"].append(event.get("last_timestamp", ts))
+            numeric["source_port"].append(event.get("source_port") or 0)
+            numeric["dest_port"].append(event.get("dest_port") or 0)
+            numeric["packets"].append(event.get("packets", 1))
+            numeric["bytes"].append(event.get("bytes", 0))
+            numeric["payload_size"].append(event.get("payload_size") or 0)
+            numeric["tcp_flags"].append(_flags_to_bits(event.get("flags")))
+            numeric["kind"].append(kind)
+            strings["event_type"].append(event.get("event_type"))
+            strings["source_ip"].append(event.get("source_ip"))
+            strings["dest_ip"].append(event.get("dest_ip"))
+            strings["protocol"].append(event.get("protocol"))
+            strings["metadata"].append(json.dumps(event.get("metadata") or {}, sort_keys=True))
+            strings["extra"].append(json.dumps(extra) if extra else None)
+            self._timeline.add(ts, event.get("bytes") or event.get("payload_size") or 0)
+        else:
+            # Host events and other records are kept whole
+            ts = event_time(event)
+            for name, _ in NUMERIC_COLUMNS:
+                numeric[name].append(0)
+            numeric["first_timestamp"][-1] = ts
+            numeric["last_timestamp"][-1] = ts
+            numeric["kind"][-1] = KIND_OTHER
+            for name in STRING_COLUMNS:
+                strings[name].append(None)
+            strings["event_type"][-1] = event.get("event_type")
+            strings["extra"][-1] = json.dumps(event)
+            self._timeline.add(ts)
+
+        self._rows += 1
+        self._total += 1
+        if self._rows >= self.chunk_size:
+            self._flush_chunk()
+
+    def _write_aligned(self, data: bytes) -> Tuple[int, int]:
+        pad = -self._offset % _ALIGN
+        if pad:
+            self._file.write(b"\0" * pad)
+            self._offset += pad
+        offset = self._offset
+        self._file.write(data)
+        self._offset += len(data)
+        return offset, len(data)
+
+    def _write_array(self, values: array) -> Tuple[int, int]:
+        if not _LITTLE_ENDIAN:
+            values.byteswap()
+        return self._write_aligned(values.tobytes())
+
+    def _flush_chunk(self) -> None:
+        rows = self._rows
+        if not rows:
+            return
+        timestamps = self._numeric["first_timestamp"]
+        order = sorted(range(rows), key=timestamps.__getitem__)
+
+        columns: Dict[str, Dict] = {}
+        for name, typecode in NUMERIC_COLUMNS:
+            values = self._numeric[name]
+            offset, size = self._write_array(array(typecode, [values[i] for i in order]))
+            columns[name] = {"offset": offset, "size": size}
+
+        for name in STRING_COLUMNS:
+            values = self._strings[name]
+            # Code 0 is reserved for missing values
+            dictionary: Dict[str, int] = {}
+            codes = array("I")
+            for i in order:
+                value = values[i]
+                if value is None:
+                    codes.append(0)
+                    continue
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary) + 1
+                codes.append(code)
+            encoded = [value.encode("utf-8") for value in dictionary]
+            ends = array("I")
+            position = 0
+            for item in encoded:
+                position += len(item)
+                ends.append(position)
+            codes_offset, codes_size = self._write_array(codes)
+            ends_offset, ends_size = self._write_array(ends)
+            data_offset, data_size = self._write_aligned(b"".join(encoded))
+            columns[name] = {
+                "offset": codes_offset,
+                "size": codes_size,
+                "dictionary": [ends_offset, ends_size, data_offset, data_size],
+            }
+
+        self._chunks.append(
+            {
+                "rows": rows,
+                "min_ts": timestamps[order[0]],
+                "max_ts": timestamps[order[-1]],
+                "columns": columns,
+            }
+        )
+        self._reset()
+
+    def close(self) -> str:
+        if self._file is None:
+            return self.path
+        self._flush_chunk()
+        chunks = self._chunks
+        levels = []
+        for level in self._timeline.levels():
+            levels.append(
+                {
+                    "width": level.width,
+                    "first_index": level.first_index,
+                    "indexes": self._write_array(level.indexes),
+                    "counts": self._write_array(level.counts),
+                    "volumes": self._write_array(level.volumes),
+                }
+            )
+        footer = {
+            "version": FORMAT_VERSION,
+            "byteorder": "little",
+            "numeric_columns": [
+                {"name": name, "typecode": code, "dtype": NUMPY_DTYPES[code]}
+                for name, code in NUMERIC_COLUMNS
+            ],
+            "string_columns": list(STRING_COLUMNS),
+            "code_dtype": NUMPY_DTYPES["I"],
+            "total_events": self._total,
+            "start_ts": min((c["min_ts"] for c in chunks), default=None),
+            "end_ts": max((c["max_ts"] for c in chunks), default=None),
+            "info": self.info,
+            "chunks": chunks,
+            "timeline": {"factor": self._timeline.factor, "levels": levels},
+        }
+        payload = json.dumps(footer, separators=(",", ":")).encode("utf-8")
+        self._write_aligned(payload)
+        self._file.write(_TRAILER.pack(len(payload), MAGIC))
+        self._file.close()
+        self._file = None
+        return self.path
+
+
+class ReplayReader:
+    """
+    Random-access reader for columnar replay files
+
+    Only the footer is parsed on open; chunk columns are read straight out
+    of the memory mapping when a query touches them. Chunks are located by
+    binary search over the footer's time index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:
+            self._file.close()
+            raise ReplayFormatError(f"{path}: empty replay file") from exc
+        if self._mm[: len(MAGIC)] != MAGIC or len(self._mm) < len(MAGIC) + _TRAILER.size:
+            self.close()
+            raise ReplayFormatError(f"{path}: not a replay file")
+        footer_size, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ReplayFormatError(f"{path}: truncated replay file")
+        footer_start = len(self._mm) - _TRAILER.size - footer_size
+        self.footer: Dict = json.loads(self._mm[footer_start : footer_start + footer_size])
+        self.info: Dict = self.footer.get("info", {})
+        self._typecodes = {c["name"]: c["typecode"] for c in self.footer["numeric_columns"]}
+
+        # Chunks sorted by min_ts with a running max of max_ts: both are
+        # monotonic, so the chunks overlapping a range are a contiguous
+        # slice found with two bisects even when chunk ranges overlap.
+        self.chunks: List[Dict] = sorted(self.footer["chunks"], key=lambda c: c["min_ts"])
+        self._min_ts = [c["min_ts"] for c in self.chunks]
+        self._running_max: List[float] = []
+        running = float("-inf")
+        for chunk in self.chunks:
+            running = max(running, chunk["max_ts"])
+            self._running_max.append(running)
+
+    def __enter__(self) -> "ReplayReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.footer["total_events"]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # column views still referenced; released on collection
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def start_ts(self) -> Optional[float]:
+        return self.footer.get("start_ts")
+
+    @property
+    def end_ts(self) -> Optional[float]:
+        return self.footer.get("end_ts")
+
+    def timeline(self) -> Optional[Timeline]:
+        """Event count / byte pyramid (None for files written without one)"""
+        meta = self.footer.get("timeline")
+        if not meta or not meta["levels"]:
+            return None
+        levels = [
+            TimelineLevel(
+                level["width"],
+                level["first_index"],
+                self._typed(*level["counts"], "Q"),
+                self._typed(*level["volumes"], "Q"),
+                self._typed(*level["indexes"], "q") if "indexes" in level else None,
+            )
+            for level in meta["levels"]
+        ]
+        return Timeline(levels, meta["factor"])
+
+    def chunks_in_range(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> List[int]:
+        """Indexes into ``self.chunks`` of chunks with rows in [start, end]"""
+        return list(self._iter_chunks(start, end))
+
+    def _iter_chunks(self, start: Optional[float], end: Optional[float]) -> Iterator[int]:
+        lo = 0 if start is None else bisect_left(self._running_max, start)
+        hi = len(self.chunks) if end is None else bisect_right(self._min_ts, end)
+        for i in range(lo, hi):
+            if start is None or self.chunks[i]["max_ts"] >= start:
+                yield i
+
+    def column(self, chunk: int, name: str) -> memoryview:
+        """Zero-copy typed view of a numeric column (``numpy.asarray``-ready)"""
+        meta = self.chunks[chunk]["columns"][name]
+        return self._typed(meta["offset"], meta["size"], self._typecodes[name])
+
+    def string_column(
+        self, chunk: int, name: str, lo: int = 0, hi: Optional[int] = None
+    ) -> List[Optional[str]]:
+        """
+        Decode a dictionary-encoded string column (rows ``lo:hi``)
+
+        Only the dictionary entries the rows refer to are decoded, so a
+        slice costs O(rows) however large the chunk's dictionary is.
+        """
+        meta = self.chunks[chunk]["columns"][name]
+        codes = self._typed(meta["offset"], meta["size"], "I")[lo:hi]
+        ends_offset, ends_size, data_offset, _ = meta["dictionary"]
+        ends = self._typed(ends_offset, ends_size, "I")
+        mm = self._mm
+        decoded: Dict[int, Optional[str]] = {0: None}
+        values = []
+        for code in codes:
+            value = decoded.get(code, _MISSING)
+            if value is _MISSING:
+                start = data_offset + (ends[code - 2] if code > 1 else 0)
+                value = decoded[code] = mm[start : data_offset + ends[code - 1]].decode("utf-8")
+            values.append(value)
+        return values
+
+    def dictionary(self, chunk: int, name: str) -> List[Optional[str]]:
+        """Distinct values of a string column; index 0 is the missing value"""
+        ends_offset, ends_size, data_offset, data_size = self.chunks[chunk]["columns"][name][
+            "dictionary"
+        ]
+        ends = self._typed(ends_offset, ends_size, "I")
+        data = self._mm[data_offset : data_offset + data_size]
+        values: List[Optional[str]] = [None]
+        start = 0
+        for end in ends:
+            values.append(data[start:end].decode("utf-8"))
+            start = end
+        return values
+
+    def _typed(self, offset: int, size: int, typecode: str):
+        view = memoryview(self._mm)[offset : offset + size]
+        if _LITTLE_ENDIAN:
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def events(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Yield events with ``start <= first_timestamp <= end`` in time order
+
+        Chunk time ranges may overlap (flows are written as they close), so
+        the overlapping chunks are heap-merged; a chunk is only opened once
+        the merge reaches its ``min_ts``. Rows are decoded ``ROW_BATCH`` at a
+        time, so the cost of a query is O(log chunks + rows returned) rather
+        than proportional to the size of the replay.
+        """
+        if limit is not None and limit <= 0:
+            return
+        chunks = self._iter_chunks(start, end)
+        heap: List[Tuple[float, int, Iterator[Tuple[float, Dict]]]] = []
+        upcoming = next(chunks, None)
+        emitted = 0
+        while True:
+            # Open every chunk that may hold a row earlier than the heap top
+            while upcoming is not None and (
+                not heap or heap[0][0] >= self.chunks[upcoming]["min_ts"]
+            ):
+                rows = self._chunk_rows(upcoming, start, end)
+                first = next(rows, None)
+                if first is not None:
+                    heapq.heappush(heap, (first[0], upcoming, first[1], rows))
+                upcoming = next(chunks, None)
+            if not heap:
+                return
+            _, index, event, rows = heap[0]
+            yield event
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+            following = next(rows, None)
+            if following is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (following[0], index, following[1], rows))
+
+    def _chunk_rows(
+        self, index: int, start: Optional[float], end: Optional[float]
+    ) -> Iterator[Tuple[float, Dict]]:
+        """(first_timestamp, event) for one chunk's rows in [start, end]"""
+        first_ts = self.column(index, "first_timestamp")
+        lo = 0 if start is None else bisect_left(first_ts, start)
+        hi = len(first_ts) if end is None else bisect_right(first_ts, end)
+        for batch in range(lo, hi, ROW_BATCH):
+            batch_end = min(batch + ROW_BATCH, hi)
+            num = {name: self.column(index, name)[batch:batch_end] for name, _ in NUMERIC_COLUMNS}
+            text = {
+                name: self.string_column(index, name, batch, batch_end) for name in STRING_COLUMNS
+            }
+            for row in range(batch_end - batch):
+                yield num["first_timestamp"][row], self._row_event(num, text, row)
+
+    @staticmethod
+    def _row_event(num: Dict, text: Dict, row: int) -> Dict:
+        kind = num["kind"][row]
+        extra = text["extra"][row]
+        if kind == KIND_OTHER:
+            return json.loads(extra)
+        ts = num["first_timestamp"][row]
+        event = {
+            "timestamp": datetime.utcfromtimestamp(ts).isoformat(),
+            "event_type": text["event_type"][row],
+            "source_ip": text["source_ip"][row],
+            "source_port": num["source_port"][row],
+            "dest_ip": text["dest_ip"][row],
+            "dest_port": num["dest_port"][row],
+            "protocol": text["protocol"][row],
+            "payload_size": num["payload_size"][row],
+            "flags": tcp_flag_names(num["tcp_flags"][row]),
+        }
+        if kind == KIND_FLOW:
+            last_ts = num["last_timestamp"][row]
+            event["packets"] = num["packets"][row]
+            event["bytes"] = num["bytes"][row]
+            event["first_timestamp"] = ts
+            event["last_timestamp"] = last_ts
+            event["duration_seconds"] = round(last_ts - ts, 6)
+        event["metadata"] = json.loads(text["metadata"][row] or "{}")
+        if extra:
+            event.update(json.loads(extra))
+        return event
@@ -0,0 +1,247 @@
+"""
+Network / Host Event Correlation
+Joins replay flow events against Sysmon host events with a sort-merge sweep
+over timestamps and hash indexes on (ip, port) and process id
+"""
+
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+# Sysmon event IDs used by the correlator
+SYSMON_PROCESS_CREATE = 1
+SYSMON_NETWORK_CONNECT = 3
+SYSMON_FILE_CREATE = 11
+SYSMON_DNS_QUERY = 22
+
+# Max clock skew between a packet and the host event that describes it
+DEFAULT_WINDOW = 2.0
+# How far back a DNS answer may explain a connection
+DEFAULT_DNS_WINDOW = 300.0
+# How far back a file write may explain an upload from the same process
+DEFAULT_UPLOAD_WINDOW = 600.0
+
+ProcessKey = Tuple[Optional[str], int]
+
+
+def event_time(event: Dict) -> float:
+    """Epoch seconds for a network or host event"""
+    ts = event.get("first_timestamp")
+    if ts is not None:
+        return float(ts)
+    ts = event.get("@timestamp", event.get("timestamp"))
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if not ts:
+        return 0.0
+    parsed = datetime.fromisoformat(ts)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _event_id(event: Dict) -> int:
+    return _int(event.get("event_id"))
+
+
+def _process_key(event: Dict) -> ProcessKey:
+    return event.get("computer_name"), _int(event.get("process_id"))
+
+
+def _dns_answers(event: Dict) -> List[str]:
+    """Addresses from a Sysmon DNS query result ("::ffff:1.2.3.4;5.6.7.8;")"""
+    results = event.get("query_results") or ""
+    if isinstance(results, list):
+        return results
+    answers = []
+    for item in results.split(";"):
+        item = item.strip()
+        if item.startswith("::ffff:"):
+            item = item[7:]
+        if item and not item.startswith("type:"):
+            answers.append(item)
+    return answers
+
+
+class _WindowIndex:
+    """
+    Hash index over a sliding time window
+
+    Events are inserted in timestamp order, so each key's bucket is itself
+    time-ordered and expiry pops from bucket fronts in amortised O(1).
+    """
+
+    def __init__(self, span: float):
+        self.span = span
+        self.buckets: Dict = defaultdict(deque)
+        self._order: Deque[Tuple[float, object]] = deque()
+
+    def add(self, key, ts: float, event: Dict) -> None:
+        self.buckets[key].append((ts, event))
+        self._order.append((ts, key))
+
+    def expire(self, now: float) -> None:
+        cutoff = now - self.span
+        order = self._order
+        buckets = self.buckets
+        while order and order[0][0] < cutoff:
+            _, key = order.popleft()
+            bucket = buckets[key]
+            bucket.popleft()
+            if not bucket:
+                del buckets[key]
+
+    def get(self, key) -> Optional[Deque[Tuple[float, Dict]]]:
+        return self.buckets.get(key)
+
+
+def _nearest(bucket: Optional[Deque[Tuple[float, Dict]]], ts: float) -> Optional[Dict]:
+    """Closest event in a bucket to ``ts``"""
+    best = None
+    best_delta = float("inf")
+    if bucket:
+        for event_ts, event in bucket:
+            delta = abs(event_ts - ts)
+            if delta < best_delta:
+                best, best_delta = event, delta
+    return best
+
+
+def _latest_before(bucket: Optional[Deque[Tuple[float, Dict]]], ts: float) -> Optional[Dict]:
+    if bucket:
+        for event_ts, event in reversed(bucket):
+            if event_ts <= ts:
+                return event
+    return None
+
+
+def correlate(
+    network_events: Iterable[Dict],
+    host_events: Iterable[Dict],
+    window: float = DEFAULT_WINDOW,
+    dns_window: float = DEFAULT_DNS_WINDOW,
+    upload_window: float = DEFAULT_UPLOAD_WINDOW,
+) -> List[Dict]:
+    """
+    Build a unified, time-ordered timeline of network and host events
+
+    Network events that can be attributed are returned as enriched copies:
+
+    - ``process``: the Sysmon network-connect event on the same (ip, port)
+      within ``window`` seconds, resolved to its process-create event by
+      (computer_name, process_id)
+    - ``dns_query``: the most recent DNS query (within ``dns_window``) whose
+      answers contain the connection's destination address
+    - ``uploaded_files``: files written by the owning process within
+      ``upload_window`` seconds before a connection that carried payload
+
+    Both inputs are sorted once and swept together, with every lookup an
+    O(1) hash probe into a sliding window, so the join is O((N+M) log(N+M))
+    rather than O(N*M).
+    """
+    network = sorted(((event_time(e), e) for e in network_events), key=lambda item: item[0])
+    host = sorted(((event_time(e), e) for e in host_events), key=lambda item: item[0])
+
+    connections = _WindowIndex(2 * window)  # (source_ip, source_port)
+    # (source_ip, destination_ip, destination_port), used when Sysmon did
+    # not record the ephemeral source port
+    connections_by_dest = _WindowIndex(2 * window)
+    dns_answers = _WindowIndex(dns_window + window)  # resolved ip
+    file_writes = _WindowIndex(upload_window + window)  # (computer_name, process_id)
+    processes: Dict[ProcessKey, Dict] = {}
+
+    enriched: List[Tuple[float, Dict]] = []
+    host_count = len(host)
+    h = 0
+    for ts, event in network:
+        # Leading edge: index every host event up to ts + window
+        horizon = ts + window
+        while h < host_count and host[h][0] <= horizon:
+            host_ts, host_event = host[h]
+            h += 1
+            event_id = _event_id(host_event)
+            if event_id == SYSMON_NETWORK_CONNECT:
+                source_port = _int(host_event.get("source_port"))
+                if source_port >= 0:
+                    connections.add((host_event.get("source_ip"), source_port), host_ts, host_event)
+                dest_key = (
+                    host_event.get("source_ip"),
+                    host_event.get("destination_ip"),
+                    _int(host_event.get("destination_port")),
+                )
+                connections_by_dest.add(dest_key, host_ts, host_event)
+            elif event_id == SYSMON_PROCESS_CREATE:
+                processes[_process_key(host_event)] = host_event
+            elif event_id == SYSMON_DNS_QUERY:
+                for address in _dns_answers(host_event):
+                    dns_answers.add(address, host_ts, host_event)
+            elif event_id == SYSMON_FILE_CREATE:
+                file_writes.add(_process_key(host_event), host_ts, host_event)
+
+        # Trailing edge: drop host events that can no longer match
+        connections.expire(horizon)
+        connections_by_dest.expire(horizon)
+        dns_answers.expire(horizon)
+        file_writes.expire(horizon)
+
+        source_ip = event.get("source_ip")
+        dest_ip = event.get("dest_ip")
+        match = _nearest(connections.get((source_ip, event.get("source_port"))), ts)
+        if match is None:
+            dest_key = (source_ip, dest_ip, event.get("dest_port"))
+            match = _nearest(connections_by_dest.get(dest_key), ts)
+        dns = _latest_before(dns_answers.get(dest_ip), ts)
+        if match is None and dns is None:
+            enriched.append((ts, event))
+            continue
+
+        event = dict(event)
+        if match is not None:
+            key = _process_key(match)
+            creation = processes.get(key)
+            event["process"] = {
+                "computer_name": key[0],
+                "process_id": key[1],
+                "image": (creation or match).get("image"),
+                "command_line": (creation or {}).get("command_line"),
+                "parent_process_id": (creation or {}).get("parent_process_id"),
+                "user": (creation or match).get("user"),
+            }
+            if event.get("payload_size"):
+                uploaded = [
+                    write.get("target_filename")
+                    for write_ts, write in file_writes.get(key) or ()
+                    if write_ts <= ts
+                ]
+                if uploaded:
+                    event["uploaded_files"] = uploaded
+        if dns is not None:
+            event["dns_query"] = {
+                "query_name": dns.get("query_name"),
+                "timestamp": dns.get("@timestamp", dns.get("timestamp")),
+                "process_id": _int(dns.get("process_id")),
+            }
+        enriched.append((ts, event))
+
+    # Both runs are already sorted: a linear merge builds the timeline
+    timeline: List[Dict] = []
+    append = timeline.append
+    i = j = 0
+    network_count = len(enriched)
+    while i < network_count and j < host_count:
+        if enriched[i][0] <= host[j][0]:
+            append(enriched[i][1])
+            i += 1
+        else:
+            append(host[j][1])
+            j += 1
+    timeline.extend(event for _, event in enriched[i:])
+    timeline.extend(event for _, event in host[j:])
+    return timeline
@@ -0,0 +1,254 @@
+"""
+Flow Aggregation
+Folds decoded packets into bidirectional 5-tuple flows with idle-timeout
+eviction, so replay output is one event per connection instead of one per packet
+"""
+
+import heapq
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .pcap_reader import Packet, tcp_flag_names
+
+FlowKey = Tuple[str, str, int, str, int]
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_MAX_FLOWS = 500_000
+
+
+def starts_connection(flags: int) -> bool:
+    """True for an initial SYN (SYN without ACK)"""
+    return flags & (TCP_SYN | TCP_ACK) == TCP_SYN
+
+
+class FlowRecord:
+    """Counters for one flow; the ``source`` side is whoever sent first"""
+
+    __slots__ = (
+        "protocol",
+        "source_ip",
+        "source_port",
+        "dest_ip",
+        "dest_port",
+        "first_seen",
+        "last_seen",
+        "packets",
+        "bytes",
+        "payload_bytes",
+        "flags",
+    )
+
+    def __init__(self, packet: Packet):
+        self.protocol = packet.protocol
+        self.source_ip = packet.source_ip
+        self.source_port = packet.source_port
+        self.dest_ip = packet.dest_ip
+        self.dest_port = packet.dest_port
+        self.first_seen = packet.timestamp
+        self.last_seen = packet.timestamp
+        self.packets = 0
+        self.bytes = 0
+        self.payload_bytes = 0
+        self.flags = 0
+
+    def merge(self, other: "FlowRecord") -> None:
+        """Fold a later fragment of the same flow into this record"""
+        self.first_seen = min(self.first_seen, other.first_seen)
+        self.last_seen = max(self.last_seen, other.last_seen)
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.payload_bytes += other.payload_bytes
+        self.flags |= other.flags
+
+    def sort_key(self) -> tuple:
+        """Canonical output order: by last activity, then by identity"""
+        return (
+            self.last_seen,
+            self.first_seen,
+            self.protocol,
+            self.source_ip,
+            self.source_port,
+            self.dest_ip,
+            self.dest_port,
+            self.packets,
+            self.bytes,
+            self.payload_bytes,
+            self.flags,
+        )
+
+    def to_event(self, metadata: Optional[Dict] = None) -> Dict:
+        return {
+            "timestamp": datetime.utcfromtimestamp(self.first_seen).isoformat(),
+            "event_type": "network.connection",
+            "source_ip": self.source_ip,
+            "source_port": self.source_port,
+            "dest_ip": self.dest_ip,
+            "dest_port": self.dest_port,
+            "protocol": self.protocol,
+            "payload_size": self.payload_bytes,
+            "flags": tcp_flag_names(self.flags),
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "first_timestamp": self.first_seen,
+            "last_timestamp": self.last_seen,
+            "duration_seconds": round(self.last_seen - self.first_seen, 6),
+            "metadata": dict(metadata or {}),
+        }
+
+
+class FlowTable:
+    """
+    Bounded table of active flows keyed on the 5-tuple
+
+    Both directions of a conversation map to the same record. A packet
+    starts a new flow when its key has been idle for more than
+    ``idle_timeout`` seconds or when it is an initial SYN after the old
+    connection sent a FIN; a RST ends the flow immediately. These rules
+    only look at the flow's own packets, which is what lets byte-range
+    shards be aggregated independently (see replay.parallel).
+
+    Flows are kept in last-activity order, so idle ones are evicted from
+    the front in O(1) each. ``max_flows`` caps memory on scans and floods
+    by evicting the least recently active flow early.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        max_flows: int = DEFAULT_MAX_FLOWS,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self._flows: "OrderedDict[FlowKey, FlowRecord]" = OrderedDict()
+        self._next_sweep = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def oldest_activity(self) -> float:
+        """last_seen of the least recently active flow (inf when empty)"""
+        flows = self._flows
+        if not flows:
+            return float("inf")
+        return next(iter(flows.values())).last_seen
+
+    def add(self, packet: Packet) -> List[FlowRecord]:
+        """Account one packet; returns any flows that finished as a result"""
+        flows = self._flows
+        ts = packet.timestamp
+        flags = packet.tcp_flags
+        finished: List[FlowRecord] = []
+
+        if ts >= self._next_sweep:
+            self._evict_idle(ts, finished)
+            self._next_sweep = ts + min(self.idle_timeout, 1.0)
+
+        key = (
+            packet.protocol,
+            packet.source_ip,
+            packet.source_port,
+            packet.dest_ip,
+            packet.dest_port,
+        )
+        record = flows.get(key)
+        if record is None:
+            reverse = (
+                packet.protocol,
+                packet.dest_ip,
+                packet.dest_port,
+                packet.source_ip,
+                packet.source_port,
+            )
+            record = flows.get(reverse)
+            if record is not None:
+                key = reverse
+
+        if record is not None and (
+            ts - record.last_seen > self.idle_timeout
+            or (record.flags & TCP_FIN and starts_connection(flags))
+        ):
+            del flows[key]
+            finished.append(record)
+            record = None
+
+        if record is None:
+            key = (
+                packet.protocol,
+                packet.source_ip,
+                packet.source_port,
+                packet.dest_ip,
+                packet.dest_port,
+            )
+            record = flows[key] = FlowRecord(packet)
+            if len(flows) > self.max_flows:
+                finished.append(flows.popitem(last=False)[1])
+        else:
+            flows.move_to_end(key)
+
+        record.packets += 1
+        record.bytes += packet.length
+        record.payload_bytes += packet.payload_size
+        if ts > record.last_seen:
+            record.last_seen = ts
+        if flags:
+            record.flags |= flags
+            if flags & TCP_RST:
+                del flows[key]
+                finished.append(record)
+        return finished
+
+    def _evict_idle(self, now: float, finished: List[FlowRecord]) -> None:
+        flows = self._flows
+        cutoff = now - self.idle_timeout
+        while flows:
+            record = next(iter(flows.values()))
+            if record.last_seen >= cutoff:
+                break
+            finished.append(flows.popitem(last=False)[1])
+
+    def flush(self) -> List[FlowRecord]:
+        """Emit every remaining flow (end of capture)"""
+        finished = list(self._flows.values())
+        self._flows.clear()
+        return finished
+
+
+def aggregate_flows(
+    packets: Iterable[Packet],
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    max_flows: int = DEFAULT_MAX_FLOWS,
+) -> Iterator[FlowRecord]:
+    """
+    Fold a packet stream into flows
+
+    Finished flows pass through a small reorder heap and come out in
+    ``FlowRecord.sort_key`` order. A flow is released once nothing still
+    active (and no later packet, timestamps being non-decreasing) can
+    finish before it, so the heap only holds flows finished within the
+    last idle window and the order does not depend on eviction timing.
+    """
+    table = FlowTable(idle_timeout=idle_timeout, max_flows=max_flows)
+    add = table.add
+    pending: List[tuple] = []
+    sequence = 0
+    for packet in packets:
+        finished = add(packet)
+        for record in finished:
+            heapq.heappush(pending, (record.sort_key(), sequence, record))
+            sequence += 1
+        if pending and pending[0][0][0] < packet.timestamp:
+            horizon = min(table.oldest_activity(), packet.timestamp)
+            while pending and pending[0][0][0] < horizon:
+                yield heapq.heappop(pending)[2]
+
+    for record in table.flush():
+        heapq.heappush(pending, (record.sort_key(), sequence, record))
+        sequence += 1
+    while pending:
+        yield heapq.heappop(pending)[2]
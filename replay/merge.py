@@ -0,0 +1,105 @@
+"""
+Multi-Sensor Capture Merge
+k-way merges per-sensor captures into one time-ordered packet stream and
+drops copies of the same packet seen by more than one sensor
+"""
+
+import hashlib
+import heapq
+from collections import deque
+from contextlib import ExitStack
+from typing import Deque, Dict, Iterator, Sequence, Tuple
+
+from .pcap_reader import Packet, PcapReader
+
+# Copies of one packet reach different sensors within a few milliseconds;
+# anything further apart is treated as a genuine retransmission.
+DEFAULT_DEDUP_WINDOW = 0.05
+
+
+def packet_digest(packet: Packet) -> bytes:
+    """
+    Content hash of a packet, independent of the sensor that captured it
+
+    Covers the addressing, TCP sequence number, wire length and payload but
+    not link-layer headers, which differ between sensors (VLAN tags, MACs).
+    """
+    h = hashlib.blake2b(digest_size=8)
+    h.update(
+        f"{packet.protocol}|{packet.source_ip}|{packet.source_port}|{packet.dest_ip}|"
+        f"{packet.dest_port}|{packet.tcp_seq}|{packet.payload_size}".encode()
+    )
+    h.update(packet.payload)
+    return h.digest()
+
+
+class Deduplicator:
+    """
+    Bounded-window duplicate filter
+
+    Remembers which sensor first reported each digest for ``window``
+    seconds. A repeat from the same sensor is kept (it is a real
+    retransmission); a repeat from another sensor is a duplicate.
+    """
+
+    def __init__(self, window: float = DEFAULT_DEDUP_WINDOW):
+        self.window = window
+        self.duplicates = 0
+        self._seen: Dict[bytes, int] = {}
+        self._order: Deque[Tuple[float, bytes]] = deque()
+
+    def is_duplicate(self, packet: Packet, sensor: int) -> bool:
+        seen = self._seen
+        order = self._order
+        cutoff = packet.timestamp - self.window
+        while order and order[0][0] < cutoff:
+            _, digest = order.popleft()
+            seen.pop(digest, None)
+
+        digest = packet_digest(packet)
+        first_sensor = seen.get(digest)
+        if first_sensor is not None and first_sensor != sensor:
+            self.duplicates += 1
+            return True
+        if first_sensor is None:
+            seen[digest] = sensor
+            order.append((packet.timestamp, digest))
+        return False
+
+
+def merge_captures(
+    paths: Sequence[str], dedup_window: float = DEFAULT_DEDUP_WINDOW
+) -> Iterator[Packet]:
+    """
+    Merge several captures into one time-ordered packet stream
+
+    Each capture is streamed through its own memory-mapped reader and the
+    streams are combined with a heap-based k-way merge, so only one pending
+    packet per capture is held at a time. Set ``dedup_window`` to 0 to keep
+    every copy.
+    """
+    with ExitStack() as stack:
+        streams = []
+        for sensor, path in enumerate(paths):
+            reader = stack.enter_context(PcapReader(path))
+            streams.append(_tagged(reader.packets(), sensor))
+
+        merged = heapq.merge(*streams, key=_timestamp_of_pair)
+        if dedup_window <= 0:
+            for packet, _ in merged:
+                yield packet
+            return
+
+        dedup = Deduplicator(dedup_window)
+        for packet, sensor in merged:
+            if not dedup.is_duplicate(packet, sensor):
+                yield packet
+
+
+def _tagged(packets: Iterator[Packet], sensor: int) -> Iterator[Tuple[Packet, int]]:
+    for packet in packets:
+        yield packet, sensor
+
+
+def _timestamp_of_pair(item: Tuple[Packet, int]) -> float:
+    return item[0].timestamp
@@ -0,0 +1,193 @@
+"""
+Parallel PCAP Decoding
+Decodes record-aligned byte ranges of one capture in a process pool and
+stitches the per-shard flow tables back together
+
+The result is identical to the serial ``aggregate_flows`` path (as long as
+the serial table never reaches ``max_flows``). That works because a flow's
+boundaries only depend on its own packets:
+
+- an idle gap or a RST is a definite boundary any shard can see;
+- an initial SYN after a FIN starts a new flow, but the FIN may sit in an
+  earlier shard. Until a key's first definite boundary in a shard, such
+  SYNs are recorded as *tentative* splits and resolved during the merge,
+  once the flags carried over from earlier shards are known.
+"""
+
+import heapq
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .flows import DEFAULT_IDLE_TIMEOUT, TCP_FIN, TCP_RST, FlowRecord, starts_connection
+from .pcap_reader import PcapReader, Shard
+
+# Boundary kinds in front of a fragment of a key's head chain
+SHARD_START = 0
+TENTATIVE = 1
+
+# Each worker gets a couple of shards so one slow range does not stall the pool
+SHARDS_PER_WORKER = 2
+
+FragmentChain = List[Tuple[int, FlowRecord, bool]]
+
+
+class ShardResult(NamedTuple):
+    """Flows found in one shard"""
+
+    # Flows whose start and end were both decided inside the shard, in
+    # FlowRecord.sort_key order
+    interior: List[FlowRecord]
+    # Per key: fragments up to the first definite boundary, which may
+    # continue a flow from an earlier shard, and whether that boundary was
+    # reached (False: the chain is still open at the end of the shard)
+    chains: Dict[tuple, Tuple[FragmentChain, bool]]
+    # Per key: flow still open at the end of the shard, started after its
+    # head chain closed
+    tails: Dict[tuple, FlowRecord]
+
+
+def _flow_key(packet) -> tuple:
+    """Direction-independent 5-tuple"""
+    a = (packet.source_ip, packet.source_port)
+    b = (packet.dest_ip, packet.dest_port)
+    return (packet.protocol,) + (a + b if a <= b else b + a)
+
+
+def aggregate_shard(path: str, shard: Shard, idle_timeout: float) -> ShardResult:
+    """Decode one byte range and fold its packets into flow fragments (worker)"""
+    interior: List[FlowRecord] = []
+    chains: Dict[tuple, FragmentChain] = {}
+    closed_chains = set()
+    # key -> [current record or None, still in head chain]
+    state: Dict[tuple, list] = {}
+
+    with PcapReader(path) as reader:
+        for packet in reader.packets(shard):
+            key = _flow_key(packet)
+            flags = packet.tcp_flags
+            ts = packet.timestamp
+            entry = state.get(key)
+            if entry is None:
+                record = FlowRecord(packet)
+                chains[key] = [(SHARD_START, record, starts_connection(flags))]
+                entry = state[key] = [record, True]
+            else:
+                record, in_chain = entry
+                definite = record is None or (
+                    ts - record.last_seen > idle_timeout
+                    or (record.flags & TCP_FIN and starts_connection(flags))
+                )
+                if definite:
+                    if record is not None:
+                        if in_chain:
+                            closed_chains.add(key)
+                        else:
+                            interior.append(record)
+                    record = FlowRecord(packet)
+                    entry[:] = [record, False]
+                elif in_chain and starts_connection(flags):
+                    record = FlowRecord(packet)
+                    chains[key].append((TENTATIVE, record, True))
+                    entry[0] = record
+
+            record.packets += 1
+            record.bytes += packet.length
+            record.payload_bytes += packet.payload_size
+            if ts > record.last_seen:
+                record.last_seen = ts
+            if flags:
+                record.flags |= flags
+                if flags & TCP_RST:
+                    if entry[1]:
+                        closed_chains.add(key)
+                        entry[1] = False
+                    else:
+                        interior.append(record)
+                    entry[0] = None
+
+    tails = {}
+    for key, (record, in_chain) in state.items():
+        if record is not None and not in_chain:
+            tails[key] = record
+    interior.sort(key=FlowRecord.sort_key)
+    return ShardResult(
+        interior,
+        {key: (chain, key in closed_chains) for key, chain in chains.items()},
+        tails,
+    )
+
+
+def merge_shards(
+    results: List[ShardResult], idle_timeout: float = DEFAULT_IDLE_TIMEOUT
+) -> Iterator[FlowRecord]:
+    """Stitch per-shard results (in file order) into the serial flow sequence"""
+    open_flows: Dict[tuple, FlowRecord] = {}
+    stitched: List[FlowRecord] = []
+
+    for result in results:
+        for key, (chain, closed) in result.chains.items():
+            current: Optional[FlowRecord] = open_flows.pop(key, None)
+            for kind, record, syn in chain:
+                if current is None:
+                    current = record
+                    continue
+                if kind == SHARD_START:
+                    split = record.first_seen - current.last_seen > idle_timeout or (
+                        syn and current.flags & TCP_FIN
+                    )
+                else:
+                    split = current.flags & TCP_FIN
+                if split:
+                    stitched.append(current)
+                    current = record
+                else:
+                    current.merge(record)
+            if closed:
+                stitched.append(current)
+            else:
+                open_flows[key] = current
+        open_flows.update(result.tails)
+
+    stitched.extend(open_flows.values())
+    stitched.sort(key=FlowRecord.sort_key)
+    runs = [result.interior for result in results]
+    runs.append(stitched)
+    return heapq.merge(*runs, key=FlowRecord.sort_key)
+
+
+def parallel_flows(
+    path: str,
+    workers: Optional[int] = None,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+) -> Iterator[FlowRecord]:
+    """
+    Aggregate flows for one capture using a pool of ``workers`` processes
+
+    Yields the same FlowRecords, in the same order, as
+    ``aggregate_flows(PcapReader(path).packets())``.
+
+    A daemonic process cannot start the pool, so there the shards are
+    decoded one after another and ``replay.benchmarks.parallel`` scaling
+    does not apply. That is the case for tasks in a prefork Celery worker;
+    ``replay.process`` is routed to the decode queue, whose worker runs the
+    threads pool so tasks execute in its (non-daemonic) main process.
+    """
+    workers = workers or os.cpu_count() or 1
+    with PcapReader(path) as reader:
+        shards = reader.split(workers * SHARDS_PER_WORKER)
+    # Daemonic processes (e.g. prefork Celery children) cannot start a pool
+    if workers == 1 or len(shards) == 1 or multiprocessing.current_process().daemon:
+        results = [aggregate_shard(path, shard, idle_timeout) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(
+                    aggregate_shard,
+                    [path] * len(shards),
+                    shards,
+                    [idle_timeout] * len(shards),
+                )
+            )
+    return merge_shards(results, idle_timeout)
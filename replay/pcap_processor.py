@@ -5,85 +5,248 @@ Converts PCAP files to structured events for replay in the UI
 """
 
 import json
+import sys
 from datetime import datetime
-from typing import List, Dict
-import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from .columnar import DEFAULT_CHUNK_SIZE, ReplayReader, ReplayWriter
+from .correlation import (
+    DEFAULT_DNS_WINDOW,
+    DEFAULT_UPLOAD_WINDOW,
+    DEFAULT_WINDOW,
+    correlate,
+    event_time,
+)
+from .flows import DEFAULT_IDLE_TIMEOUT, aggregate_flows
+from .merge import DEFAULT_DEDUP_WINDOW, merge_captures
+from .parallel import parallel_flows
+from .pcap_reader import Packet, PcapReader, tcp_flag_names
+from .protocols import parse_dns_message
+from .reassembly import (
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_PREVIEW_BYTES,
+    DEFAULT_STREAM_CAP,
+    TCPReassembler,
+    payload_event,
+)
 
 
 class PCAPProcessor:
     """Process PCAP files and generate replay timeline"""
 
-    def __init__(self, pcap_path: str):
+    def __init__(
+        self,
+        pcap_path: Union[str, Sequence[str]],
+        metadata: Optional[Dict] = None,
+        flow_idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        dedup_window: float = DEFAULT_DEDUP_WINDOW,
+        workers: int = 1,
+    ):
+        # Several paths (one capture per sensor) are merged into one stream
         self.pcap_path = pcap_path
-        self.events: List[Dict] = []
-
-    def process(self) -> List[Dict]:
+        self.pcap_paths = [pcap_path] if isinstance(pcap_path, str) else list(pcap_path)
+        self.dedup_window = dedup_window
+        self.metadata = metadata or {}
+        self.flow_idle_timeout = flow_idle_timeout
+        # Decode processes for a single capture (see replay.parallel)
+        self.workers = workers
+
+    def process(self) -> Iterator[Dict]:
         """
         Process PCAP file and extract events
 
-        TODO: Implement actual PCAP parsing with scapy or dpkt
-        This is a stub showing the expected structure
+        Yields one ``network.connection`` event per flow (5-tuple, both
+        directions) with packet/byte counts, first/last timestamps and the
+        union of TCP flags. Flows are emitted as they close or go idle, so
+        memory stays bounded by the number of concurrently active flows.
+
+        With ``workers`` > 1 a single capture is split into byte ranges that
+        are decoded in parallel; the events are identical to the serial run.
         """
-        # Example event structure
-        events = [
-            {
-                "timestamp": datetime.utcnow().isoformat(),
-                "event_type": "network.connection",
-                "source_ip": "192.168.1.100",
-                "source_port": 49152,
-                "dest_ip": "10.0.0.50",
-                "dest_port": 445,
-                "protocol": "TCP",
-                "payload_size": 1024,
-                "flags": ["SYN"],
-                "metadata": {
-                    "scenario_id": "scn_123",
-                    "vm_id": "vm_456",
-                    "attack_stage": "initial_access",
-                },
+        if self.workers > 1 and len(self.pcap_paths) == 1:
+            flows = parallel_flows(
+                self.pcap_paths[0], workers=self.workers, idle_timeout=self.flow_idle_timeout
+            )
+        else:
+            flows = aggregate_flows(self.packets(), idle_timeout=self.flow_idle_timeout)
+        for flow in flows:
+            yield flow.to_event(self.metadata)
+
+    def packets(self) -> Iterator[Packet]:
+        """
+        Stream decoded packets from the capture
+
+        With several sensor captures the streams are k-way merged by
+        timestamp and cross-sensor duplicates within ``dedup_window``
+        seconds are dropped.
+        """
+        if len(self.pcap_paths) > 1:
+            yield from merge_captures(self.pcap_paths, dedup_window=self.dedup_window)
+            return
+        with PcapReader(self.pcap_paths[0]) as reader:
+            yield from reader.packets()
+
+    def packet_events(self) -> Iterator[Dict]:
+        """Yield one event per IP packet (no flow aggregation)"""
+        for packet in self.packets():
+            yield {
+                "timestamp": datetime.utcfromtimestamp(packet.timestamp).isoformat(),
+                "event_type": "network.packet",
+                "source_ip": packet.source_ip,
+                "source_port": packet.source_port,
+                "dest_ip": packet.dest_ip,
+                "dest_port": packet.dest_port,
+                "protocol": packet.protocol,
+                "payload_size": packet.payload_size,
+                "flags": tcp_flag_names(packet.tcp_flags),
+                "metadata": dict(self.metadata),
             }
-        ]
 
-        return events
+    def payload_events(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        stream_cap: int = DEFAULT_STREAM_CAP,
+        preview_bytes: int = DEFAULT_PREVIEW_BYTES,
+    ) -> Iterator[Dict]:
+        """
+        Yield one ``network.payload`` event per reassembled TCP stream and
+        per UDP DNS message
 
-    def correlate_with_host_events(self, host_events: List[Dict]) -> List[Dict]:
+        TCP streams are rebuilt by ``replay.reassembly.TCPReassembler``
+        within ``memory_budget`` bytes overall and ``stream_cap`` bytes per
+        direction; HTTP, SMB and DNS payloads are summarised under the
+        matching key of the event.
+        """
+        reassembler = TCPReassembler(memory_budget, stream_cap, self.flow_idle_timeout)
+        for packet in self.packets():
+            if packet.protocol == "UDP" and 53 in (packet.source_port, packet.dest_port):
+                message = bytes(packet.payload)
+                dns = parse_dns_message(message)
+                if dns is not None:
+                    query = not dns["response"]
+                    event = payload_event(
+                        packet.timestamp,
+                        packet.source_ip,
+                        packet.source_port,
+                        packet.dest_ip,
+                        packet.dest_port,
+                        "UDP",
+                        "dns",
+                        message if query else b"",
+                        b"" if query else message,
+                        self.metadata,
+                        preview_bytes,
+                    )
+                    event["dns"] = {"messages": [dns]}
+                    yield event
+                continue
+            for stream in reassembler.add(packet):
+                yield stream.to_event(self.metadata, preview_bytes)
+        for stream in reassembler.flush():
+            yield stream.to_event(self.metadata, preview_bytes)
+
+    def correlate_with_host_events(
+        self,
+        host_events: List[Dict],
+        window: float = DEFAULT_WINDOW,
+        dns_window: float = DEFAULT_DNS_WINDOW,
+        upload_window: float = DEFAULT_UPLOAD_WINDOW,
+    ) -> List[Dict]:
         """
         Correlate network events with host-based events (Sysmon, etc.)
 
-        Returns a unified timeline
+        Returns a unified timeline. Connections are matched to the process
+        that opened them, to the DNS query that resolved their destination
+        and to files the process wrote before sending data; see
+        ``replay.correlation.correlate`` for the join itself.
         """
-        # TODO: Implement correlation logic
-        # 1. Match network connections to process creation
-        # 2. Match DNS queries to subsequent connections
-        # 3. Match file writes to network uploads
-        # 4. Build attack chain graph
+        # TODO: Build attack chain graph from the correlated timeline
+        return correlate(
+            self.process(),
+            host_events,
+            window=window,
+            dns_window=dns_window,
+            upload_window=upload_window,
+        )
+
+    def generate_replay(self, output_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+        """
+        Generate a columnar replay file
 
-        timeline = []
-        return timeline
+        Chunked binary layout with a footer time index, so the UI can load
+        just the chunks for the range it is showing (see replay.columnar).
+        """
+        info = {"pcap_file": self.pcap_path, "processed_at": datetime.utcnow().isoformat()}
+        with ReplayWriter(output_path, chunk_size=chunk_size, info=info) as writer:
+            for event in self.process():
+                writer.write(event)
+        return output_path
 
     def generate_replay_json(self, output_path: str):
-        """Generate replay JSON file"""
-        events = self.process()
-
-        replay_data = {
-            "pcap_file": self.pcap_path,
-            "processed_at": datetime.utcnow().isoformat(),
-            "total_events": len(events),
-            "duration_seconds": 300,  # TODO: Calculate from timestamps
-            "events": events,
-        }
-
-        with open(output_path, "w") as f:
-            json.dump(replay_data, f, indent=2)
-
-        return output_path
+        """Generate replay JSON file (export format; see generate_replay)"""
+        return write_replay_json(self.process(), output_path, self.pcap_path)
+
+
+def write_replay_json(
+    events: Iterable[Dict], output_path: str, pcap_file: Union[str, Sequence[str]]
+) -> str:
+    """
+    Write events as a replay JSON document
+
+    Events are written as they are produced instead of being collected
+    into one document first; totals are emitted after the event array.
+    """
+    total_events = 0
+    first_ts = last_ts = None
+
+    with open(output_path, "w") as f:
+        f.write("{\n")
+        f.write(f'  "pcap_file": {json.dumps(pcap_file)},\n')
+        f.write(f'  "processed_at": {json.dumps(datetime.utcnow().isoformat())},\n')
+        f.write('  "events": [')
+        for event in events:
+            f.write(",\n    " if total_events else "\n    ")
+            f.write(json.dumps(event))
+            total_events += 1
+            # Flows are emitted in close order, not start order
+            start = event_time(event)
+            end = event.get("last_timestamp", start)
+            if first_ts is None or start < first_ts:
+                first_ts = start
+            if last_ts is None or end > last_ts:
+                last_ts = end
+        f.write("\n  ],\n" if total_events else "],\n")
+        f.write(f'  "total_events": {total_events},\n')
+        duration = round(last_ts - first_ts, 6) if total_events else 0
+        f.write(f'  "duration_seconds": {duration}\n')
+        f.write("}\n")
+
+    return output_path
+
+
+def export_replay_json(replay_path: str, output_path: str) -> str:
+    """Export a columnar replay file to the replay JSON format"""
+    with ReplayReader(replay_path) as reader:
+        pcap_file = reader.info.get("pcap_file", replay_path)
+        return write_replay_json(reader.events(), output_path, pcap_file)
 
 
 def main():
-    """Example usage"""
-    processor = PCAPProcessor("/path/to/capture.pcap")
-    processor.generate_replay_json("/path/to/replay.json")
-    print("✅ Replay JSON generated")
+    """
+    Example usage: python -m replay.pcap_processor capture.pcap replay.rrp [replay.json]
+
+    Pass several comma-separated captures to merge per-sensor pcaps.
+    """
+    pcap_path = sys.argv[1] if len(sys.argv) > 1 else "/path/to/capture.pcap"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else "/path/to/replay.rrp"
+    if "," in pcap_path:
+        pcap_path = pcap_path.split(",")
+    processor = PCAPProcessor(pcap_path)
+    processor.generate_replay(output_path)
+    print("✅ Replay file generated")
+    if len(sys.argv) > 3:
+        export_replay_json(output_path, sys.argv[3])
+        print("✅ Replay JSON exported")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,464 @@
+"""
+Streaming PCAP / PCAPNG Reader
+Memory-maps a capture and decodes link, network and transport headers
+in place, yielding one lightweight record per packet
+"""
+
+import mmap
+import socket
+import struct
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Classic pcap magic numbers (as read little-endian)
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAP_MAGIC_USEC_SWAPPED = 0xD4C3B2A1
+PCAP_MAGIC_NSEC_SWAPPED = 0x4D3CB2A1
+
+# pcapng block types
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Link-layer types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+PROTOCOL_NAMES = {
+    IPPROTO_ICMP: "ICMP",
+    IPPROTO_TCP: "TCP",
+    IPPROTO_UDP: "UDP",
+    IPPROTO_ICMPV6: "ICMPv6",
+}
+
+# IPv6 extension headers that are skipped to reach the transport header
+_IPV6_EXT_HEADERS = frozenset((0, 43, 60))
+_IPV6_FRAGMENT = 44
+
+TCP_FLAG_NAMES = (
+    (0x01, "FIN"),
+    (0x02, "SYN"),
+    (0x04, "RST"),
+    (0x08, "PSH"),
+    (0x10, "ACK"),
+    (0x20, "URG"),
+    (0x40, "ECE"),
+    (0x80, "CWR"),
+)
+
+_ETHERTYPE = struct.Struct("!H")
+# version/IHL, total length, flags/fragment offset, protocol, source, destination
+_IPV4 = struct.Struct("!BxH2xH1xB2x4s4s")
+# payload length, next header, source, destination
+_IPV6 = struct.Struct("!4xHB1x16s16s")
+# ports, sequence number, data offset, flags
+_TCP = struct.Struct("!HHI4xBB")
+_PORTS = struct.Struct("!HH")
+_U16 = struct.Struct("!H")
+
+# Consumed regions of the mapping are dropped from the process' resident
+# set every this many bytes so RSS stays flat on multi-GB captures.
+RELEASE_WINDOW = 16 * 1024 * 1024
+
+_inet_ntoa = socket.inet_ntoa
+_inet_ntop = socket.inet_ntop
+_AF_INET6 = socket.AF_INET6
+
+
+class Packet(NamedTuple):
+    """A decoded packet; ``payload`` is a zero-copy view into the capture"""
+
+    timestamp: float
+    source_ip: str
+    source_port: int
+    dest_ip: str
+    dest_port: int
+    protocol: str
+    length: int
+    payload_size: int
+    tcp_flags: int
+    tcp_seq: int
+    payload: memoryview
+
+
+class Shard(NamedTuple):
+    """A record-aligned byte range of a capture (see PcapReader.split)"""
+
+    start: int
+    end: int
+    # pcapng only: (byte order, ((linktype, ticks per second), ...))
+    state: tuple
+
+
+class PCAPFormatError(ValueError):
+    """Raised when a capture file is not valid pcap or pcapng"""
+
+
+def tcp_flag_names(flags: int) -> list:
+    """Expand a TCP flags bitmask into names, e.g. 0x12 -> ["SYN", "ACK"]"""
+    return [name for bit, name in TCP_FLAG_NAMES if flags & bit]
+
+
+class PcapReader:
+    """
+    Memory-mapped reader for classic pcap and pcapng captures
+
+    The file is never read into memory: headers are decoded with
+    ``struct.unpack_from`` directly against the mapping and payloads are
+    exposed as ``memoryview`` slices, so resident memory stays flat no
+    matter how large the capture is. Payload views are only valid while
+    the reader is open.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self.format = ""
+
+    def __enter__(self) -> "PcapReader":
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Packet]:
+        return self.packets()
+
+    def open(self) -> None:
+        if self._mm is not None:
+            return
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:  # empty file
+            self._file.close()
+            self._file = None
+            raise PCAPFormatError(f"{self.path}: empty capture") from exc
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self._mm)
+        self.format = self._detect_format()
+
+    def close(self) -> None:
+        view, mm, self._view, self._mm = self._view, self._mm, None, None
+        try:
+            if view is not None:
+                view.release()
+            if mm is not None:
+                mm.close()
+        except BufferError:
+            # A consumer still holds a payload view; the mapping is
+            # released when the last view is garbage collected.
+            pass
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _detect_format(self) -> str:
+        if len(self._mm) < 4:
+            raise PCAPFormatError(f"{self.path}: truncated header")
+        (magic,) = struct.unpack_from("<I", self._mm, 0)
+        if magic == PCAPNG_SHB:
+            return "pcapng"
+        if magic in (
+            PCAP_MAGIC_USEC,
+            PCAP_MAGIC_NSEC,
+            PCAP_MAGIC_USEC_SWAPPED,
+            PCAP_MAGIC_NSEC_SWAPPED,
+        ):
+            return "pcap"
+        raise PCAPFormatError(f"{self.path}: unknown capture magic 0x{magic:08x}")
+
+    # ------------------------------------------------------------------
+    # Record framing
+    # ------------------------------------------------------------------
+
+    def records(
+        self, shard: Optional["Shard"] = None
+    ) -> Iterator[Tuple[float, int, int, int, int]]:
+        """
+        Yield raw frame records as (timestamp, linktype, offset, caplen, wirelen)
+
+        ``offset``/``caplen`` locate the link-layer frame inside the mapping.
+        Pass a Shard from ``split()`` to read only that byte range.
+        """
+        self.open()
+        if self.format == "pcapng":
+            return self._pcapng_records(shard)
+        return self._pcap_records(shard)
+
+    def _pcap_header(self) -> Tuple[str, float, int]:
+        """(endianness, timestamp divisor, linktype) from the global header"""
+        mm = self._mm
+        if len(mm) < 24:
+            raise PCAPFormatError(f"{self.path}: truncated global header")
+        (magic,) = struct.unpack_from("<I", mm, 0)
+        endian = "<" if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else ">"
+        divisor = 1e9 if magic in (PCAP_MAGIC_NSEC, PCAP_MAGIC_NSEC_SWAPPED) else 1e6
+        linktype = struct.unpack_from(endian + "I", mm, 20)[0] & 0x0FFFFFFF
+        return endian, divisor, linktype
+
+    def _pcap_records(self, shard: Optional["Shard"]) -> Iterator[Tuple[float, int, int, int, int]]:
+        mm = self._mm
+        endian, divisor, linktype = self._pcap_header()
+        record_header = struct.Struct(endian + "IIII")
+        unpack_header = record_header.unpack_from
+        header_size = record_header.size
+        size = len(mm)
+        offset = 24 if shard is None else shard.start
+        end = size if shard is None else shard.end
+        released = offset - offset % mmap.PAGESIZE
+        while offset < end and offset + header_size <= size:
+            if offset - released >= RELEASE_WINDOW:
+                released = self._release(released, offset)
+            ts_sec, ts_frac, caplen, wirelen = unpack_header(mm, offset)
+            offset += header_size
+            if offset + caplen > size:
+                break  # truncated final record (capture still being written)
+            yield ts_sec + ts_frac / divisor, linktype, offset, caplen, wirelen
+            offset += caplen
+
+    def _pcapng_records(
+        self, shard: Optional["Shard"]
+    ) -> Iterator[Tuple[float, int, int, int, int]]:
+        mm = self._mm
+        size = len(mm)
+        if shard is None:
+            offset, end = 0, size
+            # Per-section interface table: (linktype, ticks per second)
+            endian, interfaces = "<", []
+        else:
+            offset, end = shard.start, shard.end
+            endian, interfaces = shard.state[0], list(shard.state[1])
+        released = offset - offset % mmap.PAGESIZE
+
+        while offset < end and offset + 12 <= size:
+            if offset - released >= RELEASE_WINDOW:
+                released = self._release(released, offset)
+            (block_type,) = struct.unpack_from(endian + "I", mm, offset)
+            if block_type == PCAPNG_SHB:
+                # Byte order is only known after reading the BOM
+                (bom,) = struct.unpack_from("<I", mm, offset + 8)
+                endian = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+            (block_len,) = struct.unpack_from(endian + "I", mm, offset + 4)
+            if block_len < 12 or offset + block_len > size:
+                break
+
+            if block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, wirelen = struct.unpack_from(
+                    endian + "IIIII", mm, offset + 8
+                )
+                if iface < len(interfaces):
+                    linktype, resolution = interfaces[iface]
+                    ticks = (ts_high << 32) | ts_low
+                    yield ticks / resolution, linktype, offset + 28, caplen, wirelen
+            elif block_type == PCAPNG_IDB:
+                interfaces.append(self._interface(mm, endian, offset, block_len))
+            elif block_type == PCAPNG_SPB and interfaces:
+                # Simple packet blocks carry no timestamp
+                (wirelen,) = struct.unpack_from(endian + "I", mm, offset + 8)
+                caplen = min(wirelen, block_len - 16)
+                yield 0.0, interfaces[0][0], offset + 12, caplen, wirelen
+
+            offset += block_len
+
+    def split(self, shards: int) -> List["Shard"]:
+        """
+        Cut the capture into about ``shards`` byte ranges of similar size
+
+        Boundaries always fall on record (pcap) or block (pcapng) starts;
+        finding them takes one pass over the record headers only. pcapng
+        shards carry the byte order and interface table in effect at their
+        start, so each can be decoded on its own.
+        """
+        self.open()
+        mm = self._mm
+        size = len(mm)
+        shards = max(1, shards)
+        targets = [size * i // shards for i in range(1, shards)]
+        bounds: List[Tuple[int, tuple]] = []
+
+        if self.format == "pcap":
+            endian, _, _ = self._pcap_header()
+            unpack_caplen = struct.Struct(endian + "I").unpack_from
+            offset = 24
+            bounds.append((offset, ()))
+            for target in targets:
+                while offset < target and offset + 16 <= size:
+                    offset += 16 + unpack_caplen(mm, offset + 8)[0]
+                if offset + 16 <= size and offset > bounds[-1][0]:
+                    bounds.append((offset, ()))
+        else:
+            offset = 0
+            endian, interfaces = "<", []
+            bounds.append((offset, (endian, ())))
+            for target in targets:
+                while offset < target and offset + 12 <= size:
+                    (block_type,) = struct.unpack_from(endian + "I", mm, offset)
+                    if block_type == PCAPNG_SHB:
+                        (bom,) = struct.unpack_from("<I", mm, offset + 8)
+                        endian = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                        interfaces = []
+                    (block_len,) = struct.unpack_from(endian + "I", mm, offset + 4)
+                    if block_len < 12:
+                        offset = size
+                        break
+                    if block_type == PCAPNG_IDB:
+                        interfaces.append(self._interface(mm, endian, offset, block_len))
+                    offset += block_len
+                if offset + 12 <= size and offset > bounds[-1][0]:
+                    bounds.append((offset, (endian, tuple(interfaces))))
+
+        ends = [start for start, _ in bounds[1:]] + [size]
+        return [Shard(start, end, state) for (start, state), end in zip(bounds, ends)]
+
+    def _release(self, start: int, end: int) -> int:
+        """Drop consumed pages in [start, end) from the resident set"""
+        end -= end % mmap.PAGESIZE
+        if end > start and hasattr(mmap, "MADV_DONTNEED"):
+            # Read-only file mapping: pages are re-faulted from the page
+            # cache if a consumer still touches an old payload view.
+            self._mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+        return end
+
+    @classmethod
+    def _interface(cls, mm: mmap.mmap, endian: str, offset: int, block_len: int) -> tuple:
+        """(linktype, ticks per second) from an interface description block"""
+        linktype = struct.unpack_from(endian + "H", mm, offset + 8)[0]
+        return linktype, cls._if_tsresol(mm, endian, offset + 16, offset + block_len - 4)
+
+    @staticmethod
+    def _if_tsresol(mm: mmap.mmap, endian: str, offset: int, end: int) -> int:
+        """Read the if_tsresol option of an IDB, defaulting to microseconds"""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", mm, offset)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = mm[offset + 4]
+                if value & 0x80:
+                    return 2 ** (value & 0x7F)
+                return 10**value
+            offset += 4 + ((length + 3) & ~3)
+        return 1_000_000
+
+    # ------------------------------------------------------------------
+    # Header decoding
+    # ------------------------------------------------------------------
+
+    def packets(self, shard: Optional["Shard"] = None) -> Iterator[Packet]:
+        """Yield decoded IP packets in capture order, skipping non-IP frames"""
+        for record in self.records(shard):
+            packet = self.decode(*record)
+            if packet is not None:
+                yield packet
+
+    def decode(
+        self, timestamp: float, linktype: int, offset: int, caplen: int, wirelen: int
+    ) -> Optional[Packet]:
+        """Decode one frame record into a Packet (None for non-IP frames)"""
+        mm = self._mm
+        end = offset + caplen
+
+        if linktype == LINKTYPE_ETHERNET:
+            if caplen < 14:
+                return None
+            (ethertype,) = _ETHERTYPE.unpack_from(mm, offset + 12)
+            offset += 14
+            while ethertype in ETHERTYPE_VLAN and offset + 4 <= end:
+                (ethertype,) = _ETHERTYPE.unpack_from(mm, offset + 2)
+                offset += 4
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            if caplen < 1:
+                return None
+            ethertype = ETHERTYPE_IPV6 if mm[offset] >> 4 == 6 else ETHERTYPE_IPV4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            if caplen < 16:
+                return None
+            (ethertype,) = _ETHERTYPE.unpack_from(mm, offset + 14)
+            offset += 16
+        elif linktype == LINKTYPE_NULL:
+            if caplen < 4:
+                return None
+            family = mm[offset] or mm[offset + 3]
+            ethertype = ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6
+            offset += 4
+        else:
+            return None
+
+        view = self._view
+        if ethertype == ETHERTYPE_IPV4:
+            if offset + 20 > end:
+                return None
+            version_ihl, total_length, frag, proto, src, dst = _IPV4.unpack_from(mm, offset)
+            source_ip = _inet_ntoa(src)
+            dest_ip = _inet_ntoa(dst)
+            if total_length:
+                end = min(end, offset + total_length)
+            offset += (version_ihl & 0x0F) * 4
+            # Non-first fragments carry no transport header
+            fragment = frag & 0x1FFF
+        elif ethertype == ETHERTYPE_IPV6:
+            if offset + 40 > end:
+                return None
+            payload_length, proto, src, dst = _IPV6.unpack_from(mm, offset)
+            source_ip = _inet_ntop(_AF_INET6, src)
+            dest_ip = _inet_ntop(_AF_INET6, dst)
+            offset += 40
+            fragment = 0
+            end = min(end, offset + payload_length)
+            while proto in _IPV6_EXT_HEADERS and offset + 2 <= end:
+                proto, ext_len = mm[offset], (mm[offset + 1] + 1) * 8
+                offset += ext_len
+            if proto == _IPV6_FRAGMENT and offset + 8 <= end:
+                proto = mm[offset]
+                # Fragment offset in 8-byte units, as in IPv4
+                fragment = _U16.unpack_from(mm, offset + 2)[0] >> 3
+                offset += 8
+        else:
+            return None
+
+        source_port = dest_port = flags = seq = 0
+        if fragment:
+            pass
+        elif proto == IPPROTO_TCP and offset + 20 <= end:
+            source_port, dest_port, seq, data_offset, flags = _TCP.unpack_from(mm, offset)
+            offset += (data_offset >> 4) * 4
+        elif proto == IPPROTO_UDP and offset + 8 <= end:
+            source_port, dest_port = _PORTS.unpack_from(mm, offset)
+            offset += 8
+
+        if offset > end:
+            offset = end
+        return Packet(
+            timestamp,
+            source_ip,
+            source_port,
+            dest_ip,
+            dest_port,
+            PROTOCOL_NAMES.get(proto) or str(proto),
+            wirelen,
+            end - offset,
+            flags,
+            seq,
+            view[offset:end],
+        )
@@ -0,0 +1,299 @@
+"""
+Application Payload Decoders
+Summarises reassembled HTTP, SMB and DNS payloads for replay events
+"""
+
+import socket
+import struct
+from typing import Dict, List, Optional, Tuple
+
+# Upper bound on requests / commands / records listed per stream
+MAX_ITEMS = 32
+
+HTTP_METHODS = (
+    b"GET ",
+    b"POST ",
+    b"PUT ",
+    b"HEAD ",
+    b"DELETE ",
+    b"OPTIONS ",
+    b"PATCH ",
+    b"CONNECT ",
+)
+
+SMB1_MAGIC = b"\xffSMB"
+SMB2_MAGIC = b"\xfeSMB"
+
+SMB2_COMMANDS = {
+    0x00: "NEGOTIATE",
+    0x01: "SESSION_SETUP",
+    0x02: "LOGOFF",
+    0x03: "TREE_CONNECT",
+    0x04: "TREE_DISCONNECT",
+    0x05: "CREATE",
+    0x06: "CLOSE",
+    0x07: "FLUSH",
+    0x08: "READ",
+    0x09: "WRITE",
+    0x0A: "LOCK",
+    0x0B: "IOCTL",
+    0x0C: "CANCEL",
+    0x0D: "ECHO",
+    0x0E: "QUERY_DIRECTORY",
+    0x0F: "CHANGE_NOTIFY",
+    0x10: "QUERY_INFO",
+    0x11: "SET_INFO",
+    0x12: "OPLOCK_BREAK",
+}
+
+SMB1_COMMANDS = {
+    0x25: "TRANS",
+    0x2E: "READ_ANDX",
+    0x2F: "WRITE_ANDX",
+    0x32: "TRANS2",
+    0x72: "NEGOTIATE",
+    0x73: "SESSION_SETUP_ANDX",
+    0x75: "TREE_CONNECT_ANDX",
+    0xA2: "NT_CREATE_ANDX",
+}
+
+DNS_TYPES = {
+    1: "A",
+    2: "NS",
+    5: "CNAME",
+    6: "SOA",
+    12: "PTR",
+    15: "MX",
+    16: "TXT",
+    28: "AAAA",
+    33: "SRV",
+    255: "ANY",
+}
+
+_SMB2_HEADER_SIZE = 64
+_U16 = struct.Struct("<H")
+_U16_BE = struct.Struct("!H")
+_DNS_HEADER = struct.Struct("!HHHHHH")
+_DNS_QUESTION = struct.Struct("!HH")
+_DNS_RECORD = struct.Struct("!HHIH")
+
+
+def detect(dest_port: int, client_data: bytes, server_data: bytes = b"") -> str:
+    """Application protocol of a stream: by content first, then by port"""
+    if client_data.startswith(HTTP_METHODS) or server_data.startswith(b"HTTP/1."):
+        return "http"
+    if client_data[4:8] in (SMB1_MAGIC, SMB2_MAGIC):
+        return "smb"
+    if dest_port == 53:
+        return "dns"
+    if dest_port in (80, 8080, 8000):
+        return "http"
+    if dest_port in (139, 445):
+        return "smb"
+    return "unknown"
+
+
+# ----------------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------------
+
+
+def _http_messages(data: bytes) -> List[Tuple[bytes, Dict[str, str]]]:
+    """Split an HTTP/1.x byte stream into (start line, headers) pairs"""
+    messages = []
+    offset = 0
+    while offset < len(data) and len(messages) < MAX_ITEMS:
+        head_end = data.find(b"\r\n\r\n", offset)
+        if head_end < 0:
+            head_end = len(data)
+        lines = data[offset:head_end].split(b"\r\n")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(b":")
+            if sep:
+                headers[name.strip().lower().decode("latin-1")] = value.strip().decode("latin-1")
+        messages.append((lines[0], headers))
+        body_start = head_end + 4
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = 0
+        if "chunked" in headers.get("transfer-encoding", ""):
+            # Chunked bodies are not walked; look for the next message head
+            next_start = data.find(b"HTTP/1.", body_start)
+            if next_start < 0:
+                break
+            offset = data.rfind(b"\r\n", body_start, next_start)
+            offset = next_start if offset < 0 else offset + 2
+            continue
+        offset = body_start + max(length, 0)
+    return messages
+
+
+def parse_http(client_data: bytes, server_data: bytes) -> Dict:
+    requests = []
+    for start_line, headers in _http_messages(client_data):
+        parts = start_line.decode("latin-1").split(" ")
+        if len(parts) < 2:
+            continue
+        requests.append(
+            {
+                "method": parts[0],
+                "uri": parts[1],
+                "host": headers.get("host"),
+                "user_agent": headers.get("user-agent"),
+                "content_length": headers.get("content-length"),
+            }
+        )
+    responses = []
+    for start_line, headers in _http_messages(server_data):
+        parts = start_line.decode("latin-1").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            continue
+        responses.append(
+            {
+                "status": int(parts[1]) if parts[1].isdigit() else parts[1],
+                "content_type": headers.get("content-type"),
+                "content_length": headers.get("content-length"),
+                "server": headers.get("server"),
+            }
+        )
+    return {"requests": requests, "responses": responses}
+
+
+# ----------------------------------------------------------------------
+# SMB
+# ----------------------------------------------------------------------
+
+
+def _utf16(data: bytes) -> str:
+    return data.decode("utf-16-le", errors="replace")
+
+
+def parse_smb(client_data: bytes) -> Dict:
+    """Commands and tree / file paths from the client side of an SMB session"""
+    dialect = None
+    commands: List[str] = []
+    paths: List[str] = []
+    offset = 0
+    # NetBIOS session framing: type byte, 24-bit length
+    while offset + 8 <= len(client_data) and len(commands) < MAX_ITEMS:
+        length = int.from_bytes(client_data[offset + 1 : offset + 4], "big")
+        message = client_data[offset + 4 : offset + 4 + length]
+        offset += 4 + length
+        magic = message[:4]
+        if magic == SMB2_MAGIC and len(message) >= _SMB2_HEADER_SIZE:
+            dialect = "SMB2"
+            (command,) = _U16.unpack_from(message, 12)
+            commands.append(SMB2_COMMANDS.get(command, hex(command)))
+            body = _SMB2_HEADER_SIZE
+            # TREE_CONNECT: path offset/length at body+4; CREATE: name at body+44
+            field = {0x03: body + 4, 0x05: body + 44}.get(command)
+            if field is not None and len(message) >= field + 4:
+                (name_offset,) = _U16.unpack_from(message, field)
+                (name_length,) = _U16.unpack_from(message, field + 2)
+                name = message[name_offset : name_offset + name_length]
+                if name and len(paths) < MAX_ITEMS:
+                    paths.append(_utf16(name))
+        elif magic == SMB1_MAGIC and len(message) >= 5:
+            dialect = dialect or "SMB1"
+            commands.append(SMB1_COMMANDS.get(message[4], hex(message[4])))
+        elif not message:
+            break
+    return {"dialect": dialect, "commands": commands, "paths": paths}
+
+
+# ----------------------------------------------------------------------
+# DNS
+# ----------------------------------------------------------------------
+
+
+def _dns_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a (possibly compressed) name; returns (name, offset after it)"""
+    labels = []
+    end = None
+    jumps = 0
+    while offset < len(message):
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(message) or jumps > 16:
+                break
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(message[offset : offset + length].decode("latin-1"))
+        offset += length
+    return ".".join(labels), end if end is not None else offset
+
+
+def parse_dns_message(message: bytes) -> Optional[Dict]:
+    """Questions and A/AAAA/CNAME answers of one DNS message (None if malformed)"""
+    if len(message) < _DNS_HEADER.size:
+        return None
+    ident, flags, qdcount, ancount, _, _ = _DNS_HEADER.unpack_from(message)
+    offset = _DNS_HEADER.size
+    queries = []
+    answers = []
+    try:
+        for _ in range(min(qdcount, MAX_ITEMS)):
+            name, offset = _dns_name(message, offset)
+            qtype, _ = _DNS_QUESTION.unpack_from(message, offset)
+            offset += _DNS_QUESTION.size
+            queries.append({"name": name, "type": DNS_TYPES.get(qtype, str(qtype))})
+        for _ in range(min(ancount, MAX_ITEMS)):
+            name, offset = _dns_name(message, offset)
+            rtype, _, ttl, rdlength = _DNS_RECORD.unpack_from(message, offset)
+            offset += _DNS_RECORD.size
+            rdata = message[offset : offset + rdlength]
+            if rtype == 1 and rdlength == 4:
+                value = socket.inet_ntoa(rdata)
+            elif rtype == 28 and rdlength == 16:
+                value = socket.inet_ntop(socket.AF_INET6, rdata)
+            elif rtype in (2, 5, 12):
+                value = _dns_name(message, offset)[0]
+            else:
+                value = None
+            offset += rdlength
+            answers.append(
+                {"name": name, "type": DNS_TYPES.get(rtype, str(rtype)), "ttl": ttl, "data": value}
+            )
+    except struct.error:
+        if not queries:
+            return None
+    return {
+        "id": ident,
+        "response": bool(flags & 0x8000),
+        "rcode": flags & 0x000F,
+        "queries": queries,
+        "answers": answers,
+    }
+
+
+def parse_dns_tcp(client_data: bytes, server_data: bytes) -> Dict:
+    """DNS over TCP: messages are prefixed with a 16-bit length"""
+    messages = []
+    for data in (client_data, server_data):
+        offset = 0
+        while offset + 2 <= len(data) and len(messages) < MAX_ITEMS:
+            (length,) = _U16_BE.unpack_from(data, offset)
+            parsed = parse_dns_message(data[offset + 2 : offset + 2 + length])
+            if parsed is not None:
+                messages.append(parsed)
+            offset += 2 + length
+    return {"messages": messages}
+
+
+def describe(app_protocol: str, client_data: bytes, server_data: bytes) -> Optional[Dict]:
+    """Protocol summary for a reassembled stream, or None when not decoded"""
+    if app_protocol == "http":
+        return parse_http(client_data, server_data)
+    if app_protocol == "smb":
+        return parse_smb(client_data)
+    if app_protocol == "dns":
+        return parse_dns_tcp(client_data, server_data)
+    return None
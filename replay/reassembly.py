@@ -0,0 +1,403 @@
+"""
+TCP Stream Reassembly
+Rebuilds per-connection byte streams from TCP segments under a global
+memory budget, so replay can show application payloads (HTTP, SMB, DNS)
+"""
+
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import protocols
+from .flows import DEFAULT_IDLE_TIMEOUT, TCP_FIN, TCP_RST, TCP_SYN, starts_connection
+from .pcap_reader import Packet
+
+TCP_SYN_ACK = TCP_SYN | 0x10
+
+# Total bytes buffered across all streams before the least recently
+# active stream is emitted early
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Bytes kept per direction of one stream; the rest is counted, not stored
+DEFAULT_STREAM_CAP = 1024 * 1024
+# Bytes of each direction copied into the replay event
+DEFAULT_PREVIEW_BYTES = 4096
+
+StreamKey = Tuple[str, int, str, int]
+
+
+class SegmentIntervals:
+    """
+    Out-of-order TCP data as disjoint byte intervals keyed on start offset
+
+    Starts are kept sorted and located with bisect, so an insert only
+    touches the neighbouring intervals. Overlaps and adjacent intervals are
+    merged on insert; where segments overlap, the bytes that arrived first
+    are kept.
+    """
+
+    __slots__ = ("starts", "chunks", "size")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.chunks: Dict[int, bytes] = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: int, data: bytes) -> None:
+        starts = self.starts
+        chunks = self.chunks
+        end = start + len(data)
+        i = bisect_right(starts, start)
+
+        if i:
+            prev_start = starts[i - 1]
+            prev = chunks[prev_start]
+            prev_end = prev_start + len(prev)
+            if prev_end >= end:
+                return
+            if prev_end >= start:
+                i -= 1
+                data = prev + data[prev_end - start :]
+                start = prev_start
+                del starts[i]
+                del chunks[prev_start]
+                self.size -= len(prev)
+
+        while i < len(starts) and starts[i] <= end:
+            next_start = starts.pop(i)
+            following = chunks.pop(next_start)
+            self.size -= len(following)
+            next_end = next_start + len(following)
+            merged = data[: next_start - start] + following
+            if next_end < end:
+                merged += data[next_end - start :]
+            data = merged
+            end = start + len(data)
+
+        starts.insert(i, start)
+        chunks[start] = data
+        self.size += len(data)
+
+    def pop_first(self) -> Tuple[int, bytes]:
+        start = self.starts.pop(0)
+        data = self.chunks.pop(start)
+        self.size -= len(data)
+        return start, data
+
+
+class StreamDirection:
+    """One direction of a connection: in-order bytes plus pending segments"""
+
+    __slots__ = ("isn", "next_seq", "data", "pending", "fin", "gaps", "truncated")
+
+    def __init__(self):
+        self.isn: Optional[int] = None
+        self.next_seq = 0  # relative to isn
+        self.data = bytearray()
+        self.pending: Optional[SegmentIntervals] = None
+        self.fin = False
+        self.gaps = 0  # bytes never seen (capture loss)
+        self.truncated = 0  # bytes dropped by the per-stream cap
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + (self.pending.size if self.pending else 0)
+
+    def accept(self, seq: int, payload, cap: int) -> None:
+        if self.isn is None:
+            self.isn = seq
+        offset = (seq - self.isn) & 0xFFFFFFFF
+        if offset >= 0x80000000:  # retransmission from before the pickup point
+            offset -= 0x100000000
+        end = offset + len(payload)
+        if end <= self.next_seq:
+            return
+
+        # Sequence space that still fits under the cap
+        limit = self.next_seq + cap - len(self.data)
+        if end > limit:
+            self.truncated += end - max(offset, limit)
+            end = limit
+            if offset >= end:
+                return
+
+        if offset > self.next_seq:
+            if self.pending is None:
+                self.pending = SegmentIntervals()
+            self.pending.add(offset, bytes(payload[: end - offset]))
+            return
+
+        self.data += payload[self.next_seq - offset : end - offset]
+        self.next_seq = end
+        pending = self.pending
+        while pending and pending.starts[0] <= self.next_seq:
+            start, chunk = pending.pop_first()
+            tail = chunk[self.next_seq - start :]
+            if tail:
+                self.data += tail
+                self.next_seq += len(tail)
+
+    def finalize(self) -> None:
+        """Append segments stranded behind a hole, recording the hole"""
+        pending = self.pending
+        while pending:
+            start, chunk = pending.pop_first()
+            self.gaps += start - self.next_seq
+            self.data += chunk
+            self.next_seq = start + len(chunk)
+        self.pending = None
+
+
+class TCPStream:
+    """A reassembled connection; the ``source`` side is the client"""
+
+    __slots__ = (
+        "source_ip",
+        "source_port",
+        "dest_ip",
+        "dest_port",
+        "first_seen",
+        "last_seen",
+        "packets",
+        "to_server",
+        "to_client",
+        "close_reason",
+    )
+
+    def __init__(self, packet: Packet, client_is_source: bool = True):
+        if client_is_source:
+            self.source_ip, self.source_port = packet.source_ip, packet.source_port
+            self.dest_ip, self.dest_port = packet.dest_ip, packet.dest_port
+        else:
+            self.source_ip, self.source_port = packet.dest_ip, packet.dest_port
+            self.dest_ip, self.dest_port = packet.source_ip, packet.source_port
+        self.first_seen = packet.timestamp
+        self.last_seen = packet.timestamp
+        self.packets = 0
+        self.to_server = StreamDirection()
+        self.to_client = StreamDirection()
+        self.close_reason = "end"
+
+    @property
+    def size(self) -> int:
+        return self.to_server.size + self.to_client.size
+
+    @property
+    def client_data(self) -> bytes:
+        return bytes(self.to_server.data)
+
+    @property
+    def server_data(self) -> bytes:
+        return bytes(self.to_client.data)
+
+    def to_event(
+        self, metadata: Optional[Dict] = None, preview_bytes: int = DEFAULT_PREVIEW_BYTES
+    ) -> Dict:
+        client = self.client_data
+        server = self.server_data
+        app_protocol = protocols.detect(self.dest_port, client, server)
+        event = payload_event(
+            self.first_seen,
+            self.source_ip,
+            self.source_port,
+            self.dest_ip,
+            self.dest_port,
+            "TCP",
+            app_protocol,
+            client,
+            server,
+            metadata,
+            preview_bytes,
+        )
+        event.update(
+            {
+                "last_timestamp": self.last_seen,
+                "packets": self.packets,
+                "truncated_bytes": self.to_server.truncated + self.to_client.truncated,
+                "missing_bytes": self.to_server.gaps + self.to_client.gaps,
+                "close_reason": self.close_reason,
+            }
+        )
+        details = protocols.describe(app_protocol, client, server)
+        if details is not None:
+            event[app_protocol] = details
+        return event
+
+
+def payload_event(
+    timestamp: float,
+    source_ip: str,
+    source_port: int,
+    dest_ip: str,
+    dest_port: int,
+    protocol: str,
+    app_protocol: str,
+    client_data: bytes,
+    server_data: bytes,
+    metadata: Optional[Dict] = None,
+    preview_bytes: int = DEFAULT_PREVIEW_BYTES,
+) -> Dict:
+    """
+    ``network.payload`` replay event
+
+    Payload previews are decoded as latin-1, which maps every byte to one
+    character, so the original bytes can be recovered from the JSON.
+    """
+    return {
+        "timestamp": datetime.utcfromtimestamp(timestamp).isoformat(),
+        "event_type": "network.payload",
+        "source_ip": source_ip,
+        "source_port": source_port,
+        "dest_ip": dest_ip,
+        "dest_port": dest_port,
+        "protocol": protocol,
+        "app_protocol": app_protocol,
+        "first_timestamp": timestamp,
+        "client_bytes": len(client_data),
+        "server_bytes": len(server_data),
+        "client_payload": client_data[:preview_bytes].decode("latin-1"),
+        "server_payload": server_data[:preview_bytes].decode("latin-1"),
+        "metadata": dict(metadata or {}),
+    }
+
+
+class TCPReassembler:
+    """
+    Bounded-memory TCP reassembly
+
+    Streams live in an OrderedDict kept in last-activity order. Idle
+    streams are emitted from the front, and whenever the bytes buffered
+    across all streams exceed ``memory_budget`` the least recently active
+    streams are emitted early (``close_reason`` "evicted"). Each direction
+    stores at most ``stream_cap`` bytes; out-of-order segments wait in a
+    SegmentIntervals structure that counts against the same cap.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        stream_cap: int = DEFAULT_STREAM_CAP,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.memory_budget = memory_budget
+        self.stream_cap = stream_cap
+        self.idle_timeout = idle_timeout
+        self.buffered = 0
+        self.peak_buffered = 0
+        self.evicted = 0
+        self._streams: "OrderedDict[StreamKey, TCPStream]" = OrderedDict()
+        self._next_sweep = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def add(self, packet: Packet) -> List[TCPStream]:
+        """Account one packet; returns streams that finished as a result"""
+        finished: List[TCPStream] = []
+        if packet.protocol != "TCP":
+            return finished
+        streams = self._streams
+        ts = packet.timestamp
+        flags = packet.tcp_flags
+
+        if ts >= self._next_sweep:
+            self._evict_idle(ts, finished)
+            self._next_sweep = ts + min(self.idle_timeout, 1.0)
+
+        key = (packet.source_ip, packet.source_port, packet.dest_ip, packet.dest_port)
+        stream = streams.get(key)
+        if stream is None:
+            reverse = (packet.dest_ip, packet.dest_port, packet.source_ip, packet.source_port)
+            stream = streams.get(reverse)
+            if stream is not None:
+                key = reverse
+
+        if stream is not None and (
+            ts - stream.last_seen > self.idle_timeout
+            or ((stream.to_server.fin or stream.to_client.fin) and starts_connection(flags))
+        ):
+            self._finish(
+                key, "idle" if ts - stream.last_seen > self.idle_timeout else "fin", finished
+            )
+            stream = None
+
+        if stream is None:
+            if flags & TCP_RST or not (packet.payload_size or flags & TCP_SYN):
+                return finished
+            client_is_source = flags & TCP_SYN_ACK != TCP_SYN_ACK
+            stream = TCPStream(packet, client_is_source)
+            key = (stream.source_ip, stream.source_port, stream.dest_ip, stream.dest_port)
+            streams[key] = stream
+        else:
+            streams.move_to_end(key)
+
+        stream.packets += 1
+        if ts > stream.last_seen:
+            stream.last_seen = ts
+        from_client = (
+            packet.source_ip == stream.source_ip and packet.source_port == stream.source_port
+        )
+        direction = stream.to_server if from_client else stream.to_client
+
+        if flags & TCP_SYN and direction.isn is None:
+            direction.isn = (packet.tcp_seq + 1) & 0xFFFFFFFF
+        if packet.payload_size:
+            before = direction.size
+            direction.accept(packet.tcp_seq, packet.payload, self.stream_cap)
+            self.buffered += direction.size - before
+            if self.buffered > self.peak_buffered:
+                self.peak_buffered = self.buffered
+        if flags & TCP_FIN:
+            direction.fin = True
+
+        if flags & TCP_RST:
+            self._finish(key, "rst", finished)
+        elif stream.to_server.fin and stream.to_client.fin:
+            self._finish(key, "fin", finished)
+
+        while self.buffered > self.memory_budget and streams:
+            self.evicted += 1
+            self._finish(next(iter(streams)), "evicted", finished)
+        return finished
+
+    def _finish(self, key: StreamKey, reason: str, finished: List[TCPStream]) -> None:
+        stream = self._streams.pop(key)
+        self.buffered -= stream.size
+        stream.close_reason = reason
+        stream.to_server.finalize()
+        stream.to_client.finalize()
+        if stream.to_server.data or stream.to_client.data:
+            finished.append(stream)
+
+    def _evict_idle(self, now: float, finished: List[TCPStream]) -> None:
+        streams = self._streams
+        cutoff = now - self.idle_timeout
+        while streams:
+            key, stream = next(iter(streams.items()))
+            if stream.last_seen >= cutoff:
+                break
+            self._finish(key, "idle", finished)
+
+    def flush(self) -> List[TCPStream]:
+        """Emit every remaining stream (end of capture)"""
+        finished: List[TCPStream] = []
+        while self._streams:
+            self._finish(next(iter(self._streams)), "end", finished)
+        return finished
+
+
+def reassemble(
+    packets: Iterable[Packet],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    stream_cap: int = DEFAULT_STREAM_CAP,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+) -> Iterator[TCPStream]:
+    """Yield reassembled TCP streams (those that carried data) as they finish"""
+    reassembler = TCPReassembler(memory_budget, stream_cap, idle_timeout)
+    add = reassembler.add
+    for packet in packets:
+        yield from add(packet)
+    yield from reassembler.flush()
@@ -0,0 +1,240 @@
+"""
+Timeline Pyramid
+Multi-resolution per-bucket event counts and byte volumes for a replay,
+built while the replay file is written, plus LTTB downsampling for charts
+
+Level 0 buckets are ``base_width`` seconds wide; each level above merges
+``factor`` buckets of the one below. Buckets are aligned on the epoch, so
+a bucket at any level is exactly the sum of its children and a query is
+answered from the coarsest level that still has enough points.
+
+Levels are sparse: sorted indexes of the non-empty buckets alongside
+their counts and volumes, so size follows the number of busy buckets, not
+the time span (an event stamped 0.0 next to current traffic adds a bucket,
+not fifty years of them). Files written before that keep dense levels,
+which read the same way.
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BASE_WIDTH = 1.0
+DEFAULT_FACTOR = 4
+DEFAULT_MAX_POINTS = 500
+
+
+class TimelineLevel:
+    """
+    Bucket arrays for one resolution: ``indexes`` holds the epoch-aligned
+    index of each bucket; without it the level is dense from ``first_index``
+    """
+
+    __slots__ = ("width", "first_index", "counts", "volumes", "indexes")
+
+    def __init__(
+        self,
+        width: float,
+        first_index: int,
+        counts: Sequence[int],
+        volumes: Sequence[int],
+        indexes: Optional[Sequence[int]] = None,
+    ):
+        self.width = width
+        self.first_index = first_index  # epoch-aligned index of counts[0]
+        self.counts = counts
+        self.volumes = volumes
+        self.indexes = indexes
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def index(self, position: int) -> int:
+        """Epoch-aligned bucket index at array ``position``"""
+        if self.indexes is None:
+            return self.first_index + position
+        return self.indexes[position]
+
+    def span(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        """Array positions [lo, hi) of the buckets overlapping [start, end]"""
+        if self.indexes is not None:
+            lo = 0 if start is None else bisect_left(self.indexes, math.floor(start / self.width))
+            hi = (
+                len(self)
+                if end is None
+                else bisect_right(self.indexes, math.floor(end / self.width))
+            )
+            return lo, max(lo, hi)
+        lo = 0 if start is None else max(0, math.floor(start / self.width) - self.first_index)
+        hi = (
+            len(self)
+            if end is None
+            else min(len(self), math.floor(end / self.width) - self.first_index + 1)
+        )
+        return lo, max(lo, hi)
+
+
+class TimelineBuilder:
+    """Accumulates level-0 buckets in any timestamp order and builds the pyramid"""
+
+    def __init__(self, base_width: float = DEFAULT_BASE_WIDTH, factor: int = DEFAULT_FACTOR):
+        if base_width <= 0 or factor < 2:
+            raise ValueError("base_width must be positive and factor at least 2")
+        self.base_width = base_width
+        self.factor = factor
+        self._buckets: Dict[int, List[int]] = {}
+
+    def add(self, timestamp: float, volume: int = 0) -> None:
+        index = math.floor(timestamp / self.base_width)
+        bucket = self._buckets.get(index)
+        if bucket is None:
+            self._buckets[index] = [1, volume]
+        else:
+            bucket[0] += 1
+            bucket[1] += volume
+
+    def levels(self) -> List[TimelineLevel]:
+        """Every level from ``base_width`` up to a single bucket"""
+        if not self._buckets:
+            return []
+        indexes = array("q", sorted(self._buckets))
+        counts = array("Q", (self._buckets[index][0] for index in indexes))
+        volumes = array("Q", (self._buckets[index][1] for index in indexes))
+        levels = [TimelineLevel(self.base_width, indexes[0], counts, volumes, indexes)]
+        factor = self.factor
+        while len(levels[-1]) > 1:
+            below = levels[-1]
+            indexes, counts, volumes = array("q"), array("Q"), array("Q")
+            # Children are sorted, so each parent's children are adjacent
+            for index, count, volume in zip(below.indexes, below.counts, below.volumes):
+                parent = index // factor
+                if indexes and indexes[-1] == parent:
+                    counts[-1] += count
+                    volumes[-1] += volume
+                else:
+                    indexes.append(parent)
+                    counts.append(count)
+                    volumes.append(volume)
+            levels.append(TimelineLevel(below.width * factor, indexes[0], counts, volumes, indexes))
+        return levels
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: indexes of ``threshold`` points that
+    keep the visual shape of the series (first and last always included)
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start or 1
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+class Timeline:
+    """Read side of a timeline pyramid (levels ordered fine to coarse)"""
+
+    def __init__(self, levels: List[TimelineLevel], factor: int = DEFAULT_FACTOR):
+        self.levels = levels
+        self.factor = factor
+
+    def pick_level(self, start: Optional[float], end: Optional[float], max_points: int) -> int:
+        """Finest level with at most ``max_points`` buckets in the range"""
+        for number, level in enumerate(self.levels):
+            lo, hi = level.span(start, end)
+            if hi - lo <= max_points:
+                return number
+        return len(self.levels) - 1
+
+    def buckets(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+    ) -> Dict:
+        """
+        Aggregated buckets overlapping [start, end]; empty buckets are left out
+
+        Bucket sums are exact, so the totals equal the raw counts for the
+        whole buckets covered. Cost is O(max_points).
+        """
+        number = self.pick_level(start, end, max_points)
+        level = self.levels[number]
+        lo, hi = level.span(start, end)
+        points = [
+            [level.index(i) * level.width, level.counts[i], level.volumes[i]] for i in range(lo, hi)
+        ]
+        return {
+            "level": number,
+            "bucket_seconds": level.width,
+            "points": points,
+            "total_events": sum(p[1] for p in points),
+            "total_bytes": sum(p[2] for p in points),
+        }
+
+    def downsample(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+        metric: str = "events",
+    ) -> Dict:
+        """
+        LTTB line series of ``metric`` (events or bytes per second)
+
+        Picked from the level one step finer than ``buckets`` would use,
+        so at most ``factor * max_points`` buckets are scanned. A run of
+        empty buckets is drawn as zeros at its two ends, which gives the
+        same line as every empty bucket would.
+        """
+        number = max(0, self.pick_level(start, end, max_points) - 1)
+        level = self.levels[number]
+        lo, hi = level.span(start, end)
+        values = level.counts if metric == "events" else level.volumes
+        width = level.width
+        xs: List[float] = []
+        ys: List[float] = []
+        previous = None
+        for i in range(lo, hi):
+            index = level.index(i)
+            if previous is not None and index - previous > 1:
+                xs.append((previous + 1.5) * width)
+                ys.append(0.0)
+                if index - previous > 2:
+                    xs.append((index - 0.5) * width)
+                    ys.append(0.0)
+            xs.append((index + 0.5) * width)
+            ys.append(values[i] / width)
+            previous = index
+        keep = lttb(xs, ys, max_points)
+        return {
+            "level": number,
+            "bucket_seconds": level.width,
+            "metric": metric,
+            "points": [[xs[i], ys[i]] for i in keep],
+        }